@@ -2,223 +2,892 @@
 orchestrator.py
 ───────────────────────────────
 전체 파이프라인 실행 + 단계별 파일 저장 + 결과 JSON 반환
+- 각 단계는 입력/출력을 선언한 DAG 노드로 구성 (module/dag.py)
+- 기준별 Audit, 섹션별 Build/EditPass1 은 입력이 준비되는 즉시 병렬 실행
+- run / run_stream 은 같은 그래프(_pipeline)를 공유
+- 같은 문서(doc_id)를 다시 돌리면 입력이 바뀐 노드만 재실행 (module/incremental.py)
+- run_stream 은 모델 토큰 조각(delta)도 {step, name, section, delta} 이벤트로 전달
+- 실행마다 run_id + 전용 작업 공간(runs/<run_id>/)과 로그 → 동시 실행 안전
+- 노드별 체크포인트(runs/<run_id>/checkpoints/) → resume=<run_id> 로 실패 지점부터 재개
+- LLM 호출별 토큰/지연 시간/비용 → runs/<run_id>/usage.json, 결과 JSON 의 usage, 실행 간 이력
+- tracing span: run → node → llm (run_id 로 묶임), 끝난 span 으로 metrics 갱신
+- tree_mode: single(섹션 전체를 한 번에) / map_reduce(문단별 fill → 부분 트리 병합) / auto(긴 섹션만 map_reduce)
+- audit_mode: criterion(기준별 템플릿) / prefix(공통 원문·트리를 앞에 → prefix 캐시) / multi(여러 기준을 한 호출로)
+- edit2_mode: whole(논문 전체를 한 번에) / section(섹션별 병렬 수정 → 순서대로 합침, 섹션이 끝날 때마다 이벤트)
+- 단계/노드별 모델 라우팅 + fallback (module/routing.py, TREELLM_ROUTES 또는 --routes)
+  결정(primary / fallback:<이유>)은 runs/<run_id>/run.json 의 routing 과 실행 간 이력에 남음
+- 그래프를 만들기 전에 실행 계획(module/planner.py)으로 빈 섹션 / 대상 섹션이 없는 기준의 노드를 뺌
+  --dry-run 은 계획과 단계별 예상 토큰/시간만 출력 (LLM 호출 없음)
+- AsyncOrchestrator: 같은 그래프를 asyncio 로 실행 (arun / arun_stream, asgi.py 에서 사용, --asyncio)
+
+환경 변수
+- TREELLM_TREE_MODE       : tree_mode 기본값 (기본: single)
+- TREELLM_TREE_AUTO_CHARS : auto 모드에서 map_reduce 로 바꾸는 섹션 길이 (기본: 12000)
+- TREELLM_AUDIT_MODE      : audit_mode 기본값 (기본: criterion)
+- TREELLM_AUDIT_GROUP     : multi 모드에서 한 호출에 넣을 기준 수 (기본: 0 = 전부)
+- TREELLM_EDIT2_MODE      : edit2_mode 기본값 (기본: whole)
 """
 
 from pathlib import Path
+import argparse
+import asyncio
+import hashlib
 import json
-from datetime import datetime
 import os
+import queue
+import threading
+from datetime import datetime
+from types import SimpleNamespace
+from typing import AsyncIterator, Callable, Dict, Iterator, List, Optional
 
 # 각 단계 모듈 불러오기
-from module.build import BuildStep
-from module.split import run as split_run
+from module.build import AsyncBuildStep, BuildStep
+from module.split import run as split_run, split_paragraphs, VALID_SECTIONS
 from module.fuse import TreeBuilder
-from module.audit import AuditStep
-from module.edit_pass1 import EditPass1
-from module.global_check import GlobalCheck
-from module.edit_pass2 import EditPass2
-
-LOG_FILE = Path("sample/orchestrator_log.txt")
+from module.tree_reduce import MapReduceTreeBuilder
+from module.audit import AUDIT_MODES, AsyncAuditStep, AuditStep
+from module.edit_pass1 import AsyncEditPass1, EditPass1
+from module.global_check import AsyncGlobalCheck, GlobalCheck
+from module.edit_pass2 import EDIT2_MODES, AsyncEditPass2, EditPass2
+from module.dag import Graph
+from module.planner import Plan, Planner
+from module.prompts import get_registry
+from module.chunking import chunk_tokens, edit_chunk_tokens
+from module.llm_cache import get_cache
+from module.llm_client import get_client
+from module.llm_async import get_async_client
+from module.routing import Router, load_routes
+from module.incremental import RunState
+from module.workspace import Workspace, cleanup, runs_root
+from module.checkpoint import CheckpointStore, MemoChain
+from module.usage import UsageTracker, append_history, current_tracker, format_row
+from module import metrics, tracing
+
+# (단계 노드, 단계 번호, run 결과 이름, 스트림 이벤트 이름)
+STEPS = [
+    ("split", 1, "Split", "Split"),
+    ("build", 2, "Build", "Build"),
+    ("fuse", 3, "Fuse (TreeBuilder)", "Fuse"),
+    ("audit", 4, "Audit", "Audit"),
+    ("edit1", 5, "EditPass1", "EditPass1"),
+    ("global_check", 6, "GlobalCheck", "GlobalCheck"),
+    ("edit2", 7, "EditPass2", "EditPass2"),
+]
+
+STEP_OF = {node: (step, name, alias) for node, step, name, alias in STEPS}
+ALIASES = {step: alias for _, step, _, alias in STEPS}
+
+TREE_MODES = ("single", "map_reduce", "auto")
+
+
+def delta_record(step: int, section: Optional[str], delta: str, reset: bool) -> dict:
+    return {"step": step, "name": ALIASES[step], "section": section, "delta": delta, "reset": reset}
+
+
+def stream_event(record: dict) -> dict:
+    """
+    _pipeline 레코드 → run_stream 이벤트 (run_stream 주석의 형식)
+    """
+    if "delta" in record:
+        event = {k: record[k] for k in ("step", "name", "section", "delta")}
+        if record["reset"]:
+            event["reset"] = True
+        return event
+    if record["step"] == 0:
+        return {"step": 0, "name": "Start", "run_id": record["run_id"]}
+    if record.get("partial"):
+        return {"step": 7, "name": record["alias"], "section": record["section"], "content": record["content"]}
+    event = {"step": record["step"], "name": record["alias"], "content": record["content"]}
+    if record["step"] == 8:
+        event["usage"] = record["usage"]["total"]
+    return event
 
 
 class Orchestrator:
-    def __init__(self, model: str = "gpt-4o"):
+    def __init__(
+        self,
+        model: str = "gpt-4o",
+        max_workers: int = 7,
+        incremental: bool = True,
+        state_dir: str = "state",
+        runs_dir: Optional[str] = None,
+        keep_going: bool = False,
+        tree_mode: Optional[str] = None,
+        audit_mode: Optional[str] = None,
+        edit2_mode: Optional[str] = None,
+    ):
+        """
+        runs_dir: 실행별 작업 공간 루트 (기본: TREELLM_RUNS_DIR 또는 runs)
+        keep_going: 노드가 실패해도 무관한 노드는 끝까지 실행 (배치 모드에서 요청을 최대한 모음)
+        tree_mode: Build 방식 (single / map_reduce / auto, 기본: TREELLM_TREE_MODE 또는 single)
+        audit_mode: Audit 프롬프트 배치 (criterion / prefix / multi, 기본: TREELLM_AUDIT_MODE 또는 criterion)
+        edit2_mode: EditPass2 방식 (whole / section, 기본: TREELLM_EDIT2_MODE 또는 whole)
+        Orchestrator 인스턴스 하나는 한 번에 하나의 실행만 담당 (요청마다 새로 생성)
+        """
         self.model = model
+        self.max_workers = max_workers  # 동시에 실행할 노드(GPT 호출) 수
+        self.incremental = incremental  # 이전 실행 기록 재사용 여부
+        self.state_dir = state_dir
+        self.runs_dir = runs_dir
+        self.keep_going = keep_going
+        self.tree_mode = tree_mode or os.getenv("TREELLM_TREE_MODE", "single")
+        if self.tree_mode not in TREE_MODES:
+            raise ValueError(f"tree_mode 는 {TREE_MODES} 중 하나: {self.tree_mode}")
+        self.tree_auto_chars = int(os.getenv("TREELLM_TREE_AUTO_CHARS", "12000"))
+        self.audit_mode = audit_mode or os.getenv("TREELLM_AUDIT_MODE", "criterion")
+        if self.audit_mode not in AUDIT_MODES:
+            raise ValueError(f"audit_mode 는 {AUDIT_MODES} 중 하나: {self.audit_mode}")
+        self.audit_group = int(os.getenv("TREELLM_AUDIT_GROUP", "0"))
+        self.edit2_mode = edit2_mode or os.getenv("TREELLM_EDIT2_MODE", "whole")
+        if self.edit2_mode not in EDIT2_MODES:
+            raise ValueError(f"edit2_mode 는 {EDIT2_MODES} 중 하나: {self.edit2_mode}")
+        self.workspace: Optional[Workspace] = None
+        self.usage: Optional[UsageTracker] = None
+
+    def settings(self) -> dict:
+        """
+        결과에 영향을 주는 실행 설정 (모델 / 방식 / 조각 크기 / 라우팅 / 프롬프트 버전)
+        """
+        router = self.llm().router
+        return {
+            "model": self.model,
+            "tree_mode": self.tree_mode,
+            "tree_auto_chars": self.tree_auto_chars,
+            "audit_mode": self.audit_mode,
+            "audit_group": self.audit_group,
+            "edit2_mode": self.edit2_mode,
+            "chunk_tokens": chunk_tokens(),
+            "edit_chunk_tokens": edit_chunk_tokens(),
+            "routes": router.describe() if router else None,
+            "prompts": get_registry().version(),
+        }
+
+    def routed_model(self, step: str, node: str, model: str) -> str:
+        """
+        노드 version 에 넣을 모델: 라우팅 표에서 이 노드/단계가 실제로 쓰는 모델 (+ fallback)
+        라우팅 표(TREELLM_ROUTES / --routes)가 바뀌면 해당 노드의 메모가 무효 → 다시 실행
+        """
+        router = self.llm().router
+        route = router.resolve(step, node, model) if router is not None else None
+        if route is None:
+            return model
+        return f"{route.model}>{route.fallback}" if route.fallback else route.model
+
+    def settings_key(self) -> str:
+        """
+        settings() 해시 → 같은 문서 + 같은 키면 이전 실행 결과를 그대로 재사용 (app.py /run_pipeline)
+        """
+        text = json.dumps(self.settings(), sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
 
     def log(self, message: str):
-        print(message)
-        with open(LOG_FILE, "a", encoding="utf-8") as log:
-            log.write(f"[{datetime.now()}] {message}\n")
-
-    def run(self, infile_text: str):
-        # 로그 초기화
-        LOG_FILE.write_text(f"[Orchestrator Started] {datetime.now()}\n\n", encoding="utf-8")
-
-        base_dir = Path("sample")
-        base_dir.mkdir(parents=True, exist_ok=True)
-
-        # 단계별 파일 경로
-        split_json = base_dir / "step1_result.json"
-        split_txt = base_dir / "sample_split.txt"
-        build_txt = base_dir / "step1_result.txt"
-        tree_json = base_dir / "step2_result.json"
-        audit_txt = base_dir / "step3_result.txt"
-        edit1_json = base_dir / "step4_result.json"
-        global_check_txt = base_dir / "step5_global_check.txt"
-        edit2_txt = base_dir / "step6_result.txt"
-        final_txt = base_dir / "final_result.txt"
+        if self.workspace is None:
+            print(message)
+        else:
+            self.workspace.log(message)
+
+    # ─────────────────────────────
+    def paths(self, base_dir: Path) -> Dict[str, Path]:
+        """
+        단계별 파일 경로
+        """
+        return {
+            "split_json": base_dir / "step1_result.json",
+            "split_txt": base_dir / "sample_split.txt",
+            "build_txt": base_dir / "step1_result.txt",
+            "tree_json": base_dir / "step2_result.json",
+            "audit_txt": base_dir / "step3_result.txt",
+            "edit1_json": base_dir / "step4_result.json",
+            "global_check_txt": base_dir / "step5_global_check.txt",
+            "edit2_txt": base_dir / "step6_result.txt",
+            "final_txt": base_dir / "final_result.txt",
+        }
+
+    # ─────────────────────────────
+    def plan(self, raw_text: str) -> Plan:
+        """
+        원문 → 실행 계획 (LLM 호출 없음)
+        """
+        return Planner(
+            model=self.model, max_workers=self.max_workers,
+            tree_mode=self.tree_mode, tree_auto_chars=self.tree_auto_chars,
+            audit_mode=self.audit_mode, audit_group=self.audit_group, edit2_mode=self.edit2_mode,
+            history_root=self.runs_dir,
+        ).plan(raw_text)
+
+    def step_classes(self) -> Dict[str, type]:
+        """
+        LLM 을 호출하는 단계 클래스 (AsyncOrchestrator 는 코루틴 버전으로 바꿈)
+        """
+        return {"build": BuildStep, "audit": AuditStep, "edit1": EditPass1,
+                "global_check": GlobalCheck, "edit2": EditPass2}
+
+    def build_graph(self, paths: Dict[str, Path], plan: Plan, emit: Optional[Callable] = None) -> Graph:
+        """
+        파이프라인 DAG 구성 (plan 에 있는 build/audit/edit1 노드만 추가)
+        emit(step, section, delta, reset) 가 주어지면 GPT 호출을 토큰 단위로 스트리밍
+        - split            : raw_text → sections, section:<섹션>
+        - build:<pid>      : section:<섹션> → fill 결과 블록 (map_reduce/auto 는 paragraphs:<섹션> 도 입력)
+        - audit:<기준>     : 기준이 보는 section:* + build:* 만 의존
+                             (prefix/multi 는 모든 기준이 보는 섹션 전체에 의존, multi 는 audit:<기준1>+<기준2> 노드 하나가 여러 출력)
+        - edit1:<섹션>     : section:<섹션> + 그 섹션을 다루는 audit:* 만 의존
+        - edit2:<섹션>     : (section 모드) edit1 + global_check → 섹션별 수정, edit2 가 순서대로 합침
+        - build/fuse/audit/edit1/global_check/edit2 : 단계 단위 합류 노드
+        """
+        graph = Graph(max_workers=self.max_workers)
+
+        classes = self.step_classes()
+        build_step = classes["build"](model=self.model, max_workers=self.max_workers)
+        reduce_step = MapReduceTreeBuilder(model=self.model, max_workers=self.max_workers)
+        builder = TreeBuilder()
+        audit_step = classes["audit"](model=self.model, max_workers=self.max_workers)
+        edit1_step = classes["edit1"](model=self.model)
+        global_check = classes["global_check"](model=self.model, max_workers=self.max_workers)
+        edit2_step = classes["edit2"](model=self.model, max_workers=self.max_workers)
 
-        # 결과 JSON 누적
-        result_data = {"steps": []}
+        def sink(step: int, section: Optional[str] = None):
+            if emit is None:
+                return None
+            return lambda delta, reset=False: emit(step, section, delta, reset)
 
         # ✅ 1. Split
-        raw_text = Path(infile_text).read_text(encoding="utf-8")
-        sections = split_run(raw_text, out_file=split_txt)
-        split_json.write_text(json.dumps(sections, indent=2, ensure_ascii=False), encoding="utf-8")
-        self.log(f"[Step 1] Split 완료 → {split_json}, {split_txt}")
-        result_data["steps"].append({
-            "step": 1,
-            "name": "Split",
-            "files": {
-                "split.json": split_json.read_text(encoding="utf-8"),
-                "split.txt": split_txt.read_text(encoding="utf-8")
-            }
-        })
-
-        # ✅ 2. Build
-        build_step = BuildStep(model=self.model)
-        build_result = build_step.run(raw_text)
-        build_txt.write_text(build_result, encoding="utf-8")
-        self.log(f"[Step 2] Build 완료 → {build_txt}")
-        result_data["steps"].append({
-            "step": 2,
-            "name": "Build",
-            "files": {"step1_result.txt": build_result}
-        })
+        def split(d):
+            sections = split_run(d["raw_text"], out_file=paths["split_txt"])
+            outputs = {f"section:{sec}": sections[sec] for sec in VALID_SECTIONS}
+            outputs["sections"] = sections
+            if self.tree_mode != "single":
+                paragraphs = split_paragraphs(d["raw_text"])
+                for sec in VALID_SECTIONS:
+                    outputs[f"paragraphs:{sec}"] = [p.text for p in paragraphs if p.section == sec]
+            return outputs
+
+        paragraph_outputs = [] if self.tree_mode == "single" else [f"paragraphs:{sec}" for sec in VALID_SECTIONS]
+        graph.add(
+            "split",
+            split,
+            inputs=["raw_text"],
+            outputs=["sections"] + [f"section:{sec}" for sec in VALID_SECTIONS] + paragraph_outputs,
+            memo=False,  # sample_split.txt 를 매번 다시 씀
+        )
+
+        # ✅ 2. Build (fill 프롬프트별, 계획에 없는 프롬프트(빈 섹션 / split 에 없는 섹션)는 노드 자체를 만들지 않음)
+        build_nodes: Dict[str, str] = {}  # 섹션명 → build 노드
+        planned_builds = set(plan.names("build"))
+        merge_version = reduce_step.load_merge_template().version if self.tree_mode != "single" else ""
+
+        def build_one(d, pid: str, tmpl: str, sec: str) -> str:
+            text = d[f"section:{sec}"]
+            if not text.strip():
+                return ""
+            map_reduce = self.tree_mode == "map_reduce" or (
+                self.tree_mode == "auto" and len(text) >= self.tree_auto_chars
+            )
+            if map_reduce and len(d[f"paragraphs:{sec}"]) > 1:
+                return reduce_step.run_one(pid, tmpl, d[f"paragraphs:{sec}"], on_delta=sink(2, sec))
+            return build_step.run_one(pid, tmpl, text, on_delta=sink(2, sec))
+
+        for pid, tmpl in build_step.load_prompts():
+            sec = build_step.section_of(pid)
+            if pid not in planned_builds:
+                continue
+            build_nodes[sec] = f"build:{pid}"
+            if self.tree_mode == "single":
+                inputs = [f"section:{sec}"]
+                version = f"{self.routed_model('build', f'build:{pid}', build_step.model)}:{tmpl.version}"
+            else:
+                inputs = [f"section:{sec}", f"paragraphs:{sec}"]
+                version = (f"{self.routed_model('build', f'build:{pid}', build_step.model)}:{tmpl.version}:"
+                           f"{self.tree_mode}:{self.routed_model('merge', f'build:{pid}', reduce_step.model)}:"
+                           f"{merge_version}")
+            graph.add(
+                f"build:{pid}",
+                lambda d, pid=pid, tmpl=tmpl, sec=sec: build_one(d, pid, tmpl, sec),
+                inputs=inputs,
+                version=version,
+            )
+        graph.add(
+            "build",
+            lambda d: "\n\n".join(block for block in d.values() if block),
+            inputs=list(build_nodes.values()),
+        )
 
         # ✅ 3. Fuse (TreeBuilder)
-        builder = TreeBuilder()
-        tree_result = builder.run(build_result)
-        tree_json.write_text(tree_result, encoding="utf-8")
-        self.log(f"[Step 3] TreeBuilder 완료 → {tree_json}")
-        result_data["steps"].append({
-            "step": 3,
-            "name": "Fuse (TreeBuilder)",
-            "files": {"tree.json": tree_result}
-        })
-
-        # ✅ 4. Audit
-        tree_dict = json.loads(tree_result)
-        audit_step = AuditStep()
-        audit_result = audit_step.run(sections, tree_dict)
-        audit_txt.write_text(audit_result, encoding="utf-8")
-        self.log(f"[Step 4] Audit 완료 → {audit_txt}")
-        result_data["steps"].append({
-            "step": 4,
-            "name": "Audit",
-            "files": {"audit.txt": audit_result}
-        })
-
-        # ✅ 5. EditPass1
-        edit1_step = EditPass1()
-        edit1_result = edit1_step.run(sections, audit_result)
-        edit1_json.write_text(json.dumps(edit1_result, indent=2, ensure_ascii=False), encoding="utf-8")
-        self.log(f"[Step 5] EditPass1 완료 → {edit1_json}")
-        result_data["steps"].append({
-            "step": 5,
-            "name": "EditPass1",
-            "files": {"edit1.json": json.dumps(edit1_result, indent=2, ensure_ascii=False)}
-        })
-
-        # ✅ 6. GlobalCheck
-        global_check = GlobalCheck()
-        global_check_result = global_check.run(edit1_result)
-        global_check_txt.write_text(global_check_result, encoding="utf-8")
-        self.log(f"[Step 6] GlobalCheck 완료 → {global_check_txt}")
-        result_data["steps"].append({
-            "step": 6,
-            "name": "GlobalCheck",
-            "files": {"global_check.txt": global_check_result}
-        })
+        graph.add("fuse", lambda d: builder.run(d["build"]), inputs=["build"])
+
+        # ✅ 4. Audit (기준별, 대상 섹션이 모두 빈 기준은 제외)
+        audit_nodes = []  # audit:<기준> 출력 키
+        covering: Dict[str, list] = {sec: [] for sec in VALID_SECTIONS}  # 섹션 → 관련 audit 출력
+        planned_criteria = {pname for node in plan.names("audit") for pname in node.split("+")}
+        audit_prompts = {pname: t for pname, t in audit_step.load_prompts().items() if pname in planned_criteria}
+        for pname in audit_prompts:
+            audit_nodes.append(f"audit:{pname}")
+            for sec in audit_step.section_map.get(pname, []):
+                if sec in VALID_SECTIONS:
+                    covering[sec].append(f"audit:{pname}")
+
+        def audit_context(d, target):
+            sections = {sec: d[f"section:{sec}"] for sec in target}
+            blocks = [d[build_nodes[sec]] for sec in target if sec in build_nodes]
+            return sections, json.loads(builder.run("\n\n".join(b for b in blocks if b)))
+
+        if self.audit_mode == "criterion":
+            for pname, template in audit_prompts.items():
+                target = [sec for sec in audit_step.section_map.get(pname, []) if sec in VALID_SECTIONS]
+
+                def audit_one(d, pname=pname, template=template, target=target):
+                    sections, tree_dict = audit_context(d, target)
+                    return audit_step.run_criterion(pname, template, sections, tree_dict, on_delta=sink(4, pname))
+
+                graph.add(
+                    f"audit:{pname}",
+                    audit_one,
+                    inputs=[f"section:{sec}" for sec in target]
+                           + [build_nodes[sec] for sec in target if sec in build_nodes],
+                    version=f"{self.routed_model('audit', f'audit:{pname}', audit_step.model)}:{template.version}",
+                )
+        else:
+            # 모든 기준이 같은 prefix(공통 섹션 원문 + 트리)를 쓰므로 입력도 공통
+            shared = [sec for sec in audit_step.shared_sections() if sec in VALID_SECTIONS]
+            shared_inputs = [f"section:{sec}" for sec in shared] + [build_nodes[sec] for sec in shared if sec in build_nodes]
+            names = list(audit_prompts)
+            size = len(names) if self.audit_mode == "prefix" or self.audit_group <= 0 else self.audit_group
+            groups = [[p] for p in names] if self.audit_mode == "prefix" else [
+                names[i:i + size] for i in range(0, len(names), size)
+            ]
+            for i, group in enumerate(groups):
+                items = [(pname, audit_prompts[pname]) for pname in group]
+                # prefix: 첫 기준이 공급자 prefix 캐시를 채운 뒤 나머지 기준을 병렬로 (동시에 보내면 캐시 미적중)
+                warm = [f"audit:{groups[0][0]}"] if self.audit_mode == "prefix" and i > 0 else []
+
+                def audit_group(d, items=items):
+                    sections, tree_dict = audit_context(d, shared)
+                    if self.audit_mode == "prefix":
+                        pname, template = items[0]
+                        return audit_step.run_criterion_prefixed(
+                            pname, template, sections, tree_dict, on_delta=sink(4, pname)
+                        )
+                    label = "+".join(pname for pname, _ in items)
+                    blocks = audit_step.run_criteria(items, sections, tree_dict, on_delta=sink(4, label))
+                    outputs = {f"audit:{pname}": blocks.get(pname, "") for pname, _ in items}
+                    return outputs if len(items) > 1 else outputs[f"audit:{items[0][0]}"]
+
+                graph.add(
+                    "audit:" + "+".join(group),
+                    audit_group,
+                    inputs=shared_inputs + warm,
+                    outputs=[f"audit:{pname}" for pname in group] if len(group) > 1 else None,
+                    version=f"{self.routed_model('audit', 'audit:' + '+'.join(group), audit_step.model)}:"
+                            f"{self.audit_mode}:"
+                            + ":".join(audit_prompts[pname].version for pname in group),
+                )
+        graph.add(
+            "audit",
+            lambda d: "\n\n".join(d[n] for n in audit_nodes if d[n]),
+            inputs=["fuse"] + audit_nodes,
+        )
+
+        # ✅ 5. EditPass1 (내용이 있는 섹션별)
+        edit1_template = edit1_step.load_template()
+        edit1_sections = plan.names("edit1")
+        for sec in edit1_sections:
+            def edit_one(d, sec=sec):
+                feedback_text = "\n\n".join(d[n] for n in covering[sec] if d[n])
+                feedback = edit1_step.parse_feedback(feedback_text).get(sec, "No major issues found.")
+                return edit1_step.run_section(
+                    edit1_template, sec, d[f"section:{sec}"], feedback, on_delta=sink(5, sec)
+                )
+
+            graph.add(
+                f"edit1:{sec}",
+                edit_one,
+                inputs=[f"section:{sec}"] + covering[sec],
+                version=f"{self.routed_model('edit1', f'edit1:{sec}', edit1_step.model)}:{edit1_template.version}",
+            )
+        graph.add(
+            "edit1",
+            lambda d: {sec: d[f"edit1:{sec}"] for sec in edit1_sections},
+            inputs=["audit"] + [f"edit1:{sec}" for sec in edit1_sections],
+        )
+
+        # ✅ 6. GlobalCheck (내용이 있는 섹션이 하나도 없으면 6·7단계도 호출하지 않음)
+        empty = not plan.nodes("global_check")
+        graph.add(
+            "global_check",
+            lambda d: "" if empty else global_check.run(d["edit1"], on_delta=sink(6)),
+            inputs=["edit1"],
+            version=f"{self.routed_model('global_check', 'global_check', global_check.model)}:"
+                    f"{global_check.load_template().version}",
+        )
 
         # ✅ 7. EditPass2
-        edit2_step = EditPass2()
-        edit2_result = edit2_step.run(json.dumps(edit1_result, ensure_ascii=False), global_check_result)
-        edit2_txt.write_text(edit2_result, encoding="utf-8")
-        self.log(f"[Step 7] EditPass2 완료 → {edit2_txt}")
+        if self.edit2_mode == "section":
+            section_template = edit2_step.load_section_template()
+            for sec in edit1_sections:
+                def edit2_one(d, sec=sec):
+                    texts = edit2_step.collect_sections(d["edit1"])
+                    feedback = edit2_step.parse_feedback(d["global_check"])
+                    return edit2_step.revise_section(section_template, sec, texts, feedback, on_delta=sink(7, sec))
+
+                graph.add(
+                    f"edit2:{sec}",
+                    edit2_one,
+                    inputs=["edit1", "global_check"],
+                    version=f"{self.routed_model('edit2', f'edit2:{sec}', edit2_step.model)}:{section_template.version}",
+                )
+            graph.add(
+                "edit2",
+                lambda d: "" if empty else edit2_step.assemble({sec: d[f"edit2:{sec}"] for sec in edit1_sections}),
+                inputs=[f"edit2:{sec}" for sec in edit1_sections],
+            )
+            return graph
+
+        graph.add(
+            "edit2",
+            lambda d: "" if empty else edit2_step.run(
+                json.dumps(d["edit1"], ensure_ascii=False), d["global_check"], on_delta=sink(7)
+            ),
+            inputs=["edit1", "global_check"],
+            version=f"{self.routed_model('edit2', 'edit2', edit2_step.model)}:{edit2_step.load_template().version}",
+        )
+        return graph
+
+    # ─────────────────────────────
+    def _open(self, infile_text: Optional[str], doc_id: Optional[str], resume: Optional[str]) -> SimpleNamespace:
+        """
+        실행 준비: 작업 공간 + 입력 사본 + 체크포인트/증분 기록 + 사용량/span + 실행 계획
+        → _pipeline / AsyncOrchestrator._apipeline 이 공유하는 실행 상태
+        """
+        if resume:
+            raw_text, doc_id = self._open_resume(resume)
+        else:
+            raw_text = Path(infile_text).read_text(encoding="utf-8")
+            doc_id = doc_id or Path(infile_text).stem
+            self.workspace = Workspace(None, self.runs_dir)
+            self.workspace.log_file.write_text(f"[Orchestrator Started] {datetime.now()}\n\n", encoding="utf-8")
+            # 재개에 필요한 입력 사본 + 실행 정보
+            self.workspace.path("input.txt").write_text(raw_text, encoding="utf-8")
+            self.workspace.path("run.json").write_text(json.dumps(
+                {"run_id": self.workspace.run_id, "infile": str(infile_text), "doc_id": doc_id,
+                 "model": self.model, "created": str(datetime.now())},
+                indent=2, ensure_ascii=False,
+            ), encoding="utf-8")
+
+        removed = cleanup(self.runs_dir, keep=[self.workspace.run_id])
+        if removed:
+            self.log(f"[Workspace] 오래된 작업 공간 {len(removed)}개 정리")
+
+        checkpoints = CheckpointStore(self.workspace.path("checkpoints"))
+        run_state = RunState.for_document(doc_id, self.state_dir) if self.incremental else None
+        self.usage = UsageTracker()
+        run = SimpleNamespace(
+            raw_text=raw_text, doc_id=doc_id, resume=resume, paths=self.paths(self.workspace.dir),
+            checkpoints=checkpoints, run_state=run_state, memo=MemoChain([checkpoints, run_state]),
+            span=tracing.start_span("run", run_id=self.workspace.run_id, doc_id=doc_id,
+                                    model=self.model, resume=bool(resume)),
+            finished=False,
+        )
+
+        self.workspace.acquire()  # 다른 실행의 cleanup 이 건드리지 않도록 (_close / 준비 실패 시 release)
+        try:
+            run.plan = self.plan(raw_text)
+            self.workspace.path("plan.json").write_text(
+                json.dumps(run.plan.to_dict(), indent=2, ensure_ascii=False), encoding="utf-8")
+        except BaseException as exc:
+            self.workspace.release()
+            run.span.finish(exc)
+            raise
+        total = run.plan.total()
+        self.log(f"[Planner] 노드 {total['nodes']}개 (LLM 호출 약 {total['calls']}회, 건너뜀 {len(run.plan.skipped)}개), "
+                 f"예상 입력 {total['prompt_tokens']} / 출력 {total['completion_tokens']} 토큰, 약 {total['wall']:.0f}s")
+        # 준비가 끝난 실행만 셈 → 호출한 쪽의 try/finally 에서 _close 가 dec
+        metrics.RUNS_IN_FLIGHT.inc()
+        return run
+
+    def _on_node(self, run: SimpleNamespace, node: str, outputs: dict) -> List[dict]:
+        """
+        끝난 노드 하나 → 파일 저장 + 로그 + 내보낼 레코드 (단계 합류 노드가 아니면 대개 없음)
+        """
+        self.workspace.heartbeat()
+        if node.startswith("edit2:"):
+            # section 모드: 섹션 수정이 끝날 때마다 (완료 순서대로) 부분 결과
+            return [{"step": 7, "name": ALIASES[7], "alias": ALIASES[7], "section": node.split(":", 1)[1],
+                     "content": outputs[node], "partial": True}]
+        if node == "split" and run.run_state is not None:
+            changed = run.run_state.update_sections(outputs["sections"])
+            self.log(f"[Incremental] 변경된 섹션: {changed}")
+        if node not in STEP_OF:
+            return []
+        records = [self._step_record(node, *STEP_OF[node], outputs, run.paths)]
+
+        if node == "edit2":
+            # ✅ 8. Final Output (EditPass2 결과 복사)
+            content = outputs["edit2"]
+            run.paths["final_txt"].write_text(content, encoding="utf-8")
+            self.log(f"[Step 8] Finalize 완료 → {run.paths['final_txt']}")
+            if run.run_state is not None:
+                run.run_state.save()
+                self.log(f"[Incremental] 재사용 노드 {len(run.run_state.reused)}개, "
+                         f"실행 노드 {len(run.run_state.executed)}개")
+            if run.resume:
+                self.log(f"[Resume] 복원 {len(run.checkpoints.restored)}개, "
+                         f"무효 체크포인트 {len(run.checkpoints.invalid)}개")
+            summary = self._log_usage(run.doc_id)
+            self._save_routing()
+            run.finished = True
+            self.workspace.mark_done()
+            records.append({"step": 8, "name": "Finalize", "alias": "Finalize", "files": {}, "content": content,
+                            "usage": summary})
+        return records
+
+    def _close(self, run: SimpleNamespace, failure: Optional[BaseException]):
+        # 실패한 실행도 그때까지의 사용량은 남김
+        self.usage.save(self.workspace.path("usage.json"))
+        self.workspace.release()
+        metrics.RUNS_IN_FLIGHT.dec()
+        if not run.finished and failure is None:
+            run.span.attrs["cancelled"] = True
+        run.span.finish(failure)
+
+    def _start_record(self) -> dict:
+        return {"step": 0, "name": "Start", "alias": "Start", "files": {}, "content": "",
+                "run_id": self.workspace.run_id}
+
+    def _pipeline(
+        self,
+        infile_text: str,
+        doc_id: Optional[str] = None,
+        stream_tokens: bool = False,
+        resume: Optional[str] = None,
+    ) -> Iterator[dict]:
+        """
+        그래프를 실행하면서 단계가 끝날 때마다 파일 저장 + 로그 + 단계 레코드 반환.
+        단계 합류 노드는 이전 단계에 의존하므로 레코드는 항상 단계 순서대로 나옴.
+        doc_id: 증분 재분석 기록 키 (기본값: 입력 파일 이름)
+        stream_tokens: True 면 토큰 조각 레코드({"delta": ...})도 섞어서 반환
+
+        resume: 재개할 run_id (작업 공간에 저장된 입력/체크포인트 사용)
+
+        그래프는 별도 스레드에서 돌고, 노드 완료/토큰 조각은 하나의 큐로 모임.
+        """
+        run = self._open(infile_text, doc_id, resume)
+        failure: Optional[BaseException] = None
+
+        events: "queue.Queue[tuple]" = queue.Queue()
+        stop = threading.Event()
+
+        def emit(step: int, section: Optional[str], delta: str, reset: bool):
+            events.put(("delta", delta_record(step, section, delta, reset)))
+
+        try:
+            graph = self.build_graph(run.paths, run.plan, emit if stream_tokens else None)
+
+            def drive():
+                current_tracker.set(self.usage)  # 노드 스레드로 전달되어 LLM 호출이 여기에 기록됨
+                tracing.current_span.set(run.span)
+                runner = graph.run({"raw_text": run.raw_text}, memo=run.memo, keep_going=self.keep_going)
+                try:
+                    for item in runner:
+                        if stop.is_set():
+                            break
+                        events.put(("node", item))
+                    events.put(("done", None))
+                except Exception as exc:
+                    events.put(("error", exc))
+                finally:
+                    runner.close()
+
+            driver = threading.Thread(target=drive, daemon=True)
+            driver.start()
+            yield self._start_record()
+            while True:
+                kind, payload = events.get()
+                if kind == "done":
+                    break
+                if kind == "error":
+                    failure = payload
+                    raise payload
+                if kind == "delta":
+                    yield payload
+                    continue
+                yield from self._on_node(run, *payload)
+        finally:
+            # 소비자가 중간에 끊으면 (예: SSE 연결 종료) 남은 노드 실행을 멈춤
+            stop.set()
+            self._close(run, failure)
+
+    def _log_usage(self, doc_id: str) -> dict:
+        """
+        단계별 사용량 로그 + 실행 간 비교용 이력(runs/usage_history.jsonl)에 추가
+        """
+        summary = self.usage.summary()
+        for step, totals in summary["by_step"].items():
+            self.log(f"[Usage] {format_row(step, totals)}")
+        self.log(f"[Usage] {format_row('TOTAL', summary['total'])}")
+        entry = {
+            "run_id": self.workspace.run_id,
+            "doc_id": doc_id,
+            "model": self.model,
+            "finished": str(datetime.now()),
+            "total": summary["total"],
+            "by_step": summary["by_step"],
+        }
+        if summary["degraded"]:
+            # 재요청까지 실패해 버리거나 대체한 구조화 출력 (module/structured.py record_fallback)
+            self.log(f"[Usage] ⚠ 형식 오류로 대체된 결과 → {summary['degraded']}")
+            entry["degraded"] = summary["degraded"]
+        routes = self.usage.routes()
+        if routes["decisions"]:
+            for route, totals in routes["by_route"].items():
+                self.log(f"[Routing] {format_row(route, totals)}")
+            entry["by_route"] = routes["by_route"]
+            entry["by_model"] = summary["by_model"]
+        append_history(self.runs_dir or runs_root(), entry)
+        return summary
+
+    def _save_routing(self):
+        """
+        run.json 에 라우팅 표 + 호출별 결정 기록 (라우팅을 안 쓰면 그대로)
+        """
+        router = self.llm().router
+        if router is None:
+            return
+        path = self.workspace.path("run.json")
+        meta = json.loads(path.read_text(encoding="utf-8"))
+        meta["routing"] = {"routes": router.describe(), **self.usage.routes()}
+        path.write_text(json.dumps(meta, indent=2, ensure_ascii=False), encoding="utf-8")
+
+    def llm(self):
+        """
+        이 실행이 쓰는 LLM 클라이언트 (통계 / 라우팅 표)
+        """
+        return get_client()
+
+    def _open_resume(self, run_id: str):
+        """
+        기존 작업 공간 열기 → (원문, doc_id)
+        """
+        ws_dir = Path(self.runs_dir or runs_root()) / run_id
+        if not (ws_dir / "run.json").exists():
+            raise FileNotFoundError(f"재개할 작업 공간 없음: {ws_dir}")
+        self.workspace = Workspace(run_id, self.runs_dir)
+        meta = json.loads(self.workspace.path("run.json").read_text(encoding="utf-8"))
+        self.model = meta.get("model", self.model)
+        self.log(f"[Orchestrator Resumed] {datetime.now()} (run_id={run_id})")
+        return self.workspace.path("input.txt").read_text(encoding="utf-8"), meta["doc_id"]
+
+    def _step_record(self, node: str, step: int, name: str, alias: str, outputs: dict, paths: Dict[str, Path]) -> dict:
+        """
+        단계 합류 노드 결과 → 파일 저장 + 로그 + 단계 레코드
+        """
+        value = outputs["sections"] if node == "split" else outputs[node]
+
+        if node == "split":
+            paths["split_json"].write_text(json.dumps(value, indent=2, ensure_ascii=False), encoding="utf-8")
+            files = {
+                "split.json": paths["split_json"].read_text(encoding="utf-8"),
+                "split.txt": paths["split_txt"].read_text(encoding="utf-8"),
+            }
+            content = files["split.txt"]
+            self.log(f"[Step 1] Split 완료 → {paths['split_json']}, {paths['split_txt']}")
+        elif node == "edit1":
+            content = json.dumps(value, indent=2, ensure_ascii=False)
+            paths["edit1_json"].write_text(content, encoding="utf-8")
+            files = {"edit1.json": content}
+            self.log(f"[Step 5] EditPass1 완료 → {paths['edit1_json']}")
+        else:
+            key, fname = {
+                "build": ("build_txt", "step1_result.txt"),
+                "fuse": ("tree_json", "tree.json"),
+                "audit": ("audit_txt", "audit.txt"),
+                "global_check": ("global_check_txt", "global_check.txt"),
+                "edit2": ("edit2_txt", "edit2.txt"),
+            }[node]
+            content = value
+            paths[key].write_text(content, encoding="utf-8")
+            files = {fname: content}
+            self.log(f"[Step {step}] {name} 완료 → {paths[key]}")
+
+        return {"step": step, "name": name, "alias": alias, "files": files, "content": content}
+
+    # ─────────────────────────────
+    def run(self, infile_text: Optional[str] = None, doc_id: Optional[str] = None, resume: Optional[str] = None):
+        """
+        resume: 실패/중단된 run_id → 유효한 체크포인트는 불러오고 나머지만 실행
+        """
+        # 결과 JSON 누적
+        result_data = {"steps": []}
+        for record in self._pipeline(infile_text, doc_id, resume=resume):
+            self._collect(result_data, record)
+        self._log_done()
+        return result_data
+
+    @staticmethod
+    def _collect(result_data: dict, record: dict):
+        """
+        _pipeline 레코드 하나 → run() 결과 JSON 에 누적
+        """
+        if record["step"] == 0:
+            result_data["run_id"] = record["run_id"]
+            return
+        if record.get("partial"):
+            return
+        if record["step"] == 8:
+            result_data["final"] = record["content"]
+            result_data["usage"] = record["usage"]
+            return
         result_data["steps"].append({
-            "step": 7,
-            "name": "EditPass2",
-            "files": {"edit2.txt": edit2_result}
+            "step": record["step"],
+            "name": record["name"],
+            "files": record["files"],
         })
 
-        # ✅ 8. Final Output (EditPass2 결과 복사)
-        final_txt.write_text(edit2_result, encoding="utf-8")
-        self.log(f"[Step 8] Finalize 완료 → {final_txt}")
-
-        result_data["final"] = edit2_result
+    def _log_done(self):
+        self.log(f"[Orchestrator] 캐시 통계 → {get_cache().stats()}")
+        self.log(f"[Orchestrator] LLM 호출 통계 → {self.llm().stats()}")
         self.log("[Orchestrator] ✅ 전체 파이프라인 완료!")
 
+    # ✅ 스트리밍 메서드
+    # - 토큰 조각: {"step", "name", "section", "delta"} (재시도로 앞 조각을 버려야 하면 "reset": true)
+    # - 시작: {"step": 0, "name": "Start", "run_id"}
+    # - 단계 완료: {"step", "name", "content"} (기존 이벤트 그대로, Finalize 에는 "usage" 합계 추가)
+    # - 섹션 완료: {"step": 7, "name", "section", "content"} (edit2_mode=section, 섹션이 끝나는 순서대로)
+    def run_stream(
+        self,
+        infile_text: Optional[str] = None,
+        doc_id: Optional[str] = None,
+        stream_tokens: bool = True,
+        resume: Optional[str] = None,
+    ):
+        for record in self._pipeline(infile_text, doc_id, stream_tokens=stream_tokens, resume=resume):
+            yield json.dumps(stream_event(record))
+
+
+# ─────────────────────────────
+class AsyncOrchestrator(Orchestrator):
+    """
+    Orchestrator 의 asyncio 버전 (asgi.py 용)
+    - 같은 그래프 / 파일 / 체크포인트 / 증분 기록 / 이벤트 형식, 실행만 Graph.arun
+    - LLM 을 부르는 단계는 코루틴 버전(Async*) → 호출을 기다리는 동안 스레드를 잡지 않음
+      (한 이벤트 루프에서 여러 실행의 LLM 호출 수백 개가 동시에 진행)
+    - 코루틴 버전이 없는 경로(audit_mode=prefix/multi, map_reduce 병합)는 기존 단계를 작업 스레드에서 실행
+    - 배치 모드는 지원하지 않음 (동기 Orchestrator 사용)
+    """
+
+    def step_classes(self) -> Dict[str, type]:
+        classes = {"build": AsyncBuildStep, "audit": AuditStep, "edit1": AsyncEditPass1,
+                   "global_check": AsyncGlobalCheck, "edit2": AsyncEditPass2}
+        if self.audit_mode == "criterion":
+            classes["audit"] = AsyncAuditStep
+        return classes
+
+    def llm(self):
+        return get_async_client()
+
+    async def _apipeline(
+        self,
+        infile_text: Optional[str],
+        doc_id: Optional[str] = None,
+        stream_tokens: bool = False,
+        resume: Optional[str] = None,
+    ) -> AsyncIterator[dict]:
+        """
+        _pipeline 과 같은 레코드를 같은 순서로 반환.
+        파일 쓰기(작업 공간 준비 / 단계 결과 저장)는 작업 스레드에서, 노드 완료/토큰 조각은 asyncio.Queue 로 모임.
+        """
+        run = await asyncio.to_thread(self._open, infile_text, doc_id, resume)
+        failure: Optional[BaseException] = None
+        loop = asyncio.get_running_loop()
+        events: "asyncio.Queue[tuple]" = asyncio.Queue()
+
+        def emit(step: int, section: Optional[str], delta: str, reset: bool):
+            # 코루틴 단계(이벤트 루프)와 작업 스레드의 동기 단계 양쪽에서 호출됨
+            loop.call_soon_threadsafe(events.put_nowait, ("delta", delta_record(step, section, delta, reset)))
+
+        driver: Optional[asyncio.Task] = None
+        try:
+            graph = await asyncio.to_thread(self.build_graph, run.paths, run.plan, emit if stream_tokens else None)
+
+            async def drive():
+                current_tracker.set(self.usage)  # 노드 task 로 전달되어 LLM 호출이 여기에 기록됨
+                tracing.current_span.set(run.span)
+                try:
+                    async for item in graph.arun({"raw_text": run.raw_text}, memo=run.memo,
+                                                 keep_going=self.keep_going):
+                        events.put_nowait(("node", item))
+                    events.put_nowait(("done", None))
+                except Exception as exc:
+                    events.put_nowait(("error", exc))
+
+            driver = asyncio.create_task(drive())
+            yield self._start_record()
+            while True:
+                kind, payload = await events.get()
+                if kind == "done":
+                    break
+                if kind == "error":
+                    failure = payload
+                    raise payload
+                if kind == "delta":
+                    yield payload
+                    continue
+                for record in await asyncio.to_thread(self._on_node, run, *payload):
+                    yield record
+        finally:
+            # 소비자가 중간에 끊으면 (예: SSE 연결 종료) 남은 노드 task 를 취소
+            if driver is not None:
+                driver.cancel()
+            self._close(run, failure)
+
+    async def arun(self, infile_text: Optional[str] = None, doc_id: Optional[str] = None,
+                   resume: Optional[str] = None) -> dict:
+        """
+        run() 과 같은 결과 JSON
+        """
+        result_data = {"steps": []}
+        async for record in self._apipeline(infile_text, doc_id, resume=resume):
+            self._collect(result_data, record)
+        self._log_done()
         return result_data
-    
-        # ✅ 새로운 스트리밍 메서드
-    def run_stream(self, infile_text: str):
-        LOG_FILE.write_text(f"[Orchestrator Started] {datetime.now()}\n\n", encoding="utf-8")
-
-        base_dir = Path("sample")
-        base_dir.mkdir(parents=True, exist_ok=True)
-
-        # 파일 경로
-        split_json = base_dir / "step1_result.json"
-        split_txt = base_dir / "sample_split.txt"
-        build_txt = base_dir / "step1_result.txt"
-        tree_json = base_dir / "step2_result.json"
-        audit_txt = base_dir / "step3_result.txt"
-        edit1_json = base_dir / "step4_result.json"
-        global_check_txt = base_dir / "step5_global_check.txt"
-        edit2_txt = base_dir / "step6_result.txt"
-        final_txt = base_dir / "final_result.txt"
-
-        raw_text = Path(infile_text).read_text(encoding="utf-8")
-
-        # ✅ 1. Split
-        sections = split_run(raw_text, out_file=split_txt)
-        split_json.write_text(json.dumps(sections, indent=2, ensure_ascii=False), encoding="utf-8")
-        self.log("[Step 1] Split 완료")
-        yield json.dumps({"step": 1, "name": "Split", "content": split_txt.read_text(encoding="utf-8")})
-
-        # ✅ 2. Build
-        build_step = BuildStep(model=self.model)
-        build_result = build_step.run(raw_text)
-        build_txt.write_text(build_result, encoding="utf-8")
-        self.log("[Step 2] Build 완료")
-        yield json.dumps({"step": 2, "name": "Build", "content": build_result})
-
-        # ✅ 3. Fuse
-        builder = TreeBuilder()
-        tree_result = builder.run(build_result)
-        tree_json.write_text(tree_result, encoding="utf-8")
-        self.log("[Step 3] Fuse 완료")
-        yield json.dumps({"step": 3, "name": "Fuse", "content": tree_result})
-
-        # ✅ 4. Audit
-        tree_dict = json.loads(tree_result)
-        audit_step = AuditStep()
-        audit_result = audit_step.run(sections, tree_dict)
-        audit_txt.write_text(audit_result, encoding="utf-8")
-        self.log("[Step 4] Audit 완료")
-        yield json.dumps({"step": 4, "name": "Audit", "content": audit_result})
-
-        # ✅ 5. EditPass1
-        edit1_step = EditPass1()
-        edit1_result = edit1_step.run(sections, audit_result)
-        edit1_json.write_text(json.dumps(edit1_result, indent=2, ensure_ascii=False), encoding="utf-8")
-        self.log("[Step 5] EditPass1 완료")
-        yield json.dumps({"step": 5, "name": "EditPass1", "content": json.dumps(edit1_result, indent=2, ensure_ascii=False)})
-
-        # ✅ 6. GlobalCheck
-        global_check = GlobalCheck()
-        global_check_result = global_check.run(edit1_result)
-        global_check_txt.write_text(global_check_result, encoding="utf-8")
-        self.log("[Step 6] GlobalCheck 완료")
-        yield json.dumps({"step": 6, "name": "GlobalCheck", "content": global_check_result})
-
-        # ✅ 7. EditPass2
-        edit2_step = EditPass2()
-        edit2_result = edit2_step.run(json.dumps(edit1_result, ensure_ascii=False), global_check_result)
-        edit2_txt.write_text(edit2_result, encoding="utf-8")
-        self.log("[Step 7] EditPass2 완료")
-        yield json.dumps({"step": 7, "name": "EditPass2", "content": edit2_result})
 
-        # ✅ 최종 결과
-        final_txt.write_text(edit2_result, encoding="utf-8")
-        self.log("[Step 8] Finalize 완료")
-        yield json.dumps({"step": 8, "name": "Finalize", "content": edit2_result})
+    async def arun_stream(
+        self,
+        infile_text: Optional[str] = None,
+        doc_id: Optional[str] = None,
+        stream_tokens: bool = True,
+        resume: Optional[str] = None,
+    ) -> AsyncIterator[str]:
+        """
+        run_stream() 과 같은 이벤트 (JSON 문자열)
+        """
+        async for record in self._apipeline(infile_text, doc_id, stream_tokens=stream_tokens, resume=resume):
+            yield json.dumps(stream_event(record))
 
 
 if __name__ == "__main__":
-    orchestrator = Orchestrator()
-    final_data = orchestrator.run("sample/example.txt")
+    parser = argparse.ArgumentParser(description="Tree-LLM 파이프라인 실행")
+    parser.add_argument("infile", nargs="?", default="sample/example.txt")
+    parser.add_argument("--model", default="gpt-4o")
+    parser.add_argument("--resume", metavar="RUN_ID", help="중단된 실행을 체크포인트부터 재개")
+    parser.add_argument("--tree-mode", choices=TREE_MODES, help="Build 방식 (기본: TREELLM_TREE_MODE 또는 single)")
+    parser.add_argument("--audit-mode", choices=AUDIT_MODES, help="Audit 프롬프트 배치 (기본: TREELLM_AUDIT_MODE 또는 criterion)")
+    parser.add_argument("--edit2-mode", choices=EDIT2_MODES, help="EditPass2 방식 (기본: TREELLM_EDIT2_MODE 또는 whole)")
+    parser.add_argument("--routes", metavar="JSON", help="단계/노드별 모델 라우팅 설정 파일 (기본: TREELLM_ROUTES)")
+    parser.add_argument("--dry-run", action="store_true", help="실행 계획과 단계별 예상 토큰/시간만 출력 (LLM 호출 없음)")
+    parser.add_argument("--asyncio", action="store_true", help="AsyncOrchestrator 로 실행")
+    args = parser.parse_args()
+
+    orchestrator = (AsyncOrchestrator if args.asyncio else Orchestrator)(model=args.model, tree_mode=args.tree_mode, audit_mode=args.audit_mode,
+                                edit2_mode=args.edit2_mode)
+    if args.dry_run:
+        print(orchestrator.plan(Path(args.infile).read_text(encoding="utf-8")).format())
+        raise SystemExit(0)
+    if args.routes:
+        orchestrator.llm().set_router(Router(load_routes(args.routes)))
+    if args.asyncio:
+        final_data = asyncio.run(orchestrator.arun(args.infile, resume=args.resume))
+    else:
+        final_data = orchestrator.run(args.infile, resume=args.resume)
+    print(f"[Orchestrator] 작업 공간 → {orchestrator.workspace.dir}")
 
     print("\n=== 최종 논문 미리보기 ===")
     print(final_data["final"][:1000], "...")
@@ -1,16 +1,85 @@
 from flask import Flask, request, Response, jsonify
 from flask_cors import CORS
 from Orchestrator import Orchestrator
+from module.job_store import JobStore, FINISHED
+from module.uploads import UploadTooLarge, doc_hash_of, doc_key, store_upload, upload_dir, upload_max_bytes
+from module.workspace import find_run
+from module import metrics, tracing
+from jobs import WorkerPool
+import json
 import os
 import time
 
 app = Flask(__name__)
 CORS(app, supports_credentials=True)
 
-UPLOAD_FOLDER = "uploads"
+UPLOAD_FOLDER = str(upload_dir())
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+# 요청 전체 크기 상한 (multipart 머리글 여유분 포함, 파일 크기는 store_upload 가 따로 검사)
+app.config["MAX_CONTENT_LENGTH"] = upload_max_bytes() + 1024 * 1024
 
-# ✅ 파일 업로드 API
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "Connection": "keep-alive",
+    "Access-Control-Allow-Origin": "*"
+}
+
+job_store = JobStore()
+
+
+def sse_emit(stream: tracing.Span, chunk: str):
+    """
+    SSE 이벤트 하나 전송 → stream span 의 자식 span("sse.emit")
+    """
+    sp = tracing.start_span("sse.emit", parent=stream, endpoint=stream.attrs["endpoint"], bytes=len(chunk))
+    try:
+        yield chunk
+    except GeneratorExit:
+        sp.attrs["disconnected"] = True  # 클라이언트 연결 끊김
+        raise
+    finally:
+        sp.finish()
+
+
+def job_stream(job_id: str, after: int, endpoint: str, replay: bool = False):
+    """
+    작업 이벤트를 SSE 로 전달 (진행 중이면 새 이벤트를 기다림, 끝나면 end 이벤트)
+    replay: 이미 끝난 작업의 저장된 결과 → 토큰 조각(delta) 없이 단계 결과만 바로 전송
+    """
+    stream = tracing.start_span("sse.stream", endpoint=endpoint, run_id=job_store.get(job_id)["run_id"],
+                                job_id=job_id, after=after, replay=replay)
+    try:
+        while True:
+            events = job_store.events_since(job_id, after)
+            for seq, data in events:
+                after = seq
+                if replay and "delta" in json.loads(data):
+                    continue
+                yield from sse_emit(stream, f"id: {seq}\ndata: {data}\n\n")
+            if events:
+                continue
+            job = job_store.get(job_id)
+            stream.run_id = stream.run_id or job["run_id"]
+            if job["status"] in FINISHED:
+                # 완료 후 남은 이벤트가 없으면 종료
+                if not job_store.events_since(job_id, after):
+                    yield from sse_emit(stream, f"event: end\ndata: {json.dumps({'status': job['status']})}\n\n")
+                    return
+                continue
+            time.sleep(0.2)
+    except Exception as exc:
+        stream.finish(exc)
+        raise
+    finally:
+        stream.finish()
+
+
+@app.errorhandler(413)
+def too_large(_):
+    return jsonify({"error": "File too large", "max_bytes": upload_max_bytes()}), 413
+
+# ✅ 파일 업로드 API (내용 해시 이름으로 저장 → 같은 파일은 한 번만)
+# doc_id: 문서 키 (form 의 doc_id, 없으면 원래 파일 이름) → /run_pipeline, /jobs 에 넘기면 고친 원고도 증분 재분석
 @app.route("/upload", methods=["POST"])
 def upload_file():
     if "file" not in request.files:
@@ -20,33 +89,134 @@ def upload_file():
     if file.filename == "":
         return jsonify({"error": "No selected file"}), 400
 
-    save_path = os.path.join(UPLOAD_FOLDER, file.filename)
-    file.save(save_path)
+    try:
+        stored = store_upload(file.stream, UPLOAD_FOLDER)
+    except UploadTooLarge as exc:
+        return jsonify({"error": str(exc), "max_bytes": upload_max_bytes()}), 413
 
-    return jsonify({"file_path": save_path})
+    return jsonify({"file_path": str(stored.path), "doc_id": doc_key(file.filename, request.form.get("doc_id")),
+                    "doc_hash": stored.doc_hash, "size": stored.size, "filename": file.filename,
+                    "duplicate": stored.duplicate})
 
 
 # ✅ SSE 스트리밍: 파이프라인 실행 API
+# 같은 문서(내용 해시) + 같은 설정(모델 / 방식 / 프롬프트 버전)의 실행이
+# - 끝나 있으면: 저장된 결과 이벤트를 바로 전송
+# - 진행 중이면: 새로 실행하지 않고 그 실행의 이벤트 스트림에 붙음
+# - 없으면: 작업을 큐에 넣고 워커 풀이 실행 (/jobs 와 같은 경로, 요청 스레드 수와 무관하게 동시 실행 수 고정)
+# 어느 경우든 이 요청은 작업 DB 의 이벤트를 SSE 로 전달 (같이 붙은 요청과 공유, 워커가 없으면 queued 에서 대기)
+# resume=<run_id>: 그 run 의 작업이 실패했거나 죽었으면 다시 큐에 넣어 체크포인트부터 (X-Run-State: resumed),
+#                  진행 중 / 완료면 위와 같이 붙음 / 재생
 @app.route("/run_pipeline", methods=["GET"])
 def run_pipeline():
     file_path = request.args.get("file_path")
+    resume = request.args.get("resume")  # 중단된 run_id → 체크포인트부터 재개 (같은 작업 큐 / 이벤트 경로)
+    if not resume and (not file_path or not os.path.exists(file_path)):
+        return jsonify({"error": "Invalid file path"}), 400
+
+    orchestrator = Orchestrator()
+    if resume:
+        run_dir = find_run(resume, orchestrator.runs_dir)
+        if run_dir is None:
+            return jsonify({"error": "Unknown run_id"}), 404
+        meta = json.loads((run_dir / "run.json").read_text(encoding="utf-8"))
+        job, state = job_store.resume_run(resume, str(run_dir / "input.txt"), meta.get("model", orchestrator.model),
+                                          doc_id=meta.get("doc_id"))
+    else:
+        doc_id = request.args.get("doc_id")
+        job, created = job_store.start(file_path, orchestrator.model, doc_hash_of(file_path),
+                                       orchestrator.settings_key(), doc_id=doc_key(file_path, doc_id) if doc_id else None)
+        state = "started" if created else "reused" if job["status"] == "done" else "attached"
+    headers = dict(SSE_HEADERS, **{"X-Job-Id": job["id"], "X-Run-State": state})
+    return Response(job_stream(job["id"], 0, "run_pipeline", replay=state == "reused"),
+                    mimetype="text/event-stream", headers=headers)
+
+
+# ✅ 작업 제출 API (백그라운드 워커가 실행)
+# 워커: python app.py 는 워커 풀을 같이 띄움 / flask run, WSGI 서버로 띄우면 python jobs.py 를 따로 실행
+@app.route("/jobs", methods=["POST"])
+def submit_job():
+    data = request.get_json(silent=True) or request.form
+    file_path = data.get("file_path")
     if not file_path or not os.path.exists(file_path):
         return jsonify({"error": "Invalid file path"}), 400
 
-    def generate():
-        orchestrator = Orchestrator()
-        for update in orchestrator.run_stream(file_path):
-            # ✅ SSE 이벤트 형식으로 데이터 전송
-            yield f"data: {update}\n\n"
-            # time.sleep(0.5)  # 실제 환경에서는 제거 가능
+    # 같은 문서 + 설정의 작업이 이미 있으면 (완료 / 진행 중) 그 작업을 돌려줌
+    orchestrator = Orchestrator(model=data.get("model", "gpt-4o"))
+    doc_hash, config = doc_hash_of(file_path), orchestrator.settings_key()
+    job = job_store.find(doc_hash, config)
+    if job is not None:
+        return jsonify({"job_id": job["id"], "status": job["status"], "reused": True}), 200
+    doc_id = data.get("doc_id")
+    job_id = job_store.submit(file_path, model=orchestrator.model, doc_hash=doc_hash, config=config,
+                              doc_id=doc_key(file_path, doc_id) if doc_id else None)
+    return jsonify({"job_id": job_id}), 202
 
-    # ✅ SSE 응답 헤더
-    return Response(generate(), mimetype="text/event-stream", headers={
-        "Cache-Control": "no-cache",
-        "Connection": "keep-alive",
-        "Access-Control-Allow-Origin": "*"
-    })
+
+# ✅ 작업 상태 API
+@app.route("/jobs/<job_id>", methods=["GET"])
+def job_status(job_id):
+    job = job_store.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job"}), 404
+    job.pop("result")
+    return jsonify(job)
+
+
+# ✅ 작업 결과 API
+@app.route("/jobs/<job_id>/result", methods=["GET"])
+def job_result(job_id):
+    job = job_store.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job"}), 404
+    if job["status"] == "failed":
+        return jsonify({"status": "failed", "error": job["error"]}), 500
+    if job["status"] != "done":
+        return jsonify({"status": job["status"]}), 409
+    return jsonify({"status": "done", **job["result"]})
+
+
+# ✅ 실패한 작업 재개 API (체크포인트부터)
+@app.route("/jobs/<job_id>/resume", methods=["POST"])
+def resume_job(job_id):
+    if job_store.get(job_id) is None:
+        return jsonify({"error": "Unknown job"}), 404
+    if not job_store.resume(job_id):
+        return jsonify({"error": "Only failed jobs can be resumed"}), 409
+    return jsonify({"job_id": job_id}), 202
+
+
+# ✅ 작업 이벤트 SSE (Last-Event-ID 로 끊긴 지점부터 재접속)
+@app.route("/jobs/<job_id>/events", methods=["GET"])
+def job_events(job_id):
+    if job_store.get(job_id) is None:
+        return jsonify({"error": "Unknown job"}), 404
+    last_id = request.headers.get("Last-Event-ID") or request.args.get("last_event_id") or "0"
+    try:
+        after = int(last_id)
+    except ValueError:
+        return jsonify({"error": "Invalid Last-Event-ID"}), 400
+
+    return Response(job_stream(job_id, after, "job_events"), mimetype="text/event-stream", headers=SSE_HEADERS)
+
+
+# ✅ Prometheus 지표 (단계/LLM 지연 시간, 실행 중인 run, 큐 깊이, 오류 수)
+@app.route("/metrics", methods=["GET"])
+def metrics_endpoint():
+    # 큐 깊이/상태별 작업 수와 워커 프로세스의 지표(run 은 워커에서 실행)는 공유하는 작업 DB 에서 읽어 합산
+    counts = job_store.counts()
+    for status in ("queued", "running", "done", "failed"):
+        metrics.JOBS.set(counts.get(status, 0), status=status)
+    return Response(metrics.render(job_store.worker_metrics()), content_type=metrics.CONTENT_TYPE)
 
 
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=5000, debug=True)
+    debug = os.getenv("FLASK_DEBUG", "1") != "0"
+    # 백그라운드 워커 풀: debug 리로더를 쓰면 감시(부모) 프로세스가 아닌 실제 서버 프로세스에서만,
+    # 리로더가 없으면 바로 띄움
+    # (WSGI 서버로 띄울 때는 이 블록이 실행되지 않으므로 python jobs.py 로 워커를 따로 실행)
+    if not debug or os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        WorkerPool(int(os.getenv("TREELLM_JOB_WORKERS", "2"))).start()
+
+    # 실행마다 작업 공간이 분리되어 있으므로 요청을 스레드별로 동시에 처리
+    app.run(host="0.0.0.0", port=5000, debug=debug, threaded=True)
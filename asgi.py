@@ -0,0 +1,286 @@
+"""
+asgi.py
+───────────────────────────────
+app.py 의 ASGI(Starlette) 버전 — 같은 /upload, /run_pipeline 계약
+- 파이프라인은 AsyncOrchestrator 로 이벤트 루프 안에서 실행 → 열린 SSE 연결 / 진행 중인 LLM 호출마다 스레드를 잡지 않음
+  (한 프로세스에서 스트림 수백 개)
+- 파일 쓰기 / 작업 DB 접근은 작업 스레드에서 (asyncio.to_thread)
+- /run_pipeline 의 중복 실행 방지(started / attached / reused)와 X-Job-Id, X-Run-State 헤더는 app.py 와 같음
+  새 실행만 다름: app.py 는 큐에 넣어 워커 풀이 실행, 여기서는 running 으로 등록(JobStore.start(worker=...))하고
+  이 이벤트 루프의 task 로 실행 → jobs.py 워커와 같은 DB 를 써도 워커가 가져가지 않음
+- 작업 이벤트는 같은 작업 DB 에 기록 → /jobs/<job_id>/events 로 끊긴 지점부터 재접속
+- 같은 작업을 보는 스트림이 여러 개여도 새 이벤트 확인(DB 폴링)은 작업당 하나 (JobWatch → asyncio.Condition 으로 알림),
+  변화가 없으면 폴링 간격을 POLL_MIN 에서 POLL_MAX 까지 늘림
+- 작업 큐(/jobs 제출·재개)와 배치 모드는 app.py + jobs.py 워커 사용
+
+환경 변수
+- app.py 와 같음 (TREELLM_UPLOAD_DIR, TREELLM_UPLOAD_MAX_BYTES, TREELLM_LLM_MAX_CONCURRENCY ...)
+
+사용법
+    uvicorn asgi:app --host 0.0.0.0 --port 5000
+    python asgi.py
+"""
+
+from __future__ import annotations
+from contextlib import contextmanager
+from typing import AsyncIterator, Dict, Optional, Set
+import asyncio
+import json
+import os
+import sqlite3
+
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+
+from Orchestrator import AsyncOrchestrator
+from module.job_store import JobStore, FINISHED
+from module.uploads import UploadTooLarge, doc_hash_of, doc_key, store_upload, upload_dir, upload_max_bytes
+from module.workspace import find_run
+from module import metrics, tracing
+from jobs import arun_job
+
+UPLOAD_FOLDER = str(upload_dir())
+os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+# 요청 전체 크기 상한 (multipart 머리글 여유분 포함, 파일 크기는 store_upload 가 따로 검사)
+MAX_CONTENT_LENGTH = upload_max_bytes() + 1024 * 1024
+
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "Connection": "keep-alive",
+    "Access-Control-Allow-Origin": "*"
+}
+
+job_store = JobStore()
+running_jobs: Set[asyncio.Task] = set()  # 실행 중인 작업 task (끝나기 전에 GC 되지 않도록)
+
+# 새 이벤트 확인 간격(초): 변화가 있으면 POLL_MIN, 없으면 두 배씩 POLL_MAX 까지
+POLL_MIN = 0.2
+POLL_MAX = 2.0
+GONE = "missing"  # 스트림 도중 작업이 삭제됨 (purge_finished)
+
+
+class JobWatch:
+    """
+    작업 하나의 진행 상황 (마지막 seq / 상태) 을 폴링하는 task 하나 + 기다리는 스트림들
+    같은 작업의 스트림이 모두 끝나면 폴링도 멈춤 (watch_job / unwatch_job)
+    """
+
+    def __init__(self, job_id: str):
+        self.job_id = job_id
+        self.seq = 0
+        self.status: Optional[str] = None
+        self.run_id: Optional[str] = None
+        self.streams = 0
+        self.changed = asyncio.Condition()
+        self.task = asyncio.create_task(self._poll())
+
+    async def _poll(self):
+        delay = POLL_MIN
+        while True:
+            try:
+                progress = await asyncio.to_thread(job_store.progress, self.job_id)
+            except sqlite3.Error as exc:  # 잠깐 잠긴 DB 등 → 다음 주기에 다시
+                print(f"[JobWatch] ⚠ {self.job_id} 진행 상황 조회 실패: {exc}")
+                await asyncio.sleep(POLL_MAX)
+                continue
+            seq, status, run_id = progress or (self.seq, GONE, self.run_id)
+            if (seq, status) != (self.seq, self.status):
+                delay = POLL_MIN
+                async with self.changed:
+                    self.seq, self.status, self.run_id = seq, status, run_id
+                    self.changed.notify_all()
+                if status in FINISHED or status == GONE:
+                    return
+            else:
+                delay = min(delay * 2, POLL_MAX)
+            await asyncio.sleep(delay)
+
+    async def wait(self, after: int) -> str:
+        """
+        seq 가 after 를 넘거나 작업이 끝날 때까지 대기 → 그때의 상태
+        """
+        async with self.changed:
+            await self.changed.wait_for(
+                lambda: self.seq > after or self.status in FINISHED or self.status == GONE
+            )
+            return self.status
+
+
+watches: Dict[str, JobWatch] = {}
+
+
+def watch_job(job_id: str) -> JobWatch:
+    watch = watches.get(job_id)
+    if watch is None or watch.task.done() and watch.status not in FINISHED:
+        watch = watches[job_id] = JobWatch(job_id)
+    watch.streams += 1
+    return watch
+
+
+def unwatch_job(watch: JobWatch):
+    watch.streams -= 1
+    if watch.streams == 0 and watches.get(watch.job_id) is watch:
+        watch.task.cancel()
+        del watches[watch.job_id]
+
+
+@contextmanager
+def sse_emit(stream: tracing.Span, chunk: str):
+    """
+    SSE 이벤트 하나 전송 → stream span 의 자식 span("sse.emit")
+    사용: with sse_emit(stream, chunk) as data: yield data
+    """
+    sp = tracing.start_span("sse.emit", parent=stream, endpoint=stream.attrs["endpoint"], bytes=len(chunk))
+    try:
+        yield chunk
+    except BaseException:
+        sp.attrs["disconnected"] = True  # 클라이언트 연결 끊김 (제너레이터 종료 / task 취소)
+        raise
+    finally:
+        sp.finish()
+
+
+def too_large() -> JSONResponse:
+    return JSONResponse({"error": "File too large", "max_bytes": upload_max_bytes()}, status_code=413)
+
+
+async def job_stream(job_id: str, after: int, endpoint: str, replay: bool = False) -> AsyncIterator[str]:
+    """
+    app.job_stream 의 asyncio 버전 (새 이벤트는 작업별 JobWatch 알림으로 기다림, 이벤트 루프를 막지 않음)
+    """
+    job = await asyncio.to_thread(job_store.get, job_id)
+    status = job["status"]
+    stream = tracing.start_span("sse.stream", endpoint=endpoint, run_id=job["run_id"],
+                                job_id=job_id, after=after, replay=replay)
+    watch = watch_job(job_id)
+    try:
+        while True:
+            events = await asyncio.to_thread(job_store.events_since, job_id, after)
+            for seq, data in events:
+                after = seq
+                if replay and "delta" in json.loads(data):
+                    continue
+                with sse_emit(stream, f"id: {seq}\ndata: {data}\n\n") as chunk:
+                    yield chunk
+            if events:
+                continue
+            if status in FINISHED or status == GONE:
+                # 완료 후 남은 이벤트가 없으면 종료
+                with sse_emit(stream, f"event: end\ndata: {json.dumps({'status': status})}\n\n") as chunk:
+                    yield chunk
+                return
+            status = await watch.wait(after)
+            stream.run_id = stream.run_id or watch.run_id
+    except Exception as exc:
+        stream.finish(exc)
+        raise
+    finally:
+        unwatch_job(watch)
+        stream.finish()
+
+
+# ✅ 파일 업로드 API (내용 해시 이름으로 저장 → 같은 파일은 한 번만)
+async def upload_file(request: Request):
+    if int(request.headers.get("content-length") or 0) > MAX_CONTENT_LENGTH:
+        return too_large()
+    form = await request.form()
+    file = form.get("file")
+    if file is None or isinstance(file, str):
+        return JSONResponse({"error": "No file part"}, status_code=400)
+    if not file.filename:
+        return JSONResponse({"error": "No selected file"}, status_code=400)
+
+    try:
+        stored = await asyncio.to_thread(store_upload, file.file, UPLOAD_FOLDER)
+    except UploadTooLarge as exc:
+        return JSONResponse({"error": str(exc), "max_bytes": upload_max_bytes()}, status_code=413)
+    finally:
+        await form.close()
+
+    doc_id = form.get("doc_id")
+    return JSONResponse({"file_path": str(stored.path),
+                         "doc_id": doc_key(file.filename, doc_id if isinstance(doc_id, str) else None),
+                         "doc_hash": stored.doc_hash, "size": stored.size, "filename": file.filename,
+                         "duplicate": stored.duplicate})
+
+
+# ✅ SSE 스트리밍: 파이프라인 실행 API (app.py 와 같은 규칙)
+# - 같은 문서 + 설정의 실행이 끝나 있으면 저장된 결과 이벤트, 진행 중이면 그 스트림에 붙음
+# - 없으면 작업을 만들고 이 이벤트 루프의 task 로 실행
+# - resume=<run_id>: 그 run 의 작업이 실패했거나 죽었으면 이 이벤트 루프에서 체크포인트부터 다시 실행
+async def run_pipeline(request: Request):
+    file_path = request.query_params.get("file_path")
+    resume = request.query_params.get("resume")  # 중단된 run_id → 체크포인트부터 재개 (같은 작업 / 이벤트 경로)
+    if not resume and (not file_path or not os.path.exists(file_path)):
+        return JSONResponse({"error": "Invalid file path"}, status_code=400)
+
+    orchestrator = AsyncOrchestrator()
+    worker = f"asgi-{os.getpid()}"
+    if resume:
+        run_dir = find_run(resume, orchestrator.runs_dir)
+        if run_dir is None:
+            return JSONResponse({"error": "Unknown run_id"}, status_code=404)
+        meta = json.loads(await asyncio.to_thread((run_dir / "run.json").read_text, encoding="utf-8"))
+        job, state = await asyncio.to_thread(job_store.resume_run, resume, str(run_dir / "input.txt"),
+                                             meta.get("model", orchestrator.model), meta.get("doc_id"), worker)
+    else:
+        doc_hash = await asyncio.to_thread(doc_hash_of, file_path)
+        doc_id = request.query_params.get("doc_id")
+        job, created = await asyncio.to_thread(job_store.start, file_path, orchestrator.model, doc_hash,
+                                               orchestrator.settings_key(),
+                                               doc_key(file_path, doc_id) if doc_id else None, worker)
+        state = "started" if created else "reused" if job["status"] == "done" else "attached"
+    if state in ("started", "resumed"):
+        task = asyncio.create_task(arun_job(job_store, job))
+        running_jobs.add(task)
+        task.add_done_callback(running_jobs.discard)
+    headers = dict(SSE_HEADERS, **{"X-Job-Id": job["id"], "X-Run-State": state})
+    return StreamingResponse(job_stream(job["id"], 0, "run_pipeline", replay=state == "reused"),
+                             media_type="text/event-stream", headers=headers)
+
+
+# ✅ 작업 이벤트 SSE (Last-Event-ID 로 끊긴 지점부터 재접속)
+async def job_events(request: Request):
+    job_id = request.path_params["job_id"]
+    if await asyncio.to_thread(job_store.get, job_id) is None:
+        return JSONResponse({"error": "Unknown job"}, status_code=404)
+    last_id = request.headers.get("Last-Event-ID") or request.query_params.get("last_event_id") or "0"
+    try:
+        after = int(last_id)
+    except ValueError:
+        return JSONResponse({"error": "Invalid Last-Event-ID"}, status_code=400)
+
+    return StreamingResponse(job_stream(job_id, after, "job_events"), media_type="text/event-stream",
+                             headers=SSE_HEADERS)
+
+
+# ✅ Prometheus 지표
+async def metrics_endpoint(request: Request):
+    counts = await asyncio.to_thread(job_store.counts)
+    for status in ("queued", "running", "done", "failed"):
+        metrics.JOBS.set(counts.get(status, 0), status=status)
+    # 따로 띄운 워커 프로세스(python jobs.py)의 지표도 합산
+    snapshots = await asyncio.to_thread(job_store.worker_metrics)
+    return Response(metrics.render(snapshots), headers={"Content-Type": metrics.CONTENT_TYPE})
+
+
+app = Starlette(
+    routes=[
+        Route("/upload", upload_file, methods=["POST"]),
+        Route("/run_pipeline", run_pipeline, methods=["GET"]),
+        Route("/jobs/{job_id}/events", job_events, methods=["GET"]),
+        Route("/metrics", metrics_endpoint, methods=["GET"]),
+    ],
+    middleware=[Middleware(CORSMiddleware, allow_origin_regex=".*", allow_credentials=True,
+                           allow_methods=["*"], allow_headers=["*"])],
+)
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    uvicorn.run(app, host="0.0.0.0", port=5000)
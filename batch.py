@@ -0,0 +1,193 @@
+"""
+batch.py
+───────────────────────────────
+논문 여러 편(디렉터리 또는 목록 파일)을 한 번에 파이프라인으로 처리하는 CLI
+- 모든 논문이 하나의 LLMClient 호출 예산(동시 호출 수 / 분당 호출 수)을 공유
+- --export 를 주면 API 를 직접 부르지 않고 모든 LLM 요청을 Batch API 형식 JSONL 로 기록
+  → 배치 엔드포인트(또는 serve-local)로 처리한 결과 파일을 --results 로 넣어 다시 실행
+  → 결과가 채워진 만큼 다음 단계 요청이 기록됨 (모든 논문이 done 이 될 때까지 반복)
+- 논문별 최종 결과는 <out>/<doc_id>.txt, 요약은 <out>/batch_summary.json
+
+사용법
+    python batch.py run papers/ --papers 4 --max-concurrency 8 --rpm 300
+    python batch.py run manifest.jsonl --export batch/requests.jsonl --results batch/results.jsonl
+    python batch.py serve-local batch/requests.jsonl batch/results.jsonl --workers 8
+    python batch.py submit batch/requests.jsonl          # OpenAI Batch API 에 제출 → batch id
+    python batch.py fetch <batch_id> batch/results.jsonl # 완료된 배치 결과 내려받기
+
+목록 파일
+- .txt   : 한 줄에 논문 경로 하나 (목록 파일 기준 상대 경로 가능)
+- .jsonl : {"path": ..., "doc_id": ..., "model": ...} 한 줄씩 (doc_id, model 은 선택)
+"""
+
+from __future__ import annotations
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List
+import argparse
+import json
+import sys
+import time
+
+from Orchestrator import Orchestrator
+from module.batch_io import BatchIO, BatchPending, serve_local
+from module.llm_client import get_client
+
+
+def load_papers(source: str, model: str) -> List[Dict[str, str]]:
+    """
+    디렉터리(*.txt) 또는 목록 파일 → [{"path", "doc_id", "model"}]
+    """
+    src = Path(source)
+    if src.is_dir():
+        entries = [{"path": str(p)} for p in sorted(src.glob("*.txt"))]
+    elif src.suffix == ".jsonl":
+        entries = [json.loads(line) for line in src.read_text(encoding="utf-8").splitlines() if line.strip()]
+    else:
+        entries = [{"path": line.strip()} for line in src.read_text(encoding="utf-8").splitlines()
+                   if line.strip() and not line.startswith("#")]
+
+    papers = []
+    for entry in entries:
+        path = Path(entry["path"])
+        if not path.is_absolute() and not src.is_dir():
+            path = src.parent / path
+        papers.append({
+            "path": str(path),
+            "doc_id": entry.get("doc_id") or path.stem,
+            "model": entry.get("model") or model,
+        })
+    doc_ids = [p["doc_id"] for p in papers]
+    duplicated = sorted({d for d in doc_ids if doc_ids.count(d) > 1})
+    if duplicated:
+        raise ValueError(f"doc_id 중복: {duplicated} (목록 파일에서 doc_id 를 지정하세요)")
+    return papers
+
+
+def run_paper(paper: Dict[str, str], out_dir: Path, keep_going: bool) -> Dict[str, str]:
+    """
+    논문 한 편 실행 → {"doc_id", "status": done/pending/failed, ...}
+    """
+    record = {"doc_id": paper["doc_id"], "path": paper["path"]}
+    orchestrator = Orchestrator(model=paper["model"], keep_going=keep_going)
+    try:
+        result = orchestrator.run(paper["path"], doc_id=paper["doc_id"])
+        final_file = out_dir / f"{paper['doc_id']}.txt"
+        final_file.write_text(result["final"], encoding="utf-8")
+        record.update(status="done", final=str(final_file))
+    except BatchPending:
+        record["status"] = "pending"
+    except Exception as exc:
+        record.update(status="failed", error=f"{type(exc).__name__}: {exc}")
+    if orchestrator.workspace is not None:
+        record["run_id"] = orchestrator.workspace.run_id
+    print(f"[Batch] {paper['doc_id']} → {record['status']}")
+    return record
+
+
+# ─────────────────────────────
+def cmd_run(args) -> int:
+    papers = load_papers(args.source, args.model)
+    out_dir = Path(args.out)
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    client = get_client()
+    client.set_limits(args.max_concurrency, args.rpm)
+    batch = None
+    if args.export:
+        batch = BatchIO(args.export, args.results)
+        client.use_batch(batch)
+        print(f"[Batch] ▶ 배치 모드: 요청 → {args.export}, 결과 {len(batch.results)}개 로드")
+
+    print(f"[Batch] ▶ 논문 {len(papers)}편 처리 (동시 {args.papers}편)")
+    started = time.time()
+    with ThreadPoolExecutor(max_workers=max(1, args.papers)) as pool:
+        records = list(pool.map(lambda p: run_paper(p, out_dir, keep_going=batch is not None), papers))
+
+    counts = {s: sum(r["status"] == s for r in records) for s in ("done", "pending", "failed")}
+    summary = {
+        "counts": counts,
+        "elapsed": round(time.time() - started, 2),
+        "llm_stats": client.stats(),
+        "papers": records,
+    }
+    if batch is not None:
+        summary["batch"] = {"requests": str(batch.requests_path), "pending_requests": batch.pending}
+    (out_dir / "batch_summary.json").write_text(json.dumps(summary, indent=2, ensure_ascii=False), encoding="utf-8")
+
+    print(f"[Batch] ✅ done {counts['done']} / pending {counts['pending']} / failed {counts['failed']} "
+          f"→ {out_dir / 'batch_summary.json'}")
+    if batch is not None and counts["pending"]:
+        print(f"[Batch] 대기 중인 요청 {batch.pending}개 → 배치 처리 후 --results 로 다시 실행하세요")
+    if counts["failed"]:
+        return 1
+    return 2 if counts["pending"] else 0
+
+
+def cmd_serve_local(args) -> int:
+    n = serve_local(args.requests, args.results, get_client(), workers=args.workers)
+    print(f"[Batch] ✅ 로컬 배치 처리 {n}건 → {args.results}")
+    return 0
+
+
+def cmd_submit(args) -> int:
+    client = get_client().client
+    with open(args.requests, "rb") as fp:
+        uploaded = client.files.create(file=fp, purpose="batch")
+    job = client.batches.create(
+        input_file_id=uploaded.id,
+        endpoint="/v1/chat/completions",
+        completion_window=args.window,
+    )
+    print(f"[Batch] ✅ 제출 완료 → batch id: {job.id} (상태: {job.status})")
+    return 0
+
+
+def cmd_fetch(args) -> int:
+    client = get_client().client
+    job = client.batches.retrieve(args.batch_id)
+    print(f"[Batch] 상태: {job.status} ({job.request_counts})")
+    if job.status != "completed" or not job.output_file_id:
+        return 2
+    content = client.files.content(job.output_file_id).text
+    results = Path(args.results)
+    results.parent.mkdir(parents=True, exist_ok=True)
+    with results.open("a", encoding="utf-8") as fp:
+        fp.write(content if content.endswith("\n") else content + "\n")
+    print(f"[Batch] ✅ 결과 저장 → {results}")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Tree-LLM 논문 일괄 처리")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_run = sub.add_parser("run", help="디렉터리/목록 파일의 논문을 파이프라인으로 처리")
+    p_run.add_argument("source", help="논문 디렉터리(*.txt) 또는 목록 파일(.txt/.jsonl)")
+    p_run.add_argument("--model", default="gpt-4o")
+    p_run.add_argument("--out", default="batch_out", help="최종 결과/요약 저장 디렉터리")
+    p_run.add_argument("--papers", type=int, default=4, help="동시에 처리할 논문 수")
+    p_run.add_argument("--max-concurrency", type=int, default=8, help="전체 동시 LLM 호출 수 (0 = 제한 없음)")
+    p_run.add_argument("--rpm", type=float, default=0, help="전체 분당 LLM 호출 수 (0 = 제한 없음)")
+    p_run.add_argument("--export", metavar="REQUESTS_JSONL", help="배치 모드: LLM 요청을 이 파일에 기록")
+    p_run.add_argument("--results", metavar="RESULTS_JSONL", help="배치 모드: 배치 결과 파일")
+    p_run.set_defaults(func=cmd_run)
+
+    p_serve = sub.add_parser("serve-local", help="요청 JSONL 을 로컬에서 실행해 결과 JSONL 작성")
+    p_serve.add_argument("requests")
+    p_serve.add_argument("results")
+    p_serve.add_argument("--workers", type=int, default=4)
+    p_serve.set_defaults(func=cmd_serve_local)
+
+    p_submit = sub.add_parser("submit", help="요청 JSONL 을 OpenAI Batch API 에 제출")
+    p_submit.add_argument("requests")
+    p_submit.add_argument("--window", default="24h")
+    p_submit.set_defaults(func=cmd_submit)
+
+    p_fetch = sub.add_parser("fetch", help="완료된 OpenAI 배치 결과를 결과 JSONL 에 추가")
+    p_fetch.add_argument("batch_id")
+    p_fetch.add_argument("results")
+    p_fetch.set_defaults(func=cmd_fetch)
+
+    args = parser.parse_args()
+    sys.exit(args.func(args))
@@ -0,0 +1,149 @@
+"""
+audit_layout.py
+───────────────────────────────
+Audit 프롬프트 배치별 입력 토큰 / prefix 캐시 적중 / 지연 시간 비교
+- criterion : 기준별 템플릿에 해당 섹션을 끼워 넣는 기존 방식
+- prefix    : 공통 원문 + 트리를 첫 메시지로 고정, 기준 지시문은 뒤에
+- multi     : prefix 배치 + 모든 기준을 한 번의 JSON 호출로
+- 모드마다 새 LLM 클라이언트(응답 캐시 끔)로 실행 → 모드끼리 캐시를 공유하지 않음
+- 기본은 가짜 백엔드 (module/fake_llm.py 의 prefix 캐시 흉내), --live 면 실제 API
+
+사용법 (저장소 루트에서)
+    python bench/audit_layout.py                      # 가짜 백엔드, 기준 병렬 실행
+    python bench/audit_layout.py --workers 1          # 기준을 순서대로 (앞 호출이 prefix 캐시를 채움)
+    python bench/audit_layout.py --live --modes criterion prefix --out bench/audit_layout.json
+"""
+
+from __future__ import annotations
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Tuple
+import argparse
+import json
+import os
+import sys
+import time
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# 가짜 백엔드 조건 (run_bench.py 와 같은 값)
+FAKE_ENV = {
+    "TREELLM_LLM_BACKEND": "fake",
+    "TREELLM_FAKE_LATENCY": "0.05",
+    "TREELLM_FAKE_JITTER": "0.01",
+    "TREELLM_FAKE_TPS": "4000",
+    "TREELLM_FAKE_PROMPT_TPS": "20000",
+    "TREELLM_FAKE_ERROR_RATE": "0",
+    "TREELLM_FAKE_SEED": "0",
+    "TREELLM_FAKE_PREFIX_CACHE": "1",
+    "TREELLM_FAKE_SAMPLE_DIR": "init_sample",
+}
+os.environ["TREELLM_TRACE"] = "0"
+os.chdir(ROOT)  # 프롬프트 / 샘플 경로는 저장소 루트 기준
+sys.path.insert(0, str(ROOT))
+
+from module.audit import AUDIT_MODES, AuditStep  # noqa: E402
+from module.dag import current_node  # noqa: E402
+from module.llm_cache import ResponseCache  # noqa: E402
+from module.llm_client import LLMClient  # noqa: E402
+from module.split import run as split_run  # noqa: E402
+from module.usage import UsageTracker, current_tracker  # noqa: E402
+
+
+def tasks_for(mode: str, step: AuditStep, sections: Dict[str, str], tree: Dict[str, dict]) -> List[Tuple[str, Callable]]:
+    """
+    Orchestrator 의 audit 노드와 같은 단위의 작업 목록 [(노드 이름, 실행 함수)]
+    """
+    prompts = step.load_prompts()
+    if mode == "multi":
+        items = list(prompts.items())
+        return [("audit:" + "+".join(prompts), lambda: step.run_criteria(items, sections, tree))]
+    if mode == "prefix":
+        context = step.shared_context(sections, tree)
+        return [(f"audit:{p}", lambda p=p, t=t: step.run_criterion_prefixed(p, t, sections, tree, context=context))
+                for p, t in prompts.items()]
+    return [(f"audit:{p}", lambda p=p, t=t: step.run_criterion(
+                p, t, {sec: sections.get(sec, "") for sec in step.section_map.get(p, [])}, tree))
+            for p, t in prompts.items()]
+
+
+def measure(mode: str, backend: str, model: str, workers: int,
+            sections: Dict[str, str], tree: Dict[str, dict]) -> Dict[str, Any]:
+    step = AuditStep(model=model)
+    step.llm = LLMClient(cache=ResponseCache(enabled=False), backend=backend)
+    tracker = UsageTracker()
+
+    def run(item: Tuple[str, Callable]):
+        current_node.set(item[0])
+        return item[1]()
+
+    token = current_tracker.set(tracker)
+    try:
+        tasks = tasks_for(mode, step, sections, tree)
+        started = time.perf_counter()
+        if mode == "prefix":
+            # Orchestrator 와 같이 첫 기준으로 prefix 캐시를 채운 뒤 나머지를 병렬 실행
+            copy_context().run(run, tasks.pop(0))
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            futures = [pool.submit(copy_context().run, run, item) for item in tasks]
+            for future in futures:
+                future.result()
+        wall = time.perf_counter() - started
+    finally:
+        current_tracker.reset(token)
+
+    total = tracker.summary()["total"]
+    return {
+        "calls": total["calls"],
+        "prompt_tokens": total["prompt_tokens"],
+        "cached_tokens": total["cached_tokens"],
+        "completion_tokens": total["completion_tokens"],
+        "uncached_tokens": total["prompt_tokens"] - total["cached_tokens"],
+        "latency_sum": total["latency"],
+        "wall": round(wall, 3),
+        "cost_usd": total["cost_usd"],
+    }
+
+
+def report(results: Dict[str, Dict[str, Any]]):
+    base = results.get("criterion")
+    print(f"\n{'mode':<10} {'calls':>5} {'in':>8} {'cached':>8} {'uncached':>9} {'out':>7} "
+          f"{'wall(s)':>8} {'sum(s)':>7} {'cost':>9}  vs criterion")
+    for mode, r in results.items():
+        diff = ""
+        if base and mode != "criterion":
+            diff = (f"uncached {r['uncached_tokens'] / max(1, base['uncached_tokens']) - 1:+.0%}, "
+                    f"wall {r['wall'] / max(1e-9, base['wall']) - 1:+.0%}")
+        print(f"{mode:<10} {r['calls']:>5} {r['prompt_tokens']:>8} {r['cached_tokens']:>8} "
+              f"{r['uncached_tokens']:>9} {r['completion_tokens']:>7} {r['wall']:>8.2f} "
+              f"{r['latency_sum']:>7.2f} ${r['cost_usd']:>8.4f}  {diff}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Audit 프롬프트 배치별 토큰/지연 비교")
+    parser.add_argument("--modes", nargs="+", choices=AUDIT_MODES, default=list(AUDIT_MODES))
+    parser.add_argument("--live", action="store_true", help="실제 OpenAI API 사용 (비용 발생)")
+    parser.add_argument("--model", default="gpt-4o")
+    parser.add_argument("--workers", type=int, default=7, help="기준 병렬 실행 수 (Orchestrator max_workers)")
+    parser.add_argument("--infile", default="sample/example.txt")
+    parser.add_argument("--tree", default="init_sample/step2_result.txt")
+    parser.add_argument("--out", help="결과 JSON 저장 경로")
+    args = parser.parse_args()
+
+    if not args.live:
+        os.environ.update(FAKE_ENV)
+    sections = split_run(Path(args.infile).read_text(encoding="utf-8"))
+    tree = json.loads(Path(args.tree).read_text(encoding="utf-8"))
+
+    results = {
+        mode: measure(mode, "openai" if args.live else "fake", args.model, args.workers, sections, tree)
+        for mode in args.modes
+    }
+    report(results)
+    if args.out:
+        Path(args.out).write_text(json.dumps(
+            {"backend": "openai" if args.live else "fake", "workers": args.workers, "results": results},
+            indent=2, ensure_ascii=False,
+        ), encoding="utf-8")
+        print(f"\n[AuditLayout] ✅ 결과 저장 → {args.out}")
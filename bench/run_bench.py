@@ -0,0 +1,196 @@
+"""
+run_bench.py
+───────────────────────────────
+가짜 LLM 백엔드(module/fake_llm.py)로 Orchestrator.run 을 돌리는 오프라인 벤치마크
+- e2e        : sample/example.txt 한 편 → 전체 시간, 단계별 시간, LLM 호출 수
+- size_xN    : 같은 논문을 N 배로 늘렸을 때 (섹션 길이 N 배, TPS 로 출력/입력 길이 영향)
+- workers_N  : Orchestrator max_workers 별 전체 시간 (동시성 확장성)
+- 결과를 bench/baseline.json 과 비교해 기준보다 느려지거나 호출 수가 늘면 종료 코드 1
+
+사용법 (저장소 루트에서)
+    python bench/run_bench.py                     # 측정 + baseline 비교
+    python bench/run_bench.py --update-baseline   # 현재 결과를 baseline 으로 저장
+    python bench/run_bench.py --out bench/latest.json --tolerance 0.3
+"""
+
+from __future__ import annotations
+from pathlib import Path
+from typing import Any, Dict, List
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+ROOT = Path(__file__).resolve().parent.parent
+BASELINE = Path(__file__).resolve().parent / "baseline.json"
+
+# 벤치마크 조건 고정 (외부 환경 변수와 무관하게 같은 조건으로 측정)
+FAKE_ENV = {
+    "TREELLM_LLM_BACKEND": "fake",
+    "TREELLM_FAKE_LATENCY": "0.05",
+    "TREELLM_FAKE_JITTER": "0.01",
+    "TREELLM_FAKE_TPS": "4000",
+    "TREELLM_FAKE_PROMPT_TPS": "20000",
+    "TREELLM_FAKE_ERROR_RATE": "0",
+    "TREELLM_FAKE_SEED": "0",
+    "TREELLM_FAKE_SAMPLE_DIR": "init_sample",
+    "TREELLM_FAKE_PREFIX_CACHE": "0",  # 반복 실행끼리 prefix 캐시를 공유하지 않도록
+    "TREELLM_TREE_MODE": "single",
+    "TREELLM_AUDIT_MODE": "criterion",
+    "TREELLM_EDIT2_MODE": "whole",
+    "TREELLM_CACHE": "0",
+    "TREELLM_TRACE": "0",
+    "TREELLM_LLM_MAX_CONCURRENCY": "0",
+    "TREELLM_LLM_RPM": "0",
+}
+os.environ.update(FAKE_ENV)
+os.environ["TREELLM_RUNS_DIR"] = tempfile.mkdtemp(prefix="treellm-bench-")
+os.chdir(ROOT)  # 프롬프트 경로는 저장소 루트 기준
+sys.path.insert(0, str(ROOT))
+
+from Orchestrator import Orchestrator  # noqa: E402
+from module import tracing  # noqa: E402
+from module.llm_client import get_client  # noqa: E402
+
+# 시간 지표는 tolerance 비율 + 절대 여유(초) 안에서만 허용, 호출 수는 늘면 안 됨
+TIME_SLACK = 0.05
+
+
+class StepTimer:
+    """
+    tracing 리스너: run_id 별 노드 span → 단계별 (첫 시작 ~ 마지막 종료) 시간
+    """
+
+    def __init__(self):
+        self.spans: Dict[str, List[tracing.Span]] = {}
+        tracing.add_listener(self.on_span)
+
+    def on_span(self, sp: tracing.Span):
+        if sp.name == "node":
+            self.spans.setdefault(sp.run_id, []).append(sp)
+
+    def steps(self, run_id: str) -> Dict[str, float]:
+        windows: Dict[str, List[float]] = {}
+        for sp in self.spans.get(run_id, []):
+            w = windows.setdefault(sp.attrs["step"], [sp.start, sp.end])
+            w[0], w[1] = min(w[0], sp.start), max(w[1], sp.end)
+        return {step: round(end - start, 4) for step, (start, end) in windows.items()}
+
+
+def run_once(infile: Path, workers: int, timer: StepTimer) -> Dict[str, Any]:
+    client = get_client()
+    before = sum(c["calls"] for c in client.stats().values())
+    orchestrator = Orchestrator(max_workers=workers, incremental=False)
+    started = time.perf_counter()
+    result = orchestrator.run(str(infile))
+    wall = time.perf_counter() - started
+    calls = sum(c["calls"] for c in client.stats().values()) - before
+    return {
+        "wall": round(wall, 4),
+        "calls": calls,
+        "prompt_tokens": result["usage"]["total"]["prompt_tokens"],
+        "steps": timer.steps(result["run_id"]),
+    }
+
+
+def measure(infile: Path, workers: int, repeat: int, timer: StepTimer) -> Dict[str, Any]:
+    """
+    repeat 번 실행 → 전체 시간은 중앙값, 나머지는 중앙값 실행의 값
+    """
+    runs = sorted((run_once(infile, workers, timer) for _ in range(repeat)), key=lambda r: r["wall"])
+    return runs[len(runs) // 2] | {"wall_runs": [r["wall"] for r in runs]}
+
+
+def scaled_paper(src: Path, factor: int, out_dir: Path) -> Path:
+    """
+    원문을 factor 번 이어 붙임 → split 이 같은 섹션을 합치므로 섹션 길이가 factor 배
+    """
+    path = out_dir / f"paper_x{factor}.txt"
+    text = src.read_text(encoding="utf-8")
+    path.write_text("\n\n".join([text] * factor), encoding="utf-8")
+    return path
+
+
+# ─────────────────────────────
+def run_suite(repeat: int) -> Dict[str, Any]:
+    timer = StepTimer()
+    sample = ROOT / "sample" / "example.txt"
+    work = Path(os.environ["TREELLM_RUNS_DIR"])
+    results: Dict[str, Any] = {"e2e": measure(sample, 7, repeat, timer)}
+    for factor in (1, 2, 4):
+        results[f"size_x{factor}"] = measure(scaled_paper(sample, factor, work), 7, repeat, timer)
+    for workers in (1, 4, 7):
+        results[f"workers_{workers}"] = measure(sample, workers, repeat, timer)
+    return results
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """
+    baseline 대비 회귀 목록 (빈 목록이면 통과)
+    """
+    regressions = []
+    for name, base in baseline.get("scenarios", {}).items():
+        cur = results.get(name)
+        if cur is None:
+            regressions.append(f"{name}: 시나리오 없음")
+            continue
+        limit = base["wall"] * (1 + tolerance) + TIME_SLACK
+        if cur["wall"] > limit:
+            regressions.append(f"{name}: wall {cur['wall']:.3f}s > {limit:.3f}s (baseline {base['wall']:.3f}s)")
+        if cur["calls"] > base["calls"]:
+            regressions.append(f"{name}: calls {cur['calls']} > baseline {base['calls']}")
+        for step, t in base.get("steps", {}).items():
+            step_limit = t * (1 + tolerance) + TIME_SLACK
+            if cur["steps"].get(step, 0) > step_limit:
+                regressions.append(f"{name}/{step}: {cur['steps'][step]:.3f}s > {step_limit:.3f}s")
+    return regressions
+
+
+def report(results: Dict[str, Any], baseline: Dict[str, Any]):
+    base = baseline.get("scenarios", {})
+    print(f"\n{'scenario':<12} {'wall(s)':>9} {'base':>9} {'calls':>6} {'in_tok':>8}  steps")
+    for name, r in results.items():
+        b = base.get(name, {}).get("wall")
+        steps = " ".join(f"{k}={v:.2f}" for k, v in r["steps"].items())
+        print(f"{name:<12} {r['wall']:>9.3f} {b if b is not None else '-':>9} {r['calls']:>6} "
+              f"{r['prompt_tokens']:>8}  {steps}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Tree-LLM 오프라인 성능 벤치마크")
+    parser.add_argument("--repeat", type=int, default=3, help="시나리오별 반복 횟수 (중앙값 사용)")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="허용 시간 증가 비율")
+    parser.add_argument("--baseline", default=str(BASELINE))
+    parser.add_argument("--out", help="결과 JSON 저장 경로")
+    parser.add_argument("--update-baseline", action="store_true")
+    args = parser.parse_args()
+
+    results = run_suite(max(1, args.repeat))
+    baseline_path = Path(args.baseline)
+    baseline = json.loads(baseline_path.read_text(encoding="utf-8")) if baseline_path.exists() else {}
+    report(results, baseline)
+
+    if args.out:
+        Path(args.out).write_text(json.dumps(results, indent=2, ensure_ascii=False), encoding="utf-8")
+    if args.update_baseline:
+        baseline_path.write_text(json.dumps(
+            {"conditions": FAKE_ENV | {"repeat": args.repeat},
+             "scenarios": {k: {"wall": v["wall"], "calls": v["calls"], "steps": v["steps"]}
+                           for k, v in results.items()}},
+            indent=2, ensure_ascii=False,
+        ) + "\n", encoding="utf-8")
+        print(f"\n[Bench] ✅ baseline 갱신 → {baseline_path}")
+        sys.exit(0)
+
+    regressions = compare(results, baseline, args.tolerance)
+    if not baseline:
+        print("\n[Bench] ⚠ baseline 없음 (--update-baseline 으로 생성)")
+    elif regressions:
+        print("\n[Bench] ❌ 성능 회귀:")
+        for line in regressions:
+            print(f"  - {line}")
+        sys.exit(1)
+    else:
+        print("\n[Bench] ✅ baseline 대비 회귀 없음")
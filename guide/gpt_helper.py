@@ -1,12 +1,11 @@
-from openai import OpenAI
+from module.llm_client import get_client
 
-client = OpenAI()
 
 def generate_text(prompt: str, model: str = "gpt-4o") -> str:
-    response = client.chat.completions.create(
+    return get_client().complete(
+        [{"role": "user", "content": prompt}],
         model=model,
-        messages=[{"role": "user", "content": prompt}],
         temperature=0.3,
         top_p=0.3,
+        step="helper",
     )
-    return response.choices[0].message.content.strip()
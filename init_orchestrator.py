@@ -58,7 +58,7 @@ class Orchestrator:
 
         # ✅ 2. Build
         build_step = BuildStep(model=self.model)
-        build_result = build_step.run(raw_text)
+        build_result = build_step.run(sections)
         build_txt.write_text(build_result, encoding="utf-8")
         self.log(f"[Step 2] Build 완료 → {build_txt}")
 
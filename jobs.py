@@ -0,0 +1,193 @@
+"""
+jobs.py
+───────────────────────────────
+백그라운드 작업 워커 풀
+- module/job_store.py 의 SQLite 큐에서 작업을 가져와 Orchestrator 실행
+- run_stream 이벤트는 events 테이블에 기록 → SSE 재접속 시 이어 받기
+  (토큰 조각은 EventBuffer 로 묶어서, 작업이 끝나면 단계 이벤트만 남음)
+- 작업을 실행하는 동안 Heartbeat 스레드가 stale_timeout / 4 마다 heartbeat 갱신 (이벤트가 뜸한 긴 호출 중에도
+  다른 워커가 죽은 작업으로 보고 다시 실행하지 않음)
+- 워커는 보관 기간(TREELLM_JOB_RETENTION)이 지난 작업을 주기적으로 삭제
+- 워커는 별도 프로세스 (HTTP 요청 스레드 수와 무관하게 동시 실행 수 고정)
+- 이미 run_id 가 있는 작업(재개/죽은 워커 복구)은 체크포인트부터 이어서 실행
+- 작업의 doc_id(업로드 문서 키)를 증분 재분석 키로 넘김 (없으면 Orchestrator 기본값 = 파일 이름)
+- arun_job: 같은 작업 실행을 AsyncOrchestrator 로 (asgi.py 가 요청을 받은 이벤트 루프에서 실행)
+- 워커는 TREELLM_WORKER_METRICS_PUSH 초(기본: 15)마다, 그리고 작업이 끝날 때마다 지표 스냅숏을 작업 DB 에 올림
+  → app.py / asgi.py 의 /metrics 가 자기 지표와 합산 (워커 프로세스에서 실행한 run 의 단계/LLM 지표 포함)
+- TREELLM_WORKER_METRICS_PORT 를 주면 워커 i 가 <포트 + i>/metrics 로 자기 지표만 따로 노출
+
+사용법
+    python jobs.py --workers 4      # 워커만 따로 실행
+"""
+
+from __future__ import annotations
+from typing import List, Optional
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import sqlite3
+import threading
+import time
+import traceback
+
+from module.job_store import EventBuffer, Heartbeat, JobStore
+from module import metrics
+
+
+def run_job(store: JobStore, job: dict, stale_timeout: float = 600.0):
+    """
+    작업 하나 실행: 이벤트 기록 → 최종 결과 저장 (실패 시 failed + 오류 이벤트)
+    stale_timeout: 죽은 작업 판정 기준 (heartbeat 는 그 1/4 간격으로 갱신)
+    """
+    from Orchestrator import Orchestrator  # 워커 프로세스에서만 필요
+
+    job_id = job["id"]
+    events = EventBuffer(store, job_id)
+    final = None
+    usage = None
+    with Heartbeat(store, job_id, stale_timeout / 4):
+        try:
+            orchestrator = Orchestrator(model=job["model"])
+            for update in orchestrator.run_stream(job["file_path"], doc_id=job["doc_id"], resume=job["run_id"]):
+                event = json.loads(update)
+                if events.add(update, event):
+                    events.flush()
+                if event.get("step") == 0:
+                    store.set_run_id(job_id, event["run_id"])
+                elif event.get("step") == 8:
+                    final = event["content"]
+                    usage = event.get("usage")
+            events.flush()
+            store.finish(job_id, {"final": final, "run_id": orchestrator.workspace.run_id, "usage": usage})
+        except Exception as exc:
+            traceback.print_exc()
+            events.add(json.dumps({"error": str(exc)}, ensure_ascii=False))
+            events.flush()
+            store.fail(job_id, f"{type(exc).__name__}: {exc}")
+
+
+async def arun_job(store: JobStore, job: dict, stale_timeout: float = 600.0):
+    """
+    run_job 의 asyncio 버전 (asgi.py 가 이벤트 루프 안에서 실행, 작업 DB 쓰기는 작업 스레드에서)
+    """
+    from Orchestrator import AsyncOrchestrator
+
+    job_id = job["id"]
+    events = EventBuffer(store, job_id)
+    final = None
+    usage = None
+    with Heartbeat(store, job_id, stale_timeout / 4):
+        try:
+            orchestrator = AsyncOrchestrator(model=job["model"])
+            async for update in orchestrator.arun_stream(job["file_path"], doc_id=job["doc_id"],
+                                                         resume=job["run_id"]):
+                event = json.loads(update)
+                if events.add(update, event):
+                    await asyncio.to_thread(events.flush)
+                if event.get("step") == 0:
+                    await asyncio.to_thread(store.set_run_id, job_id, event["run_id"])
+                elif event.get("step") == 8:
+                    final = event["content"]
+                    usage = event.get("usage")
+            await asyncio.to_thread(events.flush)
+            await asyncio.to_thread(store.finish, job_id,
+                                    {"final": final, "run_id": orchestrator.workspace.run_id, "usage": usage})
+        except Exception as exc:
+            traceback.print_exc()
+            events.add(json.dumps({"error": str(exc)}, ensure_ascii=False))
+            await asyncio.to_thread(events.flush)
+            await asyncio.to_thread(store.fail, job_id, f"{type(exc).__name__}: {exc}")
+
+
+def push_metrics(store: JobStore, name: str):
+    """
+    이 프로세스의 지표 스냅숏을 작업 DB 에 올림 (실패해도 작업 실행에는 영향 없음)
+    """
+    try:
+        store.put_metrics(name, metrics.snapshot())
+    except sqlite3.Error as exc:
+        print(f"[Worker {name}] ⚠ 지표 기록 실패: {exc}")
+
+
+def _push_metrics_loop(store: JobStore, name: str, interval: float):
+    while True:
+        push_metrics(store, name)
+        time.sleep(interval)
+
+
+def worker_loop(db_path: Optional[str], name: str, poll: float = 1.0, stale_timeout: float = 600.0,
+                metrics_port: Optional[int] = None, purge_every: float = 300.0):
+    """
+    큐가 빌 때는 poll 초마다 확인, 작업이 있으면 하나씩 실행
+    purge_every 초마다 보관 기간이 지난 작업/이벤트 삭제
+    """
+    store = JobStore(db_path)
+    print(f"[Worker {name}] ▶ 시작 (pid={os.getpid()})")
+    if metrics_port:
+        metrics.serve(metrics_port)
+        print(f"[Worker {name}] 지표 → :{metrics_port}/metrics")
+    # 긴 작업 중에도 지표가 보이도록 백그라운드 스레드가 주기적으로 올림
+    threading.Thread(target=_push_metrics_loop, name="metrics-push", daemon=True,
+                     args=(store, name, float(os.getenv("TREELLM_WORKER_METRICS_PUSH", "15")))).start()
+    purged = -purge_every
+    while True:
+        store.requeue_stale(stale_timeout)
+        if time.monotonic() - purged >= purge_every:
+            purged = time.monotonic()
+            removed = store.purge_finished()
+            if removed:
+                print(f"[Worker {name}] 보관 기간이 지난 작업 {removed}개 삭제")
+        job = store.claim(name)
+        if job is None:
+            time.sleep(poll)
+            continue
+        print(f"[Worker {name}] ▶ 작업 {job['id']} 실행 중...")
+        run_job(store, job, stale_timeout)
+        push_metrics(store, name)
+        print(f"[Worker {name}] ✅ 작업 {job['id']} 종료")
+
+
+class WorkerPool:
+    def __init__(self, workers: int = 2, db_path: Optional[str] = None, metrics_port: Optional[int] = None):
+        self.workers = max(1, workers)
+        self.db_path = db_path
+        port = metrics_port or os.getenv("TREELLM_WORKER_METRICS_PORT")
+        self.metrics_port = int(port) if port else None
+        self.processes: List[multiprocessing.Process] = []
+
+    def start(self):
+        JobStore(self.db_path)  # 테이블 미리 생성
+        for i in range(self.workers):
+            proc = multiprocessing.Process(
+                target=worker_loop,
+                args=(self.db_path, f"w{i}-{os.getpid()}"),
+                kwargs={"metrics_port": self.metrics_port + i if self.metrics_port else None},
+                daemon=True,
+            )
+            proc.start()
+            self.processes.append(proc)
+        return self
+
+    def stop(self):
+        for proc in self.processes:
+            proc.terminate()
+        for proc in self.processes:
+            proc.join(timeout=5)
+        self.processes.clear()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Tree-LLM 파이프라인 작업 워커")
+    parser.add_argument("--workers", type=int, default=int(os.getenv("TREELLM_JOB_WORKERS", "2")))
+    parser.add_argument("--db", default=None, help="작업 DB 경로 (기본: TREELLM_JOBS_DB 또는 jobs.sqlite3)")
+    args = parser.parse_args()
+
+    pool = WorkerPool(args.workers, args.db).start()
+    print(f"[WorkerPool] ✅ 워커 {pool.workers}개 실행 중 (Ctrl+C 로 종료)")
+    try:
+        for proc in pool.processes:
+            proc.join()
+    except KeyboardInterrupt:
+        pool.stop()
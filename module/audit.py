@@ -4,17 +4,47 @@ audit.py
 USENIX 기준 점검:
 - split 결과 (섹션 → 내용)
 - tree (구조화 정보)
-- prompts/USENIX/*.txt 기반 GPT 호출
+- prompts/USENIX/*.txt 기반 GPT 호출 (module/prompts.py 레지스트리)
+
+프롬프트 배치 (mode)
+- criterion : 기준별 템플릿에 해당 섹션 원문/트리를 끼워 넣음 (기존 방식, 지시문이 앞 → 기준마다 prefix 가 다름)
+- prefix    : 모든 기준이 보는 섹션 원문 + 트리를 항상 같은 첫 메시지로 보내고, 기준 지시문은 그 뒤에
+              → 기준마다 같은 prefix 라 공급자 prompt prefix 캐시가 적중 (cached_tokens 로 확인)
+              동시에 보낸 요청끼리는 캐시를 공유하지 못하므로 첫 기준을 먼저 보내고 나머지를 보냄
+- multi     : prefix 배치 + 여러 기준을 한 번의 호출에서 JSON 배열로 평가 (빠진 기준은 prefix 방식으로 다시 호출)
+
+긴 논문: 기준 프롬프트가 TREELLM_CHUNK_TOKENS 를 넘으면 섹션 원문을 문단 경계(겹침 포함)로 나눠 병렬 점검하고
+조각별 JSON 을 issues/improvements 합집합으로 합침 (prefix/multi 는 공통 문맥이 넘으면 이 방식으로 대체)
+
+AsyncAuditStep: criterion 모드의 asyncio 버전 (AsyncOrchestrator 용)
+
+사용법
+    python -m module.audit          # sample/step2_result.txt → sample/step3_result.txt (저장소 루트에서)
 """
 
 from __future__ import annotations
 from pathlib import Path
-import os
 import json
-import glob
-from typing import Dict
-from openai import OpenAI
-from .split import run as split_run  # 개선된 split.py (dict 반환)
+from typing import Dict, List, Optional, Tuple
+from .chunking import chunk_tokens, gather_map, merge_reports, parallel_map, split_text
+from .llm_async import get_async_client
+from .llm_cache import template_version
+from .llm_client import get_client
+from .prompts import Template, get_registry
+from .split import SECTION_ORDER, run as split_run  # 개선된 split.py (dict 반환)
+from .structured import loads, to_block
+from .usage import count_tokens
+
+AUDIT_MODES = ("criterion", "prefix", "multi")
+
+#  기준별 섹션 매핑
+SECTION_MAP: Dict[str, List[str]] = {
+    "BackgroundClarity": ["Introduction", "Related Work"],
+    "Contribution": ["Introduction", "Related Work", "Method"],
+    "GapValidation": ["Introduction", "Related Work"],
+    "Lesson": ["Discussion", "Conclusion"],
+    "Robustness": ["Method"]  # Experiment는 제외 (split에서 삭제됨)
+}
 
 
 class AuditStep:
@@ -24,77 +54,337 @@ class AuditStep:
     Output: USENIX 평가 보고서(string)
     """
 
-    def __init__(self, model: str = "gpt-4o"):
+    def __init__(self, model: str = "gpt-4o", max_workers: int = 7):
+        """
+        max_workers: 긴 논문을 나눈 조각을 동시에 점검할 수
+        """
         self.model = model
-        self.prompt_dir = Path(__file__).resolve().parent.parent / "prompts" / "USENIX"
-        self.client = OpenAI()
+        self.max_workers = max(1, max_workers)
+        self.prompts = get_registry()
+        self.llm = get_client()  # 공유 클라이언트 (연결 재사용 + 재시도 + 캐시)
 
-        if not os.getenv("OPENAI_API_KEY"):
-            raise EnvironmentError("OPENAI_API_KEY 환경 변수가 필요합니다.")
+        self.section_map = {pname: list(secs) for pname, secs in SECTION_MAP.items()}
+
+    # ─────────────────────────────
+    def load_prompts(self) -> Dict[str, Template]:
+        return self.prompts.group("USENIX")
 
-        #  기준별 섹션 매핑
-        self.section_map = {
-            "BackgroundClarity": ["Introduction", "Related Work"],
-            "Contribution": ["Introduction", "Related Work", "Method"],
-            "GapValidation": ["Introduction", "Related Work"],
-            "Lesson": ["Discussion", "Conclusion"],
-            "Robustness": ["Method"]  # Experiment는 제외 (split에서 삭제됨)
-        }
+    def shared_sections(self) -> List[str]:
+        """
+        어떤 기준이든 보는 섹션 전체 (SECTION_ORDER 순서 → prefix 가 항상 같음)
+        """
+        used = {sec for secs in self.section_map.values() for sec in secs}
+        return [sec for sec in SECTION_ORDER if sec in used]
 
     # ─────────────────────────────
-    def load_prompts(self) -> Dict[str, str]:
-        paths = sorted(glob.glob(str(self.prompt_dir / "*.txt")))
-        if not paths:
-            raise FileNotFoundError(f"USENIX 프롬프트 없음: {self.prompt_dir}")
-        return {Path(p).stem: Path(p).read_text(encoding="utf-8") for p in paths}
+    def call_gpt(self, prompt: str, version: str = "", on_delta=None, prefix: str = "") -> str:
+        """
+        prefix 가 있으면 첫 메시지로 따로 보냄 (기준이 달라도 같은 내용 → prefix 캐시)
+        """
+        messages = [{"role": "user", "content": prefix}] if prefix else []
+        return self.llm.complete(
+            messages + [{"role": "user", "content": prompt}],
+            model=self.model, temperature=0.3, top_p=0.3,
+            step="audit",
+            version=version,
+            on_delta=on_delta,
+        )
 
     # ─────────────────────────────
-    def call_gpt(self, prompt: str) -> str:
-        response = self.client.chat.completions.create(
-            model=self.model,
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.3,
-            top_p=0.3
+    def criterion_input(
+        self,
+        pname: str,
+        template: Template,
+        sections: Dict[str, str],
+        tree_dict: Dict[str, dict],
+    ) -> Tuple[List[str], str]:
+        """
+        기준 하나의 입력 → (원문 조각 목록, 트리 JSON) (해당 섹션이 없으면 조각 없음, 예산 안이면 조각 하나)
+        """
+        #  섹션 내용 합치기
+        combined_text = ""
+        combined_tree = {}
+        for sec in self.section_map.get(pname, []):
+            text = sections.get(sec, "")
+            if text:
+                combined_text += f"\n\n## {sec}\n{text}"
+                combined_tree[sec] = tree_dict.get(sec.lower(), {})
+
+        if not combined_text.strip():
+            return [], ""  # 해당 기준에 들어갈 섹션이 없으면 스킵
+
+        #  예산을 넘으면 원문을 나눔
+        tree_info = json.dumps(combined_tree, ensure_ascii=False, indent=2)
+        budget = chunk_tokens() - count_tokens(
+            template.render(SECTION_TEXT="", TREE_INFO=tree_info, SECTION_NAME=pname), self.model
         )
-        return response.choices[0].message.content.strip()
+        return split_text(combined_text.strip(), max(budget, chunk_tokens() // 4), model=self.model), tree_info
+
+    @staticmethod
+    def criterion_prompt(pname: str, template: Template, text: str, tree_info: str) -> str:
+        return template.render(SECTION_TEXT=text, TREE_INFO=tree_info, SECTION_NAME=pname)
+
+    @staticmethod
+    def merge_outputs(outputs: List[str]) -> str:
+        """
+        조각별 응답 → 하나의 블록 (JSON 보고서는 merge_reports, JSON 이 하나도 없으면 응답을 그대로 이어 붙임)
+        """
+        reports = [r for r in (loads(o) for o in outputs) if isinstance(r, dict)]
+        if not reports:
+            return "\n\n".join(outputs)
+        return to_block(merge_reports(reports))
+
+    def run_criterion(
+        self,
+        pname: str,
+        template: Template,
+        sections: Dict[str, str],
+        tree_dict: Dict[str, dict],
+        on_delta=None,
+    ) -> str:
+        """
+        기준 하나 점검 → "# <기준>\n<응답>" (해당 섹션이 없으면 빈 문자열)
+        on_delta: 토큰 스트리밍 콜백 (llm_client.complete 참고)
+        """
+        chunks, tree_info = self.criterion_input(pname, template, sections, tree_dict)
+        if not chunks:
+            return ""
+        if len(chunks) > 1:
+            return self.run_criterion_chunked(pname, template, chunks, tree_info, on_delta=on_delta)
+
+        print(f"[AuditStep] ▶ {pname} ({', '.join(self.section_map.get(pname, []))}) 점검 실행...")
+        prompt = self.criterion_prompt(pname, template, chunks[0], tree_info)
+        gpt_output = self.call_gpt(prompt, version=template.version, on_delta=on_delta)
+        return f"# {pname}\n{gpt_output}"
+
+    def run_criterion_chunked(
+        self,
+        pname: str,
+        template: Template,
+        chunks: List[str],
+        tree_info: str,
+        on_delta=None,
+    ) -> str:
+        """
+        원문 조각별로 같은 기준 점검 (병렬) → 조각 순서대로 합친 "# <기준>\n```json```"
+        on_delta 에는 합친 블록을 한 번에 전달 (조각 스트림이 섞이지 않도록)
+        """
+        print(f"[AuditStep] ▶ {pname}: 원문이 길어 {len(chunks)}개 조각으로 나눠 점검...")
+
+        def check(text: str) -> str:
+            return self.call_gpt(self.criterion_prompt(pname, template, text, tree_info), version=template.version)
+
+        body = self.merge_outputs(parallel_map(check, chunks, self.max_workers))
+        if on_delta is not None:
+            on_delta(body)
+        return f"# {pname}\n{body}"
+
+    def fits_context(self, context: str) -> bool:
+        """
+        prefix / multi 공통 문맥이 한 번에 보낼 수 있는 크기인지 (넘으면 기준별 조각 점검으로 대체)
+        """
+        return count_tokens(context, self.model) <= chunk_tokens()
 
     # ─────────────────────────────
-    def run(self, sections: Dict[str, str], tree_dict: Dict[str, dict]) -> str:
+    def shared_context(self, sections: Dict[str, str], tree_dict: Dict[str, dict]) -> str:
         """
-        기준별로 관련 섹션 묶어 GPT 호출
+        prefix / multi 모드의 공통 첫 메시지: 원문 + 트리 (기준과 무관하게 같은 문자열)
         """
-        prompts = self.load_prompts()
-        outputs = []
+        text = "\n\n".join(
+            f"## {sec}\n{sections[sec]}" for sec in self.shared_sections() if sections.get(sec, "").strip()
+        )
+        tree = {sec: tree_dict.get(sec.lower(), {}) for sec in self.shared_sections() if sections.get(sec, "").strip()}
+        return (
+            "[Paper]\n" + text
+            + "\n\n[Structured Information]\n" + json.dumps(tree, ensure_ascii=False, indent=2)
+        )
 
-        for pname, template in prompts.items():
-            target_sections = self.section_map.get(pname, [])
-
-            #  섹션 내용 합치기
-            combined_text = ""
-            combined_tree = {}
-            for sec in target_sections:
-                text = sections.get(sec, "")
-                if text:
-                    combined_text += f"\n\n## {sec}\n{text}"
-                    combined_tree[sec] = tree_dict.get(sec.lower(), {})
-
-            if not combined_text.strip():
-                continue  # 해당 기준에 들어갈 섹션이 없으면 스킵
-
-            #  프롬프트 생성
-            prompt = (
-                template.replace("{SECTION_TEXT}", combined_text.strip())
-                        .replace("{TREE_INFO}", json.dumps(combined_tree, ensure_ascii=False, indent=2))
-                        .replace("{SECTION_NAME}", pname)
+    def instructions(self, pname: str, template: Template) -> str:
+        """
+        기준 지시문 (원문/트리 자리는 앞 메시지를 가리키는 짧은 문구로 대체)
+        """
+        target = self.section_map.get(pname, [])
+        return template.render(
+            SECTION_NAME=pname,
+            SECTION_TEXT=f"(앞 메시지 [Paper] 의 {', '.join(target)} 섹션만 평가 대상)",
+            TREE_INFO=f"(앞 메시지 [Structured Information] 의 {', '.join(target)} 항목)",
+        )
+
+    def has_target(self, pname: str, sections: Dict[str, str]) -> bool:
+        return any(sections.get(sec, "").strip() for sec in self.section_map.get(pname, []))
+
+    def run_criterion_prefixed(
+        self,
+        pname: str,
+        template: Template,
+        sections: Dict[str, str],
+        tree_dict: Dict[str, dict],
+        on_delta=None,
+        context: Optional[str] = None,
+    ) -> str:
+        """
+        prefix 모드의 기준 하나 → "# <기준>\n<응답>" (run_criterion 과 같은 형식)
+        """
+        if not self.has_target(pname, sections):
+            return ""
+        context = context if context is not None else self.shared_context(sections, tree_dict)
+        if not self.fits_context(context):
+            print(f"[AuditStep] ⚠ {pname}: 공통 문맥이 예산 초과 → 기준별 조각 점검")
+            return self.run_criterion(pname, template, sections, tree_dict, on_delta=on_delta)
+        print(f"[AuditStep] ▶ {pname} (prefix) 점검 실행...")
+        gpt_output = self.call_gpt(
+            self.instructions(pname, template), version=f"prefix:{template.version}",
+            on_delta=on_delta, prefix=context,
+        )
+        return f"# {pname}\n{gpt_output}"
+
+    def run_criteria(
+        self,
+        items: List[Tuple[str, Template]],
+        sections: Dict[str, str],
+        tree_dict: Dict[str, dict],
+        on_delta=None,
+    ) -> Dict[str, str]:
+        """
+        여러 기준을 한 번에 평가 → {기준: "# <기준>\n```json ...```"}
+        응답에서 빠졌거나 JSON 이 깨진 기준은 prefix 방식으로 하나씩 다시 호출
+        """
+        items = [(pname, template) for pname, template in items if self.has_target(pname, sections)]
+        if not items:
+            return {}
+        context = self.shared_context(sections, tree_dict)
+        if not self.fits_context(context):
+            print("[AuditStep] ⚠ 공통 문맥이 예산 초과 → 기준별 조각 점검")
+            blocks = parallel_map(
+                lambda item: self.run_criterion(item[0], item[1], sections, tree_dict), items, self.max_workers
             )
+            return {pname: block for (pname, _), block in zip(items, blocks)}
+        if len(items) == 1:
+            pname, template = items[0]
+            return {pname: self.run_criterion_prefixed(pname, template, sections, tree_dict, on_delta, context)}
+
+        names = [pname for pname, _ in items]
+        prompt = (
+            f"아래 {len(items)}개 평가 기준을 각각 독립적으로 수행하세요.\n"
+            "모든 기준의 결과를 하나의 JSON 배열로만 출력하고, 배열의 각 원소는 해당 기준의 "
+            "[Output Format Example] 형식을 따르며 \"criterion\" 값은 기준 이름과 같아야 합니다.\n"
+            f"기준 순서: {', '.join(names)}\n\n"
+            + "\n\n".join(f"===== 기준: {pname} =====\n{self.instructions(pname, template)}"
+                           for pname, template in items)
+        )
+        print(f"[AuditStep] ▶ {', '.join(names)} (multi) 점검 실행...")
+        version = "multi:" + template_version(":".join(template.version for _, template in items))
+        output = self.call_gpt(prompt, version=version, on_delta=on_delta, prefix=context)
 
-            print(f"[AuditStep] ▶ {pname} ({', '.join(target_sections)}) 점검 실행...")
-            gpt_output = self.call_gpt(prompt)
-            outputs.append(f"# {pname}\n{gpt_output}")
+        results = self.parse_multi(output)
+        blocks: Dict[str, str] = {}
+        for pname, template in items:
+            if pname in results:
+                body = json.dumps(results[pname], ensure_ascii=False, indent=2)
+                blocks[pname] = f"# {pname}\n```json\n{body}\n```"
+            else:
+                print(f"[AuditStep] ⚠ {pname}: multi 응답에 없음 → 단독 호출")
+                blocks[pname] = self.run_criterion_prefixed(pname, template, sections, tree_dict, None, context)
+        return blocks
+
+    @staticmethod
+    def parse_multi(output: str) -> Dict[str, dict]:
+        """
+        JSON 배열(또는 {"results": [...]}, {기준: {...}}) → {기준: 결과}
+        """
+        data = loads(output, default={})
+        if isinstance(data, dict):
+            data = data.get("results", data)
+        if isinstance(data, dict):
+            return {k: v for k, v in data.items() if isinstance(v, dict)}
+        return {item["criterion"]: item for item in data if isinstance(item, dict) and "criterion" in item}
+
+    # ─────────────────────────────
+    def run(self, sections: Dict[str, str], tree_dict: Dict[str, dict], mode: str = "criterion") -> str:
+        """
+        기준별로 관련 섹션 묶어 GPT 호출 (mode: criterion / prefix / multi)
+        """
+        if mode not in AUDIT_MODES:
+            raise ValueError(f"mode 는 {AUDIT_MODES} 중 하나: {mode}")
+        prompts = self.load_prompts()
+        if mode == "multi":
+            blocks = self.run_criteria(list(prompts.items()), sections, tree_dict)
+            return "\n\n".join(blocks[p] for p in prompts if blocks.get(p))
+
+        outputs = []
+        context = self.shared_context(sections, tree_dict) if mode == "prefix" else None
+        for pname, template in prompts.items():
+            if mode == "prefix":
+                output = self.run_criterion_prefixed(pname, template, sections, tree_dict, context=context)
+            else:
+                output = self.run_criterion(pname, template, sections, tree_dict)
+            if output:
+                outputs.append(output)
 
         return "\n\n".join(outputs)
 
 
+class AsyncAuditStep(AuditStep):
+    """
+    AuditStep 의 asyncio 버전 (AsyncOrchestrator 용, criterion 모드만)
+    prefix / multi 는 첫 기준을 먼저 보내는 순서 제어 + 기준별 대체 호출이 얽혀 있어 동기 AuditStep 을 스레드에서 사용
+    """
+
+    def __init__(self, model: str = "gpt-4o", max_workers: int = 7):
+        super().__init__(model, max_workers)
+        self.llm = get_async_client()
+
+    async def call_gpt(self, prompt: str, version: str = "", on_delta=None, prefix: str = "") -> str:
+        messages = [{"role": "user", "content": prefix}] if prefix else []
+        return await self.llm.complete(
+            messages + [{"role": "user", "content": prompt}],
+            model=self.model, temperature=0.3, top_p=0.3,
+            step="audit",
+            version=version,
+            on_delta=on_delta,
+        )
+
+    async def run_criterion(self, pname: str, template: Template, sections: Dict[str, str],
+                            tree_dict: Dict[str, dict], on_delta=None) -> str:
+        chunks, tree_info = self.criterion_input(pname, template, sections, tree_dict)
+        if not chunks:
+            return ""
+        if len(chunks) > 1:
+            return await self.run_criterion_chunked(pname, template, chunks, tree_info, on_delta=on_delta)
+        print(f"[AuditStep] ▶ {pname} ({', '.join(self.section_map.get(pname, []))}) 점검 실행...")
+        prompt = self.criterion_prompt(pname, template, chunks[0], tree_info)
+        return f"# {pname}\n{await self.call_gpt(prompt, version=template.version, on_delta=on_delta)}"
+
+    async def run_criterion_chunked(self, pname: str, template: Template, chunks: List[str], tree_info: str,
+                                    on_delta=None) -> str:
+        print(f"[AuditStep] ▶ {pname}: 원문이 길어 {len(chunks)}개 조각으로 나눠 점검...")
+        outputs = await gather_map(
+            lambda text: self.call_gpt(self.criterion_prompt(pname, template, text, tree_info),
+                                       version=template.version),
+            chunks, self.max_workers,
+        )
+        body = self.merge_outputs(outputs)
+        if on_delta is not None:
+            on_delta(body)
+        return f"# {pname}\n{body}"
+
+    def run_criterion_prefixed(self, *args, **kwargs):
+        raise NotImplementedError("prefix 모드는 AuditStep 사용")
+
+    def run_criteria(self, *args, **kwargs):
+        raise NotImplementedError("multi 모드는 AuditStep 사용")
+
+    async def run(self, sections: Dict[str, str], tree_dict: Dict[str, dict], mode: str = "criterion") -> str:
+        if mode != "criterion":
+            raise NotImplementedError(f"{mode} 모드는 AuditStep 사용")
+        prompts = self.load_prompts()
+        outputs = await gather_map(
+            lambda item: self.run_criterion(item[0], item[1], sections, tree_dict), list(prompts.items()),
+            len(prompts),
+        )
+        return "\n\n".join(output for output in outputs if output)
+
+
 # ─────────────────────────────
 if __name__ == "__main__":
     infile_text = "sample/example.txt"         # 원문
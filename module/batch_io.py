@@ -0,0 +1,123 @@
+"""
+batch_io.py
+───────────────────────────────
+LLM 요청 배치 입출력 (OpenAI Batch API JSONL 형식)
+- 요청 파일 : {"custom_id", "method", "url", "body"} 한 줄씩
+- 결과 파일 : {"custom_id", "response": {"status_code", "body"}, "error"} 한 줄씩
+- custom_id 는 응답 캐시 키 → 같은 요청은 한 번만 기록, 결과는 다시 캐시로 들어감
+- serve_local(): 배치 엔드포인트 대신 로컬에서 요청 파일을 처리해 결과 파일 생성
+"""
+
+from __future__ import annotations
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, Optional, Set
+import json
+import threading
+import uuid
+
+
+class BatchPending(Exception):
+    """
+    배치 결과가 아직 없는 요청 (요청 파일에 기록됨)
+    """
+
+    def __init__(self, custom_id: str):
+        super().__init__(f"배치 결과 대기 중: {custom_id}")
+        self.custom_id = custom_id
+
+
+def read_results(path: str | Path) -> Dict[str, str]:
+    """
+    결과 JSONL → {custom_id: 응답 텍스트} (오류 난 요청은 제외)
+    """
+    results: Dict[str, str] = {}
+    for line in Path(path).read_text(encoding="utf-8").splitlines():
+        if not line.strip():
+            continue
+        item = json.loads(line)
+        response = item.get("response") or {}
+        if item.get("error") or response.get("status_code", 200) != 200:
+            continue
+        body = response.get("body", {})
+        results[item["custom_id"]] = body["choices"][0]["message"]["content"].strip()
+    return results
+
+
+class BatchIO:
+    def __init__(self, requests_path: str | Path, results_path: str | Path | None = None):
+        self.requests_path = Path(requests_path)
+        self.results: Dict[str, str] = {}
+        if results_path and Path(results_path).exists():
+            self.results = read_results(results_path)
+        self._written: Set[str] = set()
+        self._lock = threading.Lock()
+
+        # 이미 기록된 요청은 다시 쓰지 않음 (여러 라운드에 걸쳐 같은 파일 사용)
+        if self.requests_path.exists():
+            for line in self.requests_path.read_text(encoding="utf-8").splitlines():
+                if line.strip():
+                    self._written.add(json.loads(line)["custom_id"])
+
+    def result_for(self, custom_id: str) -> Optional[str]:
+        return self.results.get(custom_id)
+
+    def record(self, custom_id: str, body: Dict[str, Any]):
+        with self._lock:
+            if custom_id in self._written:
+                return
+            self.requests_path.parent.mkdir(parents=True, exist_ok=True)
+            with self.requests_path.open("a", encoding="utf-8") as fp:
+                fp.write(json.dumps({
+                    "custom_id": custom_id,
+                    "method": "POST",
+                    "url": "/v1/chat/completions",
+                    "body": body,
+                }, ensure_ascii=False) + "\n")
+            self._written.add(custom_id)
+
+    @property
+    def pending(self) -> int:
+        return len(self._written - set(self.results))
+
+
+# ─────────────────────────────
+def serve_local(requests_path: str | Path, results_path: str | Path, client, workers: int = 4) -> int:
+    """
+    로컬 배치 서버 대용: 요청 파일의 각 요청을 client(LLMClient, 배치 모드 아님)로
+    실행해 결과 파일 작성 (이미 결과가 있는 custom_id 는 건너뜀) → 새로 처리한 요청 수
+    """
+    results_path = Path(results_path)
+    done = read_results(results_path) if results_path.exists() else {}
+    todo = []
+    for line in Path(requests_path).read_text(encoding="utf-8").splitlines():
+        if line.strip():
+            item = json.loads(line)
+            if item["custom_id"] not in done:
+                todo.append(item)
+
+    lock = threading.Lock()
+
+    def handle(item: Dict[str, Any]):
+        body = item["body"]
+        try:
+            content = client.complete(
+                body["messages"],
+                model=body["model"],
+                temperature=body.get("temperature"),
+                top_p=body.get("top_p"),
+                step="batch",
+            )
+            line = {"id": f"batch_req_{uuid.uuid4().hex}", "custom_id": item["custom_id"],
+                    "response": {"status_code": 200,
+                                 "body": {"choices": [{"index": 0, "message": {"role": "assistant", "content": content}}]}},
+                    "error": None}
+        except Exception as exc:
+            line = {"id": f"batch_req_{uuid.uuid4().hex}", "custom_id": item["custom_id"],
+                    "response": None, "error": {"code": type(exc).__name__, "message": str(exc)}}
+        with lock, results_path.open("a", encoding="utf-8") as fp:
+            fp.write(json.dumps(line, ensure_ascii=False) + "\n")
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        list(pool.map(handle, todo))
+    return len(todo)
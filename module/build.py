@@ -1,79 +1,185 @@
 """
-build.py (string in → string out)
+build.py (sections in → string out)
 ───────────────────────────────
-- run(raw_text: str) → gpt_output(str)
-- prompts/fill/*.txt 사용
-- 최신 OpenAI API 사용 (클래스 내부에서 직접 GPT 호출)
+- run(sections: {섹션명: 내용}) → gpt_output(str)
+- prompts/fill/*.txt 사용 (각 템플릿에는 해당 섹션 텍스트만 전달, module/prompts.py 레지스트리에서 가져옴)
+- LLM 호출은 공용 클라이언트 (module/llm_client.py get_client) + structured.complete_json 으로
+- fill 프롬프트는 스레드 풀에서 동시 실행 (max_workers 로 동시성 제한)
+- 응답은 TREE_SCHEMA 로 검사, 형식이 깨진 섹션만 다시 요청 (module/structured.py)
+  재요청까지 실패한 섹션은 빈 블록으로 제외하고 계속 (structured.record_fallback 으로 기록)
+- AsyncBuildStep: 같은 단계의 asyncio 버전 (module/llm_async.py, AsyncOrchestrator 용)
+
+사용법
+    python -m module.build          # sample/example.txt → sample/step1_result.txt (저장소 루트에서)
 """
 
 from __future__ import annotations
 from pathlib import Path
-from typing import List, Tuple
-import glob
-import os
-from openai import OpenAI
+from typing import Any, Dict, List, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from .chunking import gather_map
+from .llm_async import get_async_client
+from .llm_client import get_client
+from .prompts import Template, get_registry
+from .split import run as split_run
+from .structured import StructuredOutputError, acomplete_json, complete_json, record_fallback, to_block
+
+# fill 응답: {"<섹션>": {노드: 내용, ...}}
+TREE_SCHEMA = {
+    "type": "object",
+    "minProperties": 1,
+    "additionalProperties": {"type": "object"},
+}
 
 
 class BuildStep:
     """
     Step 1: Fill Prompts 실행 모듈
-    Input  : 하나의 문자열(raw_text)
+    Input  : {섹션명: 내용} (split.run 결과)
     Output : GPT 응답을 합친 하나의 문자열
     """
 
-    def __init__(self, model: str = "gpt-4o"):
+    def __init__(self, model: str = "gpt-4o", max_workers: int = 7):
+        """
+        max_workers: 동시에 실행할 GPT 호출 수 (1 이면 기존처럼 순차 실행)
+        """
         self.model = model
-        self.prompt_dir = Path(__file__).resolve().parent.parent / "prompts" / "fill"
-        self.client = OpenAI()
+        self.max_workers = max(1, max_workers)
+        self.prompts = get_registry()
+        self.llm = get_client()  # 공유 클라이언트 (연결 재사용 + 재시도 + 캐시)
 
-        if not os.getenv("OPENAI_API_KEY"):
-            raise EnvironmentError(
-                "OPENAI_API_KEY 환경 변수가 설정되지 않았습니다. "
-                "export OPENAI_API_KEY='sk-...' 로 설정하세요."
-            )
+    # ─────────────────────────────
+    def load_prompts(self) -> List[Tuple[str, Template]]:
+        """
+        prompts/fill/*_fill_prompt.txt → [(prompt_id, 템플릿)] 리스트
+        """
+        return list(self.prompts.group("fill", suffix="_fill_prompt").items())
 
     # ─────────────────────────────
-    def load_prompts(self) -> List[Tuple[str, str]]:
+    @staticmethod
+    def section_of(pid: str) -> str:
         """
-        prompts/fill/*.txt → [(prompt_id, 템플릿)] 리스트
+        prompt_id → split 섹션명 (예: related_work → Related Work)
         """
-        paths = sorted(glob.glob(str(self.prompt_dir / "*_fill_prompt.txt")))
-        if not paths:
-            raise FileNotFoundError(f"프롬프트 없음: {self.prompt_dir}")
-        return [
-            (Path(p).stem.replace("_fill_prompt", ""), Path(p).read_text(encoding="utf-8"))
-            for p in paths
-        ]
+        return pid.replace("_", " ").title()
 
     # ─────────────────────────────
-    def call_gpt(self, prompt: str) -> str:
+    def call_gpt(self, prompt: str, version: str = "", on_delta=None) -> str:
         """
-        최신 OpenAI API를 사용해 GPT 응답 생성.
+        공유 LLM 클라이언트로 GPT 응답 생성 (캐시/재시도 포함).
         """
-        response = self.client.chat.completions.create(
-            model=self.model,
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.3,
-            top_p=0.3
+        return self.llm.complete(
+            [{"role": "user", "content": prompt}],
+            model=self.model, temperature=0.3, top_p=0.3,
+            step="build",
+            version=version,
+            on_delta=on_delta,
         )
-        return response.choices[0].message.content.strip()
+
+    def call_json(self, prompt: str, version: str = "", on_delta=None) -> Dict[str, Any]:
+        """
+        call_gpt + JSON 파싱/복구/TREE_SCHEMA 검사 (실패하면 이 프롬프트만 다시 요청)
+        """
+        tree, _ = complete_json(
+            self.llm,
+            [{"role": "user", "content": prompt}],
+            TREE_SCHEMA,
+            model=self.model, temperature=0.3, top_p=0.3,
+            step="build",
+            version=version,
+            on_delta=on_delta,
+        )
+        return tree
+
+    # ─────────────────────────────
+    def run_one(self, pid: str, tmpl: Template, section_text: str, on_delta=None) -> str:
+        """
+        fill 프롬프트 하나 실행 → "### <pid>\n```json ...```" 블록 (검사를 통과한 JSON 으로 정리)
+        on_delta: 토큰 스트리밍 콜백 (llm_client.complete 참고)
+        """
+        print(f"[BuildStep] ▶ {pid} 실행 중...")
+        prompt = tmpl.render(INPUT=section_text)
+        try:
+            tree = self.call_json(prompt, version=tmpl.version, on_delta=on_delta)
+        except StructuredOutputError as exc:
+            return self.drop(pid, exc, on_delta)
+        return f"### {pid}\n{to_block(tree)}"
+
+    @staticmethod
+    def drop(pid: str, error: StructuredOutputError, on_delta=None) -> str:
+        """
+        재요청까지 형식이 깨진 섹션은 빈 블록 → 트리/Audit 에서 그 섹션만 빠지고 실행은 계속
+        """
+        record_fallback(error, "dropped", pid=pid)
+        print(f"[BuildStep] ⚠ {pid}: 응답 형식 오류로 섹션 제외 ({error})")
+        if on_delta is not None:
+            on_delta("", reset=True)  # 이미 보낸 깨진 응답 조각 취소
+        return ""
 
     # ─────────────────────────────
-    def run(self, raw_text: str) -> str:
+    def run(self, sections: Dict[str, str]) -> str:
         """
-        string → string
-        모든 fill 프롬프트 실행 결과를 합쳐 반환.
+        {섹션명: 내용} → string
+        각 fill 프롬프트에 해당 섹션 텍스트만 넣어 실행하고 결과를 합쳐 반환.
+        섹션이 없거나 비어 있는 템플릿은 건너뜀.
         """
-        prompts = self.load_prompts()
-        outputs = []
+        prompts = [
+            (pid, tmpl) for pid, tmpl in self.load_prompts()
+            if sections.get(self.section_of(pid), "").strip()
+        ]
+        if not prompts:
+            return ""
+
+        def fill(item: Tuple[str, Template]) -> str:
+            pid, tmpl = item
+            return self.run_one(pid, tmpl, sections[self.section_of(pid)])
+
+        # map() 은 입력 순서대로 결과를 돌려주므로 "### <pid>" 순서가 유지됨
+        workers = min(self.max_workers, len(prompts))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            outputs = list(pool.map(fill, prompts))
+
+        return "\n\n".join(block for block in outputs if block)
 
-        for pid, tmpl in prompts:
-            print(f"[BuildStep] ▶ {pid} 실행 중...")
-            prompt = tmpl.replace("{INPUT}", raw_text)
-            gpt_output = self.call_gpt(prompt)
-            outputs.append(f"### {pid}\n{gpt_output}")
 
-        return "\n\n".join(outputs)
+class AsyncBuildStep(BuildStep):
+    """
+    BuildStep 의 asyncio 버전 (AsyncOrchestrator 용) — 프롬프트/결과 형식은 같고 GPT 호출만 코루틴
+    """
+
+    def __init__(self, model: str = "gpt-4o", max_workers: int = 7):
+        super().__init__(model, max_workers)
+        self.llm = get_async_client()
+
+    async def call_json(self, prompt: str, version: str = "", on_delta=None) -> Dict[str, Any]:
+        tree, _ = await acomplete_json(
+            self.llm,
+            [{"role": "user", "content": prompt}],
+            TREE_SCHEMA,
+            model=self.model, temperature=0.3, top_p=0.3,
+            step="build",
+            version=version,
+            on_delta=on_delta,
+        )
+        return tree
+
+    async def run_one(self, pid: str, tmpl: Template, section_text: str, on_delta=None) -> str:
+        print(f"[BuildStep] ▶ {pid} 실행 중...")
+        try:
+            tree = await self.call_json(tmpl.render(INPUT=section_text), version=tmpl.version, on_delta=on_delta)
+        except StructuredOutputError as exc:
+            return self.drop(pid, exc, on_delta)
+        return f"### {pid}\n{to_block(tree)}"
+
+    async def run(self, sections: Dict[str, str]) -> str:
+        prompts = [
+            (pid, tmpl) for pid, tmpl in self.load_prompts()
+            if sections.get(self.section_of(pid), "").strip()
+        ]
+        outputs = await gather_map(
+            lambda item: self.run_one(item[0], item[1], sections[self.section_of(item[0])]), prompts, self.max_workers
+        )
+        return "\n\n".join(block for block in outputs if block)
 
 
 # ─────────────────────────────
@@ -82,9 +188,10 @@ if __name__ == "__main__":
     outfile = "sample/step1_result.txt"
 
     raw_text = Path(infile).read_text(encoding="utf-8")
+    sections = split_run(raw_text)
 
     build_step = BuildStep(model="gpt-4o")
-    result_text = build_step.run(raw_text)
+    result_text = build_step.run(sections)
 
     # 파일 저장 (검증용)
     Path(outfile).write_text(result_text, encoding="utf-8")
@@ -0,0 +1,84 @@
+"""
+checkpoint.py
+───────────────────────────────
+실행(run) 단위 체크포인트
+- 노드가 끝날 때마다 runs/<run_id>/checkpoints/<노드>.json 에 (입력 지문, 출력) 저장
+- resume 시 지문이 맞는 체크포인트만 불러오고, 없거나 깨졌거나 입력이 바뀐
+  노드부터 다시 실행 (dag.Graph.run 의 memo 인터페이스)
+"""
+
+from __future__ import annotations
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+import json
+import os
+import re
+import threading
+
+from .incremental import content_hash
+
+
+class CheckpointStore:
+    def __init__(self, directory: str | Path):
+        self.dir = Path(directory)
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self.restored: List[str] = []
+        self.invalid: List[str] = []
+        self._lock = threading.Lock()
+
+    def _file(self, node: str) -> Path:
+        return self.dir / (re.sub(r"[^\w.-]", "_", node) + ".json")
+
+    # ─────────────────────────────
+    def fingerprint(self, node, args: Dict[str, Any]) -> str:
+        return content_hash({"node": node.name, "version": node.version, "inputs": args})
+
+    def lookup(self, node: str, fp: str) -> Optional[Dict[str, Any]]:
+        path = self._file(node)
+        if not path.exists():
+            return None
+        try:
+            data = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, json.JSONDecodeError):
+            data = None
+        with self._lock:
+            if data and data.get("node") == node and data.get("fingerprint") == fp:
+                self.restored.append(node)
+                return data["outputs"]
+            self.invalid.append(node)
+        return None
+
+    def record(self, node: str, fp: str, outputs: Dict[str, Any]):
+        """
+        임시 파일에 쓴 뒤 rename → 중간에 죽어도 반쯤 쓴 체크포인트가 남지 않음
+        """
+        path = self._file(node)
+        tmp = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp.write_text(
+            json.dumps({"node": node, "fingerprint": fp, "outputs": outputs}, ensure_ascii=False),
+            encoding="utf-8",
+        )
+        os.replace(tmp, path)
+
+
+class MemoChain:
+    """
+    여러 memo(체크포인트, 증분 기록)를 순서대로 조회하고, 기록은 모두에 남김
+    """
+
+    def __init__(self, memos: Sequence[Any]):
+        self.memos = [m for m in memos if m is not None]
+
+    def fingerprint(self, node, args: Dict[str, Any]) -> str:
+        return self.memos[0].fingerprint(node, args)
+
+    def lookup(self, node: str, fp: str) -> Optional[Dict[str, Any]]:
+        for memo in self.memos:
+            outputs = memo.lookup(node, fp)
+            if outputs is not None:
+                return outputs
+        return None
+
+    def record(self, node: str, fp: str, outputs: Dict[str, Any]):
+        for memo in self.memos:
+            memo.record(node, fp, outputs)
@@ -0,0 +1,169 @@
+"""
+chunking.py
+───────────────────────────────
+컨텍스트 창보다 긴 입력 나누기 (GlobalCheck / EditPass2 / Audit 공통)
+- 토큰 수를 세서 예산(budget)을 넘을 때만 나눔 → 짧은 논문은 기존과 같은 한 번의 호출 (프롬프트 / 캐시 키 동일)
+- 경계 우선순위: 빈 줄(문단) → 문장 → 토큰 단위로 강제 절단
+- 조각 사이 overlap 토큰만큼 앞 조각의 끝 문단을 다음 조각 앞에 반복 (문맥 유지)
+- 조각은 입력 순서대로 병렬 처리 (parallel_map / asyncio 는 gather_map), 결과 병합은 조각 순서만 보는 결정적 방식
+  · merge_reports : JSON 보고서(issues / suggestions / analysis ...)를 키 등장 순서대로 병합, 목록은 순서를 지킨 합집합
+- 조각 수는 입력 길이 / 예산에 비례 → 긴 문서에서도 호출당 입력·출력 크기와 지연 시간이 일정
+
+환경 변수
+- TREELLM_CHUNK_TOKENS      : 분석 호출(GlobalCheck, Audit) 한 번에 넣을 최대 입력 토큰 (기본: 32000)
+- TREELLM_EDIT_CHUNK_TOKENS : 수정 호출(EditPass2) 한 번에 넣을 최대 본문 토큰 (기본: 8000, 출력이 입력만큼 길어서 작게)
+- TREELLM_CHUNK_OVERLAP     : 조각 사이에 겹치는 토큰 수 (기본: 400)
+"""
+
+from __future__ import annotations
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence
+import asyncio
+import os
+import re
+
+from .usage import count_tokens
+
+_PARAGRAPH = re.compile(r"\n[ \t]*\n")
+_SENTENCE = re.compile(r"(?<=[.!?。])\s+")
+
+
+def chunk_tokens() -> int:
+    return int(os.getenv("TREELLM_CHUNK_TOKENS", "32000"))
+
+
+def edit_chunk_tokens() -> int:
+    return int(os.getenv("TREELLM_EDIT_CHUNK_TOKENS", "8000"))
+
+
+def chunk_overlap() -> int:
+    return int(os.getenv("TREELLM_CHUNK_OVERLAP", "400"))
+
+
+# ─────────────────────────────
+def _hard_split(text: str, budget: int, model: str) -> List[str]:
+    """
+    문장 하나가 예산보다 길 때: 글자 수 비율로 자른 뒤 예산 안에 들 때까지 줄임
+    """
+    out: List[str] = []
+    while text:
+        size = len(text)
+        while size > 1 and count_tokens(text[:size], model) > budget:
+            size = max(1, size * budget // count_tokens(text[:size], model) - 1)
+        out.append(text[:size].strip())
+        text = text[size:]
+    return [piece for piece in out if piece]
+
+
+def units(text: str, budget: int, model: str = "gpt-4o") -> List[str]:
+    """
+    텍스트 → 예산 이하의 단위 목록 (문단, 긴 문단은 문장, 긴 문장은 강제 절단)
+    """
+    out: List[str] = []
+    for paragraph in _PARAGRAPH.split(text.strip()):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        if count_tokens(paragraph, model) <= budget:
+            out.append(paragraph)
+            continue
+        for sentence in _SENTENCE.split(paragraph):
+            if not sentence or not sentence.strip():
+                continue
+            if count_tokens(sentence, model) <= budget:
+                out.append(sentence.strip())
+            else:
+                out += _hard_split(sentence, budget, model)
+    return out
+
+
+def split_text(text: str, budget: int, overlap: Optional[int] = None, model: str = "gpt-4o") -> List[str]:
+    """
+    텍스트 → 조각 목록 (조각마다 budget 토큰 이하, 예산 안이면 [text] 그대로)
+    새 조각은 앞 조각 끝에서 overlap 토큰 이내의 단위를 반복해서 시작 (조각 자체는 여전히 budget 이하)
+    """
+    if count_tokens(text, model) <= budget:
+        return [text]
+    overlap = chunk_overlap() if overlap is None else overlap
+    overlap = min(overlap, budget // 4)
+
+    chunks: List[str] = []
+    current: List[str] = []
+    sizes: List[int] = []
+    fresh = 0  # current 중 앞 조각에서 반복하지 않은 단위 수
+    for unit in units(text, budget, model):
+        size = count_tokens(unit, model) + 1
+        if current and sum(sizes) + size > budget and fresh:
+            chunks.append("\n\n".join(current))
+            # 끝에서부터 overlap 안에 드는 단위만 다음 조각으로
+            keep, kept = 0, 0
+            while keep < len(sizes) and kept + sizes[-1 - keep] <= overlap and kept + sizes[-1 - keep] + size <= budget:
+                kept += sizes[-1 - keep]
+                keep += 1
+            current, sizes = (current[-keep:], sizes[-keep:]) if keep else ([], [])
+            fresh = 0
+        current.append(unit)
+        sizes.append(size)
+        fresh += 1
+    if fresh:
+        chunks.append("\n\n".join(current))
+    return chunks
+
+
+# ─────────────────────────────
+def parallel_map(fn: Callable[[Any], Any], items: Sequence[Any], max_workers: int = 7) -> List[Any]:
+    """
+    입력 순서대로 결과 반환, 호출한 쪽 contextvars(usage/tracing/current_node) 유지
+    """
+    if len(items) <= 1:
+        return [fn(item) for item in items]
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(items)))) as pool:
+        futures = [pool.submit(copy_context().run, fn, item) for item in items]
+        return [f.result() for f in futures]
+
+
+async def gather_map(fn: Callable[[Any], Awaitable[Any]], items: Sequence[Any], max_workers: int = 7) -> List[Any]:
+    """
+    parallel_map 의 asyncio 버전: 코루틴 fn(item) 을 최대 max_workers 개씩 동시에, 결과는 입력 순서
+    """
+    semaphore = asyncio.Semaphore(max(1, max_workers))
+
+    async def one(item: Any) -> Any:
+        async with semaphore:
+            return await fn(item)
+
+    return list(await asyncio.gather(*(one(item) for item in items)))
+
+
+def _norm(value: Any) -> str:
+    return " ".join(str(value).split()).lower()
+
+
+def merge_reports(reports: Sequence[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    조각별 JSON 보고서 → 하나 (조각 순서만으로 결정되는 결과)
+    - 키는 처음 나온 순서, 목록은 공백/대소문자를 무시한 중복 제거 합집합
+    - dict 는 재귀 병합, 문자열은 서로 다른 값만 줄바꿈으로 이음, 그 밖의 값은 첫 값
+    """
+    merged: Dict[str, Any] = {}
+    for report in reports:
+        for key, value in report.items():
+            if key not in merged:
+                merged[key] = value
+                continue
+            current = merged[key]
+            if isinstance(current, list) and isinstance(value, list):
+                seen = {_norm(v) for v in current}
+                items = list(current)
+                for v in value:
+                    if _norm(v) not in seen:
+                        seen.add(_norm(v))
+                        items.append(v)
+                merged[key] = items
+            elif isinstance(current, dict) and isinstance(value, dict):
+                merged[key] = merge_reports([current, value])
+            elif isinstance(current, str) and isinstance(value, str):
+                if _norm(value) and _norm(value) not in _norm(current):
+                    merged[key] = f"{current}\n{value}"
+    return merged
@@ -0,0 +1,291 @@
+"""
+dag.py
+───────────────────────────────
+작은 의존성 그래프(DAG) 실행 엔진
+- 각 노드는 입력 키(inputs)와 출력 키(outputs)를 선언
+- 입력이 모두 준비된 노드는 스레드 풀에서 즉시 병렬 실행
+- run() 은 노드가 끝나는 순서대로 (노드명, 출력 dict)를 yield
+- memo(예: incremental.RunState)를 주면 입력 지문이 같은 노드는 이전 출력을 재사용
+  노드 실행 중 mark_degraded() 가 불리면 (구조화 출력을 버리거나 대체한 경우) 그 결과는 memo 에 남기지 않음
+  → 다음 실행에서 다시 계산
+- 노드는 run() 을 호출한 쪽의 contextvars 를 물려받고, 실행 중에는 current_node 에 노드명이 들어감
+- 노드 실행마다 tracing span("node") 기록 (step = 노드명의 ':' 앞부분)
+- arun(): 같은 규칙의 asyncio 버전 — 노드 fn 은 스레드에서 호출하고 (CPU 작업이 이벤트 루프를 막지 않음)
+  fn 이 코루틴을 돌려주면 (AsyncOrchestrator 의 LLM 호출) 이벤트 루프에서 await → 호출 중에는 스레드를 잡지 않음
+"""
+
+from __future__ import annotations
+from contextvars import ContextVar, copy_context
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional, Sequence, Set, Tuple
+import asyncio
+import inspect
+
+from . import tracing
+
+# 지금 실행 중인 노드 이름 (노드 안에서 호출되는 코드가 읽음, 예: 사용량 기록)
+current_node: ContextVar[Optional[str]] = ContextVar("current_node", default=None)
+# 지금 실행 중인 노드의 대체(degraded) 사유 목록 (mark_degraded 가 채움)
+_degraded: ContextVar[Optional[List[str]]] = ContextVar("_degraded", default=None)
+
+
+def mark_degraded(reason: str = ""):
+    """
+    지금 실행 중인 노드의 결과가 대체값임을 표시 → memo(증분 기록 / 체크포인트)에 저장하지 않음
+    노드 밖에서 부르면 아무 일도 하지 않음
+    """
+    reasons = _degraded.get()
+    if reasons is not None:
+        reasons.append(reason)
+
+
+@dataclass
+class Node:
+    """
+    name    : 노드 이름 (그래프 안에서 유일)
+    fn      : fn({입력키: 값}) → 값 (출력이 여러 개면 {출력키: 값})
+    inputs  : 실행 전에 준비되어야 하는 키 목록
+    outputs : 이 노드가 만들어 내는 키 목록 (기본값: 노드 이름)
+    version : 입력 외에 결과에 영향을 주는 값 (모델명, 프롬프트 버전 등)
+    memo    : False 면 항상 실행 (파일 쓰기 등 부수 효과가 있는 노드)
+    """
+    name: str
+    fn: Callable[[Dict[str, Any]], Any]
+    inputs: Tuple[str, ...]
+    outputs: Tuple[str, ...]
+    version: str = ""
+    memo: bool = True
+
+
+class Graph:
+    def __init__(self, max_workers: int = 8):
+        self.max_workers = max(1, max_workers)
+        self.nodes: Dict[str, Node] = {}
+
+    # ─────────────────────────────
+    def add(
+        self,
+        name: str,
+        fn: Callable[[Dict[str, Any]], Any],
+        inputs: Sequence[str] = (),
+        outputs: Optional[Sequence[str]] = None,
+        version: str = "",
+        memo: bool = True,
+    ) -> Node:
+        if name in self.nodes:
+            raise ValueError(f"중복 노드: {name}")
+        node = Node(name, fn, tuple(inputs), tuple(outputs or (name,)), version, memo)
+        self.nodes[name] = node
+        return node
+
+    # ─────────────────────────────
+    def _producers(self, initial: Dict[str, Any]) -> Dict[str, str]:
+        """
+        출력키 → 생산 노드 매핑 + 누락 입력/순환 의존 검사
+        """
+        producers: Dict[str, str] = {}
+        for node in self.nodes.values():
+            for key in node.outputs:
+                if key in producers or key in initial:
+                    raise ValueError(f"출력 키 중복: {key}")
+                producers[key] = node.name
+
+        for node in self.nodes.values():
+            missing = [k for k in node.inputs if k not in producers and k not in initial]
+            if missing:
+                raise ValueError(f"[{node.name}] 입력을 만드는 노드 없음: {missing}")
+
+        # 순환 검사 (DFS)
+        state: Dict[str, int] = {}
+
+        def visit(name: str):
+            if state.get(name) == 1:
+                raise ValueError(f"순환 의존성 발견: {name}")
+            if state.get(name) == 2:
+                return
+            state[name] = 1
+            for key in self.nodes[name].inputs:
+                if key in producers:
+                    visit(producers[key])
+            state[name] = 2
+
+        for name in self.nodes:
+            visit(name)
+        return producers
+
+    # ─────────────────────────────
+    @staticmethod
+    def _execute(node: Node, args: Dict[str, Any], join: bool, degraded: Set[str]) -> Any:
+        """
+        join: 'build:*' 같은 노드들을 모으는 합류 노드 (지표에서 단계 실행 시간으로 세지 않음)
+        degraded: mark_degraded() 가 불린 노드 이름을 모으는 집합
+        """
+        current_node.set(node.name)
+        reasons: List[str] = []
+        _degraded.set(reasons)
+        with tracing.span("node", node=node.name, step=node.name.split(":")[0], join=join) as sp:
+            result = node.fn(args)
+            if reasons:
+                sp.attrs["degraded"] = ",".join(sorted(set(reasons)))
+                degraded.add(node.name)
+            return result
+
+    def run(
+        self,
+        initial: Optional[Dict[str, Any]] = None,
+        memo: Any = None,
+        keep_going: bool = False,
+    ) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """
+        준비된 노드를 병렬 실행하면서 완료 순서대로 (노드명, 출력) 반환.
+        노드에서 예외가 나면 남은 노드를 취소하고 그대로 다시 던짐.
+        keep_going=True 면 실패한 노드에 의존하지 않는 노드는 끝까지 실행한 뒤
+        첫 번째 예외를 던짐 (예: 배치 모드에서 요청을 최대한 많이 모을 때)
+
+        memo: fingerprint(node, args) / lookup(node, fp) / record(node, fp, outputs)
+              를 제공하는 객체. 지문이 일치하는 노드는 실행하지 않고 저장된 출력 사용.
+              mark_degraded() 가 불린 노드는 record 하지 않음.
+        """
+        values: Dict[str, Any] = dict(initial or {})
+        self._producers(values)
+
+        pending = dict(self.nodes)
+        running: Dict[Future, Tuple[Node, Optional[str]]] = {}
+        reused: List[Tuple[str, Dict[str, Any]]] = []
+        errors: List[BaseException] = []
+        degraded: Set[str] = set()
+
+        fanned = {name.split(":")[0] for name in self.nodes if ":" in name}
+
+        def ready() -> List[Node]:
+            return [n for n in pending.values() if all(k in values for k in n.inputs)]
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            try:
+                while pending or running or reused:
+                    if errors and not running and not reused and not ready():
+                        break  # 남은 노드는 모두 실패한 노드에 막혀 있음
+                    for node in ready():
+                        del pending[node.name]
+                        args = {k: values[k] for k in node.inputs}
+                        fp = memo.fingerprint(node, args) if memo is not None and node.memo else None
+                        cached = memo.lookup(node.name, fp) if fp else None
+                        if cached is not None:
+                            values.update(cached)
+                            memo.record(node.name, fp, cached)
+                            reused.append((node.name, cached))
+                            continue
+                        running[pool.submit(copy_context().run, self._execute, node, args, node.name in fanned,
+                                            degraded)] = (node, fp)
+
+                    # 재사용된 노드는 바로 반환 (그 사이 새로 준비된 노드는 다음 루프에서 제출)
+                    if reused:
+                        yield reused.pop(0)
+                        continue
+
+                    done, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for fut in done:
+                        node, fp = running.pop(fut)
+                        if keep_going and fut.exception() is not None:
+                            errors.append(fut.exception())
+                            continue
+                        result = fut.result()
+                        if len(node.outputs) == 1:
+                            outputs = {node.outputs[0]: result}
+                        else:
+                            outputs = {k: result[k] for k in node.outputs}
+                        values.update(outputs)
+                        if fp and node.name not in degraded:
+                            memo.record(node.name, fp, outputs)
+                        yield node.name, outputs
+            finally:
+                for fut in running:
+                    fut.cancel()
+        if errors:
+            raise errors[0]
+
+    # ─────────────────────────────
+    @staticmethod
+    async def _aexecute(node: Node, args: Dict[str, Any], join: bool, degraded: Set[str],
+                        slots: asyncio.Semaphore) -> Any:
+        async with slots:
+            current_node.set(node.name)
+            reasons: List[str] = []
+            _degraded.set(reasons)
+            with tracing.span("node", node=node.name, step=node.name.split(":")[0], join=join) as sp:
+                result = await asyncio.to_thread(node.fn, args)
+                if inspect.isawaitable(result):
+                    result = await result
+                if reasons:
+                    sp.attrs["degraded"] = ",".join(sorted(set(reasons)))
+                    degraded.add(node.name)
+                return result
+
+    async def arun(
+        self,
+        initial: Optional[Dict[str, Any]] = None,
+        memo: Any = None,
+        keep_going: bool = False,
+    ) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        """
+        run() 의 asyncio 버전 (같은 memo / keep_going 규칙, 동시에 실행하는 노드 수는 max_workers)
+        노드는 호출한 task 의 contextvars 를 물려받음
+        """
+        values: Dict[str, Any] = dict(initial or {})
+        self._producers(values)
+
+        pending = dict(self.nodes)
+        running: Dict[asyncio.Task, Tuple[Node, Optional[str]]] = {}
+        errors: List[BaseException] = []
+        degraded: Set[str] = set()
+        slots = asyncio.Semaphore(self.max_workers)
+
+        fanned = {name.split(":")[0] for name in self.nodes if ":" in name}
+
+        def ready() -> List[Node]:
+            return [n for n in pending.values() if all(k in values for k in n.inputs)]
+
+        try:
+            while pending or running:
+                if errors and not running and not ready():
+                    break  # 남은 노드는 모두 실패한 노드에 막혀 있음
+                reused = None
+                for node in ready():
+                    del pending[node.name]
+                    args = {k: values[k] for k in node.inputs}
+                    fp = memo.fingerprint(node, args) if memo is not None and node.memo else None
+                    cached = memo.lookup(node.name, fp) if fp else None
+                    if cached is not None:
+                        values.update(cached)
+                        memo.record(node.name, fp, cached)
+                        reused = (node.name, cached)
+                        break  # 재사용된 노드는 바로 반환 (새로 준비된 노드는 다음 루프에서)
+                    task = asyncio.create_task(self._aexecute(node, args, node.name in fanned, degraded, slots))
+                    running[task] = (node, fp)
+                if reused is not None:
+                    yield reused
+                    continue
+                if not running:
+                    continue
+
+                done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    node, fp = running.pop(task)
+                    if keep_going and task.exception() is not None:
+                        errors.append(task.exception())
+                        continue
+                    result = task.result()
+                    if len(node.outputs) == 1:
+                        outputs = {node.outputs[0]: result}
+                    else:
+                        outputs = {k: result[k] for k in node.outputs}
+                    values.update(outputs)
+                    if fp and node.name not in degraded:
+                        memo.record(node.name, fp, outputs)
+                    yield node.name, outputs
+        finally:
+            for task in running:
+                task.cancel()
+        if errors:
+            raise errors[0]
@@ -4,55 +4,65 @@ edit_pass1.py
 1차 수정: USENIX 피드백 기반 개선안 생성
 - 입력: split 결과(sample_split.txt), USENIX 피드백(step3_result.txt)
 - 출력: 개선안 JSON(step4_result.json)
+- AsyncEditPass1: 같은 단계의 asyncio 버전 (섹션을 동시에 개선, AsyncOrchestrator 용)
+
+사용법
+    python -m module.edit_pass1     # sample/step3_result.txt → sample/step4_result.json (저장소 루트에서)
 """
 
 from __future__ import annotations
 from pathlib import Path
-import os
 import json
 from typing import Dict
-from openai import OpenAI
+from .chunking import gather_map
+from .llm_async import get_async_client
+from .llm_client import get_client
+from .prompts import Template, get_registry
 
 
 class EditPass1:
     def __init__(self, model="gpt-4o"):
         self.model = model
-        self.client = OpenAI()
-        self.prompt_file = Path(__file__).resolve().parent.parent / "prompts" / "1st_modify" / "Modify.txt"
-
-        if not os.getenv("OPENAI_API_KEY"):
-            raise EnvironmentError("OPENAI_API_KEY 환경 변수가 필요합니다.")
+        self.llm = get_client()  # 공유 클라이언트 (연결 재사용 + 재시도 + 캐시)
+        self.prompts = get_registry()
 
-    def load_template(self) -> str:
-        return self.prompt_file.read_text(encoding="utf-8")
+    def load_template(self) -> Template:
+        return self.prompts.get("1st_modify/Modify")
 
-    def call_gpt(self, prompt: str) -> str:
-        response = self.client.chat.completions.create(
+    def call_gpt(self, prompt: str, version: str = "", on_delta=None) -> str:
+        return self.llm.complete(
+            [{"role": "user", "content": prompt}],
             model=self.model,
-            messages=[{"role": "user", "content": prompt}],
+            step="edit1",
+            version=version,
+            on_delta=on_delta,
         )
-        return response.choices[0].message.content.strip()
 
     def run(self, sections: Dict[str, str], feedback_text: str) -> Dict[str, str]:
         template = self.load_template()
 
         # USENIX 피드백을 기준별로 파싱 → 섹션별 맵핑
-        feedback_map = self._parse_feedback(feedback_text)
+        feedback_map = self.parse_feedback(feedback_text)
 
         revised_sections = {}
         for sec, text in sections.items():
+            if not text.strip():  # 빈 섹션은 모델을 부르지 않음 (결과에서도 제외)
+                continue
             feedback = feedback_map.get(sec, "No major issues found.")
-            prompt = (
-                template.replace("{SECTION_NAME}", sec)
-                        .replace("{SECTION_TEXT}", text)
-                        .replace("{FEEDBACK}", feedback)
-            )
-            print(f"[EditPass1] ▶ {sec} 개선 중...")
-            revised_sections[sec] = self.call_gpt(prompt)
+            revised_sections[sec] = self.run_section(template, sec, text, feedback)
 
         return revised_sections
 
-    def _parse_feedback(self, feedback_text: str) -> Dict[str, str]:
+    def run_section(self, template: Template, sec: str, text: str, feedback: str, on_delta=None) -> str:
+        """
+        섹션 하나 개선 (feedback 은 해당 섹션에 대한 피드백 문자열)
+        on_delta: 토큰 스트리밍 콜백 (llm_client.complete 참고)
+        """
+        prompt = template.render(SECTION_NAME=sec, SECTION_TEXT=text, FEEDBACK=feedback)
+        print(f"[EditPass1] ▶ {sec} 개선 중...")
+        return self.call_gpt(prompt, version=template.version, on_delta=on_delta)
+
+    def parse_feedback(self, feedback_text: str) -> Dict[str, str]:
         """
         USENIX 보고서에서 섹션명 기반으로 피드백 추출
         """
@@ -69,6 +79,40 @@ class EditPass1:
         return feedback_map
 
 
+class AsyncEditPass1(EditPass1):
+    """
+    EditPass1 의 asyncio 버전 — 프롬프트/결과 형식은 같고 GPT 호출만 코루틴
+    """
+
+    def __init__(self, model="gpt-4o"):
+        super().__init__(model)
+        self.llm = get_async_client()
+
+    async def call_gpt(self, prompt: str, version: str = "", on_delta=None) -> str:
+        return await self.llm.complete(
+            [{"role": "user", "content": prompt}],
+            model=self.model,
+            step="edit1",
+            version=version,
+            on_delta=on_delta,
+        )
+
+    async def run(self, sections: Dict[str, str], feedback_text: str) -> Dict[str, str]:
+        template = self.load_template()
+        feedback_map = self.parse_feedback(feedback_text)
+        targets = [sec for sec, text in sections.items() if text.strip()]
+        outputs = await gather_map(
+            lambda sec: self.run_section(template, sec, sections[sec], feedback_map.get(sec, "No major issues found.")),
+            targets, len(targets),
+        )
+        return dict(zip(targets, outputs))
+
+    async def run_section(self, template: Template, sec: str, text: str, feedback: str, on_delta=None) -> str:
+        prompt = template.render(SECTION_NAME=sec, SECTION_TEXT=text, FEEDBACK=feedback)
+        print(f"[EditPass1] ▶ {sec} 개선 중...")
+        return await self.call_gpt(prompt, version=template.version, on_delta=on_delta)
+
+
 # ─────────────────────────────
 if __name__ == "__main__":
     infile_split_txt = Path("sample/sample_split.txt")  # 현재 split 결과
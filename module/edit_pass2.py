@@ -2,66 +2,407 @@
 edit_pass2.py
 ───────────────────────────────
 2차 수정: GlobalCheck 피드백 기반 전체 논문 개선
+- 본문이 TREELLM_EDIT_CHUNK_TOKENS 를 넘으면 섹션 단위로 묶어 나눔 (한 섹션이 넘으면 문단 경계로 part 분할)
+  조각은 병렬로 수정하고 섹션 순서 / part 순서대로 다시 이어 붙임 (응답에 빠진 부분은 원문 유지)
+
+mode
+- whole   : 논문 전체를 한 번의 호출로 수정 (기존 방식, 2nd_modify.txt)
+- section : 섹션마다 따로 수정 호출 (2nd_modify_section.txt), GlobalCheck issues/suggestions 와
+            전체 흐름 요약(OUTLINE)은 공통 문맥 → 섹션별로 병렬 실행 후 ORDER 순서로 합침
+            출력 토큰이 섹션 수만큼 나뉘어 가장 긴 섹션 하나의 시간으로 끝남
+
+AsyncEditPass2: 같은 단계의 asyncio 버전 (AsyncOrchestrator 용)
+
+사용법
+    python -m module.edit_pass2     # sample/step5_global_check.txt → sample/step6_result.txt (저장소 루트에서)
 """
 
 from __future__ import annotations
 from pathlib import Path
-import os
 import json
+import os
 import re
-from openai import OpenAI
+from typing import Dict, List, Tuple
+from .chunking import chunk_overlap, edit_chunk_tokens, gather_map, parallel_map, split_text, units
+from .llm_async import get_async_client
+from .llm_client import get_client
+from .prompts import Template, get_registry
+from .structured import extract, loads, parse, to_block
+from .usage import count_tokens
+
+ORDER = ["Abstract", "Introduction", "Background", "Related Work", "Method", "Discussion", "Conclusion"]
+EDIT2_MODES = ("whole", "section")
+OUTLINE_CHARS = 160  # 흐름 요약에 넣는 섹션 앞/뒤 글자 수
 
 
 class EditPass2:
-    def __init__(self, model="gpt-4o"):
+    def __init__(self, model="gpt-4o", max_workers: int = 7):
+        """
+        max_workers: 긴 논문을 나눈 조각을 동시에 수정할 수
+        """
         self.model = model
-        self.client = OpenAI()
-        self.prompt_file = Path(__file__).resolve().parent.parent / "prompts" / "2nd_modify" / "2nd_modify.txt"
+        self.max_workers = max(1, max_workers)
+        self.llm = get_client()  # 공유 클라이언트 (연결 재사용 + 재시도 + 캐시)
+        self.prompts = get_registry()
 
-        if not os.getenv("OPENAI_API_KEY"):
-            raise EnvironmentError("OPENAI_API_KEY 환경 변수가 필요합니다.")
+    def load_template(self) -> Template:
+        return self.prompts.get("2nd_modify/2nd_modify")
 
-    def load_template(self) -> str:
-        return self.prompt_file.read_text(encoding="utf-8")
+    def load_section_template(self) -> Template:
+        return self.prompts.get("2nd_modify/2nd_modify_section")
 
     def clean_json(self, raw_text: str) -> str:
         """Remove markdown fences (```json ... ```) and return pure JSON"""
-        return re.sub(r"^```json|```$", "", raw_text, flags=re.MULTILINE).strip()
+        return extract(raw_text)
+
+    def parse_feedback(self, global_feedback_text: str) -> dict:
+        """
+        GlobalCheck 결과 → {"issues": [...], "suggestions": [...]}
+        복구해도 JSON 이 아니면 원문 전체를 issues 하나로 사용 (파이프라인을 멈추지 않음)
+        """
+        try:
+            feedback, _ = parse(global_feedback_text)
+        except json.JSONDecodeError:
+            print("[EditPass2] ⚠ GlobalCheck 결과가 JSON 이 아님 → 원문을 그대로 피드백으로 사용")
+            return {"issues": [global_feedback_text.strip()], "suggestions": []}
+        if not isinstance(feedback, dict):
+            return {"issues": [str(item) for item in feedback] if isinstance(feedback, list) else [], "suggestions": []}
+        items = {key: feedback.get(key) or [] for key in ("issues", "suggestions")}
+        return {key: [str(v) for v in (value if isinstance(value, list) else [value])] for key, value in items.items()}
 
-    def call_gpt(self, prompt: str) -> str:
-        response = self.client.chat.completions.create(
+    def call_gpt(self, prompt: str, version: str = "", on_delta=None) -> str:
+        return self.llm.complete(
+            [{"role": "user", "content": prompt}],
             model=self.model,
-            messages=[{"role": "user", "content": prompt}],
+            step="edit2",
+            version=version,
+            on_delta=on_delta,
         )
-        return response.choices[0].message.content.strip()
 
-    def run(self, edit_pass1_json: str, global_feedback_text: str) -> str:
+    @staticmethod
+    def collect_sections(sections: dict) -> Dict[str, str]:
+        """
+        EditPass1 결과 → {섹션: 본문} (ORDER 순서, EditPass1 이 건너뛴 빈 섹션 제외)
+        """
+        texts: Dict[str, str] = {}
+        for sec in ORDER:
+            if sec not in sections:
+                continue
+            text = sections[sec]
+            if isinstance(text, dict) and "improved" in text:
+                text = text["improved"]
+            texts[sec] = text.strip()
+        return texts
+
+    def prepare(self, edit_pass1_json: str, global_feedback_text: str) -> Tuple[Dict[str, str], dict]:
+        """
+        EditPass1 결과 JSON + GlobalCheck 결과 → ({섹션: 본문}, 피드백)
+        """
         # ✅ Load EditPass1 result
         sections = json.loads(edit_pass1_json)
 
-        # ✅ Clean and parse GlobalCheck JSON
-        feedback_clean = self.clean_json(global_feedback_text)
-        feedback = json.loads(feedback_clean)
+        # ✅ Clean and parse GlobalCheck JSON (fences / common JSON errors repaired)
+        feedback = self.parse_feedback(global_feedback_text)
+        return self.collect_sections(sections), feedback
 
-        # ✅ Prepare combined sections
-        order = ["Abstract", "Introduction", "Background", "Related Work", "Method", "Discussion", "Conclusion"]
-        combined_sections = ""
-        for sec in order:
-            text = sections.get(sec, "")
-            if isinstance(text, dict) and "improved" in text:
-                text = text["improved"]
-            combined_sections += f"\n# {sec}\n{text.strip()}\n"
+    @staticmethod
+    def render(template: Template, all_sections: str, feedback: dict) -> str:
+        return template.render(
+            ALL_SECTIONS=all_sections,
+            ISSUES="\n".join(feedback.get("issues", [])),
+            SUGGESTIONS="\n".join(feedback.get("suggestions", [])),
+        )
+
+    def needs_chunks(self, texts: Dict[str, str]) -> bool:
+        combined_sections = "".join(f"\n# {sec}\n{text}\n" for sec, text in texts.items())
+        return count_tokens(combined_sections, self.model) > edit_chunk_tokens()
+
+    def run(self, edit_pass1_json: str, global_feedback_text: str, on_delta=None, mode: str = "whole") -> str:
+        if mode not in EDIT2_MODES:
+            raise ValueError(f"mode 는 {EDIT2_MODES} 중 하나: {mode}")
+        texts, feedback = self.prepare(edit_pass1_json, global_feedback_text)
+        if mode == "section":
+            return self.run_sections(texts, feedback, on_delta=on_delta)
 
         # ✅ Prepare prompt
         template = self.load_template()
-        prompt = (
-            template.replace("{ALL_SECTIONS}", combined_sections.strip())
-                    .replace("{ISSUES}", "\n".join(feedback.get("issues", [])))
-                    .replace("{SUGGESTIONS}", "\n".join(feedback.get("suggestions", [])))
+        if self.needs_chunks(texts):
+            return self.run_chunked(template, texts, feedback, on_delta=on_delta)
+        combined_sections = "".join(f"\n# {sec}\n{text}\n" for sec, text in texts.items())
+        prompt = self.render(template, combined_sections.strip(), feedback)
+
+        print("[EditPass2] ▶ 글로벌 개선 실행 중...")
+        return self.call_gpt(prompt, version=template.version, on_delta=on_delta)
+
+    # ─────────────────────────────
+    def plan_chunks(self, texts: Dict[str, str]) -> List[List[Tuple[str, int, int, str]]]:
+        """
+        {섹션: 본문} → 조각 목록, 조각 = [(섹션, part 번호, part 수, 본문)] (섹션 순서 유지, 조각마다 예산 이하)
+        """
+        budget = edit_chunk_tokens()
+        parts = []
+        for sec, text in texts.items():
+            pieces = split_text(text, budget - count_tokens(f"# {sec} (part 99/99)", self.model), overlap=0,
+                                model=self.model)
+            parts += [(sec, i, len(pieces), piece) for i, piece in enumerate(pieces, 1)]
+
+        groups: List[List[Tuple[str, int, int, str]]] = []
+        size = 0
+        for part in parts:
+            tokens = count_tokens(part[3], self.model) + 8
+            if groups and size + tokens <= budget:
+                groups[-1].append(part)
+                size += tokens
+            else:
+                groups.append([part])
+                size = tokens
+        return groups
+
+    def _context(self, text: str) -> str:
+        """
+        앞 part 의 끝 문단 (TREELLM_CHUNK_OVERLAP 토큰 이내) → 다음 조각의 참고 문맥
+        """
+        budget = chunk_overlap()
+        tail: List[str] = []
+        for unit in reversed(units(text, max(budget, 1), self.model)):
+            if count_tokens("\n\n".join([unit] + tail), self.model) > budget:
+                break
+            tail.insert(0, unit)
+        return "\n\n".join(tail)
+
+    def chunk_prompt(self, template: Template, group: List[Tuple[str, int, int, str]],
+                     parts: Dict[Tuple[str, int], str], feedback: dict) -> str:
+        """
+        조각 하나의 프롬프트 (섹션 중간에서 시작하면 앞 part 의 끝 문단을 참고 문맥으로)
+        """
+        blocks = []
+        sec, i, _, _ = group[0]
+        if i > 1:
+            blocks.append(f"[앞 부분 문맥 — 참고만 하고 수정하거나 출력하지 말 것]\n{self._context(parts[(sec, i - 1)])}\n")
+        for sec, i, n, text in group:
+            label = f"{sec} (part {i}/{n}, 이 부분만 수정)" if n > 1 else sec
+            blocks.append(f"# {label}\n{text}\n")
+        return self.render(template, "\n".join(blocks).strip(), feedback)
+
+    @staticmethod
+    def chunk_result(group: List[Tuple[str, int, int, str]], output: str) -> Dict[Tuple[str, int], str]:
+        """
+        조각 응답 → {(섹션, part): 수정 본문} (응답에 없는 part 는 원문 유지)
+        """
+        revised = loads(output, default={})
+        out = {}
+        for sec, i, _, text in group:
+            value = revised.get(sec) if isinstance(revised, dict) else None
+            if isinstance(value, dict) and "improved" in value:
+                value = value["improved"]
+            if not isinstance(value, str) or not value.strip():
+                print(f"[EditPass2] ⚠ {sec} part {i}: 응답에 없음 → 원문 유지")
+                value = text
+            out[(sec, i)] = value.strip()
+        return out
+
+    @staticmethod
+    def merge_chunks(texts: Dict[str, str], results: List[Dict[Tuple[str, int], str]]) -> str:
+        """
+        조각별 결과 → 섹션 순서 / part 순서대로 이어 붙인 JSON 블록
+        """
+        edited: Dict[Tuple[str, int], str] = {}
+        for result in results:
+            edited.update(result)
+        merged = {
+            sec: "\n\n".join(edited[(sec, i)] for i in sorted(i for s, i in edited if s == sec))
+            for sec in texts
+        }
+        return to_block(merged)
+
+    def run_chunked(self, template: Template, texts: Dict[str, str], feedback: dict, on_delta=None) -> str:
+        """
+        조각별 수정 (병렬) → 섹션 순서 / part 순서대로 이어 붙인 JSON 블록
+        on_delta 에는 합친 블록을 한 번에 전달 (조각 스트림이 섞이지 않도록)
+        """
+        groups = self.plan_chunks(texts)
+        print(f"[EditPass2] ▶ 논문이 길어 {len(groups)}개 조각으로 나눠 개선 중...")
+        parts = {(sec, i): text for group in groups for sec, i, _, text in group}  # 겹침 문맥용
+
+        def edit(group: List[Tuple[str, int, int, str]]) -> Dict[Tuple[str, int], str]:
+            prompt = self.chunk_prompt(template, group, parts, feedback)
+            return self.chunk_result(group, self.call_gpt(prompt, version=template.version))
+
+        body = self.merge_chunks(texts, parallel_map(edit, groups, self.max_workers))
+        if on_delta is not None:
+            on_delta(body)
+        return body
+
+
+    # ─────────────────────────────
+    def outline(self, texts: Dict[str, str], current: str) -> str:
+        """
+        섹션별 시작/끝 일부 → 다른 섹션과의 연결을 맞추기 위한 공통 문맥 (수정 대상 섹션 표시)
+        """
+        lines = []
+        for sec, text in texts.items():
+            flat = " ".join(text.split())
+            if len(flat) > OUTLINE_CHARS * 2:
+                flat = f"{flat[:OUTLINE_CHARS]} … {flat[-OUTLINE_CHARS:]}"
+            mark = " ← 수정 대상" if sec == current else ""
+            lines.append(f"- {sec}{mark}: {flat}")
+        return "\n".join(lines)
+
+    @staticmethod
+    def clean_section(sec: str, output: str, original: str) -> str:
+        """
+        섹션 응답 → 본문만 (코드 블록 / 섹션 제목 줄 / {섹션: 본문} JSON 으로 답한 경우 정리, 빈 응답이면 원문)
+        """
+        text = output.strip()
+        fence = re.match(r"```[^\n]*\n(.*?)(?:```|\Z)", text, re.S)
+        if fence:
+            text = fence.group(1).strip()
+        if text.startswith("{"):
+            value = loads(text)
+            if isinstance(value, dict) and isinstance(value.get(sec), str):
+                text = value[sec]
+        lines = text.splitlines()
+        if lines and lines[0].lstrip("#* ").rstrip(":* ").strip().lower() == sec.lower():
+            text = "\n".join(lines[1:])
+        text = text.strip()
+        if not text:
+            print(f"[EditPass2] ⚠ {sec}: 빈 응답 → 원문 유지")
+            return original
+        return text
+
+    def section_prompts(self, template: Template, sec: str, texts: Dict[str, str],
+                        feedback: dict) -> List[Tuple[str, str]]:
+        """
+        섹션 하나 → [(프롬프트, 원문)] (TREELLM_EDIT_CHUNK_TOKENS 를 넘는 섹션은 part 별로)
+        """
+        outline = self.outline(texts, sec)
+
+        def render(name: str, text: str) -> str:
+            return template.render(
+                SECTION_NAME=name, SECTION_TEXT=text, OUTLINE=outline,
+                ISSUES="\n".join(feedback.get("issues", [])),
+                SUGGESTIONS="\n".join(feedback.get("suggestions", [])),
+            )
+
+        pieces = split_text(texts[sec], edit_chunk_tokens(), overlap=0, model=self.model)
+        print(f"[EditPass2] ▶ {sec} 개선 중..." + (f" ({len(pieces)}개 part)" if len(pieces) > 1 else ""))
+        if len(pieces) == 1:
+            return [(render(sec, texts[sec]), texts[sec])]
+        return [(render(f"{sec} (part {i}/{len(pieces)})", piece), piece) for i, piece in enumerate(pieces, 1)]
+
+    def revise_section(self, template: Template, sec: str, texts: Dict[str, str], feedback: dict,
+                       on_delta=None) -> str:
+        """
+        섹션 하나 수정 → 본문 (섹션 하나가 TREELLM_EDIT_CHUNK_TOKENS 를 넘으면 part 로 나눠 병렬 수정 후 이어 붙임)
+        on_delta: 토큰 스트리밍 콜백 (part 로 나눈 경우 합친 본문을 한 번에 전달)
+        """
+        prompts = self.section_prompts(template, sec, texts, feedback)
+        if len(prompts) == 1:
+            output = self.call_gpt(prompts[0][0], version=template.version, on_delta=on_delta)
+            return self.clean_section(sec, output, texts[sec])
+
+        def revise(item: Tuple[str, str]) -> str:
+            prompt, piece = item
+            return self.clean_section(sec, self.call_gpt(prompt, version=template.version), piece)
+
+        body = "\n\n".join(parallel_map(revise, prompts, self.max_workers))
+        if on_delta is not None:
+            on_delta(body)
+        return body
+
+    @staticmethod
+    def assemble(revised: Dict[str, str]) -> str:
+        """
+        {섹션: 수정 본문} → whole 모드와 같은 JSON 블록 (ORDER 순서)
+        """
+        return to_block({sec: revised[sec] for sec in ORDER if sec in revised})
+
+    def run_sections(self, texts: Dict[str, str], feedback: dict, on_delta=None) -> str:
+        """
+        section 모드: 섹션별 병렬 수정 → ORDER 순서로 합친 JSON 블록
+        on_delta 에는 합친 블록을 한 번에 전달 (섹션별 스트리밍은 Orchestrator 의 edit2:<섹션> 노드가 담당)
+        """
+        template = self.load_section_template()
+        outputs = parallel_map(
+            lambda sec: self.revise_section(template, sec, texts, feedback), list(texts), self.max_workers
+        )
+        body = self.assemble(dict(zip(texts, outputs)))
+        if on_delta is not None:
+            on_delta(body)
+        return body
+
+
+class AsyncEditPass2(EditPass2):
+    """
+    EditPass2 의 asyncio 버전 (AsyncOrchestrator 용) — 프롬프트/결과 형식은 같고 GPT 호출만 코루틴
+    """
+
+    def __init__(self, model="gpt-4o", max_workers: int = 7):
+        super().__init__(model, max_workers)
+        self.llm = get_async_client()
+
+    async def call_gpt(self, prompt: str, version: str = "", on_delta=None) -> str:
+        return await self.llm.complete(
+            [{"role": "user", "content": prompt}],
+            model=self.model,
+            step="edit2",
+            version=version,
+            on_delta=on_delta,
         )
 
+    async def run(self, edit_pass1_json: str, global_feedback_text: str, on_delta=None, mode: str = "whole") -> str:
+        if mode not in EDIT2_MODES:
+            raise ValueError(f"mode 는 {EDIT2_MODES} 중 하나: {mode}")
+        texts, feedback = self.prepare(edit_pass1_json, global_feedback_text)
+        if mode == "section":
+            return await self.run_sections(texts, feedback, on_delta=on_delta)
+        template = self.load_template()
+        if self.needs_chunks(texts):
+            return await self.run_chunked(template, texts, feedback, on_delta=on_delta)
+        combined_sections = "".join(f"\n# {sec}\n{text}\n" for sec, text in texts.items())
         print("[EditPass2] ▶ 글로벌 개선 실행 중...")
-        return self.call_gpt(prompt)
+        return await self.call_gpt(self.render(template, combined_sections.strip(), feedback),
+                                   version=template.version, on_delta=on_delta)
+
+    async def run_chunked(self, template: Template, texts: Dict[str, str], feedback: dict, on_delta=None) -> str:
+        groups = self.plan_chunks(texts)
+        print(f"[EditPass2] ▶ 논문이 길어 {len(groups)}개 조각으로 나눠 개선 중...")
+        parts = {(sec, i): text for group in groups for sec, i, _, text in group}
+
+        async def edit(group: List[Tuple[str, int, int, str]]) -> Dict[Tuple[str, int], str]:
+            prompt = self.chunk_prompt(template, group, parts, feedback)
+            return self.chunk_result(group, await self.call_gpt(prompt, version=template.version))
+
+        body = self.merge_chunks(texts, await gather_map(edit, groups, self.max_workers))
+        if on_delta is not None:
+            on_delta(body)
+        return body
+
+    async def revise_section(self, template: Template, sec: str, texts: Dict[str, str], feedback: dict,
+                             on_delta=None) -> str:
+        prompts = self.section_prompts(template, sec, texts, feedback)
+        if len(prompts) == 1:
+            output = await self.call_gpt(prompts[0][0], version=template.version, on_delta=on_delta)
+            return self.clean_section(sec, output, texts[sec])
+
+        async def revise(item: Tuple[str, str]) -> str:
+            prompt, piece = item
+            return self.clean_section(sec, await self.call_gpt(prompt, version=template.version), piece)
+
+        body = "\n\n".join(await gather_map(revise, prompts, self.max_workers))
+        if on_delta is not None:
+            on_delta(body)
+        return body
+
+    async def run_sections(self, texts: Dict[str, str], feedback: dict, on_delta=None) -> str:
+        template = self.load_section_template()
+        outputs = await gather_map(
+            lambda sec: self.revise_section(template, sec, texts, feedback), list(texts), self.max_workers
+        )
+        body = self.assemble(dict(zip(texts, outputs)))
+        if on_delta is not None:
+            on_delta(body)
+        return body
 
 
 if __name__ == "__main__":
@@ -75,7 +416,7 @@ if __name__ == "__main__":
 
     # ✅ Execute
     step = EditPass2()
-    result_text = step.run(edit1_text, feedback_text)
+    result_text = step.run(edit1_text, feedback_text, mode=os.getenv("TREELLM_EDIT2_MODE", "whole"))
 
     outfile_final.write_text(result_text, encoding="utf-8")
     print(f"[EditPass2] ✅ 완료! 결과 저장 → {outfile_final}")
@@ -0,0 +1,317 @@
+"""
+fake_llm.py
+───────────────────────────────
+토큰을 쓰지 않는 가짜 LLM 백엔드 (부하/성능 회귀 테스트용)
+- OpenAI 클라이언트와 같은 모양(client.chat.completions.create)이라 LLMClient 의
+  재시도 / 동시 호출 제한 / 스트리밍 / usage 기록 경로를 그대로 탐
+- 응답은 init_sample/ 의 단계별 결과를 재생 (어떤 응답인지는 실행 중인 DAG 노드로 판단)
+- 지연 시간 = latency ± jitter + 입력 토큰 / prompt_tps + 출력 토큰 / tps
+- 오류는 error_rate 확률로 주입, 응답 형식 오류(잘림/끝 쉼표/JSON 없음)는 format_error_rate 확률로 주입
+- 공급자 prompt prefix 캐시 흉내: 앞서 본 요청과 겹치는 prefix(최소 PREFIX_MIN_CHARS, PREFIX_BLOCK_CHARS 단위)는
+  usage.prompt_tokens_details.cached_tokens 로 보고하고 입력 처리 시간에서 뺌
+- 같은 seed, 같은 요청이면 지연/오류가 항상 같음 (병렬 실행 순서와 무관)
+- FakeAsyncOpenAI: 같은 응답을 AsyncOpenAI 모양으로 (module/llm_async.py)
+
+환경 변수 (TREELLM_LLM_BACKEND=fake 일 때)
+- TREELLM_FAKE_SAMPLE_DIR : 재생할 결과 디렉터리 (기본: init_sample)
+- TREELLM_FAKE_LATENCY    : 호출당 기본 지연(초) (기본: 0.05)
+- TREELLM_FAKE_JITTER     : 지연 편차(초, 균등 분포 ±) (기본: 0.02)
+- TREELLM_FAKE_TPS        : 초당 출력 토큰 수 (기본: 0 = 출력 길이 무관)
+- TREELLM_FAKE_PROMPT_TPS : 초당 입력 토큰 처리 수 (기본: 0 = 입력 길이 무관)
+- TREELLM_FAKE_ERROR_RATE : 시도마다 오류를 낼 확률 (429/500/연결 오류) (기본: 0)
+- TREELLM_FAKE_SEED       : 난수 seed (기본: 0)
+- TREELLM_FAKE_PREFIX_CACHE : 0 이면 prefix 캐시 흉내를 끔 (기본: 1)
+- TREELLM_FAKE_FORMAT_ERROR_RATE : 응답 형식을 망가뜨릴 확률 (module/structured.py 복구/재요청 확인용) (기본: 0)
+- TREELLM_FAKE_DOWN_MODELS : 항상 503 을 내는 모델 (쉼표 구분, module/routing.py fallback 확인용) (기본: 없음)
+- TREELLM_FAKE_MODEL_LATENCY : 모델별 추가 지연 "모델=초,..." (예: gpt-4.1=3) (기본: 없음)
+  요청의 timeout 보다 오래 걸리면 timeout 만큼 기다린 뒤 APITimeoutError
+"""
+
+from __future__ import annotations
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple
+import asyncio
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+
+import httpx
+import openai
+
+from . import tracing
+from .dag import current_node
+from .usage import count_tokens
+
+# OpenAI prompt caching 과 비슷한 조건 (≈1024 토큰 이상, ≈128 토큰 단위) 을 글자 수로 근사
+PREFIX_MIN_CHARS = 4096
+PREFIX_BLOCK_CHARS = 512
+
+
+class CannedResponses:
+    """
+    init_sample/ 결과 파일 → 노드별 응답
+    - build:<pid>       : step2_result.txt 의 pid 트리
+    - audit:<기준>      : step3_result.txt 의 "# <기준>" 블록 (audit:<기준1>+<기준2> 는 JSON 배열로 합침)
+    - edit1:<섹션>      : step4_result.json 의 섹션 응답
+    - global_check      : step5_global_check.txt
+    - edit2             : step6_result.txt
+    - edit2:<섹션>      : step6_result.txt 의 섹션 본문
+    """
+
+    def __init__(self, sample_dir: str | Path = "init_sample"):
+        d = Path(sample_dir)
+        self.build: Dict[str, Any] = json.loads((d / "step2_result.txt").read_text(encoding="utf-8"))
+        audit_text = (d / "step3_result.txt").read_text(encoding="utf-8")
+        self.audit: Dict[str, str] = {
+            m.group(1): m.group(2).strip()
+            for m in re.finditer(r"^# (\S+)\n(.*?)(?=^# \S+\n|\Z)", audit_text, re.M | re.S)
+        }
+        self.edit1: Dict[str, str] = json.loads((d / "step4_result.json").read_text(encoding="utf-8"))
+        self.global_check = (d / "step5_global_check.txt").read_text(encoding="utf-8").strip()
+        self.edit2 = (d / "step6_result.txt").read_text(encoding="utf-8").strip()
+
+    def reply(self, node: Optional[str], step: str) -> str:
+        kind, _, name = (node or step).partition(":")
+        if kind == "build":
+            tree = self.build.get(name, {name.replace("_", " ").title(): {}})
+            return "```json\n" + json.dumps(tree, indent=2, ensure_ascii=False) + "\n```"
+        if kind == "audit" and "+" in name:
+            items = [json.loads(re.sub(r"^```json|```$", "", self.reply(f"audit:{n}", step).strip(), flags=re.M))
+                     for n in name.split("+")]
+            return "```json\n" + json.dumps(items, indent=2, ensure_ascii=False) + "\n```"
+        if kind == "audit":
+            return self.audit.get(name, "```json\n" + json.dumps({"criterion": name, "analysis": {}}) + "\n```")
+        if kind == "edit1":
+            return self.edit1.get(name, "```json\n" + json.dumps({"section": name, "improved": ""}) + "\n```")
+        if kind == "global_check":
+            return self.global_check
+        if kind == "edit2" and name:  # section 모드: 섹션 본문만
+            sections = json.loads(re.sub(r"^```json|```$", "", self.edit2, flags=re.M))
+            return sections.get(name, "")
+        if kind == "edit2":
+            return self.edit2
+        return "OK"
+
+
+class _Completions:
+    def __init__(self, backend: "FakeOpenAI"):
+        self.backend = backend
+
+    def create(self, model: str, messages: List[Dict[str, str]], stream: bool = False,
+               stream_options: Optional[dict] = None, **params):
+        return self.backend.create(model, messages, stream, stream_options, timeout=params.get("timeout"))
+
+
+class FakeOpenAI:
+    def __init__(
+        self,
+        sample_dir: str | Path | None = None,
+        latency: Optional[float] = None,
+        jitter: Optional[float] = None,
+        tps: Optional[float] = None,
+        prompt_tps: Optional[float] = None,
+        error_rate: Optional[float] = None,
+        seed: Optional[int] = None,
+        prefix_cache: Optional[bool] = None,
+        format_error_rate: Optional[float] = None,
+    ):
+        env = os.getenv
+        self.responses = CannedResponses(sample_dir or env("TREELLM_FAKE_SAMPLE_DIR", "init_sample"))
+        self.latency = float(env("TREELLM_FAKE_LATENCY", "0.05")) if latency is None else latency
+        self.jitter = float(env("TREELLM_FAKE_JITTER", "0.02")) if jitter is None else jitter
+        self.tps = float(env("TREELLM_FAKE_TPS", "0")) if tps is None else tps
+        self.prompt_tps = float(env("TREELLM_FAKE_PROMPT_TPS", "0")) if prompt_tps is None else prompt_tps
+        self.error_rate = float(env("TREELLM_FAKE_ERROR_RATE", "0")) if error_rate is None else error_rate
+        self.seed = int(env("TREELLM_FAKE_SEED", "0")) if seed is None else seed
+        self.prefix_cache = env("TREELLM_FAKE_PREFIX_CACHE", "1") != "0" if prefix_cache is None else prefix_cache
+        self._prefixes: set = set()
+        self.format_error_rate = (float(env("TREELLM_FAKE_FORMAT_ERROR_RATE", "0"))
+                                  if format_error_rate is None else format_error_rate)
+        self.down_models = {m.strip() for m in env("TREELLM_FAKE_DOWN_MODELS", "").split(",") if m.strip()}
+        self.model_latency = {
+            name.strip(): float(sec)
+            for name, _, sec in (item.partition("=") for item in env("TREELLM_FAKE_MODEL_LATENCY", "").split(","))
+            if name.strip() and sec
+        }
+        self.chat = SimpleNamespace(completions=_Completions(self))
+        self._attempts: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    # ─────────────────────────────
+    def _rng(self, messages: List[Dict[str, str]]) -> random.Random:
+        """
+        요청 내용 + 같은 요청의 시도 횟수로 seed → 재시도마다 다른 값, 실행마다 같은 값
+        """
+        digest = hashlib.sha256(json.dumps(messages, ensure_ascii=False).encode("utf-8")).hexdigest()
+        with self._lock:
+            attempt = self._attempts.get(digest, 0)
+            self._attempts[digest] = attempt + 1
+        return random.Random(f"{self.seed}:{digest}:{attempt}")
+
+    def _cached_prefix(self, messages: List[Dict[str, str]]) -> Tuple[str, List[str]]:
+        """
+        이전 요청들과 겹치는 가장 긴 prefix (블록 단위, 최소 길이 미만이면 "") + 이 요청의 prefix 키들
+        키는 입력 처리(첫 토큰)가 끝난 뒤 _remember 로 등록 → 동시에 들어온 같은 prefix 요청은 적중하지 않음
+        """
+        text = "".join(f"<{m.get('role')}>{m.get('content') or ''}" for m in messages)
+        digest = hashlib.sha256()
+        keys: List[str] = []
+        hit = 0
+        with self._lock:
+            for end in range(PREFIX_BLOCK_CHARS, len(text) + 1, PREFIX_BLOCK_CHARS):
+                digest.update(text[end - PREFIX_BLOCK_CHARS:end].encode("utf-8"))
+                keys.append(digest.copy().hexdigest())
+                if keys[-1] in self._prefixes and hit == end - PREFIX_BLOCK_CHARS:
+                    hit = end
+        return (text[:hit] if hit >= PREFIX_MIN_CHARS else ""), keys
+
+    def _remember(self, keys: List[str]):
+        with self._lock:
+            self._prefixes.update(keys)
+
+    @staticmethod
+    def _corrupt(content: str, rng: random.Random) -> str:
+        kind = rng.choice(["truncate", "trailing_comma", "prose"])
+        if kind == "truncate":
+            return content[:max(1, int(len(content) * 0.7))]
+        if kind == "trailing_comma":
+            return re.sub(r'"\s*\n(\s*)([}\]])', '",\n\\1\\2', content, count=1)
+        return "요청하신 평가를 완료했습니다. 결과는 위 내용과 같습니다."
+
+    def _error(self, rng: random.Random, kind: Optional[str] = None) -> Exception:
+        request = httpx.Request("POST", "https://fake.local/v1/chat/completions")
+        if kind == "timeout":
+            return openai.APITimeoutError(request=request)
+        if kind == "unavailable":
+            response = httpx.Response(503, request=request, headers={"retry-after": "0"})
+            return openai.InternalServerError("fake 503", response=response, body=None)
+        kind = rng.choice(["rate_limit", "server", "connection"])
+        if kind == "connection":
+            return openai.APIConnectionError(request=request)
+        status = 429 if kind == "rate_limit" else 500
+        response = httpx.Response(status, request=request, headers={"retry-after": "0"})
+        cls = openai.RateLimitError if status == 429 else openai.InternalServerError
+        return cls(f"fake {status}", response=response, body=None)
+
+    def _prepare(self, model: str, messages: List[Dict[str, str]], timeout: Optional[float]) -> SimpleNamespace:
+        """
+        요청 하나의 결과를 미리 결정 (동기 / 비동기 클라이언트 공통, 기다리는 방식만 다름)
+        error 가 있으면 wait 초 뒤에 던지고, 없으면 delay(첫 토큰까지) + generation(출력) 동안 content 를 냄
+        """
+        rng = self._rng(messages)
+        delay = max(0.0, self.latency + rng.uniform(-self.jitter, self.jitter)) + self.model_latency.get(model, 0.0)
+        if model in self.down_models:
+            return SimpleNamespace(error=self._error(rng, "unavailable"), wait=min(delay, timeout or delay))
+        if rng.random() < self.error_rate:
+            return SimpleNamespace(error=self._error(rng), wait=delay)
+
+        sp = tracing.current_span.get()
+        content = self.responses.reply(current_node.get(), sp.attrs.get("step", "") if sp else "")
+        if self.format_error_rate and rng.random() < self.format_error_rate:
+            content = self._corrupt(content, rng)
+        usage = SimpleNamespace(
+            prompt_tokens=sum(count_tokens(m.get("content") or "", model) for m in messages),
+            completion_tokens=count_tokens(content, model),
+        )
+        usage.total_tokens = usage.prompt_tokens + usage.completion_tokens
+        cached, keys = self._cached_prefix(messages) if self.prefix_cache else ("", [])
+        usage.prompt_tokens_details = SimpleNamespace(
+            cached_tokens=min(usage.prompt_tokens, count_tokens(cached, model)) if cached else 0
+        )
+        generation = usage.completion_tokens / self.tps if self.tps > 0 else 0.0
+        if self.prompt_tps > 0:
+            # 첫 토큰까지 입력 처리 시간 (prefix 캐시에 적중한 부분은 제외)
+            delay += (usage.prompt_tokens - usage.prompt_tokens_details.cached_tokens) / self.prompt_tps
+        if timeout and delay + generation > timeout:
+            return SimpleNamespace(error=self._error(rng, "timeout"), wait=timeout)
+        return SimpleNamespace(error=None, content=content, usage=usage, delay=delay, generation=generation, keys=keys)
+
+    @staticmethod
+    def _pieces(content: str) -> List[str]:
+        return [content[i:i + 16] for i in range(0, len(content), 16)] or [""]
+
+    @staticmethod
+    def _chunk(piece: Optional[str] = None, usage=None) -> SimpleNamespace:
+        if usage is not None:
+            return SimpleNamespace(choices=[], usage=usage)
+        return SimpleNamespace(choices=[SimpleNamespace(index=0, delta=SimpleNamespace(content=piece))], usage=None)
+
+    @staticmethod
+    def _response(content: str, usage) -> SimpleNamespace:
+        message = SimpleNamespace(role="assistant", content=content)
+        return SimpleNamespace(choices=[SimpleNamespace(index=0, message=message)], usage=usage)
+
+    def create(self, model: str, messages: List[Dict[str, str]], stream: bool = False,
+               stream_options: Optional[dict] = None, timeout: Optional[float] = None):
+        r = self._prepare(model, messages, timeout)
+        if r.error is not None:
+            time.sleep(r.wait)
+            raise r.error
+        if stream:
+            include_usage = bool(stream_options and stream_options.get("include_usage"))
+            return self._stream(r, include_usage)
+        time.sleep(r.delay)
+        self._remember(r.keys)
+        time.sleep(r.generation)
+        return self._response(r.content, r.usage)
+
+    def _stream(self, r: SimpleNamespace, include_usage: bool) -> Iterator[Any]:
+        time.sleep(r.delay)  # 첫 토큰까지
+        self._remember(r.keys)
+        pieces = self._pieces(r.content)
+        for piece in pieces:
+            if r.generation:
+                time.sleep(r.generation / len(pieces))
+            yield self._chunk(piece)
+        if include_usage:
+            yield self._chunk(usage=r.usage)
+
+
+# ─────────────────────────────
+class _AsyncCompletions:
+    def __init__(self, backend: "FakeAsyncOpenAI"):
+        self.backend = backend
+
+    async def create(self, model: str, messages: List[Dict[str, str]], stream: bool = False,
+                     stream_options: Optional[dict] = None, **params):
+        return await self.backend.create(model, messages, stream, stream_options, timeout=params.get("timeout"))
+
+
+class FakeAsyncOpenAI(FakeOpenAI):
+    """
+    AsyncOpenAI 모양의 가짜 백엔드 (module/llm_async.py) — 응답/지연/오류는 FakeOpenAI 와 같고 asyncio.sleep 으로 기다림
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.chat = SimpleNamespace(completions=_AsyncCompletions(self))
+
+    async def create(self, model: str, messages: List[Dict[str, str]], stream: bool = False,
+                     stream_options: Optional[dict] = None, timeout: Optional[float] = None):
+        r = self._prepare(model, messages, timeout)
+        if r.error is not None:
+            await asyncio.sleep(r.wait)
+            raise r.error
+        if stream:
+            include_usage = bool(stream_options and stream_options.get("include_usage"))
+            return self._astream(r, include_usage)
+        await asyncio.sleep(r.delay)
+        self._remember(r.keys)
+        await asyncio.sleep(r.generation)
+        return self._response(r.content, r.usage)
+
+    async def _astream(self, r: SimpleNamespace, include_usage: bool) -> AsyncIterator[Any]:
+        await asyncio.sleep(r.delay)
+        self._remember(r.keys)
+        pieces = self._pieces(r.content)
+        for piece in pieces:
+            if r.generation:
+                await asyncio.sleep(r.generation / len(pieces))
+            yield self._chunk(piece)
+        if include_usage:
+            yield self._chunk(usage=r.usage)
@@ -1,8 +1,21 @@
+"""
+fuse.py
+───────────────────────────────
+Step 2: BuildStep 의 "### <pid>" JSON 블록들 → 하나의 트리(JSON) (GPT 호출 없음)
+- JSON 추출/복구는 module/structured.py 와 같은 규칙
+
+사용법
+    python -m module.fuse           # sample/step1_result.txt → sample/step2_result.txt (저장소 루트에서)
+    (패키지 상대 import 를 쓰므로 python module/fuse.py 로는 실행되지 않음)
+"""
+
 import json
 import re
 from pathlib import Path
 from typing import Dict
 
+from .structured import extract, parse
+
 
 class TreeBuilder:
     """
@@ -18,7 +31,7 @@ class TreeBuilder:
         """
         ```json ... ``` 블록 제거
         """
-        return re.sub(r"^```json|```$", "", text.strip(), flags=re.MULTILINE).strip()
+        return extract(text)
 
     def run(self, raw_text: str) -> str:
         matches = list(self.pattern.finditer(raw_text))
@@ -29,15 +42,17 @@ class TreeBuilder:
             start = match.end()
             end = matches[i + 1].start() if i + 1 < len(matches) else len(raw_text)
             block = raw_text[start:end].strip()
-            cleaned = self.clean_json_block(block)
 
             try:
-                parsed = json.loads(cleaned)
-                # 키를 소문자로 정규화
-                tree[section_name.lower()] = parsed
-            except json.JSONDecodeError:
-                print(f"[TreeBuilder] JSON 파싱 실패: {section_name}")
+                parsed, repaired = parse(block)
+            except json.JSONDecodeError as e:
+                # BuildStep 이 검사/재요청을 마친 블록이라 여기까지 오면 입력 자체가 잘못된 것
+                print(f"[TreeBuilder] ⚠ JSON 파싱 실패 → {section_name} 섹션 제외 ({e.msg})")
                 continue
+            if repaired:
+                print(f"[TreeBuilder] {section_name}: JSON 형식 오류 복구")
+            # 키를 소문자로 정규화
+            tree[section_name.lower()] = parsed
 
         return json.dumps(tree, indent=2, ensure_ascii=False)
 
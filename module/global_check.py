@@ -2,35 +2,85 @@
 global_check.py
 ───────────────────────────────
 전역 점검: EditPass1 결과 기반 글로벌 구조 검토
+- 응답은 FEEDBACK_SCHEMA({"issues": [...], "suggestions": [...]}) 로 검사, 깨지면 이 호출만 다시 요청
+  재요청까지 실패하면 빈 피드백으로 계속 (structured.record_fallback 으로 기록)
+- 논문이 TREELLM_CHUNK_TOKENS 를 넘으면 문단 경계(겹침 포함)로 나눠 병렬 점검 후 issues/suggestions 를 순서대로 합침
+- AsyncGlobalCheck: 같은 단계의 asyncio 버전 (AsyncOrchestrator 용)
+
+사용법
+    python -m module.global_check   # sample/step4_result.json → sample/step5_global_check.txt (저장소 루트에서)
 """
 
 from __future__ import annotations
 from pathlib import Path
-import os
+from typing import List, Tuple
 import json
-from openai import OpenAI
+from .chunking import chunk_tokens, gather_map, merge_reports, parallel_map, split_text
+from .llm_async import get_async_client
+from .llm_client import get_client
+from .prompts import Template, get_registry
+from .structured import StructuredOutputError, acomplete_json, complete_json, record_fallback, to_block
+from .usage import count_tokens
+
+FEEDBACK_SCHEMA = {
+    "type": "object",
+    "required": ["issues", "suggestions"],
+    "properties": {
+        "issues": {"type": "array", "items": {"type": "string"}},
+        "suggestions": {"type": "array", "items": {"type": "string"}},
+    },
+}
 
 
 class GlobalCheck:
-    def __init__(self, model="gpt-4o"):
+    def __init__(self, model="gpt-4o", max_workers: int = 7):
+        """
+        max_workers: 긴 논문을 나눈 조각을 동시에 점검할 수
+        """
         self.model = model
-        self.client = OpenAI()
-        self.prompt_file = Path(__file__).resolve().parent.parent / "prompts" / "global_check" / "global_check.txt"
-
-        if not os.getenv("OPENAI_API_KEY"):
-            raise EnvironmentError("OPENAI_API_KEY 환경 변수가 필요합니다.")
-
-    def load_template(self) -> str:
-        return self.prompt_file.read_text(encoding="utf-8")
-
-    def call_gpt(self, prompt: str) -> str:
-        response = self.client.chat.completions.create(
-            model=self.model,
-            messages=[{"role": "user", "content": prompt}],
-        )
-        return response.choices[0].message.content.strip()
-
-    def run(self, section_data: dict) -> str:
+        self.max_workers = max(1, max_workers)
+        self.llm = get_client()  # 공유 클라이언트 (연결 재사용 + 재시도 + 캐시)
+        self.prompts = get_registry()
+
+    def load_template(self) -> Template:
+        return self.prompts.get("global_check/global_check")
+
+    def call_gpt(self, prompt: str, version: str = "", on_delta=None) -> str:
+        """
+        응답을 검사한 뒤 정리된 ```json 블록으로 반환 (EditPass2 가 그대로 읽을 수 있음)
+        """
+        return to_block(self.call_json(prompt, version=version, on_delta=on_delta))
+
+    def call_json(self, prompt: str, version: str = "", on_delta=None) -> dict:
+        try:
+            feedback, _ = complete_json(
+                self.llm,
+                [{"role": "user", "content": prompt}],
+                FEEDBACK_SCHEMA,
+                model=self.model,
+                step="global_check",
+                version=version,
+                on_delta=on_delta,
+            )
+        except StructuredOutputError as exc:
+            return self.empty_feedback(exc, on_delta)
+        return feedback
+
+    @staticmethod
+    def empty_feedback(error: StructuredOutputError, on_delta=None) -> dict:
+        """
+        재요청까지 형식이 깨진 점검 결과 → 빈 피드백 (EditPass2 는 전역 지적 없이 진행)
+        """
+        record_fallback(error, "empty")
+        print(f"[GlobalCheck] ⚠ 응답 형식 오류로 전역 피드백 없이 진행 ({error})")
+        if on_delta is not None:
+            on_delta("", reset=True)
+        return {"issues": [], "suggestions": []}
+
+    def prepare(self, section_data: dict) -> Tuple[Template, List[str]]:
+        """
+        EditPass1 결과 → (템플릿, 본문 조각 목록) (예산 안이면 조각 하나)
+        """
         order = ["Abstract", "Introduction", "Background", "Related Work", "Method", "Discussion", "Conclusion"]
 
         full_text = ""
@@ -42,10 +92,88 @@ class GlobalCheck:
                 full_text += f"\n\n## {sec}\n{text}"
 
         prompt_template = self.load_template()
-        prompt = prompt_template.replace("{FULL_TEXT}", full_text.strip())
+        budget = chunk_tokens() - count_tokens(prompt_template.render(FULL_TEXT=""), self.model)
+        return prompt_template, split_text(full_text.strip(), max(budget, chunk_tokens() // 4), model=self.model)
+
+    @staticmethod
+    def chunk_prompt(template: Template, i: int, n: int, text: str) -> str:
+        header = f"(긴 논문을 {n}개 부분으로 나눈 것 중 {i}번째 부분입니다. 앞뒤 부분과의 연결은 경계 문단을 기준으로 판단하세요.)"
+        return template.render(FULL_TEXT=f"{header}\n\n{text}")
+
+    def run(self, section_data: dict, on_delta=None) -> str:
+        prompt_template, chunks = self.prepare(section_data)
+        if len(chunks) > 1:
+            return self.run_chunked(prompt_template, chunks, on_delta=on_delta)
+
+        prompt = prompt_template.render(FULL_TEXT=chunks[0])
 
         print("[GlobalCheck] ▶ 전역 점검 실행 중...")
-        return self.call_gpt(prompt)
+        return self.call_gpt(prompt, version=prompt_template.version, on_delta=on_delta)
+
+    def run_chunked(self, template: Template, chunks: list, on_delta=None) -> str:
+        """
+        조각별 점검 (병렬) → issues/suggestions 를 조각 순서대로 중복 없이 합침
+        on_delta 에는 합친 블록을 한 번에 전달 (조각 스트림이 섞이지 않도록)
+        """
+        print(f"[GlobalCheck] ▶ 논문이 길어 {len(chunks)}개 조각으로 나눠 점검 중...")
+
+        def check(item) -> dict:
+            i, text = item
+            return self.call_json(self.chunk_prompt(template, i, len(chunks), text), version=template.version)
+
+        reports = parallel_map(check, list(enumerate(chunks, 1)), self.max_workers)
+        body = to_block(merge_reports(reports))
+        if on_delta is not None:
+            on_delta(body)
+        return body
+
+
+class AsyncGlobalCheck(GlobalCheck):
+    """
+    GlobalCheck 의 asyncio 버전 (AsyncOrchestrator 용) — 프롬프트/결과 형식은 같고 GPT 호출만 코루틴
+    """
+
+    def __init__(self, model="gpt-4o", max_workers: int = 7):
+        super().__init__(model, max_workers)
+        self.llm = get_async_client()
+
+    async def call_gpt(self, prompt: str, version: str = "", on_delta=None) -> str:
+        return to_block(await self.call_json(prompt, version=version, on_delta=on_delta))
+
+    async def call_json(self, prompt: str, version: str = "", on_delta=None) -> dict:
+        try:
+            feedback, _ = await acomplete_json(
+                self.llm,
+                [{"role": "user", "content": prompt}],
+                FEEDBACK_SCHEMA,
+                model=self.model,
+                step="global_check",
+                version=version,
+                on_delta=on_delta,
+            )
+        except StructuredOutputError as exc:
+            return self.empty_feedback(exc, on_delta)
+        return feedback
+
+    async def run(self, section_data: dict, on_delta=None) -> str:
+        prompt_template, chunks = self.prepare(section_data)
+        if len(chunks) > 1:
+            return await self.run_chunked(prompt_template, chunks, on_delta=on_delta)
+        print("[GlobalCheck] ▶ 전역 점검 실행 중...")
+        return await self.call_gpt(prompt_template.render(FULL_TEXT=chunks[0]), version=prompt_template.version,
+                                   on_delta=on_delta)
+
+    async def run_chunked(self, template: Template, chunks: list, on_delta=None) -> str:
+        print(f"[GlobalCheck] ▶ 논문이 길어 {len(chunks)}개 조각으로 나눠 점검 중...")
+        reports = await gather_map(
+            lambda item: self.call_json(self.chunk_prompt(template, item[0], len(chunks), item[1]),
+                                        version=template.version),
+            list(enumerate(chunks, 1)), self.max_workers,
+        )
+        body = to_block(merge_reports(reports))
+        if on_delta is not None:
+            on_delta(body)
+        return body
 
 
 if __name__ == "__main__":
@@ -0,0 +1,87 @@
+"""
+incremental.py
+───────────────────────────────
+수정본 재분석용 실행 기록 (문서 단위)
+- 이전 실행의 섹션별 내용 해시 + 노드별 (입력 지문 → 출력) 기록
+- dag.Graph.run(memo=...) 에 넘기면 입력이 바뀐 노드만 다시 실행
+- 저장 위치: state/<doc_id>.json
+"""
+
+from __future__ import annotations
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+import hashlib
+import json
+import os
+import re
+import threading
+
+
+def content_hash(value: Any) -> str:
+    payload = json.dumps(value, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class RunState:
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        self.previous: Dict[str, Dict[str, Any]] = {}
+        self.previous_sections: Dict[str, str] = {}
+        self.nodes: Dict[str, Dict[str, Any]] = {}
+        self.section_hashes: Dict[str, str] = {}
+        self.reused: List[str] = []
+        self.executed: List[str] = []
+        self._lock = threading.Lock()
+
+        if self.path.exists():
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+            self.previous = data.get("nodes", {})
+            self.previous_sections = data.get("section_hashes", {})
+
+    @classmethod
+    def for_document(cls, doc_id: str, root: str | Path = "state") -> "RunState":
+        safe_id = re.sub(r"[^\w.-]", "_", doc_id)
+        return cls(Path(root) / f"{safe_id}.json")
+
+    # ─────────────────────────────
+    def fingerprint(self, node, args: Dict[str, Any]) -> str:
+        """
+        노드 이름 + 버전(모델/프롬프트) + 입력 값 → 지문
+        """
+        return content_hash({"node": node.name, "version": node.version, "inputs": args})
+
+    def lookup(self, node: str, fp: str) -> Optional[Dict[str, Any]]:
+        entry = self.previous.get(node)
+        if entry and entry["fingerprint"] == fp:
+            with self._lock:
+                self.reused.append(node)
+            return entry["outputs"]
+        return None
+
+    def record(self, node: str, fp: str, outputs: Dict[str, Any]):
+        with self._lock:
+            if node not in self.reused:
+                self.executed.append(node)
+            self.nodes[node] = {"fingerprint": fp, "outputs": outputs}
+
+    # ─────────────────────────────
+    def update_sections(self, sections: Dict[str, str]) -> List[str]:
+        """
+        섹션별 내용 해시 갱신 → 이전 실행 대비 바뀐 섹션 목록
+        """
+        self.section_hashes = {sec: content_hash(text) for sec, text in sections.items()}
+        return [
+            sec for sec, h in self.section_hashes.items()
+            if self.previous_sections.get(sec) != h
+        ]
+
+    def save(self):
+        """
+        이번 실행의 기록으로 교체 (임시 파일에 쓴 뒤 rename → 중간에 죽어도 깨지지 않음)
+        """
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(f".{os.getpid()}.tmp")
+        with self._lock:
+            data = {"section_hashes": self.section_hashes, "nodes": self.nodes}
+        tmp.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp, self.path)
@@ -0,0 +1,471 @@
+"""
+job_store.py
+───────────────────────────────
+SQLite 기반 파이프라인 작업 큐 (외부 서비스 불필요)
+- jobs   : 작업 상태 (queued → running → done / failed)
+- events : 작업별 SSE 이벤트 로그 (seq 로 재접속 시 이어 받기)
+  토큰 조각(delta)은 EventBuffer 로 묶어서 기록 (토큰마다 쓰기 트랜잭션을 열지 않음),
+  작업이 끝나면 delta 행은 지우고 단계/상태 이벤트만 남김
+- worker_metrics : 워커 프로세스별 지표 스냅숏 (metrics.snapshot) → HTTP 서버의 /metrics 가 합산
+- 끝난 지 retention 초가 지난 작업은 이벤트와 함께 삭제 (purge_finished, 워커가 주기적으로 호출)
+- 여러 워커 프로세스가 claim() 으로 작업을 하나씩 원자적으로 가져감
+- 실행 중에는 Heartbeat 스레드가 heartbeat 를 주기적으로 갱신 (이벤트 없이 긴 LLM 호출 중에도 살아 있는 작업으로 보임)
+- 작업마다 문서 해시(doc_hash) + 실행 설정 키(config) → find() 로 같은 문서·설정의 완료/진행 중 작업을 찾음
+  start() 는 찾기 + queued 작업 등록을 한 트랜잭션으로 (같은 문서를 동시에 요청해도 실행은 하나, 실행은 워커가)
+- doc_id: 업로드의 문서 키 (uploads.doc_key) → 워커가 Orchestrator 의 증분 재분석 키로 넘김
+- 재개(resume / resume_run)나 죽은 워커 복구로 새 시도를 시작하면 이전 시도의 이벤트는 지우고 seq 는 이어서 증가
+  (event_base) → 처음부터 다시 받아도 단계 이벤트가 두 번 나오지 않음
+
+환경 변수
+- TREELLM_JOBS_DB            : DB 파일 경로 (기본: jobs.sqlite3)
+- TREELLM_JOB_RETENTION      : 끝난 작업을 보관하는 시간(초) (기본: 604800 = 7일)
+- TREELLM_EVENT_FLUSH_MS     : delta 를 모아 두는 최대 시간(ms) (기본: 250)
+- TREELLM_EVENT_FLUSH_CHARS  : delta 를 모아 두는 최대 글자 수 (기본: 2000)
+"""
+
+from __future__ import annotations
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+FINISHED = ("done", "failed")
+
+# 같은 문서 + 설정의 작업: done 우선, 그다음 가장 최근 (failed / heartbeat 가 끊긴 running 제외)
+_FIND = ("SELECT id FROM jobs WHERE doc_hash = ? AND config = ? AND status != 'failed' "
+         "AND (status != 'running' OR heartbeat >= ?) "
+         "ORDER BY status = 'done' DESC, created DESC LIMIT 1")
+
+
+def jobs_db() -> Path:
+    return Path(os.getenv("TREELLM_JOBS_DB", "jobs.sqlite3"))
+
+
+def job_retention() -> float:
+    return float(os.getenv("TREELLM_JOB_RETENTION", str(7 * 24 * 3600)))
+
+
+class JobStore:
+    def __init__(self, path: str | Path | None = None):
+        self.path = Path(path) if path else jobs_db()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id TEXT PRIMARY KEY, file_path TEXT NOT NULL, model TEXT NOT NULL,"
+            " status TEXT NOT NULL, created REAL NOT NULL, started REAL, finished REAL,"
+            " heartbeat REAL, worker TEXT, run_id TEXT, result TEXT, error TEXT)"
+        )
+        columns = {r["name"] for r in conn.execute("PRAGMA table_info(jobs)")}
+        for column in ("doc_hash", "config", "doc_id"):  # 이전 버전 DB
+            if column not in columns:
+                conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} TEXT")
+        if "event_base" not in columns:
+            conn.execute("ALTER TABLE jobs ADD COLUMN event_base INTEGER")
+        conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs(status, created)")
+        conn.execute("CREATE INDEX IF NOT EXISTS jobs_run ON jobs(run_id)")
+        conn.execute("CREATE INDEX IF NOT EXISTS jobs_doc ON jobs(doc_hash, config, created)")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS events ("
+            " job_id TEXT NOT NULL, seq INTEGER NOT NULL, data TEXT NOT NULL, kind TEXT,"
+            " PRIMARY KEY (job_id, seq))"
+        )
+        if "kind" not in {r["name"] for r in conn.execute("PRAGMA table_info(events)")}:  # 이전 버전 DB
+            conn.execute("ALTER TABLE events ADD COLUMN kind TEXT")
+        conn.execute("CREATE INDEX IF NOT EXISTS jobs_finished ON jobs(finished)")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS worker_metrics ("
+            " worker TEXT PRIMARY KEY, updated REAL NOT NULL, data TEXT NOT NULL)"
+        )
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    # ─────────────────────────────
+    def submit(self, file_path: str, model: str = "gpt-4o", doc_hash: Optional[str] = None,
+               config: Optional[str] = None, doc_id: Optional[str] = None) -> str:
+        job_id = uuid.uuid4().hex
+        self._insert(self._conn(), job_id, file_path, model, doc_hash, config, doc_id)
+        return job_id
+
+    @staticmethod
+    def _insert(conn: sqlite3.Connection, job_id: str, file_path: str, model: str, doc_hash: Optional[str],
+                config: Optional[str], doc_id: Optional[str], worker: Optional[str] = None,
+                run_id: Optional[str] = None):
+        """
+        worker 가 없으면 queued, 있으면 그 worker 가 바로 실행하는 running 작업
+        run_id 를 주면 그 작업 공간의 체크포인트부터 재개하는 작업
+        """
+        now = time.time()
+        conn.execute(
+            "INSERT INTO jobs(id, file_path, model, status, created, started, heartbeat, worker, doc_hash, config,"
+            " doc_id, run_id) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (job_id, file_path, model, "running" if worker else "queued", now, now if worker else None,
+             now if worker else None, worker, doc_hash, config, doc_id, run_id),
+        )
+
+    def find(self, doc_hash: str, config: str, stale_timeout: float = 600.0) -> Optional[Dict[str, Any]]:
+        """
+        같은 문서 + 설정의 작업 (done 우선, 그다음 가장 최근의 queued/running)
+        failed 와 heartbeat 가 stale_timeout 초 넘게 끊긴 running(죽은 실행)은 제외
+        """
+        row = self._conn().execute(_FIND, (doc_hash, config, time.time() - stale_timeout)).fetchone()
+        return self.get(row["id"]) if row else None
+
+    def start(self, file_path: str, model: str, doc_hash: str, config: str, doc_id: Optional[str] = None,
+              worker: Optional[str] = None, stale_timeout: float = 600.0) -> Tuple[Dict[str, Any], bool]:
+        """
+        같은 문서 + 설정의 작업이 있으면 (그 작업, False), 없으면 작업을 새로 등록해 (작업, True)
+        새 작업은 queued → 워커 풀이 claim() 으로 가져가 실행
+        worker 를 주면 running 으로 등록 → 호출한 쪽이 직접 실행 (asgi.py 의 이벤트 루프 실행, 워커가 가져가지 않음)
+        """
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(_FIND, (doc_hash, config, time.time() - stale_timeout)).fetchone()
+            created = row is None
+            job_id = uuid.uuid4().hex if created else row["id"]
+            if created:
+                self._insert(conn, job_id, file_path, model, doc_hash, config, doc_id, worker)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return self.get(job_id), created
+
+    def claim(self, worker: str) -> Optional[Dict[str, Any]]:
+        """
+        가장 오래된 queued 작업 하나를 running 으로 바꾸고 반환 (없으면 None)
+        """
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT id, run_id FROM jobs WHERE status = 'queued' ORDER BY created LIMIT 1"
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            now = time.time()
+            conn.execute(
+                "UPDATE jobs SET status = 'running', started = ?, heartbeat = ?, worker = ? WHERE id = ?",
+                (now, now, worker, row["id"]),
+            )
+            if row["run_id"]:  # 이전 시도가 있던 작업 (재개 / 죽은 워커 복구)
+                self._clear_events(conn, row["id"])
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return self.get(row["id"])
+
+    def resume(self, job_id: str) -> bool:
+        """
+        failed 작업 → queued (워커가 run_id 의 체크포인트부터 재개)
+        """
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT status FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            resumed = row is not None and row["status"] == "failed"
+            if resumed:
+                self._restart(conn, job_id)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return resumed
+
+    def resume_run(self, run_id: str, file_path: str, model: str, doc_id: Optional[str] = None,
+                   worker: Optional[str] = None, stale_timeout: float = 600.0) -> Tuple[Dict[str, Any], str]:
+        """
+        run_id(작업 공간)의 재개 요청 → (작업, 상태)
+        - 그 run 의 작업이 failed 거나 heartbeat 가 끊긴 running → 다시 실행 ("resumed")
+        - queued / running → 그 작업에 붙음 ("attached"), done → 저장된 결과 ("reused")
+        - 작업이 없으면 (작업 큐를 거치지 않은 run 등) 그 run_id 로 재개하는 새 작업 ("resumed")
+        worker 를 주면 start() 처럼 running 으로 → 호출한 쪽이 직접 실행
+        """
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT id, status, heartbeat FROM jobs WHERE run_id = ? ORDER BY created DESC LIMIT 1", (run_id,)
+            ).fetchone()
+            if row is None:
+                job_id, state = uuid.uuid4().hex, "resumed"
+                self._insert(conn, job_id, file_path, model, None, None, doc_id, worker, run_id)
+            else:
+                job_id = row["id"]
+                dead = row["status"] == "running" and (row["heartbeat"] or 0) < time.time() - stale_timeout
+                if row["status"] == "failed" or dead:
+                    state = "resumed"
+                    self._restart(conn, job_id, worker)
+                else:
+                    state = "reused" if row["status"] == "done" else "attached"
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return self.get(job_id), state
+
+    def _restart(self, conn: sqlite3.Connection, job_id: str, worker: Optional[str] = None):
+        """
+        작업의 새 시도: worker 가 없으면 queued, 있으면 그 worker 의 running + 이전 시도의 이벤트 삭제
+        """
+        now = time.time() if worker else None
+        conn.execute(
+            "UPDATE jobs SET status = ?, worker = ?, started = ?, heartbeat = ?, error = NULL, finished = NULL"
+            " WHERE id = ?",
+            ("running" if worker else "queued", worker, now, now, job_id),
+        )
+        self._clear_events(conn, job_id)
+
+    @staticmethod
+    def _clear_events(conn: sqlite3.Connection, job_id: str):
+        """
+        이전 시도의 이벤트 삭제, 마지막 seq 는 event_base 로 남김 → 새 이벤트의 seq 는 이어서 증가
+        (이전 Last-Event-ID 로 재접속해도 새 이벤트를 놓치지 않고, 0 부터 받아도 이전 단계 이벤트가 섞이지 않음)
+        """
+        conn.execute(
+            "UPDATE jobs SET event_base = COALESCE((SELECT MAX(seq) FROM events WHERE job_id = ?), event_base)"
+            " WHERE id = ?",
+            (job_id, job_id),
+        )
+        conn.execute("DELETE FROM events WHERE job_id = ?", (job_id,))
+
+    def requeue_stale(self, timeout: float = 600.0) -> int:
+        """
+        heartbeat 가 timeout 초 넘게 끊긴 running 작업 → queued (죽은 워커 복구)
+        """
+        cur = self._conn().execute(
+            "UPDATE jobs SET status = 'queued', worker = NULL WHERE status = 'running' AND heartbeat < ?",
+            (time.time() - timeout,),
+        )
+        return cur.rowcount
+
+    def purge_finished(self, retention: Optional[float] = None) -> int:
+        """
+        끝난 지 retention 초(기본: TREELLM_JOB_RETENTION)가 지난 작업과 그 이벤트 삭제 → 삭제한 작업 수
+        (그동안 지표를 올리지 않은 워커의 스냅숏도 함께 삭제)
+        """
+        cutoff = time.time() - (job_retention() if retention is None else retention)
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            old = "SELECT id FROM jobs WHERE status IN ('done', 'failed') AND finished < ?"
+            conn.execute(f"DELETE FROM events WHERE job_id IN ({old})", (cutoff,))
+            removed = conn.execute("DELETE FROM jobs WHERE status IN ('done', 'failed') AND finished < ?",
+                                   (cutoff,)).rowcount
+            conn.execute("DELETE FROM worker_metrics WHERE updated < ?", (cutoff,))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return removed
+
+    # ─────────────────────────────
+    def add_event(self, job_id: str, data: str, kind: str = "event") -> int:
+        """
+        이벤트 추가 → seq (1부터 증가, SSE id 로 사용)
+        """
+        return self.add_events(job_id, [(data, kind)])
+
+    def add_events(self, job_id: str, items: List[Tuple[str, str]]) -> int:
+        """
+        (data, kind) 여러 개를 한 트랜잭션으로 추가 → 마지막 seq
+        kind: "delta"(토큰 조각, 작업이 끝나면 삭제) / "event"(단계/상태 이벤트)
+        """
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            seq = conn.execute(
+                "SELECT COALESCE((SELECT MAX(seq) FROM events WHERE job_id = ?),"
+                " (SELECT event_base FROM jobs WHERE id = ?), 0)",
+                (job_id, job_id),
+            ).fetchone()[0]
+            rows = [(job_id, seq + i, data, kind) for i, (data, kind) in enumerate(items, 1)]
+            conn.executemany("INSERT INTO events(job_id, seq, data, kind) VALUES (?, ?, ?, ?)", rows)
+            conn.execute("UPDATE jobs SET heartbeat = ? WHERE id = ?", (time.time(), job_id))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return seq + len(items)
+
+    def touch(self, job_id: str):
+        """
+        실행 중 작업의 heartbeat 만 갱신 (Heartbeat 스레드가 호출)
+        """
+        self._conn().execute("UPDATE jobs SET heartbeat = ? WHERE id = ? AND status = 'running'",
+                             (time.time(), job_id))
+
+    def events_since(self, job_id: str, after: int = 0, limit: int = 500) -> List[Tuple[int, str]]:
+        rows = self._conn().execute(
+            "SELECT seq, data FROM events WHERE job_id = ? AND seq > ? ORDER BY seq LIMIT ?",
+            (job_id, after, limit),
+        ).fetchall()
+        return [(r["seq"], r["data"]) for r in rows]
+
+    def progress(self, job_id: str) -> Optional[Tuple[int, str, Optional[str]]]:
+        """
+        (마지막 이벤트 seq, 상태, run_id) 한 번에 조회 (SSE 스트림의 새 이벤트 대기용), 작업이 없으면 None
+        """
+        row = self._conn().execute(
+            "SELECT status, run_id, COALESCE((SELECT MAX(seq) FROM events WHERE job_id = ?), event_base, 0) AS seq"
+            " FROM jobs WHERE id = ?",
+            (job_id, job_id),
+        ).fetchone()
+        return None if row is None else (row["seq"], row["status"], row["run_id"])
+
+    def set_run_id(self, job_id: str, run_id: str):
+        self._conn().execute("UPDATE jobs SET run_id = ? WHERE id = ?", (run_id, job_id))
+
+    def finish(self, job_id: str, result: Any):
+        self._end(job_id, "UPDATE jobs SET status = 'done', finished = ?, result = ? WHERE id = ?",
+                  (time.time(), json.dumps(result, ensure_ascii=False), job_id))
+
+    def fail(self, job_id: str, error: str):
+        self._end(job_id, "UPDATE jobs SET status = 'failed', finished = ?, error = ? WHERE id = ?",
+                  (time.time(), error, job_id))
+
+    def _end(self, job_id: str, update: str, params: tuple):
+        """
+        상태 갱신 + 토큰 조각(delta) 행 삭제 (끝난 작업의 재생/재접속에는 단계 이벤트만 필요)
+        """
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(update, params)
+            conn.execute("DELETE FROM events WHERE job_id = ? AND kind = 'delta'", (job_id,))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    # ─────────────────────────────
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        row = self._conn().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def counts(self) -> Dict[str, int]:
+        """
+        상태별 작업 수 (queued 수 = 큐 깊이)
+        """
+        rows = self._conn().execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status").fetchall()
+        return {r["status"]: r["n"] for r in rows}
+
+    # ─────────────────────────────
+    def put_metrics(self, worker: str, data: Dict[str, Any]):
+        """
+        워커의 지표 스냅숏 저장 (워커마다 한 행, 최신 값으로 덮어씀)
+        """
+        self._conn().execute("INSERT OR REPLACE INTO worker_metrics(worker, updated, data) VALUES (?, ?, ?)",
+                             (worker, time.time(), json.dumps(data)))
+
+    def worker_metrics(self) -> List[Tuple[float, Dict[str, Any]]]:
+        """
+        워커별 (올린 시각, 지표 스냅숏) → metrics.render(snapshots)
+        """
+        rows = self._conn().execute("SELECT updated, data FROM worker_metrics").fetchall()
+        return [(r["updated"], json.loads(r["data"])) for r in rows]
+
+
+class EventBuffer:
+    """
+    작업 이벤트 기록기: 같은 단계/섹션의 연속된 토큰 조각(delta)을 하나로 합쳐 모았다가
+    flush_ms 또는 flush_chars 를 넘으면 한 트랜잭션으로 기록. 단계/상태 이벤트는 모아 둔 것과 함께 바로 기록.
+
+    사용법
+        if buffer.add(update, event):
+            buffer.flush()
+        ...
+        buffer.flush()
+    add() 는 DB 에 쓰지 않음 → 비동기 쪽에서는 flush() 만 작업 스레드에서 실행
+    """
+
+    def __init__(self, store: JobStore, job_id: str, flush_ms: Optional[float] = None,
+                 flush_chars: Optional[int] = None):
+        self.store = store
+        self.job_id = job_id
+        self.flush_ms = float(os.getenv("TREELLM_EVENT_FLUSH_MS", "250")) if flush_ms is None else flush_ms
+        self.flush_chars = int(os.getenv("TREELLM_EVENT_FLUSH_CHARS", "2000")) if flush_chars is None else flush_chars
+        self.pending: List[Tuple[Dict[str, Any], Optional[str]]] = []  # (이벤트, 원문 — delta 는 합친 뒤 직렬화)
+        self.chars = 0
+        self.since = 0.0
+
+    def add(self, data: str, event: Optional[Dict[str, Any]] = None) -> bool:
+        """
+        이벤트 하나 추가 → True 면 flush() 할 때
+        """
+        event = json.loads(data) if event is None else event
+        if not self.pending:
+            self.since = time.monotonic()
+        if "delta" not in event:
+            self.pending.append((event, data))
+            return True
+        last = self.pending[-1][0] if self.pending else None
+        if (last is not None and "delta" in last and not event.get("reset")
+                and all(last.get(k) == event.get(k) for k in ("step", "name", "section"))):
+            last["delta"] += event["delta"]
+        else:
+            self.pending.append((dict(event), None))
+        self.chars += len(event["delta"])
+        return self.chars >= self.flush_chars or (time.monotonic() - self.since) * 1000 >= self.flush_ms
+
+    def flush(self):
+        if not self.pending:
+            return
+        items = [(json.dumps(event), "delta") if data is None else (data, "event") for event, data in self.pending]
+        self.pending = []
+        self.chars = 0
+        self.store.add_events(self.job_id, items)
+
+
+class Heartbeat:
+    """
+    작업 실행 동안 interval 초마다 heartbeat 를 갱신하는 스레드 (이벤트 기록과 무관)
+    토큰 조각 없이 오래 걸리는 호출 중에도 stale_timeout 을 넘기지 않음 → requeue_stale 이 중복 실행하거나
+    find/start 가 죽은 작업으로 보지 않음
+
+    사용법
+        with Heartbeat(store, job_id, stale_timeout / 4):
+            ...
+    """
+
+    def __init__(self, store: JobStore, job_id: str, interval: float):
+        self.store = store
+        self.job_id = job_id
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"heartbeat-{job_id}", daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.store.touch(self.job_id)
+            except sqlite3.Error as exc:
+                print(f"[JobStore] ⚠ heartbeat 갱신 실패 ({self.job_id}): {exc}")
+
+    def __enter__(self) -> "Heartbeat":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
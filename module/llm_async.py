@@ -0,0 +1,236 @@
+"""
+llm_async.py
+───────────────────────────────
+LLMClient 의 asyncio 버전 (AsyncOrchestrator / asgi.py 용)
+- AsyncOpenAI 로 호출 → 진행 중인 호출마다 스레드를 잡지 않음 (한 프로세스에서 수백 개 동시 호출)
+- 단계별 설정 / 재시도(백오프) / 응답 캐시 / usage 기록 / tracing / 라우팅(fallback)은 LLMClient 와 같음
+  (설정·집계 메서드는 그대로 물려받고, 호출 경로만 코루틴)
+- 동시 호출 수 / 분당 호출 수 제한은 asyncio.Semaphore / 비동기 대기로
+- 응답 캐시(SQLite)와 토큰 계산은 asyncio.to_thread 로 → 이벤트 루프에서 디스크 I/O 를 하지 않음
+- 배치 모드(use_batch)는 동기 경로에서만 지원
+
+환경 변수
+- LLMClient 와 같음 (TREELLM_LLM_BACKEND, TREELLM_LLM_MAX_CONCURRENCY, TREELLM_LLM_RPM, TREELLM_ROUTES)
+"""
+
+from __future__ import annotations
+from dataclasses import replace
+from typing import Callable, Dict, List, Optional
+import asyncio
+import threading
+import time
+
+from openai import AsyncOpenAI
+
+from .dag import current_node
+from .llm_client import CallConfig, DeltaCallback, LLMClient, Reply, _usage_of, is_retryable
+from .routing import Route
+from . import tracing, usage
+
+
+class AsyncRateLimiter:
+    """
+    분당 호출 수 제한 (호출 간격을 60/rpm 초로 맞춤, 기다리는 동안 이벤트 루프를 막지 않음)
+    """
+
+    def __init__(self, rpm: float):
+        self.interval = 60.0 / rpm
+        self._next = 0.0
+
+    async def acquire(self):
+        now = time.monotonic()
+        slot = max(now, self._next)
+        self._next = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+
+class AsyncLLMClient(LLMClient):
+    def _make_client(self):
+        # LLMClient.__init__ 에서 호출 → 동기 클라이언트는 만들지 않음 (호출 경로가 모두 코루틴)
+        if self.backend == "fake":
+            from .fake_llm import FakeAsyncOpenAI
+            return FakeAsyncOpenAI()
+        return AsyncOpenAI(max_retries=0)
+
+    def set_limits(self, max_concurrency: int = 0, rpm: float = 0):
+        self._semaphore = asyncio.Semaphore(max_concurrency) if max_concurrency > 0 else None
+        self._rate = AsyncRateLimiter(rpm) if rpm > 0 else None
+
+    def use_batch(self, batch):
+        if batch is not None:
+            raise NotImplementedError("배치 모드는 동기 LLMClient 에서만 지원")
+
+    # ─────────────────────────────
+    async def _stream(self, model: str, messages: List[Dict[str, str]], config: CallConfig,
+                      on_delta: DeltaCallback, **params) -> Reply:
+        parts: List[str] = []
+        reported = None
+        stream = await self.client.chat.completions.create(
+            model=model,
+            messages=messages,
+            timeout=config.timeout,
+            stream=True,
+            stream_options={"include_usage": True},
+            **params,
+        )
+        async for chunk in stream:
+            reported = _usage_of(chunk) or reported
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                parts.append(delta)
+                on_delta(delta)
+        return "".join(parts).strip(), reported
+
+    async def _call(self, model: str, messages: List[Dict[str, str]], config: CallConfig,
+                    on_delta: Optional[DeltaCallback], **params) -> Reply:
+        if self._rate is not None:
+            await self._rate.acquire()
+        if self._semaphore is not None:
+            await self._semaphore.acquire()
+        try:
+            if on_delta is not None:
+                return await self._stream(model, messages, config, on_delta, **params)
+            response = await self.client.chat.completions.create(
+                model=model,
+                messages=messages,
+                timeout=config.timeout,
+                **params,
+            )
+            return response.choices[0].message.content.strip(), _usage_of(response)
+        finally:
+            if self._semaphore is not None:
+                self._semaphore.release()
+
+    async def _create(self, model: str, messages: List[Dict[str, str]], config: CallConfig, step: str,
+                      on_delta: Optional[DeltaCallback] = None, **params) -> Reply:
+        attempt = 0
+        while True:
+            try:
+                if on_delta is not None and attempt:
+                    on_delta("", reset=True)
+                return await self._call(model, messages, config, on_delta, **params)
+            except Exception as exc:
+                if not is_retryable(exc) or attempt >= config.max_retries:
+                    self._count(step, "failures")
+                    raise
+                delay = self._backoff(config, attempt, exc)
+                attempt += 1
+                self._count(step, "retries")
+                sp = tracing.current_span.get()
+                if sp is not None:
+                    sp.attrs["retries"] = attempt
+                print(f"[AsyncLLMClient] ⚠ {step} 재시도 {attempt}/{config.max_retries} "
+                      f"({type(exc).__name__}, {delay:.1f}s 후)")
+                await asyncio.sleep(delay)
+
+    async def complete(
+        self,
+        messages: List[Dict[str, str]],
+        model: str = "gpt-4o",
+        temperature: Optional[float] = None,
+        top_p: Optional[float] = None,
+        step: str = "default",
+        version: str = "",
+        on_delta: Optional[DeltaCallback] = None,
+        accept: Optional[Callable[[str], bool]] = None,
+    ) -> str:
+        """
+        LLMClient.complete 와 같은 동작의 코루틴
+        """
+        route = self.router.resolve(step, current_node.get(), model) if self.router is not None else None
+        if route is not None:
+            return await self._complete_routed(route, messages, temperature, top_p, step, version, on_delta, accept)
+        with tracing.span("llm", step=step, model=model, prompt_version=version):
+            return await self._complete(messages, model, temperature, top_p, step, version, on_delta, accept=accept)
+
+    async def _complete_routed(self, route: Route, messages, temperature, top_p, step, version, on_delta,
+                                      accept=None) -> str:
+        config = self.config_for(step)
+        candidates = self.router.candidates(route)
+        for i, (model, decision) in enumerate(candidates):
+            last = i == len(candidates) - 1
+            call_config = config if last else replace(
+                config, timeout=route.timeout or config.timeout, max_retries=min(route.retries, config.max_retries)
+            )
+            started = time.monotonic()
+            try:
+                with tracing.span("llm", step=step, model=model, prompt_version=version, route=decision):
+                    content = await self._complete(messages, model, temperature, top_p, step, version, on_delta,
+                                                   config=call_config, route=decision, accept=accept)
+            except Exception as exc:
+                reason = self.router.observe(route, model, error=exc)
+                if last:
+                    raise
+                self._count(step, "fallbacks")
+                fallback = candidates[i + 1][0]
+                candidates[i + 1] = (fallback, f"fallback:{reason or 'error'}")
+                print(f"[AsyncLLMClient] ⚠ {step}: {model} 실패 ({type(exc).__name__}) → {fallback} 로 전환")
+                if on_delta is not None:
+                    on_delta("", reset=True)
+                continue
+            if self.router.observe(route, model, latency=time.monotonic() - started) == "slow":
+                print(f"[AsyncLLMClient] ⚠ {step}: {model} 지연 {time.monotonic() - started:.1f}s "
+                      f"→ {route.cooldown:.0f}s 동안 {route.fallback} 사용")
+            return content
+        raise RuntimeError("unreachable")
+
+    async def _complete(self, messages, model, temperature, top_p, step, version, on_delta,
+                        config: Optional[CallConfig] = None, route: str = "", accept=None) -> str:
+        self._count(step, "calls")
+        # 토큰 계산(tiktoken)과 캐시(SQLite 읽기/쓰기)는 작업 스레드에서 → 이벤트 루프를 막지 않음
+        estimated = await asyncio.to_thread(usage.estimate_tokens, messages, model)
+        started = time.monotonic()
+        key = self.cache.make_key(model, messages, temperature, top_p, version)
+        cached = await asyncio.to_thread(self._cached, key, accept) if self.cache.enabled else None
+        if cached is not None:
+            self._count(step, "cache_hits")
+            completion_tokens = await asyncio.to_thread(usage.count_tokens, cached, model)
+            usage.record(step, model, estimated, estimated, completion_tokens,
+                         time.monotonic() - started, source="cache", estimated=True, route=route)
+            if on_delta is not None:
+                on_delta(cached)
+            return cached
+
+        params = {k: v for k, v in {"temperature": temperature, "top_p": top_p}.items() if v is not None}
+        content, reported = await self._create(model, messages, config or self.config_for(step), step, on_delta,
+                                               **params)
+        latency = time.monotonic() - started
+        if reported:
+            usage.record(step, model, estimated, reported["prompt_tokens"], reported["completion_tokens"], latency,
+                         cached_tokens=reported.get("cached_tokens", 0), route=route)
+        else:
+            completion_tokens = await asyncio.to_thread(usage.count_tokens, content, model)
+            usage.record(step, model, estimated, estimated, completion_tokens, latency, estimated=True, route=route)
+        if self.cache.enabled:
+            await asyncio.to_thread(self._store, key, content, accept)
+        return content
+
+    def _cached(self, key: str, accept) -> Optional[str]:
+        cached = self.cache.get(key)
+        if cached is not None and accept is not None and not accept(cached):
+            self.cache.delete(key)  # 이전에 저장된 형식 오류 응답 → 버리고 다시 호출
+            return None
+        return cached
+
+    def _store(self, key: str, content: str, accept):
+        if accept is None or accept(content):
+            self.cache.put(key, content)
+
+
+# ─────────────────────────────
+_default_client: Optional[AsyncLLMClient] = None
+_default_lock = threading.Lock()
+
+
+def get_async_client() -> AsyncLLMClient:
+    """
+    프로세스 공용 비동기 LLM 클라이언트 (이벤트 루프 하나에서 사용)
+    """
+    global _default_client
+    with _default_lock:
+        if _default_client is None:
+            _default_client = AsyncLLMClient()
+        return _default_client
@@ -0,0 +1,239 @@
+"""
+llm_cache.py
+───────────────────────────────
+디스크 기반 LLM 응답 캐시 (content-addressed)
+- 키: sha256(model, messages, temperature, top_p, 프롬프트 템플릿 버전)
+- 저장소: SQLite (WAL) → 여러 프로세스/스레드에서 동시에 안전하게 접근
+- 용량(max_bytes) / 나이(max_age) 기준 LRU 제거 (저장 evict_every 번마다 또는 evict_interval 초가 지나면,
+  매 저장마다 전체 크기를 다시 세지 않음)
+- hit/miss 통계 (프로세스 내 카운터 + DB 누적 카운터)
+
+환경 변수
+- TREELLM_CACHE=0               : 캐시 끄기
+- TREELLM_CACHE_DIR             : 캐시 디렉터리 (기본: .cache)
+- TREELLM_CACHE_MAX_MB          : 최대 용량 MB (기본: 256)
+- TREELLM_CACHE_MAX_AGE_DAYS    : 최대 보관 일수 (기본: 30)
+- TREELLM_CACHE_EVICT_EVERY     : 제거 검사 주기 (저장 횟수, 기본: 100)
+- TREELLM_CACHE_EVICT_SECONDS   : 제거 검사 주기 (초, 기본: 300)
+"""
+
+from __future__ import annotations
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+
+
+def template_version(template: str) -> str:
+    """
+    프롬프트 템플릿 버전 해시 (템플릿이 바뀌면 캐시 키도 바뀜)
+    """
+    return hashlib.sha256(template.encode("utf-8")).hexdigest()[:12]
+
+
+class ResponseCache:
+    def __init__(
+        self,
+        path: str | Path | None = None,
+        max_bytes: int | None = None,
+        max_age: float | None = None,
+        enabled: bool | None = None,
+        evict_every: int | None = None,
+        evict_interval: float | None = None,
+    ):
+        cache_dir = Path(os.getenv("TREELLM_CACHE_DIR", ".cache"))
+        self.path = Path(path) if path else cache_dir / "llm_cache.sqlite3"
+        self.max_bytes = max_bytes if max_bytes is not None else int(
+            float(os.getenv("TREELLM_CACHE_MAX_MB", "256")) * 1024 * 1024
+        )
+        self.max_age = max_age if max_age is not None else (
+            float(os.getenv("TREELLM_CACHE_MAX_AGE_DAYS", "30")) * 86400
+        )
+        self.enabled = enabled if enabled is not None else os.getenv("TREELLM_CACHE", "1") != "0"
+        self.evict_every = max(1, evict_every if evict_every is not None else int(
+            os.getenv("TREELLM_CACHE_EVICT_EVERY", "100")))
+        self.evict_interval = evict_interval if evict_interval is not None else float(
+            os.getenv("TREELLM_CACHE_EVICT_SECONDS", "300"))
+
+        self.hits = 0
+        self.misses = 0
+        self._puts = 0
+        self._evicted = time.monotonic()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+        if self.enabled:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with self._conn() as conn:
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS entries ("
+                    " key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL,"
+                    " created REAL NOT NULL, accessed REAL NOT NULL)"
+                )
+                conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries(accessed)")
+                conn.execute("CREATE TABLE IF NOT EXISTS stats (name TEXT PRIMARY KEY, count INTEGER NOT NULL)")
+
+    # ─────────────────────────────
+    def _conn(self) -> sqlite3.Connection:
+        """
+        스레드마다 별도 연결 (sqlite3 연결은 스레드 간 공유 불가)
+        """
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def make_key(
+        model: str,
+        messages: List[Dict[str, str]],
+        temperature: Optional[float] = None,
+        top_p: Optional[float] = None,
+        version: str = "",
+    ) -> str:
+        payload = json.dumps(
+            {"model": model, "messages": messages, "temperature": temperature,
+             "top_p": top_p, "version": version},
+            ensure_ascii=False, sort_keys=True,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    # ─────────────────────────────
+    def _count(self, conn: sqlite3.Connection, name: str):
+        conn.execute(
+            "INSERT INTO stats(name, count) VALUES (?, 1) "
+            "ON CONFLICT(name) DO UPDATE SET count = count + 1",
+            (name,),
+        )
+
+    def get(self, key: str) -> Optional[str]:
+        if not self.enabled:
+            return None
+        now = time.time()
+        conn = self._conn()
+        row = conn.execute(
+            "SELECT value FROM entries WHERE key = ? AND created >= ?",
+            (key, now - self.max_age),
+        ).fetchone()
+        if row is None:
+            with self._lock:
+                self.misses += 1
+            self._count(conn, "misses")
+            return None
+        conn.execute("UPDATE entries SET accessed = ? WHERE key = ?", (now, key))
+        with self._lock:
+            self.hits += 1
+        self._count(conn, "hits")
+        return row[0]
+
+    def put(self, key: str, value: str):
+        if not self.enabled:
+            return
+        now = time.time()
+        conn = self._conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO entries(key, value, size, created, accessed) VALUES (?, ?, ?, ?, ?)",
+            (key, value, len(value.encode("utf-8")), now, now),
+        )
+        with self._lock:
+            self._puts += 1
+            due = self._puts % self.evict_every == 0 or time.monotonic() - self._evicted >= self.evict_interval
+            if due:
+                self._evicted = time.monotonic()
+        if due:
+            self.evict()
+
+    def delete(self, key: str):
+        if self.enabled:
+            self._conn().execute("DELETE FROM entries WHERE key = ?", (key,))
+
+    def get_or_call(self, key: str, fn: Callable[[], str]) -> str:
+        """
+        캐시에 있으면 반환, 없으면 fn() 호출 후 저장
+        """
+        cached = self.get(key)
+        if cached is not None:
+            return cached
+        value = fn()
+        self.put(key, value)
+        return value
+
+    # ─────────────────────────────
+    def evict(self):
+        """
+        오래된 항목 삭제 후, 용량 초과 시 가장 오래 안 쓰인 항목부터 삭제 (LRU)
+        """
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM entries WHERE created < ?", (time.time() - self.max_age,))
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+            if total > self.max_bytes:
+                for key, size in conn.execute("SELECT key, size FROM entries ORDER BY accessed").fetchall():
+                    conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                    total -= size
+                    if total <= self.max_bytes:
+                        break
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def clear(self):
+        if self.enabled:
+            conn = self._conn()
+            conn.execute("DELETE FROM entries")
+            conn.execute("DELETE FROM stats")
+
+    def stats(self) -> Dict[str, int]:
+        """
+        hits/misses     : 이 프로세스에서의 통계
+        total_*         : DB 에 누적된 통계 (모든 프로세스)
+        """
+        result = {"hits": self.hits, "misses": self.misses}
+        if self.enabled:
+            conn = self._conn()
+            totals = dict(conn.execute("SELECT name, count FROM stats").fetchall())
+            entries, size = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+            result.update({
+                "total_hits": totals.get("hits", 0),
+                "total_misses": totals.get("misses", 0),
+                "entries": entries,
+                "bytes": size,
+            })
+        return result
+
+
+# ─────────────────────────────
+_default_cache: Optional[ResponseCache] = None
+_default_lock = threading.Lock()
+
+
+def get_cache() -> ResponseCache:
+    """
+    프로세스 공용 캐시 인스턴스
+    """
+    global _default_cache
+    with _default_lock:
+        if _default_cache is None:
+            _default_cache = ResponseCache()
+        return _default_cache
+
+
+# ─────────────────────────────
+if __name__ == "__main__":
+    # python -m module.llm_cache [stats|clear]
+    cache = get_cache()
+    if len(sys.argv) > 1 and sys.argv[1] == "clear":
+        cache.clear()
+        print(f"[llm_cache] ✅ 캐시 삭제 완료 → {cache.path}")
+    else:
+        print(json.dumps(cache.stats(), indent=2))
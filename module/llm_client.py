@@ -0,0 +1,400 @@
+"""
+llm_client.py
+───────────────────────────────
+모든 단계가 공유하는 LLM 호출 계층
+- 프로세스당 OpenAI 클라이언트 1개 (HTTP 연결 풀 재사용)
+- 호출별 timeout, 재시도 가능한 오류(429/5xx/timeout/연결 오류)는
+  지수 백오프 + jitter 로 재시도
+- 단계(step)별 설정 (configure) + 재시도/실패 카운트 (stats)
+- 응답 캐시(llm_cache)도 여기서 처리
+- on_delta 를 주면 stream=True 로 호출해 토큰 조각을 바로 전달
+- 프로세스 전체 동시 호출 수 / 분당 요청 수 제한 (set_limits, 여러 논문이 공유)
+- 호출마다 토큰(추정/실제), 지연 시간, 모델, 단계를 usage 에 기록 + tracing span("llm")
+- 배치 모드(use_batch): API 를 직접 부르지 않고 요청을 JSONL 로 기록, 결과 파일에서 응답을 읽음
+- 모델 라우팅(module/routing.py): 단계/노드별 모델 + fallback (느림/429/실패 시 자동 전환, 결정은 usage 에 기록)
+
+환경 변수
+- TREELLM_LLM_BACKEND         : openai (기본) / fake (module/fake_llm.py, API 키·네트워크 불필요)
+- TREELLM_LLM_MAX_CONCURRENCY : 동시 API 호출 수 상한 (기본: 0 = 제한 없음)
+- TREELLM_LLM_RPM             : 분당 API 호출 수 상한 (기본: 0 = 제한 없음)
+- TREELLM_ROUTES              : 라우팅 설정 (module/routing.py 참고, 기본: 없음)
+"""
+
+from __future__ import annotations
+from dataclasses import dataclass, replace
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import os
+import random
+import threading
+import time
+
+import openai
+from openai import OpenAI
+
+from .batch_io import BatchIO, BatchPending
+from .dag import current_node
+from .llm_cache import ResponseCache, get_cache
+from .routing import Route, Router
+from . import tracing, usage
+
+RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.InternalServerError,
+)
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+# on_delta(delta, reset=False): reset=True 면 지금까지 받은 조각을 버리라는 뜻 (재시도 시작)
+DeltaCallback = Callable[..., None]
+
+# (응답 텍스트, usage) — usage 는 {"prompt_tokens", "completion_tokens"} 또는 None
+Reply = Tuple[str, Optional[Dict[str, int]]]
+
+
+@dataclass
+class CallConfig:
+    """
+    timeout      : 호출 1회 제한 시간(초)
+    max_retries  : 재시도 횟수 (총 시도 = max_retries + 1)
+    backoff_base : 첫 재시도 대기 상한(초), 이후 2배씩 증가
+    backoff_max  : 대기 상한(초)
+    """
+    timeout: float = 120.0
+    max_retries: int = 4
+    backoff_base: float = 1.0
+    backoff_max: float = 30.0
+
+
+# 단계별 기본 설정 (전체 논문을 다시 쓰는 EditPass2 는 더 길게 기다림)
+DEFAULT_STEP_CONFIGS: Dict[str, CallConfig] = {
+    "edit2": CallConfig(timeout=300.0),
+    "global_check": CallConfig(timeout=180.0),
+}
+
+
+def is_retryable(exc: Exception) -> bool:
+    if isinstance(exc, RETRYABLE_ERRORS):
+        return True
+    return isinstance(exc, openai.APIStatusError) and exc.status_code in RETRYABLE_STATUS
+
+
+def _usage_of(response: Any) -> Optional[Dict[str, int]]:
+    reported = getattr(response, "usage", None)
+    if reported is None:
+        return None
+    details = getattr(reported, "prompt_tokens_details", None)
+    return {
+        "prompt_tokens": reported.prompt_tokens,
+        "completion_tokens": reported.completion_tokens,
+        "cached_tokens": getattr(details, "cached_tokens", 0) or 0,  # 공급자 측 prompt prefix 캐시 적중분
+    }
+
+
+class RateLimiter:
+    """
+    분당 rpm 회로 호출 간격을 고르게 맞춤 (스레드 안전, 호출 시점 예약 후 대기)
+    """
+
+    def __init__(self, rpm: float):
+        self.interval = 60.0 / rpm
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next)
+            self._next = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class LLMClient:
+    def __init__(self, cache: Optional[ResponseCache] = None, backend: Optional[str] = None):
+        """
+        backend: "openai" / "fake" (기본: TREELLM_LLM_BACKEND 또는 openai)
+        """
+        self.backend = backend or os.getenv("TREELLM_LLM_BACKEND", "openai")
+        if self.backend == "openai" and not os.getenv("OPENAI_API_KEY"):
+            raise EnvironmentError(
+                "OPENAI_API_KEY 환경 변수가 설정되지 않았습니다. "
+                "export OPENAI_API_KEY='sk-...' 로 설정하세요."
+            )
+        if self.backend not in ("openai", "fake"):
+            raise ValueError(f"알 수 없는 LLM 백엔드: {self.backend} (openai / fake)")
+        self.client = self._make_client()
+        self.cache = cache or get_cache()
+        self.default_config = CallConfig()
+        self.step_configs: Dict[str, CallConfig] = dict(DEFAULT_STEP_CONFIGS)
+        self._stats: Dict[str, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+        self._semaphore: Optional[threading.Semaphore] = None
+        self._rate: Optional[RateLimiter] = None
+        self.batch: Optional[BatchIO] = None
+        self.router: Optional[Router] = Router.from_env()
+        self.set_limits(
+            int(os.getenv("TREELLM_LLM_MAX_CONCURRENCY", "0")),
+            float(os.getenv("TREELLM_LLM_RPM", "0")),
+        )
+
+    def _make_client(self):
+        if self.backend == "fake":
+            from .fake_llm import FakeOpenAI
+            return FakeOpenAI()
+        # 재시도는 여기서 직접 처리하므로 SDK 자체 재시도는 끔
+        return OpenAI(max_retries=0)
+
+    # ─────────────────────────────
+    def set_limits(self, max_concurrency: int = 0, rpm: float = 0):
+        """
+        프로세스 전체 호출 예산 (0 이면 제한 없음)
+        - max_concurrency : 동시에 진행 중인 API 호출 수
+        - rpm             : 분당 API 호출 수 (재시도 포함)
+        """
+        self._semaphore = threading.Semaphore(max_concurrency) if max_concurrency > 0 else None
+        self._rate = RateLimiter(rpm) if rpm > 0 else None
+
+    def use_batch(self, batch: Optional[BatchIO]):
+        """
+        배치 모드 켜기/끄기: 캐시에 없는 요청은 batch 결과에서 찾고, 없으면 기록 후 BatchPending
+        """
+        self.batch = batch
+
+    def set_router(self, router: Optional[Router]):
+        """
+        라우팅 표 교체 (None 이면 라우팅 끔 → 단계가 넘긴 모델 그대로)
+        """
+        self.router = router
+
+    def configure(self, step: str, **kwargs) -> CallConfig:
+        """
+        단계별 설정 변경 (예: configure("build", timeout=60, max_retries=2))
+        """
+        with self._lock:
+            config = replace(self.config_for(step), **kwargs)
+            self.step_configs[step] = config
+        return config
+
+    def config_for(self, step: str) -> CallConfig:
+        return self.step_configs.get(step, self.default_config)
+
+    def _count(self, step: str, name: str, n: int = 1):
+        with self._lock:
+            counters = self._stats.setdefault(
+                step, {"calls": 0, "cache_hits": 0, "retries": 0, "failures": 0, "batch_pending": 0, "fallbacks": 0}
+            )
+            counters[name] += n
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        with self._lock:
+            return {step: dict(c) for step, c in self._stats.items()}
+
+    # ─────────────────────────────
+    def _backoff(self, config: CallConfig, attempt: int, exc: Exception) -> float:
+        """
+        full jitter: [0, min(max, base * 2^attempt)] 균등 분포
+        서버가 Retry-After 를 주면 그 값을 하한으로 사용
+        """
+        delay = random.uniform(0, min(config.backoff_max, config.backoff_base * (2 ** attempt)))
+        response = getattr(exc, "response", None)
+        retry_after = response.headers.get("retry-after") if response is not None else None
+        try:
+            delay = max(delay, float(retry_after)) if retry_after else delay
+        except ValueError:
+            pass
+        return min(delay, config.backoff_max)
+
+    def _stream(self, model: str, messages: List[Dict[str, str]], config: CallConfig,
+                on_delta: DeltaCallback, **params) -> Reply:
+        """
+        stream=True 호출 → 조각마다 on_delta 호출, (전체 텍스트, usage) 반환
+        usage 는 include_usage 로 요청한 마지막 조각에서 읽음
+        """
+        parts: List[str] = []
+        reported = None
+        stream = self.client.chat.completions.create(
+            model=model,
+            messages=messages,
+            timeout=config.timeout,
+            stream=True,
+            stream_options={"include_usage": True},
+            **params,
+        )
+        for chunk in stream:
+            reported = _usage_of(chunk) or reported
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                parts.append(delta)
+                on_delta(delta)
+        return "".join(parts).strip(), reported
+
+    def _call(self, model: str, messages: List[Dict[str, str]], config: CallConfig,
+              on_delta: Optional[DeltaCallback], **params) -> Reply:
+        """
+        API 호출 1회 (동시 호출 수 / 분당 호출 수 제한 적용)
+        """
+        if self._rate is not None:
+            self._rate.acquire()
+        if self._semaphore is not None:
+            self._semaphore.acquire()
+        try:
+            if on_delta is not None:
+                return self._stream(model, messages, config, on_delta, **params)
+            response = self.client.chat.completions.create(
+                model=model,
+                messages=messages,
+                timeout=config.timeout,
+                **params,
+            )
+            return response.choices[0].message.content.strip(), _usage_of(response)
+        finally:
+            if self._semaphore is not None:
+                self._semaphore.release()
+
+    def _create(self, model: str, messages: List[Dict[str, str]], config: CallConfig, step: str,
+                on_delta: Optional[DeltaCallback] = None, **params) -> Reply:
+        attempt = 0
+        while True:
+            try:
+                if on_delta is not None and attempt:
+                    on_delta("", reset=True)
+                return self._call(model, messages, config, on_delta, **params)
+            except Exception as exc:
+                if not is_retryable(exc) or attempt >= config.max_retries:
+                    self._count(step, "failures")
+                    raise
+                delay = self._backoff(config, attempt, exc)
+                attempt += 1
+                self._count(step, "retries")
+                sp = tracing.current_span.get()
+                if sp is not None:
+                    sp.attrs["retries"] = attempt
+                print(f"[LLMClient] ⚠ {step} 재시도 {attempt}/{config.max_retries} "
+                      f"({type(exc).__name__}, {delay:.1f}s 후)")
+                time.sleep(delay)
+
+    def complete(
+        self,
+        messages: List[Dict[str, str]],
+        model: str = "gpt-4o",
+        temperature: Optional[float] = None,
+        top_p: Optional[float] = None,
+        step: str = "default",
+        version: str = "",
+        on_delta: Optional[DeltaCallback] = None,
+        accept: Optional[Callable[[str], bool]] = None,
+    ) -> str:
+        """
+        chat completion → 응답 텍스트 (캐시 → 재시도 포함 API 호출 → 캐시 저장)
+        on_delta: 주어지면 토큰 조각 단위로 전달 (캐시 적중 시 전체를 한 번에 전달)
+        배치 모드에서 결과가 아직 없으면 요청을 기록하고 BatchPending 발생
+        라우팅 표에 이 노드/단계가 있으면 model 대신 Route 의 모델을 쓰고, 실패하면 fallback 으로 다시 호출
+        accept: 응답 검사 (예: structured 의 형식 검사) → False 인 응답은 캐시에 저장하지 않고,
+                캐시에 있던 응답이 False 면 지우고 다시 호출
+        """
+        route = self.router.resolve(step, current_node.get(), model) if self.router is not None else None
+        if route is not None:
+            return self._complete_routed(route, messages, temperature, top_p, step, version, on_delta, accept)
+        with tracing.span("llm", step=step, model=model, prompt_version=version):
+            return self._complete(messages, model, temperature, top_p, step, version, on_delta, accept=accept)
+
+    def _complete_routed(self, route: Route, messages, temperature, top_p, step, version, on_delta,
+                                accept=None) -> str:
+        """
+        primary: Route 의 timeout / retries 로 짧게 시도 → 실패하면 같은 요청을 fallback 으로 (단계 설정 그대로)
+        primary 가 cooldown 중이면 처음부터 fallback
+        """
+        config = self.config_for(step)
+        candidates = self.router.candidates(route)
+        for i, (model, decision) in enumerate(candidates):
+            last = i == len(candidates) - 1
+            call_config = config if last else replace(
+                config, timeout=route.timeout or config.timeout, max_retries=min(route.retries, config.max_retries)
+            )
+            started = time.monotonic()
+            try:
+                with tracing.span("llm", step=step, model=model, prompt_version=version, route=decision):
+                    content = self._complete(messages, model, temperature, top_p, step, version, on_delta,
+                                             config=call_config, route=decision, accept=accept)
+            except BatchPending:
+                raise
+            except Exception as exc:
+                reason = self.router.observe(route, model, error=exc)
+                if last:
+                    raise
+                self._count(step, "fallbacks")
+                fallback = candidates[i + 1][0]
+                candidates[i + 1] = (fallback, f"fallback:{reason or 'error'}")
+                print(f"[LLMClient] ⚠ {step}: {model} 실패 ({type(exc).__name__}) → {fallback} 로 전환")
+                if on_delta is not None:
+                    on_delta("", reset=True)
+                continue
+            if self.router.observe(route, model, latency=time.monotonic() - started) == "slow":
+                print(f"[LLMClient] ⚠ {step}: {model} 지연 {time.monotonic() - started:.1f}s "
+                      f"→ {route.cooldown:.0f}s 동안 {route.fallback} 사용")
+            return content
+        raise RuntimeError("unreachable")
+
+    def _complete(self, messages, model, temperature, top_p, step, version, on_delta,
+                  config: Optional[CallConfig] = None, route: str = "", accept=None) -> str:
+        self._count(step, "calls")
+        estimated = usage.estimate_tokens(messages, model)
+        started = time.monotonic()
+        key = self.cache.make_key(model, messages, temperature, top_p, version)
+        cached = self.cache.get(key)
+        if cached is not None and accept is not None and not accept(cached):
+            self.cache.delete(key)  # 이전에 저장된 형식 오류 응답 → 버리고 다시 호출
+            cached = None
+        if cached is not None:
+            self._count(step, "cache_hits")
+            usage.record(step, model, estimated, estimated, usage.count_tokens(cached, model),
+                         time.monotonic() - started, source="cache", estimated=True, route=route)
+            if on_delta is not None:
+                on_delta(cached)
+            return cached
+
+        params = {k: v for k, v in {"temperature": temperature, "top_p": top_p}.items() if v is not None}
+        if self.batch is not None:
+            content = self.batch.result_for(key)
+            if content is None:
+                self._count(step, "batch_pending")
+                self.batch.record(key, {"model": model, "messages": messages, **params})
+                raise BatchPending(key)
+            if accept is None or accept(content):
+                self.cache.put(key, content)
+            usage.record(step, model, estimated, estimated, usage.count_tokens(content, model),
+                         time.monotonic() - started, source="batch", estimated=True, route=route)
+            if on_delta is not None:
+                on_delta(content)
+            return content
+
+        content, reported = self._create(model, messages, config or self.config_for(step), step, on_delta, **params)
+        latency = time.monotonic() - started
+        if reported:
+            usage.record(step, model, estimated, reported["prompt_tokens"], reported["completion_tokens"], latency,
+                         cached_tokens=reported.get("cached_tokens", 0), route=route)
+        else:
+            usage.record(step, model, estimated, estimated, usage.count_tokens(content, model), latency,
+                         estimated=True, route=route)
+        if accept is None or accept(content):
+            self.cache.put(key, content)
+        return content
+
+
+# ─────────────────────────────
+_default_client: Optional[LLMClient] = None
+_default_lock = threading.Lock()
+
+
+def get_client() -> LLMClient:
+    """
+    프로세스 공용 LLM 클라이언트
+    """
+    global _default_client
+    with _default_lock:
+        if _default_client is None:
+            _default_client = LLMClient()
+        return _default_client
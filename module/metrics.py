@@ -0,0 +1,242 @@
+"""
+metrics.py
+───────────────────────────────
+Prometheus 텍스트 형식 지표 (외부 라이브러리 없이 최소 구현)
+- Counter / Gauge / Histogram + 라벨
+- 끝난 span(tracing)을 받아 단계/LLM 지연 시간, 토큰, 오류 수를 갱신
+- render() → /metrics 응답 본문 (text/plain; version=0.0.4)
+- 지표는 프로세스별: 워커 프로세스는 snapshot() 을 작업 DB 에 주기적으로 올리고 (jobs.py),
+  /metrics 는 render(snapshots) 로 자기 지표와 합산 (serve() 로 워커별로 따로 노출할 수도 있음)
+"""
+
+from __future__ import annotations
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Iterable, List, Sequence, Tuple
+import threading
+import time
+
+from . import tracing
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300)
+
+LabelKey = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _key(self, labels: Dict[str, str]) -> LabelKey:
+        return tuple(str(labels.get(n, "")) for n in self.label_names)
+
+    def render(self, others: Iterable[Dict[str, Any]] = ()) -> List[str]:
+        """
+        others: 다른 프로세스의 snapshot() → 라벨별로 합산해서 출력
+        """
+        with self._lock:
+            values = {k: list(v) if isinstance(v, list) else v for k, v in self._values.items()}
+        for snap in others:
+            for key, value in snap.get(self.name, ()):
+                self._add(values, tuple(key), value)
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"] + self._samples(values)
+
+    def snapshot(self) -> List[list]:
+        with self._lock:
+            return [[list(k), v] for k, v in self._values.items()]
+
+    @staticmethod
+    def _add(values: dict, key: LabelKey, value):
+        raise NotImplementedError
+
+    def _samples(self, values: dict) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()):
+        super().__init__(name, help_text, labels)
+        self._values: Dict[LabelKey, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    @staticmethod
+    def _add(values: dict, key: LabelKey, value: float):
+        values[key] = values.get(key, 0) + value
+
+    def _samples(self, values: dict) -> List[str]:
+        return [f"{self.name}{_labels(self.label_names, k)} {v}" for k, v in sorted(values.items())]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = (), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+        self._values: Dict[LabelKey, list] = {}  # [버킷별 개수..., 합, 전체 개수]
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            data = self._values.setdefault(key, [0] * len(self.buckets) + [0.0, 0])
+            i = bisect_left(self.buckets, value)
+            if i < len(self.buckets):
+                data[i] += 1
+            data[-2] += value
+            data[-1] += 1
+
+    @staticmethod
+    def _add(values: dict, key: LabelKey, value: list):
+        data = values.get(key)
+        values[key] = list(value) if data is None else [a + b for a, b in zip(data, value)]
+
+    def _samples(self, values: dict) -> List[str]:
+        lines = []
+        for key, data in sorted(values.items()):
+            cumulative = 0
+            for bound, n in zip(self.buckets, data):
+                cumulative += n
+                le = _labels(self.label_names, key, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            le = _labels(self.label_names, key, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{le} {data[-1]}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, key)} {round(data[-2], 6)}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, key)} {data[-1]}")
+        return lines
+
+
+REGISTRY: List[_Metric] = []
+
+# ─────────────────────────────
+STEP_SECONDS = Histogram("treellm_step_duration_seconds", "파이프라인 노드 실행 시간 (단계별)", ["step"])
+LLM_SECONDS = Histogram("treellm_llm_call_duration_seconds", "LLM 호출 시간 (재시도 포함)", ["step", "source"])
+LLM_TOKENS = Counter("treellm_llm_tokens_total", "LLM 토큰 수", ["step", "type"])
+RUN_SECONDS = Histogram("treellm_run_duration_seconds", "파이프라인 실행 전체 시간", [],
+                        buckets=(10, 30, 60, 120, 300, 600, 1200, 1800, 3600))
+RUNS_IN_FLIGHT = Gauge("treellm_runs_in_flight", "실행 중인 파이프라인 수")
+RUNS_TOTAL = Counter("treellm_runs_total", "끝난 파이프라인 실행 수", ["status"])
+ERRORS = Counter("treellm_errors_total", "오류 수 (run/node/llm/sse)", ["kind", "step"])
+SSE_EVENTS = Counter("treellm_sse_events_total", "전송한 SSE 이벤트 수", ["endpoint"])
+JOBS = Gauge("treellm_jobs", "상태별 작업 수 (queued = 큐 깊이)", ["status"])
+STRUCTURED = Counter("treellm_structured_outputs_total", "구조화 출력 처리 결과 (ok/repaired/reask/failed)",
+                     ["step", "outcome"])
+FALLBACKS = Counter("treellm_structured_fallbacks_total",
+                    "재요청까지 실패한 구조화 출력을 버리거나 대체한 횟수 (dropped/empty/local_merge/original)",
+                    ["step", "action"])
+RUNS_IN_FLIGHT.set(0)
+_GAUGES = {metric.name for metric in REGISTRY if isinstance(metric, Gauge)}
+
+
+def _step_of(sp: tracing.Span) -> str:
+    return str(sp.attrs.get("step", ""))
+
+
+def observe_span(sp: tracing.Span):
+    """
+    끝난 span → 지표 갱신 (tracing 리스너)
+    """
+    if sp.name == "node":
+        if not sp.attrs.get("join"):
+            STEP_SECONDS.observe(sp.duration, step=_step_of(sp))
+    elif sp.name == "llm":
+        LLM_SECONDS.observe(sp.duration, step=_step_of(sp), source=sp.attrs.get("source", "api"))
+        for kind in ("prompt_tokens", "completion_tokens", "cached_tokens"):
+            if sp.attrs.get(kind) and sp.attrs.get("source") != "cache":
+                LLM_TOKENS.inc(sp.attrs[kind], step=_step_of(sp), type=kind.split("_")[0])
+    elif sp.name == "run":
+        RUN_SECONDS.observe(sp.duration)
+        RUNS_TOTAL.inc(status="failed" if sp.error else "done")
+    elif sp.name == "structured":
+        STRUCTURED.inc(step=_step_of(sp), outcome=sp.attrs.get("outcome", "failed"))
+    elif sp.name == "structured.fallback":
+        FALLBACKS.inc(step=_step_of(sp), action=sp.attrs.get("action", ""))
+    elif sp.name == "sse.emit":
+        SSE_EVENTS.inc(endpoint=sp.attrs.get("endpoint", ""))
+    if sp.error:
+        ERRORS.inc(kind=sp.name, step=_step_of(sp))
+
+
+tracing.add_listener(observe_span)
+
+
+def snapshot() -> Dict[str, List[list]]:
+    """
+    이 프로세스의 지표 값 (JSON 직렬화 가능) → 다른 프로세스의 render(snapshots) 가 합산
+    """
+    return {metric.name: metric.snapshot() for metric in REGISTRY}
+
+
+def render(snapshots: Iterable[Tuple[float, Dict[str, List[list]]]] = (), stale: float = 60.0) -> str:
+    """
+    snapshots: 다른 프로세스(워커)의 (올린 시각, snapshot()) → 이 프로세스의 지표와 합산
+    stale 초 넘게 새로 올리지 않은 (죽은) 프로세스는 counter/histogram 만 합산 (gauge 는 현재 값이 아니므로 제외)
+    """
+    now = time.time()
+    others = [snap if now - updated <= stale else {n: v for n, v in snap.items() if n not in _GAUGES}
+              for updated, snap in snapshots]
+    return "\n".join(line for metric in REGISTRY for line in metric.render(others)) + "\n"
+
+
+# ─────────────────────────────
+def serve(port: int, host: str = "0.0.0.0") -> ThreadingHTTPServer:
+    """
+    /metrics 만 응답하는 작은 HTTP 서버 (Flask 가 없는 워커 프로세스용, 백그라운드 스레드)
+    """
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -0,0 +1,333 @@
+"""
+planner.py
+───────────────────────────────
+실행 계획: LLM 을 부르기 전에 split 결과만 보고 꼭 필요한 호출만 고름
+- build  : fill 프롬프트 중 split 이 지원하는 섹션 + 내용이 있는 섹션만 (experiment 등은 제외)
+- audit  : section_map 대상 섹션이 하나도 없는 기준은 제외
+- edit1  : 내용이 있는 섹션만 (빈 섹션은 모델을 부르지 않음)
+- 제외한 호출은 이유와 함께 skipped 에 남김
+- 호출마다 프롬프트 토큰(템플릿을 실제로 채워서 계산) / 출력 토큰 / 지연 시간 추정
+  출력 토큰·지연 시간은 실행 이력(runs/usage_history.jsonl)의 단계별 호출당 평균, 이력이 없으면 기본값
+- 단계 경과 시간은 max_workers 만큼 병렬로 돈다고 보고 계산 (단계 사이는 순서대로 더함 → 보수적인 값)
+- 입력이 chunking 예산을 넘는 audit / global_check / edit2 는 조각 수만큼 호출로 계산
+
+사용법
+    python -m module.planner sample/example.txt          # 계획 + 예상 토큰/시간
+    python Orchestrator.py sample/example.txt --dry-run  # 같은 출력 (LLM 호출 없음)
+"""
+
+from __future__ import annotations
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+import argparse
+import json
+
+from .audit import SECTION_MAP
+from .build import BuildStep
+from .chunking import chunk_tokens, edit_chunk_tokens
+from .prompts import get_registry
+from .split import SECTION_ORDER, VALID_SECTIONS, run as split_run, split_paragraphs
+from .tree_reduce import MIN_CHARS, chunk_paragraphs
+from .usage import count_tokens, load_history
+
+# 단계 순서 (Orchestrator STEPS 와 같음, LLM 을 부르는 단계만)
+PLAN_STEPS = ("build", "audit", "edit1", "global_check", "edit2")
+
+# 이력이 없을 때 호출당 출력 토큰
+DEFAULT_COMPLETION = {"build": 600, "audit": 700, "edit1": 900, "global_check": 800, "edit2": 3000}
+# 이력이 없을 때 지연 시간 = 기본 지연 + 입력 / PROMPT_TPS + 출력 / OUTPUT_TPS
+BASE_LATENCY = 0.5
+PROMPT_TPS = 5000
+OUTPUT_TPS = 60
+
+HISTORY_RUNS = 20  # 평균에 쓰는 최근 실행 수
+
+
+@dataclass
+class PlannedCall:
+    """
+    노드 하나의 예상 호출
+    calls : 노드가 부를 LLM 호출 수 (map_reduce 는 문단 묶음 수, 병합 호출은 제외)
+    """
+    step: str
+    node: str
+    prompt_tokens: int
+    completion_tokens: int
+    latency: float
+    calls: int = 1
+
+
+@dataclass
+class Plan:
+    """
+    sections : 내용이 있는 섹션 (SECTION_ORDER 순서)
+    calls    : 실행할 노드 (단계 순서)
+    skipped  : [(노드, 이유)] — 만들지 않는 노드
+    source   : 출력 토큰/지연 시간 추정 근거 (history:<실행 수> / default)
+    """
+    sections: List[str]
+    calls: List[PlannedCall] = field(default_factory=list)
+    skipped: List[Tuple[str, str]] = field(default_factory=list)
+    max_workers: int = 7
+    source: str = "default"
+
+    def nodes(self, step: str) -> List[str]:
+        return [c.node for c in self.calls if c.step == step]
+
+    def names(self, step: str) -> List[str]:
+        """
+        단계 노드 이름에서 "<step>:" 를 뗀 목록 (pid / 기준 / 섹션)
+        """
+        return [node.split(":", 1)[1] for node in self.nodes(step)]
+
+    def by_step(self) -> Dict[str, Dict[str, Any]]:
+        """
+        단계별 합계 (wall: 병렬 실행 기준 예상 경과 시간)
+        """
+        out: Dict[str, Dict[str, Any]] = {}
+        for step in PLAN_STEPS:
+            calls = [c for c in self.calls if c.step == step]
+            latency = sum(c.latency for c in calls)
+            lanes = min(self.max_workers, len(calls)) or 1
+            out[step] = {
+                "nodes": len(calls),
+                "calls": sum(c.calls for c in calls),
+                "prompt_tokens": sum(c.prompt_tokens for c in calls),
+                "completion_tokens": sum(c.completion_tokens for c in calls),
+                "latency": round(latency, 1),
+                "wall": round(max([c.latency for c in calls] + [latency / lanes]), 1),
+            }
+        return out
+
+    def total(self) -> Dict[str, Any]:
+        steps = self.by_step().values()
+        return {key: round(sum(s[key] for s in steps), 1) if key in ("latency", "wall") else sum(s[key] for s in steps)
+                for key in ("nodes", "calls", "prompt_tokens", "completion_tokens", "latency", "wall")}
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "sections": self.sections,
+            "source": self.source,
+            "by_step": self.by_step(),
+            "total": self.total(),
+            "calls": [asdict(c) for c in self.calls],
+            "skipped": [{"node": node, "reason": reason} for node, reason in self.skipped],
+        }
+
+    def format(self) -> str:
+        lines = [f"섹션: {', '.join(self.sections) or '(없음)'}  (추정 근거: {self.source})", ""]
+        lines.append(f"{'step':<14} {'nodes':>5} {'calls':>5} {'in':>8} {'out':>7} {'sum(s)':>8} {'wall(s)':>8}")
+        rows = list(self.by_step().items()) + [("TOTAL", self.total())]
+        for name, s in rows:
+            lines.append(f"{name:<14} {s['nodes']:>5} {s['calls']:>5} {s['prompt_tokens']:>8} "
+                         f"{s['completion_tokens']:>7} {s['latency']:>8.1f} {s['wall']:>8.1f}")
+        if self.skipped:
+            lines.append("")
+            lines.append(f"건너뜀 {len(self.skipped)}개:")
+            lines += [f"  - {node}: {reason}" for node, reason in self.skipped]
+        return "\n".join(lines)
+
+
+# ─────────────────────────────
+def history_rates(root: Optional[str | Path] = None, last: int = HISTORY_RUNS) -> Tuple[Dict[str, Tuple[float, float]], int]:
+    """
+    실행 이력 → ({step: (호출당 출력 토큰, 호출당 지연 시간)}, 사용한 실행 수)
+    캐시 적중 호출은 지연 시간 평균에서 뺌
+    """
+    from .workspace import runs_root
+
+    entries = [e for e in load_history(root or runs_root())[-last:] if e.get("by_step")]
+    totals: Dict[str, List[float]] = {}  # step → [호출 수, 출력 토큰, 지연 시간, API 호출 수]
+    for entry in entries:
+        for step, u in entry["by_step"].items():
+            t = totals.setdefault(step, [0, 0, 0.0, 0])
+            t[0] += u.get("calls", 0)
+            t[1] += u.get("completion_tokens", 0)
+            t[2] += u.get("latency", 0.0)
+            t[3] += u.get("calls", 0) - u.get("cache_hits", 0)
+    rates: Dict[str, Tuple[float, float]] = {}
+    for step, (calls, completion, latency, api) in totals.items():
+        if calls and api:
+            rates[step] = (completion / calls, latency / api)
+    return rates, len(entries)
+
+
+class Planner:
+    """
+    Input  : 원문
+    Output : Plan (Orchestrator 가 이 계획에 있는 노드만 그래프에 추가)
+    단계 객체(LLM 클라이언트)를 만들지 않고 프롬프트 레지스트리만 읽음 → API 키 없이도 dry-run 가능
+    """
+
+    def __init__(
+        self,
+        model: str = "gpt-4o",
+        max_workers: int = 7,
+        tree_mode: str = "single",
+        tree_auto_chars: int = 12000,
+        audit_mode: str = "criterion",
+        audit_group: int = 0,
+        edit2_mode: str = "whole",
+        history_root: Optional[str | Path] = None,
+    ):
+        self.model = model
+        self.max_workers = max(1, max_workers)
+        self.tree_mode = tree_mode
+        self.tree_auto_chars = tree_auto_chars
+        self.audit_mode = audit_mode
+        self.audit_group = audit_group
+        self.edit2_mode = edit2_mode
+        self.history_root = history_root
+        self.prompts = get_registry()
+
+    # ─────────────────────────────
+    def _tokens(self, text: str) -> int:
+        return count_tokens(text, self.model) + 7  # estimate_tokens 와 같은 메시지 여유분
+
+    @staticmethod
+    def _pieces(tokens: int, budget: int) -> int:
+        """
+        chunking 예산으로 나눌 때의 조각 수 (겹침은 무시한 근사치)
+        """
+        return max(1, -(-tokens // max(1, budget)))
+
+    def _call(self, plan: Plan, rates: Dict[str, Tuple[float, float]], step: str, node: str,
+              prompt_tokens: int, calls: int = 1, completion: Optional[int] = None) -> PlannedCall:
+        """
+        calls 가 여러 개면 노드 안에서 max_workers 만큼 병렬 → 지연 시간은 호출 묶음(rounds) 수만큼
+        completion: 출력 토큰을 알고 있으면 (예: 섹션별 edit2 ≈ 그 섹션 edit1 출력) 이력 대신 사용
+        """
+        rounds = -(-calls // self.max_workers)
+        if completion is not None:
+            latency = (BASE_LATENCY + prompt_tokens / calls / PROMPT_TPS + completion / calls / OUTPUT_TPS) * rounds
+        elif step in rates:
+            completion = int(rates[step][0] * calls)
+            latency = rates[step][1] * rounds
+        else:
+            completion = DEFAULT_COMPLETION[step] * calls
+            latency = (BASE_LATENCY + prompt_tokens / calls / PROMPT_TPS + DEFAULT_COMPLETION[step] / OUTPUT_TPS) * rounds
+        call = PlannedCall(step, node, prompt_tokens, completion, round(latency, 2), calls)
+        plan.calls.append(call)
+        return call
+
+    # ─────────────────────────────
+    def plan(self, raw_text: str) -> Plan:
+        sections = split_run(raw_text)
+        present = [sec for sec in VALID_SECTIONS if sections[sec].strip()]
+        plan = Plan(present, max_workers=self.max_workers)
+        rates, runs = history_rates(self.history_root)
+        plan.source = f"history:{runs}" if rates else "default"
+
+        # ✅ Build
+        paragraphs: Dict[str, List[str]] = {}
+        if self.tree_mode != "single":
+            for p in split_paragraphs(raw_text):
+                paragraphs.setdefault(p.section, []).append(p.text)
+        tree_tokens: Dict[str, int] = {}  # 섹션 → 예상 트리 토큰 (audit 프롬프트 추정용)
+        for pid, tmpl in self.prompts.group("fill", suffix="_fill_prompt").items():
+            sec = BuildStep.section_of(pid)
+            if sec not in VALID_SECTIONS:
+                plan.skipped.append((f"build:{pid}", f"split 이 만들지 않는 섹션 ({sec})"))
+                continue
+            if sec not in present:
+                plan.skipped.append((f"build:{pid}", "빈 섹션"))
+                continue
+            text = sections[sec]
+            map_reduce = self.tree_mode == "map_reduce" or (
+                self.tree_mode == "auto" and len(text) >= self.tree_auto_chars
+            )
+            if map_reduce and len(paragraphs.get(sec, [])) > 1:
+                chunks = chunk_paragraphs(paragraphs[sec], MIN_CHARS)
+                call = self._call(plan, rates, "build", f"build:{pid}",
+                                  sum(self._tokens(tmpl.render(INPUT=c)) for c in chunks), calls=len(chunks))
+            else:
+                call = self._call(plan, rates, "build", f"build:{pid}", self._tokens(tmpl.render(INPUT=text)))
+            tree_tokens[sec] = call.completion_tokens // call.calls
+
+        # ✅ Audit
+        audit_prompts = self.prompts.group("USENIX")
+        criteria = []
+        for pname in audit_prompts:
+            target = [sec for sec in SECTION_MAP.get(pname, []) if sec in VALID_SECTIONS]
+            if not any(sec in present for sec in target):
+                plan.skipped.append((f"audit:{pname}", f"대상 섹션 없음 ({', '.join(target) or '-'})"))
+                continue
+            criteria.append(pname)
+
+        def audit_text(target: List[str]) -> int:
+            return sum(self._tokens(f"## {sec}\n{sections[sec]}") + tree_tokens.get(sec, 0)
+                       for sec in target if sec in present)
+
+        def instructions(pname: str) -> int:
+            return self._tokens(audit_prompts[pname].render(SECTION_NAME=pname, SECTION_TEXT="", TREE_INFO=""))
+
+        if self.audit_mode == "criterion":
+            for pname in criteria:
+                prompt = instructions(pname) + audit_text(SECTION_MAP.get(pname, []))
+                self._call(plan, rates, "audit", f"audit:{pname}", prompt,
+                           calls=self._pieces(prompt, chunk_tokens()))
+        else:
+            # prefix/multi: 모든 기준이 보는 섹션 원문 + 트리가 공통 첫 메시지
+            shared = audit_text([sec for sec in SECTION_ORDER if any(sec in secs for secs in SECTION_MAP.values())])
+            size = len(criteria) if self.audit_mode == "prefix" or self.audit_group <= 0 else self.audit_group
+            groups = [[p] for p in criteria] if self.audit_mode == "prefix" else [
+                criteria[i:i + size] for i in range(0, len(criteria), size)
+            ]
+            per_criterion = rates["audit"][0] if "audit" in rates else DEFAULT_COMPLETION["audit"]
+            for group in groups:
+                self._call(plan, rates, "audit", "audit:" + "+".join(group),
+                           shared + sum(instructions(p) for p in group), completion=int(per_criterion * len(group)))
+
+        # ✅ EditPass1 (내용이 있는 섹션만)
+        edit1_template = self.prompts.get("1st_modify/Modify")
+        for sec in VALID_SECTIONS:
+            if sec not in present:
+                plan.skipped.append((f"edit1:{sec}", "빈 섹션"))
+                continue
+            prompt = edit1_template.render(SECTION_NAME=sec, SECTION_TEXT=sections[sec], FEEDBACK="")
+            feedback = DEFAULT_COMPLETION["audit"] // 2  # 섹션에 해당하는 audit 피드백 몫
+            self._call(plan, rates, "edit1", f"edit1:{sec}", self._tokens(prompt) + feedback)
+
+        # ✅ GlobalCheck / EditPass2 (입력은 EditPass1 출력 전체)
+        edit1_out = sum(c.completion_tokens for c in plan.calls if c.step == "edit1")
+        if not present:
+            plan.skipped += [("global_check", "빈 문서"), ("edit2", "빈 문서")]
+            return plan
+        gc_prompt = self._tokens(self.prompts.get("global_check/global_check").render(FULL_TEXT="")) + edit1_out
+        gc = self._call(plan, rates, "global_check", "global_check", gc_prompt,
+                        calls=self._pieces(gc_prompt, chunk_tokens()))
+        if self.edit2_mode == "section":
+            # 섹션별 수정: 공통 문맥(피드백 + 흐름 요약) + 그 섹션의 edit1 출력 → 출력도 섹션 길이만큼
+            section_template = self.prompts.get("2nd_modify/2nd_modify_section")
+            shared = self._tokens(section_template.render(
+                SECTION_NAME="", SECTION_TEXT="", OUTLINE="", ISSUES="", SUGGESTIONS=""))
+            shared += gc.completion_tokens + len(present) * 90  # OUTLINE: 섹션당 앞/뒤 160자
+            for call in [c for c in plan.calls if c.step == "edit1"]:
+                sec = call.node.split(":", 1)[1]
+                self._call(plan, rates, "edit2", f"edit2:{sec}", shared + call.completion_tokens,
+                           calls=self._pieces(call.completion_tokens, edit_chunk_tokens()),
+                           completion=call.completion_tokens)
+            return plan
+        edit2_prompt = self._tokens(self.prompts.get("2nd_modify/2nd_modify").render(
+            ALL_SECTIONS="", ISSUES="", SUGGESTIONS="")) + edit1_out + gc.completion_tokens
+        self._call(plan, rates, "edit2", "edit2", edit2_prompt, calls=self._pieces(edit1_out, edit_chunk_tokens()))
+        return plan
+
+
+# ─────────────────────────────
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="실행 계획 / 예상 토큰·시간 (LLM 호출 없음)")
+    parser.add_argument("infile", nargs="?", default="sample/example.txt")
+    parser.add_argument("--model", default="gpt-4o")
+    parser.add_argument("--workers", type=int, default=7)
+    parser.add_argument("--tree-mode", default="single")
+    parser.add_argument("--audit-mode", default="criterion")
+    parser.add_argument("--edit2-mode", default="whole")
+    parser.add_argument("--json", action="store_true", help="계획을 JSON 으로 출력")
+    args = parser.parse_args()
+
+    planner = Planner(model=args.model, max_workers=args.workers,
+                      tree_mode=args.tree_mode, audit_mode=args.audit_mode, edit2_mode=args.edit2_mode)
+    result = planner.plan(Path(args.infile).read_text(encoding="utf-8"))
+    print(json.dumps(result.to_dict(), indent=2, ensure_ascii=False) if args.json else result.format())
@@ -0,0 +1,186 @@
+"""
+prompts.py
+───────────────────────────────
+프롬프트 템플릿 레지스트리 (prompts/**/*.txt)
+- 시작할 때 한 번 전부 읽어서 컴파일 → 이후 호출마다 디스크를 다시 읽지 않음
+- 컴파일된 템플릿은 고정 문자열 조각 + 자리표시자({NAME} / {{NAME}}) 목록
+  render() 는 한 번의 join 으로 완성 (.replace() 체인처럼 논문 전체를 여러 번 복사하지 않음)
+- 템플릿마다 version 해시 (llm_cache.template_version 과 같은 값 → 캐시 키 / 노드 지문 / trace 에 사용)
+- 파일 mtime 이 바뀐 템플릿만 다시 읽음 (폴더에 파일이 추가/삭제되면 폴더 목록도 갱신)
+
+환경 변수
+- TREELLM_PROMPT_DIR    : 프롬프트 루트 (기본: 저장소의 prompts/)
+- TREELLM_PROMPT_RELOAD : 0 이면 mtime 확인 없이 처음 읽은 템플릿만 사용 (기본: 1)
+
+사용법
+    python -m module.prompts            # 템플릿 목록 / 자리표시자 / version
+"""
+
+from __future__ import annotations
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+import os
+import re
+import threading
+
+from .llm_cache import template_version
+
+PROMPT_ROOT = Path(__file__).resolve().parent.parent / "prompts"
+
+# {{NAME}} 또는 {NAME} (대문자/숫자/_ 만 → 프롬프트 안의 JSON 예시 중괄호와 구분)
+_PLACEHOLDER = re.compile(r"\{\{([A-Z][A-Z0-9_]*)\}\}|\{([A-Z][A-Z0-9_]*)\}")
+
+
+class Template:
+    """
+    컴파일된 프롬프트 템플릿
+    name         : prompts/ 기준 상대 경로 (확장자 제외, 예: fill/abstract_fill_prompt)
+    placeholders : 템플릿에 나오는 자리표시자 이름 (등장 순서, 중복 없음)
+    """
+    __slots__ = ("name", "text", "version", "path", "mtime", "placeholders", "_parts")
+
+    def __init__(self, name: str, text: str, path: Optional[Path] = None, mtime: int = 0):
+        self.name = name
+        self.text = text
+        self.version = template_version(text)
+        self.path = path
+        self.mtime = mtime
+        # _parts: [고정 문자열, (자리표시자 이름, 원문 토큰), 고정 문자열, ...]
+        self._parts: List[object] = []
+        names: List[str] = []
+        pos = 0
+        for m in _PLACEHOLDER.finditer(text):
+            self._parts.append(text[pos:m.start()])
+            key = m.group(1) or m.group(2)
+            self._parts.append((key, m.group(0)))
+            if key not in names:
+                names.append(key)
+            pos = m.end()
+        self._parts.append(text[pos:])
+        self.placeholders: Tuple[str, ...] = tuple(names)
+
+    def render(self, **values: str) -> str:
+        """
+        자리표시자를 한 번에 채움 (값이 없는 자리표시자는 원문 그대로 둠)
+        템플릿에 없는 이름을 넘기면 KeyError (오타 방지)
+        """
+        unknown = set(values) - set(self.placeholders)
+        if unknown:
+            raise KeyError(f"{self.name}: 알 수 없는 자리표시자 {sorted(unknown)}")
+        return "".join(
+            part if isinstance(part, str) else values.get(part[0], part[1])
+            for part in self._parts
+        )
+
+    def __repr__(self) -> str:
+        return f"Template({self.name}, v={self.version}, {list(self.placeholders)})"
+
+
+def _mtime(path: Path) -> int:
+    return path.stat().st_mtime_ns
+
+
+class PromptRegistry:
+    """
+    prompts/ 아래 *.txt 템플릿 모음 (여러 스레드에서 동시에 get 해도 안전)
+    """
+
+    def __init__(self, root: str | Path | None = None, reload: Optional[bool] = None):
+        self.root = Path(root or os.getenv("TREELLM_PROMPT_DIR") or PROMPT_ROOT)
+        self.reload = os.getenv("TREELLM_PROMPT_RELOAD", "1") != "0" if reload is None else reload
+        self._templates: Dict[str, Template] = {}
+        self._folders: Dict[str, Tuple[int, List[str]]] = {}  # 폴더 → (mtime, 템플릿 이름 목록)
+        self._lock = threading.Lock()
+        self.load_all()
+
+    # ─────────────────────────────
+    def _name(self, path: Path) -> str:
+        return path.relative_to(self.root).with_suffix("").as_posix()
+
+    def _load(self, path: Path) -> Template:
+        mtime = _mtime(path)
+        template = Template(self._name(path), path.read_text(encoding="utf-8"), path, mtime)
+        self._templates[template.name] = template
+        return template
+
+    def load_all(self):
+        if not self.root.is_dir():
+            raise FileNotFoundError(f"프롬프트 폴더 없음: {self.root}")
+        with self._lock:
+            for path in sorted(self.root.rglob("*.txt")):
+                self._load(path)
+
+    # ─────────────────────────────
+    def get(self, name: str) -> Template:
+        """
+        이름(prompts/ 기준 상대 경로, 확장자 제외) → 템플릿 (파일이 바뀌었으면 다시 읽음)
+        """
+        with self._lock:
+            template = self._templates.get(name)
+            path = template.path if template is not None else self.root / f"{name}.txt"
+            if template is not None and not self.reload:
+                return template
+            if not path.exists():
+                self._templates.pop(name, None)
+                raise FileNotFoundError(f"프롬프트 없음: {path}")
+            if template is None or _mtime(path) != template.mtime:
+                template = self._load(path)
+            return template
+
+    def group(self, folder: str, suffix: str = "") -> Dict[str, Template]:
+        """
+        폴더 안의 템플릿 → {파일 이름(stem, suffix 제거): 템플릿} (이름 순)
+        폴더 mtime 이 바뀌었을 때만 목록을 다시 읽음
+        """
+        directory = self.root / folder
+        with self._lock:
+            cached = self._folders.get(folder)
+            if cached is None or (self.reload and directory.is_dir() and _mtime(directory) != cached[0]):
+                names = [self._name(p) for p in sorted(directory.glob(f"*{suffix}.txt"))]
+                cached = (_mtime(directory) if directory.is_dir() else 0, names)
+                self._folders[folder] = cached
+        if not cached[1]:
+            raise FileNotFoundError(f"프롬프트 없음: {directory}")
+        out: Dict[str, Template] = {}
+        for name in cached[1]:
+            stem = name.rsplit("/", 1)[-1]
+            out[stem[:-len(suffix)] if suffix and stem.endswith(suffix) else stem] = self.get(name)
+        return out
+
+    def names(self) -> List[str]:
+        with self._lock:
+            return sorted(self._templates)
+
+    def version(self) -> str:
+        """
+        전체 템플릿 묶음의 버전 (어느 템플릿이든 바뀌면 바뀜 → 실행 결과 재사용 키)
+        """
+        entries = []
+        for name in self.names():
+            try:
+                entries.append(f"{name}:{self.get(name).version}")
+            except FileNotFoundError:  # 지워진 템플릿
+                continue
+        return template_version("\n".join(entries))
+
+
+_default_registry: Optional[PromptRegistry] = None
+_default_lock = threading.Lock()
+
+
+def get_registry() -> PromptRegistry:
+    """
+    프로세스 공용 레지스트리 (처음 부를 때 prompts/ 전체를 읽음)
+    """
+    global _default_registry
+    with _default_lock:
+        if _default_registry is None:
+            _default_registry = PromptRegistry()
+        return _default_registry
+
+
+if __name__ == "__main__":
+    registry = get_registry()
+    for name in registry.names():
+        template = registry.get(name)
+        print(f"{name:<40} {template.version}  {', '.join(template.placeholders)}")
@@ -0,0 +1,155 @@
+"""
+routing.py
+───────────────────────────────
+단계(step) / 노드(섹션·기준)별 모델 라우팅 + 지연·오류 기반 fallback
+- 설정 키 우선순위: 노드 이름(예: edit1:Method, audit:Robustness, build:method) → 단계(build, edit2 ...) → default
+  설정에 없으면 단계가 넘긴 모델 그대로 (라우팅 없음 = 기존 동작)
+- Route: 기본 모델(model) + fallback 모델
+  · primary 는 timeout 초 안에, retries 번 재시도 안에 끝나야 함 → 못 하면 같은 요청을 fallback 으로
+  · primary 가 429 / 오류 / timeout 이거나 지연이 slow 초를 넘으면 cooldown 초 동안 그 모델을 건너뛰고 바로 fallback
+- 결정(primary / fallback:<이유>)은 호출 기록(usage.json 의 calls[].route)과 run.json 의 routing 에 남음
+
+환경 변수
+- TREELLM_ROUTES : 라우팅 설정 JSON 파일 경로 또는 JSON 문자열 (기본: 없음 = 라우팅 끔)
+
+설정 예 (값이 문자열이면 fallback 없는 모델 지정)
+    {
+      "default": {"model": "gpt-4o", "fallback": "gpt-4o-mini", "timeout": 90, "slow": 60},
+      "build":   {"model": "gpt-4o-mini", "fallback": "gpt-4o"},
+      "audit":   "gpt-4o-mini",
+      "edit1":   {"model": "gpt-4.1", "fallback": "gpt-4o"},
+      "edit1:Method": {"model": "gpt-4o", "fallback": "gpt-4.1", "timeout": 180},
+      "edit2":   {"model": "gpt-4.1", "fallback": "gpt-4o", "timeout": 300}
+    }
+
+사용법
+    python -m module.routing routes.json        # 단계/노드별로 어떤 모델이 쓰일지 출력
+"""
+
+from __future__ import annotations
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+import json
+import os
+import sys
+import threading
+import time
+
+import openai
+
+
+@dataclass(frozen=True)
+class Route:
+    """
+    model    : 기본 모델
+    fallback : primary 가 느리거나 실패할 때 쓸 모델 (없으면 fallback 안 함)
+    timeout  : primary 호출 1회 제한 시간(초) (없으면 단계 CallConfig.timeout)
+    retries  : primary 재시도 횟수 (소진하면 fallback)
+    slow     : primary 지연이 이 값(초)을 넘으면 cooldown 동안 fallback 으로 바로 보냄 (없으면 지연은 안 봄)
+    cooldown : 문제가 생긴 모델을 건너뛰는 시간(초)
+    """
+    model: str
+    fallback: Optional[str] = None
+    timeout: Optional[float] = None
+    retries: int = 1
+    slow: Optional[float] = None
+    cooldown: float = 60.0
+
+
+def _route(value: Any) -> Route:
+    if isinstance(value, str):
+        return Route(model=value)
+    return Route(**value)
+
+
+def load_routes(source: str) -> Dict[str, Route]:
+    """
+    JSON 파일 경로 또는 JSON 문자열 → {키: Route}
+    """
+    text = source.strip()
+    if not text.startswith("{"):
+        text = Path(source).read_text(encoding="utf-8")
+    return {key: _route(value) for key, value in json.loads(text).items()}
+
+
+class Router:
+    """
+    라우팅 표 + 모델별 상태 (여러 노드 스레드에서 동시에 써도 안전, 프로세스 공용)
+    """
+
+    def __init__(self, routes: Dict[str, Route]):
+        self.routes = routes
+        self._down: Dict[str, Tuple[float, str]] = {}  # 모델 → (cooldown 끝 시각, 이유)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> Optional["Router"]:
+        source = os.getenv("TREELLM_ROUTES")
+        return cls(load_routes(source)) if source else None
+
+    # ─────────────────────────────
+    def resolve(self, step: str, node: Optional[str], model: str) -> Optional[Route]:
+        """
+        노드 → 단계 → default 순으로 찾은 Route (없으면 None → 요청한 model 그대로)
+        """
+        for key in (node, step, "default"):
+            if key and key in self.routes:
+                return self.routes[key]
+        return None
+
+    def candidates(self, route: Route) -> List[Tuple[str, str]]:
+        """
+        이번 호출에서 시도할 [(모델, 결정)] — primary 가 cooldown 중이면 바로 fallback
+        """
+        if route.fallback is None:
+            return [(route.model, "primary")]
+        reason = self.cooling(route.model)
+        if reason is not None:
+            return [(route.fallback, f"fallback:{reason}")]
+        return [(route.model, "primary"), (route.fallback, "fallback:error")]
+
+    def cooling(self, model: str) -> Optional[str]:
+        with self._lock:
+            until, reason = self._down.get(model, (0.0, ""))
+            if until > time.monotonic():
+                return reason
+            self._down.pop(model, None)
+            return None
+
+    # ─────────────────────────────
+    def observe(self, route: Route, model: str, latency: Optional[float] = None,
+                error: Optional[BaseException] = None) -> Optional[str]:
+        """
+        primary 호출 결과 반영 → cooldown 을 건 이유 (없으면 None)
+        """
+        if model != route.model or route.fallback is None:
+            return None
+        reason = None
+        if isinstance(error, openai.RateLimitError):
+            reason = "rate_limit"
+        elif isinstance(error, openai.APITimeoutError):
+            reason = "timeout"
+        elif error is not None:
+            reason = "error"
+        elif route.slow is not None and latency is not None and latency > route.slow:
+            reason = "slow"
+        if reason is not None:
+            with self._lock:
+                self._down[model] = (time.monotonic() + route.cooldown, reason)
+        return reason
+
+    def describe(self) -> Dict[str, Dict[str, Any]]:
+        return {key: asdict(route) for key, route in self.routes.items()}
+
+
+if __name__ == "__main__":
+    from .split import VALID_SECTIONS
+
+    router = Router(load_routes(sys.argv[1] if len(sys.argv) > 1 else os.environ["TREELLM_ROUTES"]))
+    nodes = ["build", "audit", *[f"edit1:{sec}" for sec in VALID_SECTIONS], "global_check", "edit2"]
+    for node in nodes:
+        step = node.split(":")[0]
+        route = router.resolve(step, node, "gpt-4o")
+        target = f"{route.model} → {route.fallback or '-'}" if route else "(요청한 모델)"
+        print(f"{node:<24} {target}")
@@ -1,10 +1,21 @@
+"""
+split.py
+───────────────────────────────
+원문 txt → 섹션 / 문단 분리 (한 번의 순회)
+- Paragraph : 섹션, 섹션 내 번호, 원문 내 [start, end) 위치만 저장 (__slots__, 문자열 복사 없음)
+              pid 는 "Introduction-1" 형식, text 는 원문 조각을 필요할 때 정리해서 반환
+- iter_paragraphs() : 문단을 하나씩 내보내는 제너레이터 (파일 객체를 주면 줄 단위로 읽음)
+- run()             : 기존과 같은 {섹션명: 전체 내용} dict (문단 목록의 view), 순서는 SECTION_ORDER
+"""
+
 from __future__ import annotations
 import re
 from pathlib import Path
-from typing import Dict, Optional
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 
-# 허용 섹션 리스트
-VALID_SECTIONS = {"Abstract", "Introduction", "Related Work", "Background", "Method", "Discussion", "Conclusion"}
+# 허용 섹션 (이 순서대로 결과 dict / 파일을 구성)
+SECTION_ORDER = ("Abstract", "Introduction", "Related Work", "Background", "Method", "Discussion", "Conclusion")
+VALID_SECTIONS = SECTION_ORDER  # 순서 있는 튜플 (in 검사는 그대로 사용)
 
 _HEADING_PATTERNS = [
     re.compile(r"^\s*\d+(?:\.\d+)*\.?\s+(.*\S)\s*$", re.I),  # 1. Intro
@@ -24,42 +35,135 @@ def _is_heading(line: str) -> Optional[str]:
     return None
 
 
+class Paragraph:
+    """
+    원문의 한 문단 (빈 줄로 구분된 줄 묶음)
+    start/end 는 원문 전체 기준 위치, source 는 원문(문자열 입력) 또는 이 문단 조각(스트림 입력)
+    """
+    __slots__ = ("section", "index", "start", "end", "_source", "_base")
+
+    def __init__(self, section: str, index: int, start: int, end: int, source: str, base: int = 0):
+        self.section = section
+        self.index = index
+        self.start = start
+        self.end = end
+        self._source = source
+        self._base = base
+
+    @property
+    def pid(self) -> str:
+        return f"{self.section}-{self.index}"
+
+    @property
+    def raw(self) -> str:
+        return self._source[self.start - self._base:self.end - self._base]
+
+    @property
+    def text(self) -> str:
+        """
+        줄바꿈을 공백으로 합친 문단 내용 (기존 섹션 문자열과 같은 정리 방식)
+        """
+        return " ".join(line.strip() for line in self.raw.splitlines() if line.strip())
+
+    def __repr__(self) -> str:
+        return f"Paragraph({self.pid}, {self.start}:{self.end})"
+
+
+def _lines(source: str) -> Iterator[Tuple[int, str]]:
+    """
+    문자열 → (시작 위치, 줄) — splitlines 처럼 전체 목록을 만들지 않음
+    """
+    pos, n = 0, len(source)
+    while pos < n:
+        nl = source.find("\n", pos)
+        end = n if nl < 0 else nl + 1
+        yield pos, source[pos:end]
+        pos = end
+
+
+def _stream_lines(lines: Iterable[str]) -> Iterator[Tuple[int, str]]:
+    pos = 0
+    for line in lines:
+        yield pos, line
+        pos += len(line)
+
+
+def iter_paragraphs(source: str | Iterable[str]) -> Iterator[Paragraph]:
+    """
+    원문(문자열) 또는 줄 iterable(파일 객체 등) → Paragraph 를 나오는 순서대로 yield
+    - 허용 섹션 제목 줄에서 섹션이 바뀌고, 빈 줄/제목 줄/끝에서 문단이 끝남
+    - 첫 허용 섹션 이전의 내용은 버림 (기존 split 과 동일)
+    - 파일 객체를 주면 각 문단이 자기 조각만 들고 있어 원문 전체를 메모리에 올리지 않음
+    """
+    whole = source if isinstance(source, str) else None
+    lines = _lines(whole) if whole is not None else _stream_lines(source)
+
+    section: Optional[str] = None
+    counts: Dict[str, int] = {}
+    start = end = -1
+    chunk: List[str] = []  # 스트림 입력일 때만 사용 (현재 문단의 줄들)
+    chunk_pos = 0
+
+    def make() -> Paragraph:
+        counts[section] = counts.get(section, 0) + 1
+        if whole is not None:
+            return Paragraph(section, counts[section], start, end, whole)
+        block = "".join(chunk)
+        chunk.clear()
+        return Paragraph(section, counts[section], start, end, block, chunk_pos)
+
+    for pos, line in lines:
+        stripped = line.strip()
+        heading = _is_heading(stripped) if stripped else None
+        if not stripped or heading:
+            if start >= 0:
+                yield make()
+                start = -1
+            if heading:
+                section = heading
+            continue
+        if section is None:  # 허용된 섹션에만 내용 추가
+            continue
+        if start < 0:
+            start = pos + (len(line) - len(line.lstrip()))
+            chunk_pos = pos
+        end = pos + len(line.rstrip())
+        if whole is None:
+            chunk.append(line)
+    if start >= 0:
+        yield make()
+
+
+def split_paragraphs(raw_text: str) -> List[Paragraph]:
+    return list(iter_paragraphs(raw_text))
+
+
+def section_view(paragraphs: Iterable[Paragraph]) -> Dict[str, str]:
+    """
+    문단 목록 → {섹션명: 전체 내용} (SECTION_ORDER 순서, 없는 섹션은 "")
+    """
+    parts: Dict[str, List[str]] = {sec: [] for sec in SECTION_ORDER}
+    for p in paragraphs:
+        parts[p.section].append(p.text)
+    return {sec: " ".join(texts).strip() for sec, texts in parts.items()}
+
+
 def run(raw_text: str, *, out_file: str | Path | None = None) -> Dict[str, str]:
     """
     txt → {섹션명: 전체 내용(문자열)}
     """
-    current_section = None
-    sections: Dict[str, str] = {}
-    buff = []
-
-    def flush():
-        if buff and current_section:
-            text = " ".join(buff).strip()
-            if text:
-                sections[current_section] = sections.get(current_section, "") + " " + text
-            buff.clear()
-
-    for line in raw_text.splitlines():
-        heading = _is_heading(line.strip())
-        if heading:
-            flush()
-            current_section = heading
-            continue
-        if line.strip():
-            if current_section:  # 허용된 섹션에만 내용 추가
-                buff.append(line.strip())
-    flush()
+    sections = section_view(iter_paragraphs(raw_text))
 
     # 결과 저장
     if out_file:
         out_path = Path(out_file)
         out_path.parent.mkdir(parents=True, exist_ok=True)
         with out_path.open("w", encoding="utf-8") as fp:
-            for sec in VALID_SECTIONS:
-                if sec in sections:
-                    fp.write(f"# {sec}\n{sections[sec].strip()}\n\n")
+            for sec in SECTION_ORDER:
+                if sections[sec]:
+                    fp.write(f"# {sec}\n{sections[sec]}\n\n")
 
-    return {sec: sections.get(sec, "").strip() for sec in VALID_SECTIONS}
+    return sections
 
 
 if __name__ == "__main__":
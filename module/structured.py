@@ -0,0 +1,345 @@
+"""
+structured.py
+───────────────────────────────
+LLM 구조화 출력(JSON) 공통 처리
+- extract  : ```json 펜스 / 앞뒤 설명문 제거 → JSON 본문 (닫히지 않은 펜스도 처리)
+- repair   : 흔한 형식 오류 복구 — 문자열 안 줄바꿈/탭, 끝 쉼표, // /* */ 주석,
+             True/False/None, 잘린 응답의 열린 따옴표/괄호
+- validate : 단계별 스키마 검사 (JSON Schema 의 type / required / properties /
+             additionalProperties / items / minItems / minProperties / enum 부분집합)
+- complete_json : 파싱·검증에 실패한 블록만 오류 내용과 함께 다시 요청 (블록당 재요청 횟수 제한)
+  → 형식 문제 때문에 실행 전체를 다시 돌리지 않음 (acomplete_json: 같은 흐름의 코루틴 버전)
+- record_fallback : 재요청까지 실패한 블록을 버리거나 대체했을 때 span("structured.fallback", outcome=failed)
+  + 실행 사용량(usage.json 의 degraded)에 기록 → 실패가 지표에서 빠지지 않음
+  + 그 노드를 degraded 로 표시 (dag.mark_degraded) → 증분 기록 / 체크포인트에 남기지 않고 다음 실행에서 다시 계산
+- 형식 검사에 실패한 응답은 응답 캐시에 남기지 않음 (llm.complete 의 accept) → 다음 실행에서 같은 오류를 재생하지 않음
+
+환경 변수
+- TREELLM_REASK_BUDGET : 블록당 최대 재요청 횟수 (기본: 2)
+"""
+
+from __future__ import annotations
+from typing import Any, Dict, List, Optional, Tuple
+import json
+import os
+import re
+
+from . import tracing, usage
+from .dag import mark_degraded
+
+_FENCE = re.compile(r"```[ \t]*(?:json|JSON)?[ \t]*\n?(.*?)(?:```|\Z)", re.S)
+_LITERALS = {"True": "true", "False": "false", "None": "null"}
+
+
+class StructuredOutputError(ValueError):
+    """
+    재요청까지 모두 실패 (errors: 마지막 검사 오류, raw: 마지막 응답)
+    """
+
+    def __init__(self, step: str, errors: List[str], raw: str):
+        super().__init__(f"[{step}] 구조화 출력 실패: {'; '.join(errors[:3])}")
+        self.step = step
+        self.errors = errors
+        self.raw = raw
+
+
+# ─────────────────────────────
+def extract(text: str) -> str:
+    """
+    응답 → JSON 본문 (펜스 안 / 첫 여는 괄호 ~ 마지막 닫는 괄호)
+    """
+    text = text.strip()
+    m = _FENCE.search(text)
+    if m and m.group(1).strip():
+        text = m.group(1).strip()
+    starts = [i for i in (text.find("{"), text.find("[")) if i >= 0]
+    if not starts:
+        return text
+    start = min(starts)
+    close = "}" if text[start] == "{" else "]"
+    end = text.rfind(close)
+    return text[start:end + 1] if end > start else text[start:]  # 닫는 괄호가 없으면 잘린 응답
+
+
+def _drop_trailing_comma(out: List[str]):
+    i = len(out) - 1
+    while i >= 0 and out[i].isspace():
+        i -= 1
+    if i >= 0 and out[i] == ",":
+        del out[i]
+
+
+def repair(text: str) -> str:
+    """
+    문자열 안/밖을 구분하며 한 번 훑어서 흔한 JSON 오류를 고침
+    """
+    out: List[str] = []
+    stack: List[str] = []
+    in_str = escaped = False
+    i, n = 0, len(text)
+    while i < n:
+        c = text[i]
+        if in_str:
+            if escaped:
+                escaped = False
+                out.append(c)
+            elif c == "\\":
+                escaped = True
+                out.append(c)
+            elif c == '"':
+                in_str = False
+                out.append(c)
+            elif c == "\n":
+                out.append("\\n")
+            elif c == "\t":
+                out.append("\\t")
+            elif c != "\r":
+                out.append(c)
+            i += 1
+            continue
+
+        if c == "/" and text.startswith("//", i):
+            nl = text.find("\n", i)
+            i = n if nl < 0 else nl
+            continue
+        if c == "/" and text.startswith("/*", i):
+            end = text.find("*/", i + 2)
+            i = n if end < 0 else end + 2
+            continue
+        if c.isascii() and c.isalpha():
+            m = re.match(r"[A-Za-z]+", text[i:])
+            word = m.group(0)
+            out.append(_LITERALS.get(word, word))
+            i += len(word)
+            continue
+        if c == '"':
+            in_str = True
+        elif c in "{[":
+            stack.append("}" if c == "{" else "]")
+        elif c in "}]":
+            _drop_trailing_comma(out)
+            if stack:
+                stack.pop()
+        out.append(c)
+        i += 1
+
+    # 잘린 응답: 열린 문자열/괄호 닫기
+    if in_str:
+        if escaped:
+            out.pop()
+        out.append('"')
+    while stack:
+        tail = "".join(out).rstrip()
+        if tail.endswith(":"):
+            out.append(" null")
+        _drop_trailing_comma(out)
+        out.append(stack.pop())
+    return "".join(out)
+
+
+def parse(text: str) -> Tuple[Any, bool]:
+    """
+    응답 → (값, 복구 여부). 복구해도 안 되면 json.JSONDecodeError
+    """
+    body = extract(text)
+    try:
+        return json.loads(body), False
+    except json.JSONDecodeError:
+        return json.loads(repair(body)), True
+
+
+def loads(text: str, default: Any = None) -> Any:
+    """
+    parse 의 값만 (실패하면 default)
+    """
+    try:
+        return parse(text)[0]
+    except json.JSONDecodeError:
+        return default
+
+
+def to_block(value: Any) -> str:
+    return "```json\n" + json.dumps(value, indent=2, ensure_ascii=False) + "\n```"
+
+
+# ─────────────────────────────
+_TYPES = {
+    "object": dict,
+    "array": list,
+    "string": str,
+    "integer": int,
+    "number": (int, float),
+    "boolean": bool,
+    "null": type(None),
+}
+
+
+def _is_type(value: Any, name: str) -> bool:
+    if name in ("integer", "number") and isinstance(value, bool):
+        return False
+    return isinstance(value, _TYPES[name])
+
+
+def validate(value: Any, schema: Dict[str, Any], path: str = "$") -> List[str]:
+    """
+    스키마 위반 목록 (빈 목록이면 통과)
+    """
+    errors: List[str] = []
+    types = schema.get("type")
+    if types is not None:
+        names = [types] if isinstance(types, str) else list(types)
+        if not any(_is_type(value, t) for t in names):
+            return [f"{path}: {'/'.join(names)} 이어야 함 (현재 {type(value).__name__})"]
+    if "enum" in schema and value not in schema["enum"]:
+        errors.append(f"{path}: {schema['enum']} 중 하나여야 함")
+
+    if isinstance(value, dict):
+        for key in schema.get("required", []):
+            if key not in value:
+                errors.append(f"{path}: 필수 키 '{key}' 없음")
+        if len(value) < schema.get("minProperties", 0):
+            errors.append(f"{path}: 키가 {schema['minProperties']}개 이상이어야 함")
+        props = schema.get("properties", {})
+        extra = schema.get("additionalProperties", True)
+        for key, item in value.items():
+            if key in props:
+                errors += validate(item, props[key], f"{path}.{key}")
+            elif extra is False:
+                errors.append(f"{path}: 허용되지 않은 키 '{key}'")
+            elif isinstance(extra, dict):
+                errors += validate(item, extra, f"{path}.{key}")
+
+    if isinstance(value, list):
+        if len(value) < schema.get("minItems", 0):
+            errors.append(f"{path}: 항목이 {schema['minItems']}개 이상이어야 함")
+        if "items" in schema:
+            for i, item in enumerate(value):
+                errors += validate(item, schema["items"], f"{path}[{i}]")
+    return errors
+
+
+def check(text: str, schema: Optional[Dict[str, Any]] = None) -> Tuple[Any, List[str], bool]:
+    """
+    응답 → (값, 오류 목록, 복구 여부)
+    """
+    try:
+        value, repaired = parse(text)
+    except json.JSONDecodeError as e:
+        return None, [f"JSON 파싱 실패: {e.msg} (line {e.lineno}, col {e.colno})"], False
+    return value, validate(value, schema) if schema else [], repaired
+
+
+def record_fallback(error: "StructuredOutputError", action: str, **attrs):
+    """
+    StructuredOutputError 를 잡고 결과를 버리거나(dropped) 대체(local_merge / original ...)한 곳에서 호출
+    지금 실행 중인 DAG 노드는 degraded 로 표시 (memo 에 저장하지 않음)
+    """
+    with tracing.span("structured.fallback", step=error.step, outcome="failed", action=action,
+                      error=str(error)[:300], **attrs):
+        usage.record_degraded(error.step, action, str(error))
+        mark_degraded(action)
+
+
+# ─────────────────────────────
+def reask_prompt(errors: List[str], schema: Optional[Dict[str, Any]]) -> str:
+    lines = "\n".join(f"- {e}" for e in errors[:10])
+    hint = f"\n\n필요한 형식 (JSON Schema):\n{json.dumps(schema, ensure_ascii=False)}" if schema else ""
+    return (
+        "방금 응답을 요구한 JSON 형식으로 읽을 수 없습니다.\n"
+        f"오류:\n{lines}{hint}\n\n"
+        "내용은 그대로 두고, 설명 없이 올바른 JSON 하나만 ```json 코드 블록으로 다시 출력하세요."
+    )
+
+
+def _cacheable(schema: Optional[Dict[str, Any]]):
+    """
+    응답 캐시에 저장해도 되는 응답인지 (파싱 + 스키마 검사 통과)
+    """
+    return lambda text: not check(text, schema)[1]
+
+
+def _rounds(messages: List[Dict[str, str]], schema: Optional[Dict[str, Any]], step: str, budget: int,
+            on_delta, sp):
+    """
+    재요청 흐름 (동기 / 비동기 공통): 보낼 messages 를 yield → 응답 텍스트를 send 로 받음 → (값, 원문) 반환
+    """
+    text = yield messages
+    for attempt in range(budget + 1):
+        value, errors, repaired = check(text, schema)
+        if not errors:
+            sp.attrs.update(outcome="reask" if attempt else ("repaired" if repaired else "ok"), reasks=attempt)
+            return value, text
+        if attempt == budget:
+            break
+        print(f"[Structured] ⚠ {step}: 형식 오류 → 재요청 {attempt + 1}/{budget} ({errors[0]})")
+        if on_delta is not None:
+            on_delta("", reset=True)
+        text = yield messages + [
+            {"role": "assistant", "content": text},
+            {"role": "user", "content": reask_prompt(errors, schema)},
+        ]
+    sp.attrs.update(outcome="failed", reasks=budget)
+    raise StructuredOutputError(step, errors, text)
+
+
+def complete_json(
+    llm,
+    messages: List[Dict[str, str]],
+    schema: Optional[Dict[str, Any]] = None,
+    *,
+    model: str = "gpt-4o",
+    step: str = "default",
+    version: str = "",
+    temperature: Optional[float] = None,
+    top_p: Optional[float] = None,
+    on_delta=None,
+    budget: Optional[int] = None,
+) -> Tuple[Any, str]:
+    """
+    llm.complete + 파싱/복구/검증 → (값, 마지막 응답 원문)
+    실패하면 원래 요청 + 실패한 응답 + 오류 내용으로 다시 요청 (최대 budget 번), 그래도 실패하면 StructuredOutputError
+    on_delta 가 있으면 재요청 전에 reset 신호를 보내고 새 응답을 다시 스트리밍
+    llm.complete 에 accept(형식 검사)를 넘김 → 검사에 실패한 응답은 응답 캐시에 저장하지 않음
+    """
+    budget = int(os.getenv("TREELLM_REASK_BUDGET", "2")) if budget is None else budget
+    accept = _cacheable(schema)
+    with tracing.span("structured", step=step) as sp:
+        rounds = _rounds(messages, schema, step, budget, on_delta, sp)
+        request = next(rounds)
+        while True:
+            text = llm.complete(request, model=model, temperature=temperature, top_p=top_p,
+                                step=step, version=version, on_delta=on_delta, accept=accept)
+            try:
+                request = rounds.send(text)
+            except StopIteration as done:
+                return done.value
+
+
+async def acomplete_json(
+    llm,
+    messages: List[Dict[str, str]],
+    schema: Optional[Dict[str, Any]] = None,
+    *,
+    model: str = "gpt-4o",
+    step: str = "default",
+    version: str = "",
+    temperature: Optional[float] = None,
+    top_p: Optional[float] = None,
+    on_delta=None,
+    budget: Optional[int] = None,
+) -> Tuple[Any, str]:
+    """
+    complete_json 의 코루틴 버전 (llm: llm_async.AsyncLLMClient)
+    """
+    budget = int(os.getenv("TREELLM_REASK_BUDGET", "2")) if budget is None else budget
+    accept = _cacheable(schema)
+    with tracing.span("structured", step=step) as sp:
+        rounds = _rounds(messages, schema, step, budget, on_delta, sp)
+        request = next(rounds)
+        while True:
+            text = await llm.complete(request, model=model, temperature=temperature, top_p=top_p,
+                                      step=step, version=version, on_delta=on_delta, accept=accept)
+            try:
+                request = rounds.send(text)
+            except StopIteration as done:
+                return done.value
@@ -0,0 +1,204 @@
+"""
+tracing.py
+───────────────────────────────
+구조화된 실행 추적 (span)
+- span: 이름, 시작/종료 시각, 소요 시간, 부모 span, run_id, 속성, 오류
+- 현재 span 은 contextvars 로 전달 → dag 노드 스레드, LLM 호출까지 부모/자식 관계 유지
+- 끝난 span 은 큐에 넣기만 하고(논블로킹) 백그라운드 스레드가 모아서 JSONL 로 기록
+  (서버와 워커 프로세스가 같은 파일을 쓰므로 크기 확인 → 회전 → 추가를 <파일>.lock 파일 잠금으로 묶음)
+- 리스너(add_listener)로 끝난 span 을 받아 지표(metrics) 갱신
+
+환경 변수
+- TREELLM_TRACE          : 0 이면 파일 기록 끔 (리스너는 그대로 동작, 기본: 1)
+- TREELLM_TRACE_FILE     : span JSONL 경로 (기본: <TREELLM_RUNS_DIR>/traces.jsonl)
+- TREELLM_TRACE_MAX_MB   : 이 크기를 넘으면 .1 로 돌리고 새 파일 시작 (기본: 64)
+"""
+
+from __future__ import annotations
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional
+import atexit
+import json
+import os
+import queue
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows: 프로세스 간 잠금 없이 기록 (단일 프로세스로 띄울 때만 안전)
+    fcntl = None
+
+from .workspace import runs_root
+
+
+class Span:
+    __slots__ = ("name", "span_id", "parent_id", "run_id", "start", "end", "attrs", "error")
+
+    def __init__(self, name: str, parent: Optional["Span"] = None, run_id: Optional[str] = None, **attrs):
+        self.name = name
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent.span_id if parent else None
+        self.run_id = run_id or (parent.run_id if parent else None)
+        self.start = time.time()
+        self.end: Optional[float] = None
+        self.attrs: Dict[str, Any] = attrs
+        self.error: Optional[str] = None
+
+    @property
+    def duration(self) -> float:
+        return (self.end or time.time()) - self.start
+
+    def finish(self, error: Optional[BaseException] = None):
+        """
+        span 종료 → 리스너 호출 + 내보내기 (두 번 불러도 한 번만 처리)
+        """
+        if self.end is not None:
+            return
+        self.end = time.time()
+        if error is not None:
+            self.error = f"{type(error).__name__}: {error}"
+        for listener in _listeners:
+            try:
+                listener(self)
+            except Exception as exc:
+                print(f"[Tracing] ⚠ 리스너 오류: {exc}")
+        get_exporter().export(self.to_dict())
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "run_id": self.run_id,
+            "start": round(self.start, 6),
+            "duration": round(self.duration, 6),
+            "attrs": self.attrs,
+            "error": self.error,
+        }
+
+
+current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+_listeners: List[Callable[[Span], None]] = []
+
+
+def add_listener(fn: Callable[[Span], None]):
+    _listeners.append(fn)
+
+
+def start_span(name: str, parent: Optional[Span] = None, run_id: Optional[str] = None, **attrs) -> Span:
+    """
+    직접 종료(finish)하는 span — 제너레이터처럼 컨텍스트가 이어지지 않는 곳에서 사용
+    parent 를 주지 않으면 현재 span 이 부모
+    """
+    return Span(name, parent or current_span.get(), run_id, **attrs)
+
+
+@contextmanager
+def span(name: str, **attrs) -> Iterator[Span]:
+    """
+    with span("llm", step="build") as sp: ... → 현재 span 의 자식, 블록 안에서는 현재 span
+    """
+    sp = start_span(name, **attrs)
+    token = current_span.set(sp)
+    try:
+        yield sp
+    except BaseException as exc:
+        sp.finish(exc)
+        raise
+    finally:
+        current_span.reset(token)
+        sp.finish()
+
+
+# ─────────────────────────────
+class JsonlExporter:
+    """
+    span 을 큐에 넣고 바로 반환, 백그라운드 스레드가 모아서 파일에 씀
+    큐가 가득 차면 버리고 dropped 만 셈 (파이프라인을 절대 막지 않음)
+    """
+
+    def __init__(self, path: str | Path, max_queue: int = 10000, batch: int = 256,
+                 interval: float = 1.0, max_bytes: int = 64 * 1024 * 1024, enabled: bool = True):
+        self.path = Path(path)
+        self.batch = batch
+        self.interval = interval
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        self.dropped = 0
+        self._queue: "queue.Queue[Optional[dict]]" = queue.Queue(maxsize=max_queue)
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def export(self, item: Dict[str, Any]):
+        if not self.enabled:
+            return
+        self._ensure_thread()
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            self.dropped += 1
+
+    def _ensure_thread(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._worker, name="span-exporter", daemon=True)
+                    self._thread.start()
+
+    def _worker(self):
+        while True:
+            items = [self._queue.get()]
+            deadline = time.monotonic() + self.interval
+            while len(items) < self.batch:
+                try:
+                    items.append(self._queue.get(timeout=max(0.0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+            try:
+                self._write([i for i in items if i is not None])
+            except OSError as exc:
+                print(f"[Tracing] ⚠ span 기록 실패: {exc}")
+            finally:
+                for _ in items:
+                    self._queue.task_done()
+
+    def _write(self, items: List[Dict[str, Any]]):
+        if not items:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        data = "".join(json.dumps(i, ensure_ascii=False) + "\n" for i in items)
+        with open(self.path.with_name(self.path.name + ".lock"), "a") as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)  # 다른 프로세스가 회전하는 사이에 옛 파일에 쓰지 않도록
+            if self.path.exists() and self.path.stat().st_size > self.max_bytes:
+                os.replace(self.path, self.path.with_name(self.path.name + ".1"))
+            with open(self.path, "a", encoding="utf-8") as fp:
+                fp.write(data)
+
+    def flush(self):
+        """
+        지금까지 넣은 span 이 모두 기록될 때까지 대기
+        """
+        if self._thread is not None:
+            self._queue.put(None)
+            self._queue.join()
+
+
+_exporter: Optional[JsonlExporter] = None
+_exporter_lock = threading.Lock()
+
+
+def get_exporter() -> JsonlExporter:
+    global _exporter
+    with _exporter_lock:
+        if _exporter is None:
+            _exporter = JsonlExporter(
+                os.getenv("TREELLM_TRACE_FILE") or runs_root() / "traces.jsonl",
+                max_bytes=int(float(os.getenv("TREELLM_TRACE_MAX_MB", "64")) * 1024 * 1024),
+                enabled=os.getenv("TREELLM_TRACE", "1") != "0",
+            )
+            atexit.register(_exporter.flush)
+        return _exporter
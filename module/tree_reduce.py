@@ -0,0 +1,259 @@
+"""
+tree_reduce.py
+───────────────────────────────
+문단 단위 map-reduce 트리 구성
+- map    : 섹션의 문단(짧은 문단은 min_chars 까지 묶음)마다 fill 프롬프트를 병렬 실행 → 부분 트리
+- reduce : 부분 트리를 fan_in 개씩 묶어 단계적으로 병합
+           · 노드가 겹치지 않거나 같은 값이면 GPT 없이 로컬 병합 (결정적)
+           · 같은 노드에 서로 다른 값이 있으면 prompts/merge 템플릿으로 GPT 병합
+- 형식 오류로 버린 부분 트리 / 로컬 병합으로 대체한 병합은 structured.record_fallback 으로 기록 (지표 + usage.json)
+- 결과는 BuildStep 과 같은 "### <pid>" 블록 / TreeBuilder 와 같은 tree.json 모양
+
+사용법
+    python -m module.tree_reduce    # sample/example.txt → sample/step2_result_map_reduce.json (저장소 루트에서)
+"""
+
+from __future__ import annotations
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+import json
+import re
+
+from .build import TREE_SCHEMA, BuildStep
+from .prompts import Template
+from .split import iter_paragraphs
+from .structured import StructuredOutputError, complete_json, record_fallback, to_block
+
+# 내용이 없다는 뜻의 값 (다른 값과 충돌로 보지 않음)
+EMPTY_VALUES = {"", "없음", "해당 없음", "n/a", "none", "-", "..."}
+
+MIN_CHARS = 1500  # 이보다 짧은 문단은 다음 문단과 묶어서 map
+
+
+class Conflict(Exception):
+    """
+    같은 노드에 서로 다른 값 → 로컬 병합 불가
+    """
+
+
+def _is_empty(value: Any) -> bool:
+    if value is None:
+        return True
+    if isinstance(value, str):
+        return value.strip().lower() in EMPTY_VALUES
+    return isinstance(value, (dict, list)) and not value
+
+
+def merge_values(a: Any, b: Any) -> Any:
+    """
+    두 부분 트리 값을 로컬 병합 (충돌하면 Conflict)
+    - dict 는 키별로 재귀 병합, list 는 순서를 지킨 합집합, 빈 값은 다른 쪽으로 대체
+    """
+    if _is_empty(a):
+        return b
+    if _is_empty(b) or a == b:
+        return a
+    if isinstance(a, dict) and isinstance(b, dict):
+        merged = dict(a)
+        for key, value in b.items():
+            merged[key] = merge_values(merged[key], value) if key in merged else value
+        return merged
+    if isinstance(a, list) and isinstance(b, list):
+        return a + [item for item in b if item not in a]
+    raise Conflict(f"{str(a)[:40]!r} ↔ {str(b)[:40]!r}")
+
+
+def chunk_paragraphs(paragraphs: Sequence[str], min_chars: int) -> List[str]:
+    """
+    짧은 문단은 min_chars 를 넘을 때까지 이어 붙임 → map 호출 단위
+    """
+    out: List[str] = []
+    buff: List[str] = []
+    for text in paragraphs:
+        buff.append(text)
+        if sum(len(t) for t in buff) >= min_chars:
+            out.append("\n\n".join(buff))
+            buff = []
+    if buff:
+        out.append("\n\n".join(buff))
+    return out
+
+
+class MapReduceTreeBuilder:
+    """
+    Input  : 섹션 문단 목록 (split.iter_paragraphs)
+    Output : {pid: 부분 트리} — TreeBuilder.run 결과와 같은 모양
+    """
+
+    def __init__(self, model: str = "gpt-4o", max_workers: int = 7, fan_in: int = 4, min_chars: int = MIN_CHARS):
+        """
+        fan_in    : 한 번에 병합할 부분 트리 수
+        min_chars : 이보다 짧은 문단은 다음 문단과 묶어서 한 번에 map
+        """
+        self.model = model
+        self.max_workers = max(1, max_workers)
+        self.fan_in = max(2, fan_in)
+        self.min_chars = min_chars
+        self.build_step = BuildStep(model=model, max_workers=max_workers)
+        self.llm = self.build_step.llm
+
+    # ─────────────────────────────
+    def load_merge_template(self) -> Template:
+        return self.build_step.prompts.get("merge/merge_prompt_template")
+
+    def _parallel(self, fn, items: Sequence[Any]) -> List[Any]:
+        """
+        입력 순서대로 결과 반환, 호출한 쪽 contextvars(usage/tracing) 유지
+        """
+        if len(items) <= 1:
+            return [fn(item) for item in items]
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(items))) as pool:
+            futures = [pool.submit(copy_context().run, fn, item) for item in items]
+            return [f.result() for f in futures]
+
+    # ─────────────────────────────
+    def chunks(self, paragraphs: Sequence[str]) -> List[str]:
+        """
+        짧은 문단은 min_chars 를 넘을 때까지 이어 붙임 (호출 수 절약)
+        """
+        return chunk_paragraphs(paragraphs, self.min_chars)
+
+    def map_paragraphs(self, pid: str, tmpl: Template, paragraphs: Sequence[str]) -> List[Dict[str, Any]]:
+        def fill(text: str) -> Optional[Dict[str, Any]]:
+            try:
+                return self.build_step.call_json(tmpl.render(INPUT=text), version=tmpl.version)
+            except StructuredOutputError as exc:
+                record_fallback(exc, "dropped", pid=pid)
+                return None  # 재요청까지 실패한 문단만 제외
+
+        trees = self._parallel(fill, self.chunks(paragraphs))
+        parsed = [t for t in trees if t is not None]
+        if len(parsed) < len(trees):
+            print(f"[MapReduce] ⚠ {pid}: 부분 트리 {len(trees) - len(parsed)}개 형식 오류로 제외")
+        return parsed
+
+    # ─────────────────────────────
+    def render_merge(self, template: Template, section: str, trees: Sequence[Dict[str, Any]]) -> str:
+        section_key = next(iter(trees[0]), section)
+        nodes: List[str] = []
+        for tree in trees:
+            body = tree.get(section_key, {})
+            for node in body if isinstance(body, dict) else []:
+                if node not in nodes:
+                    nodes.append(node)
+
+        def node_lines(m: re.Match) -> str:
+            indent = m.group(1)
+            return ",\n".join(f'{indent}{json.dumps(n, ensure_ascii=False)}: ""' for n in nodes)
+
+        partial_list = "\n\n".join(
+            f"[문단 {i}]\n{json.dumps(tree, indent=2, ensure_ascii=False)}" for i, tree in enumerate(trees, 1)
+        )
+        # 출력 예시의 {{NODE_1}}, {{NODE_2}}, ... 줄 → 부분 트리에 나온 노드 이름들
+        skeleton = re.sub(r'^([ \t]*)"\{\{NODE_1\}\}".*?^[ \t]*\.\.\.[ \t]*$', node_lines, template.text,
+                          flags=re.M | re.S)
+        return Template(template.name, skeleton).render(
+            SECTION_NAME=section, SECTION_KEY=section_key, PARTIAL_TREE_LIST=partial_list,
+        )
+
+    def merge_group(self, section: str, trees: Sequence[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        부분 트리 묶음 하나 병합: 로컬 병합 → 충돌 시 merge 프롬프트
+        """
+        merged: Dict[str, Any] = {}
+        try:
+            for tree in trees:
+                merged = merge_values(merged, tree)
+            return merged
+        except Conflict:
+            pass
+
+        template = self.load_merge_template()
+        try:
+            tree, _ = complete_json(
+                self.llm,
+                [{"role": "user", "content": self.render_merge(template, section, trees)}],
+                TREE_SCHEMA,
+                model=self.model, temperature=0.3, top_p=0.3,
+                step="merge",
+                version=template.version,
+            )
+        except StructuredOutputError as exc:
+            # 재요청까지 실패하면 가장 긴 값을 고르는 결정적 병합으로 대체
+            record_fallback(exc, "local_merge", section=section)
+            print(f"[MapReduce] ⚠ {section}: 병합 응답 형식 오류 → 로컬 병합으로 대체")
+            return self.merge_longest(trees)
+        return tree
+
+    @staticmethod
+    def merge_longest(trees: Sequence[Dict[str, Any]]) -> Dict[str, Any]:
+        def pick(a: Any, b: Any) -> Any:
+            try:
+                return merge_values(a, b)
+            except Conflict:
+                if isinstance(a, dict) and isinstance(b, dict):
+                    return {k: pick(a[k], b[k]) if k in a and k in b else a.get(k, b.get(k))
+                            for k in list(a) + [k for k in b if k not in a]}
+                return a if len(str(a)) >= len(str(b)) else b
+
+        merged: Dict[str, Any] = {}
+        for tree in trees:
+            merged = pick(merged, tree)
+        return merged
+
+    def reduce(self, section: str, trees: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        fan_in 개씩 묶어 병합 → 하나가 남을 때까지 반복 (묶음끼리는 병렬)
+        """
+        level = trees
+        while len(level) > 1:
+            groups = [level[i:i + self.fan_in] for i in range(0, len(level), self.fan_in)]
+            level = self._parallel(lambda group: self.merge_group(section, group), groups)
+        return level[0] if level else {}
+
+    # ─────────────────────────────
+    def build_tree(self, pid: str, tmpl: Template, paragraphs: Sequence[str]) -> Dict[str, Any]:
+        section = self.build_step.section_of(pid)
+        print(f"[MapReduce] ▶ {pid}: 문단 {len(paragraphs)}개 map...")
+        return self.reduce(section, self.map_paragraphs(pid, tmpl, paragraphs))
+
+    def run_one(self, pid: str, tmpl: Template, paragraphs: Sequence[str], on_delta=None) -> str:
+        """
+        BuildStep.run_one 과 같은 "### <pid>" 블록 (on_delta 에는 완성된 블록을 한 번에 전달)
+        """
+        tree = self.build_tree(pid, tmpl, paragraphs)
+        body = to_block(tree)
+        if on_delta is not None:
+            on_delta(body)
+        return f"### {pid}\n{body}"
+
+    def run(self, raw_text: str) -> str:
+        """
+        원문 → tree.json 문자열 (TreeBuilder.run 과 같은 모양, 섹션별로 병렬)
+        """
+        by_section: Dict[str, List[str]] = {}
+        for p in iter_paragraphs(raw_text):
+            by_section.setdefault(p.section, []).append(p.text)
+        prompts = [(pid, tmpl) for pid, tmpl in self.build_step.load_prompts()
+                   if by_section.get(self.build_step.section_of(pid))]
+        trees = self._parallel(
+            lambda item: self.build_tree(item[0], item[1], by_section[self.build_step.section_of(item[0])]),
+            prompts,
+        )
+        return json.dumps({pid: tree for (pid, _), tree in zip(prompts, trees)}, indent=2, ensure_ascii=False)
+
+
+# 테스트 실행
+if __name__ == "__main__":
+    infile = "sample/example.txt"
+    outfile = "sample/step2_result_map_reduce.json"
+
+    raw_text = Path(infile).read_text(encoding="utf-8")
+    result_text = MapReduceTreeBuilder().run(raw_text)
+
+    Path(outfile).write_text(result_text, encoding="utf-8")
+    print(f"[MapReduce] ✅ 트리 구성 완료 → {outfile}")
+    print("\n=== Preview ===")
+    print(result_text[:500], "...")
@@ -0,0 +1,112 @@
+"""
+uploads.py
+───────────────────────────────
+업로드 파일 저장 (내용 해시 기준)
+- 요청 스트림을 조각 단위로 임시 파일에 쓰면서 sha256 계산 → 메모리에 파일 전체를 올리지 않음
+- 크기 제한(max_bytes)을 넘으면 쓰던 임시 파일을 지우고 UploadTooLarge
+- 저장 이름은 uploads/<sha256>.txt → 같은 내용은 한 파일, 이름이 같은 다른 논문도 서로 덮어쓰지 않음
+- 문서 키(doc_id, Orchestrator 의 증분 재분석 키)는 내용 해시가 아니라 클라이언트가 준 doc_id 또는 원래 파일 이름
+  (doc_key) → 고친 원고를 다시 올려도 같은 키의 이전 상태에서 바뀐 노드만 다시 실행
+
+환경 변수
+- TREELLM_UPLOAD_DIR       : 저장 폴더 (기본: uploads)
+- TREELLM_UPLOAD_MAX_BYTES : 업로드 최대 크기 (기본: 20MB)
+"""
+
+from __future__ import annotations
+from dataclasses import dataclass
+from pathlib import Path
+from typing import BinaryIO, Optional
+import hashlib
+import os
+import re
+import tempfile
+
+CHUNK_BYTES = 64 * 1024
+DOC_KEY_MAX = 100
+
+
+def upload_dir() -> Path:
+    return Path(os.getenv("TREELLM_UPLOAD_DIR", "uploads"))
+
+
+def upload_max_bytes() -> int:
+    return int(os.getenv("TREELLM_UPLOAD_MAX_BYTES", str(20 * 1024 * 1024)))
+
+
+class UploadTooLarge(ValueError):
+    pass
+
+
+@dataclass
+class StoredUpload:
+    """
+    path      : 저장된 파일 (uploads/<doc_hash>.txt)
+    doc_hash  : 내용 sha256
+    size      : 바이트 수
+    duplicate : 같은 내용이 이미 있었는지
+    """
+    path: Path
+    doc_hash: str
+    size: int
+    duplicate: bool
+
+
+def store_upload(stream: BinaryIO, folder: str | Path | None = None,
+                 max_bytes: Optional[int] = None) -> StoredUpload:
+    """
+    스트림 → 해시 이름 파일 (같은 내용이 이미 있으면 새로 쓰지 않고 그 파일)
+    """
+    folder = Path(folder) if folder else upload_dir()
+    max_bytes = upload_max_bytes() if max_bytes is None else max_bytes
+    folder.mkdir(parents=True, exist_ok=True)
+
+    digest = hashlib.sha256()
+    size = 0
+    fd, tmp = tempfile.mkstemp(dir=folder, suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while True:
+                chunk = stream.read(CHUNK_BYTES)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadTooLarge(f"업로드 크기 제한 초과 ({max_bytes} bytes)")
+                digest.update(chunk)
+                out.write(chunk)
+        doc_hash = digest.hexdigest()
+        path = folder / f"{doc_hash}.txt"
+        duplicate = path.exists()
+        if duplicate:
+            os.unlink(tmp)
+        else:
+            os.replace(tmp, path)  # 같은 내용을 동시에 올려도 결과 파일은 하나
+        return StoredUpload(path, doc_hash, size, duplicate)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+
+
+def doc_hash_of(path: str | Path) -> str:
+    """
+    저장된 업로드는 파일 이름에서, 그 밖의 파일은 내용을 읽어서 sha256
+    """
+    path = Path(path)
+    if path.parent.resolve() == upload_dir().resolve() and len(path.stem) == 64:
+        return path.stem
+    digest = hashlib.sha256()
+    with path.open("rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_BYTES), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def doc_key(filename: str, doc_id: Optional[str] = None) -> str:
+    """
+    업로드의 문서 키: 클라이언트 doc_id, 없으면 원래 파일 이름(stem) → 경로/공백 문자를 "_" 로 바꾼 키
+    """
+    key = (doc_id or "").strip() or Path(filename.replace("\\", "/")).stem
+    key = re.sub(r"[^\w.-]", "_", key).strip("._")[:DOC_KEY_MAX]
+    return key or "document"
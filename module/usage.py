@@ -0,0 +1,272 @@
+"""
+usage.py
+───────────────────────────────
+LLM 호출별 토큰 / 지연 시간 / 비용 기록
+- 호출 전에 프롬프트 토큰을 로컬에서 추정 (tiktoken 이 있으면 사용, 없으면 글자 수 / 4)
+- 호출 후 응답의 usage(실제 토큰)와 지연 시간, 모델, 단계(step), 노드(섹션/기준) 기록
+- 실행(run)마다 UsageTracker 하나 → 단계별/노드별 합계 (usage.json, 결과 JSON, 로그)
+- 실행 요약은 runs/usage_history.jsonl 에 누적 → 실행 간 비교
+- 구조화 출력이 재요청까지 실패해 결과를 버리거나 대체한 경우(degraded)도 실행별로 기록
+
+사용법
+    python -m module.usage history            # 최근 실행 요약 비교
+    python -m module.usage show <run_id>      # 한 실행의 단계별 사용량
+"""
+
+from __future__ import annotations
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+import argparse
+import json
+import threading
+
+from . import tracing
+from .dag import current_node
+
+try:
+    import tiktoken
+except ImportError:  # 선택 의존성: 없으면 글자 수로 추정
+    tiktoken = None
+
+# 1M 토큰당 USD (입력, 출력) — 목록에 없는 모델은 비용 0 으로 계산
+# prefix 캐시에 적중한 입력 토큰은 입력 단가의 CACHED_INPUT_RATIO 배
+PRICES: Dict[str, tuple] = {
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4.1": (2.00, 8.00),
+    "gpt-4.1-mini": (0.40, 1.60),
+    "gpt-4-turbo": (10.00, 30.00),
+    "gpt-3.5-turbo": (0.50, 1.50),
+}
+
+CACHED_INPUT_RATIO = 0.5
+
+HISTORY_FILE = "usage_history.jsonl"
+
+
+# ─────────────────────────────
+@lru_cache(maxsize=16)
+def _encoding(model: str):
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("o200k_base")
+
+
+def count_tokens(text: str, model: str = "gpt-4o") -> int:
+    if tiktoken is None:
+        return (len(text) + 3) // 4
+    return len(_encoding(model).encode(text, disallowed_special=()))
+
+
+def estimate_tokens(messages: List[Dict[str, str]], model: str = "gpt-4o") -> int:
+    """
+    chat 메시지 프롬프트 토큰 추정 (메시지당 4, 응답 시작 3 토큰 여유분 포함)
+    """
+    return sum(4 + count_tokens(m.get("content") or "", model) for m in messages) + 3
+
+
+def cost_of(model: str, prompt_tokens: int, completion_tokens: int, cached_tokens: int = 0) -> float:
+    price = PRICES.get(model)
+    if price is None:
+        # 날짜가 붙은 스냅샷 이름 (예: gpt-4o-2024-08-06) → 가장 긴 접두사
+        prefixes = [name for name in PRICES if model.startswith(name)]
+        price = PRICES[max(prefixes, key=len)] if prefixes else (0.0, 0.0)
+    uncached = prompt_tokens - cached_tokens
+    return (uncached * price[0] + cached_tokens * price[0] * CACHED_INPUT_RATIO
+            + completion_tokens * price[1]) / 1_000_000
+
+
+@dataclass
+class UsageRecord:
+    """
+    step              : LLMClient.complete 의 step (build, audit, edit1 ...)
+    node              : 호출한 DAG 노드 (build:abstract, audit:<기준>, edit1:<섹션> ...)
+    estimated_tokens  : 호출 전 로컬 추정 프롬프트 토큰
+    prompt_tokens     : 실제 프롬프트 토큰 (응답 usage, 없으면 추정치)
+    completion_tokens : 실제 출력 토큰 (응답 usage, 없으면 추정치)
+    cached_tokens     : prompt_tokens 중 공급자 prefix 캐시에 적중한 토큰
+    route             : 라우팅 결정 (primary / fallback:<이유>, 라우팅을 안 쓰면 "")
+    source            : api / cache / batch
+    estimated         : usage 가 응답에 없어 추정치를 쓴 경우 True
+    """
+    step: str
+    node: Optional[str]
+    model: str
+    estimated_tokens: int
+    prompt_tokens: int
+    completion_tokens: int
+    latency: float
+    source: str = "api"
+    estimated: bool = False
+    cached_tokens: int = 0
+    route: str = ""
+
+    @property
+    def cost(self) -> float:
+        if self.source == "cache":
+            return 0.0
+        return cost_of(self.model, self.prompt_tokens, self.completion_tokens, self.cached_tokens)
+
+
+def _empty() -> Dict[str, Any]:
+    return {"calls": 0, "cache_hits": 0, "estimated_tokens": 0, "prompt_tokens": 0, "cached_tokens": 0,
+            "completion_tokens": 0, "latency": 0.0, "cost_usd": 0.0}
+
+
+def _add(total: Dict[str, Any], rec: UsageRecord):
+    total["calls"] += 1
+    total["cache_hits"] += rec.source == "cache"
+    total["estimated_tokens"] += rec.estimated_tokens
+    total["prompt_tokens"] += rec.prompt_tokens
+    total["cached_tokens"] += rec.cached_tokens
+    total["completion_tokens"] += rec.completion_tokens
+    total["latency"] = round(total["latency"] + rec.latency, 3)
+    total["cost_usd"] = round(total["cost_usd"] + rec.cost, 6)
+
+
+class UsageTracker:
+    """
+    한 실행(run)의 호출 기록 모음 (여러 노드 스레드에서 동시에 add 해도 안전)
+    """
+
+    def __init__(self):
+        self.records: List[UsageRecord] = []
+        self.degraded: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+
+    def add(self, record: UsageRecord):
+        with self._lock:
+            self.records.append(record)
+
+    def add_degraded(self, entry: Dict[str, Any]):
+        with self._lock:
+            self.degraded.append(entry)
+
+    def summary(self) -> Dict[str, Any]:
+        """
+        {"total": {...}, "by_step": {step: {...}}, "by_node": {node: {...}}, "by_model": {model: {...}},
+         "degraded": {step: {action: 횟수}}}
+        latency 는 호출 지연 시간의 합 (병렬 실행이라 실제 경과 시간보다 큼)
+        """
+        with self._lock:
+            records = list(self.records)
+            degraded = list(self.degraded)
+        summary = {"total": _empty(), "by_step": {}, "by_node": {}, "by_model": {}, "degraded": {}}
+        for entry in degraded:
+            by_action = summary["degraded"].setdefault(entry["step"], {})
+            by_action[entry["action"]] = by_action.get(entry["action"], 0) + 1
+        for rec in records:
+            _add(summary["total"], rec)
+            _add(summary["by_step"].setdefault(rec.step, _empty()), rec)
+            _add(summary["by_node"].setdefault(rec.node or rec.step, _empty()), rec)
+            _add(summary["by_model"].setdefault(rec.model, _empty()), rec)
+        return summary
+
+    def routes(self) -> Dict[str, Any]:
+        """
+        라우팅된 호출의 결정 목록 + 결정/모델별 집계 (라우팅을 안 쓴 호출은 제외)
+        {"decisions": [{node, step, model, route, latency, cost_usd}], "by_route": {...}, "by_model": {...}}
+        """
+        with self._lock:
+            records = [r for r in self.records if r.route]
+        out: Dict[str, Any] = {"decisions": [], "by_route": {}, "by_model": {}}
+        for rec in records:
+            out["decisions"].append({"node": rec.node or rec.step, "step": rec.step, "model": rec.model,
+                                     "route": rec.route, "latency": rec.latency, "cost_usd": round(rec.cost, 6)})
+            _add(out["by_route"].setdefault(rec.route, _empty()), rec)
+            _add(out["by_model"].setdefault(rec.model, _empty()), rec)
+        return out
+
+    def save(self, path: str | Path):
+        with self._lock:
+            calls = [dict(asdict(r), cost_usd=round(r.cost, 6)) for r in self.records]
+            degraded = list(self.degraded)
+        Path(path).write_text(
+            json.dumps({"summary": self.summary(), "calls": calls, "degraded": degraded}, indent=2,
+                       ensure_ascii=False),
+            encoding="utf-8",
+        )
+
+
+# 현재 실행의 tracker (Orchestrator 가 설정, dag 노드 스레드로 전달됨)
+current_tracker: ContextVar[Optional[UsageTracker]] = ContextVar("current_tracker", default=None)
+
+
+def record(step: str, model: str, estimated_tokens: int, prompt_tokens: int, completion_tokens: int,
+           latency: float, source: str = "api", estimated: bool = False, cached_tokens: int = 0,
+           route: str = ""):
+    """
+    현재 tracker 에 호출 하나 기록 (실행 밖에서의 호출은 무시)
+    현재 span(LLM 호출)에도 토큰 수/출처를 속성으로 남김
+    """
+    sp = tracing.current_span.get()
+    if sp is not None:
+        sp.attrs.update(source=source, prompt_tokens=prompt_tokens, completion_tokens=completion_tokens,
+                        estimated_tokens=estimated_tokens, cached_tokens=cached_tokens)
+        if route:
+            sp.attrs["route"] = route
+    tracker = current_tracker.get()
+    if tracker is None:
+        return
+    tracker.add(UsageRecord(step, current_node.get(), model, estimated_tokens, prompt_tokens,
+                            completion_tokens, round(latency, 3), source, estimated, cached_tokens, route))
+
+
+def record_degraded(step: str, action: str, error: str = ""):
+    """
+    현재 tracker 에 구조화 출력 대체(degraded) 하나 기록 (action: dropped / local_merge / original ...)
+    """
+    tracker = current_tracker.get()
+    if tracker is None:
+        return
+    tracker.add_degraded({"step": step, "node": current_node.get(), "action": action, "error": error[:300]})
+
+
+# ─────────────────────────────
+def append_history(root: str | Path, entry: Dict[str, Any]):
+    root = Path(root)
+    root.mkdir(parents=True, exist_ok=True)
+    with open(root / HISTORY_FILE, "a", encoding="utf-8") as fp:
+        fp.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+
+def load_history(root: str | Path) -> List[Dict[str, Any]]:
+    path = Path(root) / HISTORY_FILE
+    if not path.exists():
+        return []
+    return [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines() if line.strip()]
+
+
+def format_row(name: str, u: Dict[str, Any]) -> str:
+    return (f"{name:<28} calls {u['calls']:>4} (cache {u['cache_hits']:>3})  "
+            f"in {u['prompt_tokens']:>8} (cached {u.get('cached_tokens', 0):>7})  out {u['completion_tokens']:>7}  "
+            f"{u['latency']:>8.1f}s  ${u['cost_usd']:.4f}")
+
+
+if __name__ == "__main__":
+    from .workspace import runs_root
+
+    parser = argparse.ArgumentParser(description="LLM 사용량 비교")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_hist = sub.add_parser("history", help="실행별 합계 비교")
+    p_hist.add_argument("--last", type=int, default=20)
+    p_show = sub.add_parser("show", help="한 실행의 단계별/노드별 사용량")
+    p_show.add_argument("run_id")
+    p_show.add_argument("--nodes", action="store_true", help="노드별로도 출력")
+    args = parser.parse_args()
+
+    if args.command == "history":
+        for entry in load_history(runs_root())[-args.last:]:
+            print(format_row(f"{entry['run_id']} {entry.get('doc_id', '')}", entry["total"]))
+    else:
+        data = json.loads((runs_root() / args.run_id / "usage.json").read_text(encoding="utf-8"))
+        groups = ["by_step", "by_node"] if args.nodes else ["by_step"]
+        for group in groups:
+            for name, u in data["summary"][group].items():
+                print(format_row(name, u))
+            print()
+        print(format_row("TOTAL", data["summary"]["total"]))
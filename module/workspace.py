@@ -0,0 +1,165 @@
+"""
+workspace.py
+───────────────────────────────
+실행(run)별 격리 작업 공간
+- run_id 마다 runs/<run_id>/ 디렉터리 + 전용 로그 파일
+- 보관 정책(나이/개수)에 따라 오래된 작업 공간 정리
+  (끝까지 실행된(done 표시) run 만, 실행 중인 프로세스가 잡고 있는(run.lock) run 은 건너뜀)
+
+환경 변수
+- TREELLM_RUNS_DIR                : 작업 공간 루트 (기본: runs)
+- TREELLM_RUN_RETENTION_HOURS     : 이 시간보다 오래된 run 삭제 (기본: 72, 0 이면 끔)
+- TREELLM_RUN_RETENTION_COUNT     : 최근 N개만 보관 (기본: 200, 0 이면 끔)
+- TREELLM_RUN_LOCK_STALE          : 다른 호스트의 run.lock 을 살아 있다고 볼 시간(초, 기본: 600)
+"""
+
+from __future__ import annotations
+from datetime import datetime
+from pathlib import Path
+from typing import Iterable, List, Optional
+import os
+import re
+import shutil
+import socket
+import threading
+import time
+import uuid
+
+_RUN_ID = re.compile(r"^[\w-]+$")
+DONE = "done"          # 끝까지 실행된 run 표시 → 이 파일이 있어야 정리 대상
+RUN_LOCK = "run.lock"  # 실행 중인 프로세스 ("<호스트> <pid>"), 노드가 끝날 때마다 mtime 갱신
+
+
+def new_run_id() -> str:
+    return f"{datetime.now():%Y%m%d-%H%M%S}-{uuid.uuid4().hex[:8]}"
+
+
+def runs_root() -> Path:
+    return Path(os.getenv("TREELLM_RUNS_DIR", "runs"))
+
+
+class Workspace:
+    """
+    하나의 파이프라인 실행에 속한 파일(단계 결과, 로그)을 모아 두는 디렉터리
+    """
+
+    def __init__(self, run_id: Optional[str] = None, root: str | Path | None = None):
+        self.run_id = run_id or new_run_id()
+        if not _RUN_ID.match(self.run_id):
+            raise ValueError(f"잘못된 run_id: {self.run_id}")
+        self.root = Path(root) if root else runs_root()
+        self.dir = self.root / self.run_id
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self.log_file = self.dir / "orchestrator_log.txt"
+        self._lock = threading.Lock()
+
+    def path(self, name: str) -> Path:
+        return self.dir / name
+
+    def log(self, message: str):
+        print(message)
+        with self._lock, open(self.log_file, "a", encoding="utf-8") as log:
+            log.write(f"[{datetime.now()}] {message}\n")
+
+    # ─────────────────────────────
+    def acquire(self):
+        """
+        실행 시작 → run.lock 기록 (다른 실행의 cleanup 이 이 작업 공간을 지우지 않음)
+        """
+        self.path(RUN_LOCK).write_text(f"{socket.gethostname()} {os.getpid()}", encoding="utf-8")
+
+    def heartbeat(self):
+        self.path(RUN_LOCK).touch()
+
+    def release(self):
+        self.path(RUN_LOCK).unlink(missing_ok=True)
+
+    def mark_done(self):
+        self.path(DONE).write_text(str(datetime.now()), encoding="utf-8")
+
+
+def find_run(run_id: str, root: str | Path | None = None) -> Optional[Path]:
+    """
+    재개할 수 있는 작업 공간 (run.json 이 있는 runs/<run_id>/) → 경로, 없거나 잘못된 run_id 면 None
+    """
+    if not run_id or not _RUN_ID.match(run_id):
+        return None
+    path = (Path(root) if root else runs_root()) / run_id
+    return path if (path / "run.json").is_file() else None
+
+
+# ─────────────────────────────
+def _locked(path: Path, stale: float) -> bool:
+    """
+    run.lock 이 살아 있는지: 같은 호스트면 pid 생존 여부, 다른 호스트면 최근 stale 초 안에 갱신됐는지
+    """
+    lock = path / RUN_LOCK
+    try:
+        host, pid = lock.read_text(encoding="utf-8").split()
+        mtime = lock.stat().st_mtime
+    except (OSError, ValueError):
+        return lock.exists()  # 쓰는 중이거나 읽을 수 없음 → 안전하게 살아 있다고 봄
+    if host != socket.gethostname():
+        return time.time() - mtime < stale
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except (PermissionError, ValueError):
+        return True
+    return True
+
+
+def _last_modified(path: Path) -> float:
+    """
+    작업 공간 안에서 가장 최근에 바뀐 파일의 mtime (디렉터리 mtime 은 파일 내용 갱신을 반영하지 않음)
+    """
+    latest = path.stat().st_mtime
+    for p in path.rglob("*"):
+        try:
+            latest = max(latest, p.stat().st_mtime)
+        except OSError:
+            continue
+    return latest
+
+
+def cleanup(
+    root: str | Path | None = None,
+    max_age_hours: Optional[float] = None,
+    max_runs: Optional[int] = None,
+    keep: Iterable[str] = (),
+) -> List[str]:
+    """
+    보관 정책에 맞지 않는 작업 공간 삭제 → 삭제한 run_id 목록
+    keep: 지워서는 안 되는 run_id (현재 실행 중인 run 등)
+    done 표시가 없는 run (진행 중 / 실패 후 재개 대기) 과 run.lock 이 살아 있는 run 은 나이·개수와 무관하게 남김
+    """
+    root = Path(root) if root else runs_root()
+    if max_age_hours is None:
+        max_age_hours = float(os.getenv("TREELLM_RUN_RETENTION_HOURS", "72"))
+    if max_runs is None:
+        max_runs = int(os.getenv("TREELLM_RUN_RETENTION_COUNT", "200"))
+    if not root.is_dir():
+        return []
+
+    stale = float(os.getenv("TREELLM_RUN_LOCK_STALE", "600"))
+
+    keep = set(keep)
+    runs = []
+    for p in root.iterdir():
+        if not p.is_dir() or p.name in keep or not (p / DONE).is_file() or _locked(p, stale):
+            continue
+        try:
+            runs.append((_last_modified(p), p))
+        except OSError:
+            continue  # 그 사이 다른 프로세스가 지움
+    runs.sort(key=lambda item: item[0], reverse=True)
+    now = time.time()
+    removed = []
+    for i, (mtime, path) in enumerate(runs):
+        too_old = max_age_hours > 0 and now - mtime > max_age_hours * 3600
+        too_many = max_runs > 0 and i >= max_runs
+        if too_old or too_many:
+            shutil.rmtree(path, ignore_errors=True)
+            removed.append(path.name)
+    return removed
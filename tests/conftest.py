@@ -0,0 +1,8 @@
+"""
+저장소 루트를 import 경로에 추가 (tests/ 어디서 pytest 를 돌려도 module.*, Orchestrator 를 불러옴)
+"""
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
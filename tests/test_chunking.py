@@ -0,0 +1,147 @@
+"""
+module/chunking.py: 예산/겹침 불변식, 결정적 병합, 순서 유지 병렬 실행
+"""
+
+import asyncio
+import contextvars
+import threading
+import time
+
+import pytest
+
+from module.chunking import gather_map, merge_reports, parallel_map, split_text, units
+from module.usage import count_tokens
+
+
+def paper(paragraphs: int = 40) -> str:
+    return "\n\n".join(
+        f"Paragraph {i} opens here. " + " ".join(f"Sentence {i}.{j} says something about topic {j}." for j in range(6))
+        for i in range(paragraphs)
+    )
+
+
+def leading_overlap(prev: str, nxt: str) -> list:
+    """
+    nxt 앞부분 중 prev 끝 단위들을 그대로 반복한 단위 목록
+    """
+    a, b = prev.split("\n\n"), nxt.split("\n\n")
+    for k in range(min(len(a), len(b)), 0, -1):
+        if a[-k:] == b[:k]:
+            return b[:k]
+    return []
+
+
+# ─────────────────────────────
+def test_short_text_is_returned_unchanged():
+    text = "  짧은 본문\n\n그대로  "
+    assert split_text(text, budget=1000) == [text]
+
+
+@pytest.mark.parametrize("budget, overlap", [(200, 0), (200, 40), (300, 100), (120, 500)])
+def test_chunks_stay_within_budget(budget, overlap):
+    chunks = split_text(paper(), budget=budget, overlap=overlap)
+    assert len(chunks) > 1
+    assert all(count_tokens(c) <= budget for c in chunks)
+
+
+@pytest.mark.parametrize("overlap", [0, 40, 100])
+def test_chunks_cover_every_unit_in_order(overlap):
+    text = paper()
+    budget = 250
+    chunks = split_text(text, budget=budget, overlap=overlap)
+    seen = []
+    for i, chunk in enumerate(chunks):
+        parts = chunk.split("\n\n")
+        repeated = len(leading_overlap(chunks[i - 1], chunk)) if i and overlap else 0
+        seen += parts[repeated:]
+    assert seen == units(text, budget)
+
+
+@pytest.mark.parametrize("overlap", [0, 40, 100])
+def test_overlap_is_bounded(overlap):
+    budget = 250
+    chunks = split_text(paper(), budget=budget, overlap=overlap)
+    limit = min(overlap, budget // 4)
+    for prev, nxt in zip(chunks, chunks[1:]):
+        repeated = leading_overlap(prev, nxt)
+        assert sum(count_tokens(u) + 1 for u in repeated) <= limit
+        assert nxt.split("\n\n") != repeated  # 조각마다 새 단위가 있음 (무한 반복 없음)
+    if overlap == 0:
+        assert all(not leading_overlap(p, n) for p, n in zip(chunks, chunks[1:]))
+
+
+def test_long_paragraph_falls_back_to_sentences_and_hard_cuts():
+    long_sentence = "word " * 400
+    text = "First. Second sentence here.\n\n" + long_sentence.strip() + ". Tail."
+    chunks = split_text(text, budget=60, overlap=0)
+    assert all(count_tokens(c) <= 60 for c in chunks)
+    assert "".join(chunks).replace("\n", "").replace(" ", "") == text.replace("\n", "").replace(" ", "")
+
+
+def test_split_is_deterministic():
+    text = paper(25)
+    assert split_text(text, 200, 50) == split_text(text, 200, 50)
+
+
+def test_overlap_defaults_to_env(monkeypatch):
+    text = paper()
+    monkeypatch.setenv("TREELLM_CHUNK_OVERLAP", "0")
+    assert split_text(text, 250) == split_text(text, 250, overlap=0)
+
+
+# ─────────────────────────────
+def test_merge_reports_unions_lists_in_order():
+    merged = merge_reports([
+        {"issues": ["A", "b"], "suggestions": ["x"]},
+        {"issues": ["  a ", "C"], "analysis": "첫 조각"},
+        {"issues": ["c", "D"], "suggestions": ["X", "y"]},
+    ])
+    assert merged == {"issues": ["A", "b", "C", "D"], "suggestions": ["x", "y"], "analysis": "첫 조각"}
+    assert list(merged) == ["issues", "suggestions", "analysis"]
+
+
+def test_merge_reports_joins_distinct_strings_and_recurses_into_dicts():
+    merged = merge_reports([
+        {"summary": "도입이 약함", "scores": {"clarity": 3, "notes": ["n1"]}},
+        {"summary": "도입이 약함", "scores": {"clarity": 5, "notes": ["n2"]}},
+        {"summary": "실험이 부족", "scores": {"novelty": 4}},
+    ])
+    assert merged["summary"] == "도입이 약함\n실험이 부족"
+    assert merged["scores"] == {"clarity": 3, "notes": ["n1", "n2"], "novelty": 4}
+
+
+def test_merge_reports_keeps_first_value_on_type_mismatch_and_handles_empty():
+    assert merge_reports([{"a": [1]}, {"a": "x"}]) == {"a": [1]}
+    assert merge_reports([]) == {}
+    report = {"issues": ["a"]}
+    assert merge_reports([report]) == report
+
+
+# ─────────────────────────────
+def test_parallel_map_keeps_order_and_context():
+    var = contextvars.ContextVar("var", default="none")
+    var.set("caller")
+    threads = set()
+
+    def fn(i):
+        threads.add(threading.get_ident())
+        time.sleep(0.01 * (5 - i))
+        return i, var.get()
+
+    assert parallel_map(fn, list(range(5)), max_workers=5) == [(i, "caller") for i in range(5)]
+    assert len(threads) > 1
+
+
+def test_gather_map_limits_concurrency_and_keeps_order():
+    active = peak = 0
+
+    async def fn(i):
+        nonlocal active, peak
+        active += 1
+        peak = max(peak, active)
+        await asyncio.sleep(0.01 * (6 - i))
+        active -= 1
+        return i * 2
+
+    assert asyncio.run(gather_map(fn, list(range(6)), max_workers=2)) == [i * 2 for i in range(6)]
+    assert peak == 2
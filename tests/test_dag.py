@@ -0,0 +1,280 @@
+"""
+module/dag.py: 실행 순서 / memo 재사용 / keep_going / 그래프 검사 (run 과 asyncio 버전 arun)
+"""
+
+import asyncio
+import threading
+
+import pytest
+
+from module.dag import Graph, current_node, mark_degraded
+
+
+class DictMemo:
+    """
+    incremental.RunState / CheckpointStore 와 같은 메서드를 가진 메모리 memo
+    """
+
+    def __init__(self, saved=None):
+        self.saved = dict(saved or {})
+        self.recorded = {}
+
+    def fingerprint(self, node, args):
+        return f"{node.name}:{node.version}:{sorted(args.items())}"
+
+    def lookup(self, name, fp):
+        return self.saved.get((name, fp))
+
+    def record(self, name, fp, outputs):
+        self.recorded[(name, fp)] = outputs
+
+
+def diamond(calls=None):
+    calls = calls if calls is not None else []
+
+    def node(name, fn):
+        def run(d):
+            calls.append(name)
+            return fn(d)
+        return run
+
+    graph = Graph(max_workers=4)
+    graph.add("a", node("a", lambda d: d["x"] + 1), inputs=["x"])
+    graph.add("b", node("b", lambda d: d["a"] * 2), inputs=["a"])
+    graph.add("c", node("c", lambda d: d["a"] * 3), inputs=["a"])
+    graph.add("d", node("d", lambda d: d["b"] + d["c"]), inputs=["b", "c"])
+    return graph, calls
+
+
+def test_run_yields_every_node_after_its_inputs():
+    graph, _ = diamond()
+    order = [name for name, _ in graph.run({"x": 1})]
+    assert sorted(order) == ["a", "b", "c", "d"]
+    assert order[0] == "a" and order[-1] == "d"
+
+
+def test_run_outputs_and_multi_output_nodes():
+    graph = Graph()
+    graph.add("pair", lambda d: {"p": d["x"], "q": -d["x"]}, inputs=["x"], outputs=["p", "q"])
+    graph.add("sum", lambda d: d["p"] + d["q"], inputs=["p", "q"])
+    results = dict(graph.run({"x": 5}))
+    assert results["pair"] == {"p": 5, "q": -5}
+    assert results["sum"] == {"sum": 0}
+
+
+def test_nodes_see_current_node():
+    graph = Graph()
+    graph.add("who", lambda d: current_node.get())
+    assert dict(graph.run())["who"] == {"who": "who"}
+
+
+def test_memo_reuses_matching_fingerprints():
+    first = DictMemo()
+    graph, calls = diamond()
+    list(graph.run({"x": 1}, memo=first))
+    assert len(calls) == 4
+
+    graph, calls = diamond()
+    second = DictMemo(first.recorded)
+    results = dict(graph.run({"x": 1}, memo=second))
+    assert calls == []
+    assert results["d"] == {"d": 10}
+    assert second.recorded == first.recorded  # 재사용한 노드도 다시 기록
+
+
+def test_memo_reruns_nodes_whose_inputs_changed():
+    first = DictMemo()
+    graph, _ = diamond()
+    list(graph.run({"x": 1}, memo=first))
+
+    graph, calls = diamond()
+    list(graph.run({"x": 2}, memo=DictMemo(first.recorded)))
+    assert sorted(calls) == ["a", "b", "c", "d"]
+
+
+def test_memo_false_nodes_always_run():
+    calls = []
+    graph = Graph()
+    graph.add("write", lambda d: calls.append(1) or len(calls), inputs=["x"], memo=False)
+    memo = DictMemo()
+    list(graph.run({"x": 1}, memo=memo))
+    list(graph.run({"x": 1}, memo=DictMemo(memo.recorded)))
+    assert len(calls) == 2
+    assert memo.recorded == {}
+
+
+def test_degraded_nodes_are_not_memoized():
+    def degraded(d):
+        mark_degraded("dropped")
+        return ""
+
+    graph = Graph()
+    graph.add("ok", lambda d: d["x"], inputs=["x"])
+    graph.add("bad", degraded, inputs=["x"])
+    graph.add("join", lambda d: d["ok"] + d["bad"], inputs=["ok", "bad"])
+    memo = DictMemo()
+    assert dict(graph.run({"x": "a"}, memo=memo))["join"] == {"join": "a"}
+    assert sorted(name for name, _ in memo.recorded) == ["join", "ok"]
+    mark_degraded("outside")  # 노드 밖에서는 무시
+
+
+def failing_graph(ran):
+    graph = Graph(max_workers=2)
+    gate = threading.Event()
+
+    def boom(d):
+        raise RuntimeError("boom")
+
+    def slow(d):
+        gate.wait(0.2)
+        ran.append("slow")
+        return 1
+
+    graph.add("bad", boom, inputs=["x"])
+    graph.add("after_bad", lambda d: ran.append("after_bad"), inputs=["bad"])
+    graph.add("slow", slow, inputs=["x"])
+    graph.add("after_slow", lambda d: ran.append("after_slow") or 2, inputs=["slow"])
+    return graph
+
+
+def test_failure_raises():
+    ran = []
+    with pytest.raises(RuntimeError, match="boom"):
+        list(failing_graph(ran).run({"x": 0}))
+    assert "after_bad" not in ran
+
+
+def test_keep_going_finishes_independent_nodes_then_raises():
+    ran = []
+    done = []
+    with pytest.raises(RuntimeError, match="boom"):
+        for name, _ in failing_graph(ran).run({"x": 0}, keep_going=True):
+            done.append(name)
+    assert sorted(done) == ["after_slow", "slow"]
+    assert "after_bad" not in ran
+
+
+def test_cycle_detection():
+    graph = Graph()
+    graph.add("a", lambda d: 1, inputs=["b"])
+    graph.add("b", lambda d: 1, inputs=["a"])
+    with pytest.raises(ValueError, match="순환"):
+        list(graph.run())
+
+
+def test_missing_input_and_duplicate_output():
+    graph = Graph()
+    graph.add("a", lambda d: 1, inputs=["nowhere"])
+    with pytest.raises(ValueError, match="입력을 만드는 노드 없음"):
+        list(graph.run())
+
+    graph = Graph()
+    graph.add("a", lambda d: 1, outputs=["k"])
+    graph.add("b", lambda d: 2, outputs=["k"])
+    with pytest.raises(ValueError, match="출력 키 중복"):
+        list(graph.run())
+
+    graph = Graph()
+    graph.add("a", lambda d: 1)
+    with pytest.raises(ValueError, match="중복 노드"):
+        graph.add("a", lambda d: 1)
+
+
+# ─────────────────────────────
+def arun(graph, *args, **kwargs):
+    async def collect():
+        return [item async for item in graph.arun(*args, **kwargs)]
+    return asyncio.run(collect())
+
+
+def test_arun_matches_run():
+    graph, calls = diamond()
+    order = [name for name, _ in arun(graph, {"x": 1})]
+    assert sorted(order) == ["a", "b", "c", "d"] == sorted(calls)
+    assert order[0] == "a" and order[-1] == "d"
+    assert dict(arun(diamond()[0], {"x": 1})) == dict(diamond()[0].run({"x": 1}))
+
+
+def test_arun_awaits_coroutine_nodes_within_max_workers():
+    active = peak = 0
+
+    async def sleeper(d):
+        nonlocal active, peak
+        active += 1
+        peak = max(peak, active)
+        await asyncio.sleep(0.02)
+        active -= 1
+        return current_node.get()
+
+    graph = Graph(max_workers=2)
+    for i in range(4):
+        graph.add(f"sleep:{i}", sleeper)
+    graph.add("pair", lambda d: {"p": 1, "q": 2}, outputs=["p", "q"])
+    results = dict(arun(graph))
+    assert results["sleep:3"] == {"sleep:3": "sleep:3"}
+    assert results["pair"] == {"p": 1, "q": 2}
+    assert peak == 2
+
+
+def test_arun_memo_is_shared_with_run():
+    first = DictMemo()
+    graph, _ = diamond()
+    list(graph.run({"x": 1}, memo=first))
+
+    graph, calls = diamond()
+    second = DictMemo(first.recorded)
+    results = dict(arun(graph, {"x": 1}, memo=second))
+    assert calls == []
+    assert results["d"] == {"d": 10}
+    assert second.recorded == first.recorded
+
+    graph, calls = diamond()
+    list(arun(graph, {"x": 2}, memo=DictMemo(first.recorded)))
+    assert sorted(calls) == ["a", "b", "c", "d"]
+
+
+def test_arun_skips_degraded_nodes_in_memo():
+    async def degraded(d):
+        mark_degraded("empty")
+        return {}
+
+    graph = Graph()
+    graph.add("bad", lambda d: degraded(d), inputs=["x"])
+    graph.add("ok", lambda d: 1, inputs=["x"])
+    memo = DictMemo()
+    assert dict(arun(graph, {"x": 1}, memo=memo)) == {"bad": {"bad": {}}, "ok": {"ok": 1}}
+    assert list(memo.recorded) == [("ok", memo.fingerprint(graph.nodes["ok"], {"x": 1}))]
+
+
+def test_arun_failure_raises():
+    ran = []
+    with pytest.raises(RuntimeError, match="boom"):
+        arun(failing_graph(ran), {"x": 0})
+    assert "after_bad" not in ran
+
+
+def test_arun_keep_going_finishes_independent_nodes_then_raises():
+    ran = []
+    done = []
+
+    async def collect():
+        async for name, _ in failing_graph(ran).arun({"x": 0}, keep_going=True):
+            done.append(name)
+
+    with pytest.raises(RuntimeError, match="boom"):
+        asyncio.run(collect())
+    assert sorted(done) == ["after_slow", "slow"]
+    assert "after_bad" not in ran
+
+
+def test_arun_graph_checks():
+    graph = Graph()
+    graph.add("a", lambda d: 1, inputs=["b"])
+    graph.add("b", lambda d: 1, inputs=["a"])
+    with pytest.raises(ValueError, match="순환"):
+        arun(graph)
+
+    graph = Graph()
+    graph.add("a", lambda d: 1, inputs=["nowhere"])
+    with pytest.raises(ValueError, match="입력을 만드는 노드 없음"):
+        arun(graph)
@@ -0,0 +1,256 @@
+"""
+module/job_store.py: 작업 큐 상태 전이 / 죽은 워커 복구 / 같은 문서·설정 중복 실행 방지 / 이벤트 기록과 정리
+"""
+
+import json
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from module.job_store import EventBuffer, Heartbeat, JobStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    return JobStore(tmp_path / "jobs.sqlite3")
+
+
+def delta(text, section="Introduction", step=5, reset=False):
+    event = {"step": step, "name": "EditPass1", "section": section, "delta": text}
+    if reset:
+        event["reset"] = True
+    return json.dumps(event)
+
+
+def test_claim_takes_oldest_queued_job_once(store):
+    first = store.submit("a.txt")
+    second = store.submit("b.txt")
+    job = store.claim("w0")
+    assert job["id"] == first and job["status"] == "running" and job["worker"] == "w0"
+    assert store.claim("w1")["id"] == second
+    assert store.claim("w2") is None
+
+
+def test_requeue_stale_only_touches_dead_running_jobs(store):
+    dead = store.submit("a.txt")
+    alive = store.submit("b.txt")
+    store.claim("w0")
+    store.claim("w1")
+    store._conn().execute("UPDATE jobs SET heartbeat = ? WHERE id = ?", (time.time() - 1000, dead))
+
+    assert store.requeue_stale(timeout=600) == 1
+    assert store.get(dead)["status"] == "queued" and store.get(dead)["worker"] is None
+    assert store.get(alive)["status"] == "running"
+    assert store.claim("w2")["id"] == dead
+
+
+def test_requeue_stale_ignores_finished_jobs(store):
+    job_id = store.submit("a.txt")
+    store.claim("w0")
+    store.finish(job_id, {"final": "x"})
+    store._conn().execute("UPDATE jobs SET heartbeat = 0 WHERE id = ?", (job_id,))
+    assert store.requeue_stale(timeout=1) == 0
+    assert store.get(job_id)["status"] == "done"
+
+
+def test_heartbeat_keeps_a_silent_running_job_alive(store):
+    job_id = store.submit("a.txt")
+    store.claim("w0")
+    store._conn().execute("UPDATE jobs SET heartbeat = ? WHERE id = ?", (time.time() - 1000, job_id))
+    with Heartbeat(store, job_id, interval=0.01):
+        time.sleep(0.1)
+        assert store.requeue_stale(timeout=600) == 0
+    assert store.get(job_id)["status"] == "running" and store.get(job_id)["worker"] == "w0"
+
+
+def test_resume_only_failed_jobs(store):
+    job_id = store.submit("a.txt")
+    store.claim("w0")
+    assert not store.resume(job_id)
+    store.fail(job_id, "boom")
+    assert store.resume(job_id)
+    assert store.get(job_id)["status"] == "queued"
+
+
+def test_resume_starts_a_new_attempt_without_replaying_old_events(store):
+    job_id = store.submit("a.txt")
+    store.claim("w0")
+    store.set_run_id(job_id, "run-1")
+    store.add_events(job_id, [("split", "event"), ("error", "event")])
+    store.fail(job_id, "boom")
+    assert store.resume(job_id)
+    assert store.events_since(job_id, 0) == []
+    assert store.progress(job_id)[0] == 2
+    assert store.add_event(job_id, "split again") == 3  # 이전 Last-Event-ID 로 재접속해도 새 이벤트를 받음
+    assert store.events_since(job_id, 0) == [(3, "split again")]
+
+
+def test_claiming_a_requeued_job_drops_the_dead_attempts_events(store):
+    job_id = store.submit("a.txt")
+    store.claim("w0")
+    store.set_run_id(job_id, "run-1")
+    store.add_event(job_id, "split")
+    store._conn().execute("UPDATE jobs SET heartbeat = 0 WHERE id = ?", (job_id,))
+    store.requeue_stale(timeout=600)
+    assert store.claim("w1")["id"] == job_id
+    assert store.events_since(job_id, 0) == []
+    assert store.add_event(job_id, "split") == 2
+
+
+def test_resume_run_finds_or_creates_the_job_for_a_run(store):
+    job, state = store.resume_run("run-1", "runs/run-1/input.txt", "gpt-4o", doc_id="paper")
+    assert state == "resumed" and job["status"] == "queued" and job["run_id"] == "run-1"
+    assert store.resume_run("run-1", "x", "gpt-4o")[1] == "attached"
+    store.claim("w0")
+    store.fail(job["id"], "boom")
+    again, state = store.resume_run("run-1", "x", "gpt-4o", worker="asgi-1")
+    assert state == "resumed" and again["id"] == job["id"]
+    assert again["status"] == "running" and again["worker"] == "asgi-1"
+    store.finish(job["id"], {})
+    assert store.resume_run("run-1", "x", "gpt-4o")[1] == "reused"
+
+
+def test_start_dedups_same_document_and_settings(store):
+    job, created = store.start("uploads/a.txt", "gpt-4o", "hash-a", "cfg-1", doc_id="paper")
+    assert created and job["status"] == "queued" and job["worker"] is None and job["doc_id"] == "paper"
+    again, created = store.start("uploads/a-copy.txt", "gpt-4o", "hash-a", "cfg-1", doc_id="other")
+    assert not created and again["id"] == job["id"]
+    assert store.start("uploads/a.txt", "gpt-4o", "hash-a", "cfg-2")[1]
+    assert store.start("uploads/b.txt", "gpt-4o", "hash-b", "cfg-1")[1]
+    assert store.claim("w0")["id"] == job["id"]  # 새 작업은 큐를 거쳐 워커가 실행
+
+
+def test_start_with_worker_runs_in_place_and_is_not_claimed(store):
+    job, created = store.start("a.txt", "gpt-4o", "hash-a", "cfg", worker="asgi-1")
+    assert created and job["status"] == "running" and job["worker"] == "asgi-1" and job["heartbeat"]
+    assert store.claim("w0") is None
+
+
+def test_find_prefers_done_and_skips_failed_or_dead_runs(store):
+    done = store.submit("a.txt", doc_hash="h", config="c")
+    store.claim("w0")
+    store.finish(done, {})
+    newer = store.submit("a.txt", doc_hash="h", config="c")
+    assert store.find("h", "c")["id"] == done
+
+    store.fail(done, "boom")
+    assert store.find("h", "c")["id"] == newer
+    store.claim("w1")
+    store._conn().execute("UPDATE jobs SET heartbeat = ? WHERE id = ?", (time.time() - 1000, newer))
+    assert store.find("h", "c", stale_timeout=100) is None
+    # 죽은 실행은 재사용하지 않고 새 작업을 만듦
+    assert store.start("a.txt", "gpt-4o", "h", "c", stale_timeout=100)[1]
+    assert store.find("x", "c") is None
+
+
+def test_concurrent_start_creates_one_job(store):
+    results = []
+    barrier = threading.Barrier(8)
+
+    def request():
+        barrier.wait()
+        results.append(store.start("a.txt", "gpt-4o", "hash-a", "cfg"))
+
+    threads = [threading.Thread(target=request) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert sum(created for _, created in results) == 1
+    assert len({job["id"] for job, _ in results}) == 1
+    assert store.counts() == {"queued": 1}
+
+
+def test_old_database_gains_new_columns(tmp_path):
+    path = tmp_path / "old.sqlite3"
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "CREATE TABLE jobs (id TEXT PRIMARY KEY, file_path TEXT NOT NULL, model TEXT NOT NULL,"
+        " status TEXT NOT NULL, created REAL NOT NULL, started REAL, finished REAL,"
+        " heartbeat REAL, worker TEXT, run_id TEXT, result TEXT, error TEXT)"
+    )
+    conn.execute("INSERT INTO jobs(id, file_path, model, status, created) VALUES ('old', 'a.txt', 'gpt-4o', 'done', 0)")
+    conn.commit()
+    conn.close()
+
+    store = JobStore(path)
+    assert store.get("old")["doc_id"] is None
+    job, created = store.start("a.txt", "gpt-4o", "h", "c", doc_id="paper")
+    assert created and store.get(job["id"])["doc_id"] == "paper"
+
+
+def test_events_are_numbered_per_job(store):
+    a, b = store.submit("a.txt"), store.submit("b.txt")
+    assert store.add_event(a, "1") == 1
+    assert store.add_events(a, [("2", "event"), ("3", "delta")]) == 3
+    assert store.add_event(b, "x") == 1
+    assert store.events_since(a, 1) == [(2, "2"), (3, "3")]
+
+
+def test_progress_reports_last_seq_status_and_run(store):
+    job_id = store.submit("a.txt")
+    assert store.progress(job_id) == (0, "queued", None)
+    store.claim("w0")
+    store.set_run_id(job_id, "run-1")
+    store.add_events(job_id, [("1", "event"), ("2", "delta")])
+    assert store.progress(job_id) == (2, "running", "run-1")
+    assert store.progress("missing") is None
+
+
+def test_event_buffer_coalesces_deltas_and_flushes_on_stage_events(store):
+    job_id = store.submit("a.txt")
+    buffer = EventBuffer(store, job_id, flush_ms=60_000, flush_chars=10_000)
+    assert not buffer.add(delta("Hel"))
+    assert not buffer.add(delta("lo"))
+    assert not buffer.add(delta("Other", section="Method"))
+    assert not buffer.add(delta("", reset=True))  # 재시도: 합치지 않고 그대로
+    assert store.events_since(job_id) == []
+
+    stage = json.dumps({"step": 5, "name": "EditPass1", "content": "done"})
+    assert buffer.add(stage)
+    buffer.flush()
+    events = [json.loads(data) for _, data in store.events_since(job_id)]
+    assert [e.get("delta") for e in events] == ["Hello", "Other", "", None]
+    assert events[2]["reset"] is True
+    assert events[3]["content"] == "done"
+
+
+def test_event_buffer_flushes_by_size(store):
+    buffer = EventBuffer(store, store.submit("a.txt"), flush_ms=60_000, flush_chars=5)
+    assert not buffer.add(delta("abc"))
+    assert buffer.add(delta("def"))
+
+
+def test_finish_drops_deltas_but_keeps_stage_events(store):
+    job_id = store.submit("a.txt")
+    store.add_events(job_id, [(delta("x"), "delta"), ('{"step": 1}', "event")])
+    store.finish(job_id, {"final": ""})
+    assert [data for _, data in store.events_since(job_id)] == ['{"step": 1}']
+
+
+def test_purge_finished_removes_old_jobs_and_their_events(store):
+    old, recent, running = store.submit("a.txt"), store.submit("b.txt"), store.submit("c.txt")
+    for job_id in (old, recent, running):
+        store.add_event(job_id, '{"step": 0}')
+    store.finish(old, {})
+    store.fail(recent, "boom")
+    store._conn().execute("UPDATE jobs SET finished = ? WHERE id = ?", (time.time() - 1000, old))
+
+    assert store.purge_finished(retention=100) == 1
+    assert store.get(old) is None and store.events_since(old) == []
+    assert store.get(recent) is not None and store.events_since(recent)
+    assert store.get(running) is not None
+
+
+def test_worker_metrics_keeps_latest_snapshot_per_worker(store):
+    store.put_metrics("w0", {"treellm_runs_total": [[["done"], 1]]})
+    store.put_metrics("w0", {"treellm_runs_total": [[["done"], 2]]})
+    store.put_metrics("w1", {})
+    assert sorted(json.dumps(data) for _, data in store.worker_metrics()) == \
+        ['{"treellm_runs_total": [[["done"], 2]]}', "{}"]
+
+    store._conn().execute("UPDATE worker_metrics SET updated = ? WHERE worker = 'w1'", (time.time() - 1000,))
+    store.purge_finished(retention=100)
+    assert [data for _, data in store.worker_metrics()] == [{"treellm_runs_total": [[["done"], 2]]}]
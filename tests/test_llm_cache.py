@@ -0,0 +1,36 @@
+"""
+module/llm_cache.py: 적중/누락 / 삭제 / 주기적 LRU 제거
+"""
+
+from module.llm_cache import ResponseCache
+
+
+def make_cache(tmp_path, **kwargs):
+    return ResponseCache(tmp_path / "cache.sqlite3", enabled=True, **kwargs)
+
+
+def test_get_put_and_delete(tmp_path):
+    cache = make_cache(tmp_path)
+    key = cache.make_key("gpt-4o", [{"role": "user", "content": "q"}], version="v1")
+    assert cache.get(key) is None
+    cache.put(key, "answer")
+    assert cache.get(key) == "answer"
+    cache.delete(key)
+    assert cache.get(key) is None
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_put_evicts_every_n_puts_instead_of_each_put(tmp_path):
+    cache = make_cache(tmp_path, max_bytes=10, evict_every=3, evict_interval=3600)
+    cache.put("k0", "x" * 8)
+    cache.put("k1", "x" * 8)
+    assert cache.stats()["entries"] == 2  # 아직 검사 전 (잠시 용량 초과 허용)
+    cache.put("k2", "x" * 8)
+    assert cache.stats()["entries"] == 1
+
+
+def test_put_evicts_when_interval_passed(tmp_path):
+    cache = make_cache(tmp_path, max_bytes=10, evict_every=1000, evict_interval=0)
+    cache.put("k0", "x" * 8)
+    cache.put("k1", "x" * 8)
+    assert cache.stats()["entries"] == 1
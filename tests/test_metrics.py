@@ -0,0 +1,35 @@
+"""
+module/metrics.py: 다른 프로세스(워커)의 지표 스냅숏 합산
+"""
+
+import time
+
+from module import metrics
+
+
+def sample(text, line):
+    values = [float(l.rsplit(" ", 1)[1]) for l in text.splitlines() if l.startswith(line + " ")]
+    return values[0] if values else 0.0
+
+
+def test_render_adds_worker_snapshots():
+    base = metrics.render()
+    worker = {
+        "treellm_runs_total": [[["done"], 3]],
+        "treellm_runs_in_flight": [[[], 2]],
+        "treellm_run_duration_seconds": [[[], [1, 0, 0, 0, 0, 0, 0, 0, 0, 5.0, 1]]],
+    }
+    text = metrics.render([(time.time(), worker)])
+    assert sample(text, 'treellm_runs_total{status="done"}') == sample(base, 'treellm_runs_total{status="done"}') + 3
+    assert sample(text, "treellm_runs_in_flight") == sample(base, "treellm_runs_in_flight") + 2
+    assert sample(text, "treellm_run_duration_seconds_count") == sample(base, "treellm_run_duration_seconds_count") + 1
+    assert sample(text, 'treellm_run_duration_seconds_bucket{le="10"}') == \
+        sample(base, 'treellm_run_duration_seconds_bucket{le="10"}') + 1
+
+
+def test_render_drops_gauges_of_dead_workers():
+    base = metrics.render()
+    worker = {"treellm_runs_total": [[["done"], 3]], "treellm_runs_in_flight": [[[], 2]]}
+    text = metrics.render([(time.time() - 3600, worker)], stale=60)
+    assert sample(text, 'treellm_runs_total{status="done"}') == sample(base, 'treellm_runs_total{status="done"}') + 3
+    assert sample(text, "treellm_runs_in_flight") == sample(base, "treellm_runs_in_flight")
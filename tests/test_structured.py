@@ -0,0 +1,233 @@
+"""
+module/structured.py: JSON 추출 / 복구 / 스키마 검사 / 재요청 흐름 (가짜 LLM, 네트워크 없음)
+"""
+
+import asyncio
+import json
+
+import pytest
+
+from module import usage
+from module.dag import Graph
+from module.structured import (
+    StructuredOutputError,
+    acomplete_json,
+    check,
+    complete_json,
+    extract,
+    loads,
+    parse,
+    record_fallback,
+    repair,
+    to_block,
+    validate,
+)
+
+SCHEMA = {
+    "type": "object",
+    "required": ["issues"],
+    "properties": {"issues": {"type": "array", "items": {"type": "string"}}},
+}
+
+
+class ScriptedLLM:
+    """
+    미리 정한 응답을 순서대로 돌려주고 받은 messages 를 기록
+    """
+
+    def __init__(self, *replies):
+        self.replies = list(replies)
+        self.requests = []
+
+    def complete(self, messages, **kwargs):
+        self.requests.append(messages)
+        return self.replies.pop(0)
+
+
+class AsyncScriptedLLM(ScriptedLLM):
+    async def complete(self, messages, **kwargs):
+        return ScriptedLLM.complete(self, messages, **kwargs)
+
+
+# ─────────────────────────────
+@pytest.mark.parametrize("text", [
+    '```json\n{"a": 1}\n```',
+    '```JSON {"a": 1}```',
+    '설명입니다.\n```\n{"a": 1}\n```\n끝.',
+    '결과는 다음과 같습니다: {"a": 1} 이상입니다.',
+    '```json\n{"a": 1}',  # 닫히지 않은 펜스
+])
+def test_extract_strips_fences_and_prose(text):
+    assert extract(text) == '{"a": 1}'
+
+
+def test_extract_prefers_the_outermost_bracket():
+    assert extract('목록: [{"a": 1}, {"b": 2}] 끝') == '[{"a": 1}, {"b": 2}]'
+    assert extract("JSON 없음") == "JSON 없음"
+
+
+def test_extract_keeps_truncated_body():
+    assert extract('```json\n{"a": [1, 2') == '{"a": [1, 2'
+
+
+@pytest.mark.parametrize("broken, expected", [
+    ('{"a": 1,}', {"a": 1}),
+    ('{"a": [1, 2,],}', {"a": [1, 2]}),
+    ('{"a": "줄\n바꿈\t탭"}', {"a": "줄\n바꿈\t탭"}),
+    ('{"a": True, "b": None, "c": False}', {"a": True, "b": None, "c": False}),
+    ('{"a": 1, // 주석\n "b": /* 블록 */ 2}', {"a": 1, "b": 2}),
+    ('{"a": "http://x"}', {"a": "http://x"}),  # 문자열 안의 // 는 주석이 아님
+    ('{"a": "잘린 응답', {"a": "잘린 응답"}),
+    ('{"a": {"b": [1, 2', {"a": {"b": [1, 2]}}),
+    ('{"a": 1, "b":', {"a": 1, "b": None}),
+    ('{"a": "끝이 \\', {"a": "끝이 "}),
+])
+def test_repair_fixes_common_mistakes(broken, expected):
+    assert json.loads(repair(broken)) == expected
+
+
+def test_repair_leaves_valid_json_unchanged():
+    text = '{"a": [1, {"b": "c, d"}], "e": null}'
+    assert json.loads(repair(text)) == json.loads(text)
+
+
+def test_parse_reports_whether_it_repaired():
+    assert parse('{"a": 1}') == ({"a": 1}, False)
+    assert parse('```json\n{"a": 1,}\n```') == ({"a": 1}, True)
+    with pytest.raises(json.JSONDecodeError):
+        parse("{:}")
+    assert loads("{:}", default={}) == {}
+
+
+def test_to_block_round_trips():
+    value = {"섹션": {"노드": "내용"}}
+    assert parse(to_block(value)) == (value, False)
+
+
+# ─────────────────────────────
+def test_validate_accepts_matching_value():
+    assert validate({"issues": ["a", "b"]}, SCHEMA) == []
+
+
+def test_validate_reports_paths():
+    errors = validate({"issues": ["a", 3]}, SCHEMA)
+    assert len(errors) == 1 and errors[0].startswith("$.issues[1]")
+    assert validate({}, SCHEMA) == ["$: 필수 키 'issues' 없음"]
+    assert validate([], SCHEMA)[0].startswith("$: object")
+
+
+def test_validate_bool_is_not_a_number():
+    assert validate(True, {"type": "integer"})
+    assert validate(1, {"type": ["number", "null"]}) == []
+
+
+def test_validate_object_and_array_constraints():
+    strict = {"type": "object", "properties": {"a": {"type": "string"}}, "additionalProperties": False}
+    assert validate({"a": "x", "b": 1}, strict) == ["$: 허용되지 않은 키 'b'"]
+    assert validate({}, {"type": "object", "minProperties": 1})
+    assert validate({"x": 1}, {"type": "object", "additionalProperties": {"type": "object"}})
+    assert validate([], {"type": "array", "minItems": 1})
+    assert validate("c", {"enum": ["a", "b"]})
+
+
+def test_check_combines_parse_and_validate():
+    assert check('{"issues": []}', SCHEMA) == ({"issues": []}, [], False)
+    value, errors, repaired = check('{"issues": "x",}', SCHEMA)
+    assert repaired and errors and value == {"issues": "x"}
+    value, errors, _ = check("{:}", SCHEMA)
+    assert value is None and errors[0].startswith("JSON 파싱 실패")
+
+
+# ─────────────────────────────
+def test_complete_json_returns_first_valid_reply():
+    llm = ScriptedLLM('```json\n{"issues": ["a"]}\n```')
+    value, raw = complete_json(llm, [{"role": "user", "content": "q"}], SCHEMA, step="t")
+    assert value == {"issues": ["a"]} and "```json" in raw
+    assert len(llm.requests) == 1
+
+
+def test_complete_json_reasks_with_errors_and_previous_reply():
+    llm = ScriptedLLM('{"issues": 1}', '{"issues": ["ok"]}')
+    resets = []
+    value, _ = complete_json(llm, [{"role": "user", "content": "q"}], SCHEMA, step="t", budget=2,
+                             on_delta=lambda text, reset=False: resets.append(reset))
+    assert value == {"issues": ["ok"]}
+    retry = llm.requests[1]
+    assert retry[0] == {"role": "user", "content": "q"}
+    assert retry[1] == {"role": "assistant", "content": '{"issues": 1}'}
+    assert "$.issues" in retry[2]["content"]
+    assert resets == [True]  # 재요청 전에 스트리밍한 응답 취소
+
+
+def test_complete_json_raises_after_budget():
+    llm = ScriptedLLM("{:}", "{:}", "{:}")
+    with pytest.raises(StructuredOutputError) as info:
+        complete_json(llm, [{"role": "user", "content": "q"}], SCHEMA, step="build", budget=1)
+    assert info.value.step == "build" and info.value.raw == "{:}"
+    assert len(llm.requests) == 2
+    assert len(llm.replies) == 1
+
+
+def test_complete_json_keeps_malformed_replies_out_of_the_cache():
+    verdicts = []
+
+    class CachingLLM(ScriptedLLM):
+        def complete(self, messages, accept=None, **kwargs):
+            reply = super().complete(messages)
+            verdicts.append(accept(reply))
+            return reply
+
+    complete_json(CachingLLM('{"issues": 1}', '{"issues": []}'), [{"role": "user", "content": "q"}], SCHEMA, budget=1)
+    assert verdicts == [False, True]
+
+
+def test_complete_json_budget_from_env(monkeypatch):
+    monkeypatch.setenv("TREELLM_REASK_BUDGET", "0")
+    llm = ScriptedLLM("{:}", '{"issues": []}')
+    with pytest.raises(StructuredOutputError):
+        complete_json(llm, [{"role": "user", "content": "q"}], SCHEMA)
+    assert len(llm.requests) == 1
+
+
+def test_acomplete_json_follows_the_same_rounds():
+    llm = AsyncScriptedLLM("설명뿐", '{"issues": ["x"]}')
+    value, _ = asyncio.run(acomplete_json(llm, [{"role": "user", "content": "q"}], SCHEMA, budget=1))
+    assert value == {"issues": ["x"]}
+    assert len(llm.requests) == 2
+
+
+def test_record_fallback_lands_in_run_usage():
+    tracker = usage.UsageTracker()
+    token = usage.current_tracker.set(tracker)
+    try:
+        record_fallback(StructuredOutputError("build", ["깨짐"], "raw"), "dropped", pid="intro")
+    finally:
+        usage.current_tracker.reset(token)
+    assert tracker.summary()["degraded"] == {"build": {"dropped": 1}}
+    assert "깨짐" in tracker.degraded[0]["error"]
+
+
+def test_record_fallback_marks_the_running_node_degraded():
+    class Memo:
+        def __init__(self):
+            self.recorded = []
+
+        def fingerprint(self, node, args):
+            return node.name
+
+        def lookup(self, name, fp):
+            return None
+
+        def record(self, name, fp, outputs):
+            self.recorded.append(name)
+
+    def dropped(d):
+        record_fallback(StructuredOutputError("build", ["깨짐"], "raw"), "dropped")
+        return ""
+
+    graph = Graph()
+    graph.add("build:intro", dropped, inputs=["x"])
+    graph.add("build:method", lambda d: "tree", inputs=["x"])
+    memo = Memo()
+    list(graph.run({"x": 1}, memo=memo))
+    assert memo.recorded == ["build:method"]
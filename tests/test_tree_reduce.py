@@ -0,0 +1,60 @@
+"""
+module/tree_reduce.py: 부분 트리 로컬 병합 (LLM 호출 없음)
+"""
+
+import pytest
+
+from module.tree_reduce import Conflict, MapReduceTreeBuilder, chunk_paragraphs, merge_values
+
+
+@pytest.mark.parametrize("empty", [None, "", "  ", "없음", "N/A", "-", "...", {}, []])
+def test_empty_values_yield_to_the_other_side(empty):
+    assert merge_values(empty, "value") == "value"
+    assert merge_values("value", empty) == "value"
+
+
+def test_equal_values_merge():
+    assert merge_values("same", "same") == "same"
+    assert merge_values({"a": 1}, {"a": 1}) == {"a": 1}
+
+
+def test_dicts_merge_by_key_recursively():
+    a = {"Intro": {"문제": "A", "공백": ""}}
+    b = {"Intro": {"공백": "B", "기여": ["x"]}}
+    assert merge_values(a, b) == {"Intro": {"문제": "A", "공백": "B", "기여": ["x"]}}
+    # 입력은 바꾸지 않음
+    assert a == {"Intro": {"문제": "A", "공백": ""}}
+
+
+def test_lists_merge_as_ordered_union():
+    assert merge_values(["a", "b"], ["b", "c", "a"]) == ["a", "b", "c"]
+
+
+def test_different_values_conflict():
+    with pytest.raises(Conflict):
+        merge_values("A", "B")
+    with pytest.raises(Conflict):
+        merge_values({"k": {"n": "A"}}, {"k": {"n": "B"}})
+    with pytest.raises(Conflict):
+        merge_values({"k": 1}, ["k"])
+
+
+def test_merge_is_order_independent_without_conflicts():
+    trees = [{"S": {"a": "1"}}, {"S": {"b": "2"}}, {"S": {"a": "1", "c": ""}}]
+    forward = {}
+    for tree in trees:
+        forward = merge_values(forward, tree)
+    backward = {}
+    for tree in reversed(trees):
+        backward = merge_values(backward, tree)
+    assert forward["S"] == backward["S"] == {"a": "1", "b": "2", "c": ""}
+
+
+def test_merge_longest_resolves_conflicts_deterministically():
+    trees = [{"S": {"a": "short", "b": "x"}}, {"S": {"a": "much longer value", "c": "y"}}]
+    assert MapReduceTreeBuilder.merge_longest(trees) == {"S": {"a": "much longer value", "b": "x", "c": "y"}}
+
+
+def test_chunk_paragraphs_groups_short_paragraphs():
+    assert chunk_paragraphs(["aa", "bb", "cccc", "d"], min_chars=4) == ["aa\n\nbb", "cccc", "d"]
+    assert chunk_paragraphs([], min_chars=4) == []
@@ -0,0 +1,48 @@
+"""
+module/uploads.py: 내용 해시 저장 / 크기 제한 / 문서 키
+"""
+
+import hashlib
+import io
+
+import pytest
+
+from module.uploads import UploadTooLarge, doc_hash_of, doc_key, store_upload
+
+
+def test_store_upload_dedups_by_content(tmp_path):
+    first = store_upload(io.BytesIO(b"paper"), tmp_path)
+    second = store_upload(io.BytesIO(b"paper"), tmp_path)
+    assert first.path == second.path == tmp_path / f"{hashlib.sha256(b'paper').hexdigest()}.txt"
+    assert not first.duplicate and second.duplicate
+    assert sorted(p.name for p in tmp_path.iterdir()) == [first.path.name]
+
+
+def test_store_upload_rejects_large_files_without_leftovers(tmp_path):
+    with pytest.raises(UploadTooLarge):
+        store_upload(io.BytesIO(b"x" * 100), tmp_path, max_bytes=10)
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_doc_hash_of_hashes_content(tmp_path):
+    path = tmp_path / "draft.txt"
+    path.write_bytes(b"paper")
+    assert doc_hash_of(path) == hashlib.sha256(b"paper").hexdigest()
+
+
+@pytest.mark.parametrize("filename, doc_id, expected", [
+    ("paper.txt", None, "paper"),
+    ("my paper (v2).txt", None, "my_paper__v2"),
+    ("../../etc/passwd", None, "passwd"),
+    ("C:\\Users\\me\\논문.txt", None, "논문"),
+    ("paper.txt", "thesis/ch1", "thesis_ch1"),
+    ("paper.txt", "  ", "paper"),
+    ("...", None, "document"),
+])
+def test_doc_key_is_stable_and_safe(filename, doc_id, expected):
+    assert doc_key(filename, doc_id) == expected
+
+
+def test_doc_key_ignores_content():
+    assert doc_key("paper.txt") == doc_key("paper.txt")
+    assert len(doc_key("a" * 500 + ".txt")) == 100
@@ -0,0 +1,61 @@
+"""
+module/workspace.py: 작업 공간 정리 (완료 표시 / 실행 중 잠금 / 최근 파일 기준 나이)
+"""
+
+import os
+import time
+
+from module.workspace import Workspace, cleanup
+
+
+def make_run(tmp_path, run_id, age_hours=0.0, done=True, locked=False):
+    ws = Workspace(run_id, tmp_path)
+    ws.path("input.txt").write_text("paper", encoding="utf-8")
+    if done:
+        ws.mark_done()
+    if locked:
+        ws.acquire()
+    past = time.time() - age_hours * 3600
+    for p in [*ws.dir.rglob("*"), ws.dir]:
+        os.utime(p, (past, past))
+    return ws
+
+
+def test_cleanup_removes_only_finished_runs(tmp_path):
+    make_run(tmp_path, "old-done", age_hours=100)
+    make_run(tmp_path, "old-failed", age_hours=100, done=False)
+    assert cleanup(tmp_path, max_age_hours=72, max_runs=0) == ["old-done"]
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["old-failed"]
+
+
+def test_cleanup_skips_runs_with_live_lock(tmp_path):
+    ws = make_run(tmp_path, "resumed", age_hours=100, locked=True)
+    assert cleanup(tmp_path, max_age_hours=72, max_runs=0) == []
+    stat = ws.dir.stat()
+    ws.release()
+    os.utime(ws.dir, (stat.st_atime, stat.st_mtime))
+    assert cleanup(tmp_path, max_age_hours=72, max_runs=0) == ["resumed"]
+
+
+def test_cleanup_ignores_lock_of_dead_process(tmp_path):
+    ws = make_run(tmp_path, "crashed", age_hours=100, locked=True)
+    lock = ws.path("run.lock")
+    stat = lock.stat()
+    lock.write_text(lock.read_text().split()[0] + " 999999999")  # 이미 죽은 pid
+    os.utime(lock, (stat.st_atime, stat.st_mtime))
+    assert cleanup(tmp_path, max_age_hours=72, max_runs=0) == ["crashed"]
+
+
+def test_cleanup_ages_by_newest_file(tmp_path):
+    ws = make_run(tmp_path, "active", age_hours=100)
+    ws.path("checkpoints").mkdir()
+    ws.path("checkpoints/node.json").write_text("{}", encoding="utf-8")
+    old = time.time() - 100 * 3600
+    os.utime(ws.dir, (old, old))
+    assert cleanup(tmp_path, max_age_hours=72, max_runs=0) == []
+
+
+def test_cleanup_keeps_most_recent_runs(tmp_path):
+    for i, age in enumerate([3, 1, 2]):
+        make_run(tmp_path, f"run-{i}", age_hours=age)
+    assert cleanup(tmp_path, max_age_hours=0, max_runs=2) == ["run-0"]